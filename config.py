@@ -57,6 +57,7 @@ PERFORMANCE = {
     'chunk_size': 10000,  # عدد الصفوف لكل دفعة
     'use_multiprocessing': True,
     'n_jobs': -1,  # -1 = استخدام جميع النوى المتاحة
+    'fuzzy_max_workers': None,  # عمليات المطابقة الضبابية: None = تلقائي من 200,000 جائزة، 1 = بدون عمليات
 }
 
 # رسائل النظام
@@ -18,8 +18,11 @@ import numpy as np
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Set
 from datetime import datetime, timedelta
-import re
 import warnings
+
+from core.reference_index import ReferenceIndex, melt_references
+from core.text_normalizer import normalize_series, normalize_text
+
 warnings.filterwarnings('ignore')
 
 
@@ -71,17 +74,7 @@ class AdvancedAuditAnalyzer:
         - Lowercase
         - Remove special characters
         """
-        if pd.isna(text) or not isinstance(text, str):
-            return ""
-        
-        # Trim and normalize spaces
-        text = str(text).strip()
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Lowercase for matching
-        text = text.lower()
-        
-        return text
+        return normalize_text(text, fold_arabic=False, underscores=False)
     
     def detect_header_row(self, file_path: str, max_rows: int = 20) -> int:
         """
@@ -324,7 +317,7 @@ class AdvancedAuditAnalyzer:
         text_fields = ['OwnerName', 'BeneficiaryNameEn', 'Race', 'Season']
         for field in text_fields:
             if field in df.columns:
-                df[field] = df[field].apply(lambda x: self.normalize_text(x) if pd.notna(x) else x)
+                df[field] = normalize_series(df[field], fold_arabic=False, underscores=False, missing=np.nan)
                 df[field] = df[field].str.strip()
                 df[field] = df[field].replace('', np.nan)
         
@@ -467,6 +460,12 @@ class AdvancedAuditAnalyzer:
         """
         Verify duplicates against bank statement.
         
+        References (PaymentReference, then PaymentReference_D1) are matched on
+        their last REF_LAST_DIGITS characters in a single join:
+        - matched: a referenced bank row has the same amount (AMOUNT_TOLERANCE)
+        - partial: reference found in the bank, amount differs
+        - unmatched: no reference, or reference not found in the bank
+        
         Returns:
             Tuple of (matched, partial, unmatched) DataFrames
         """
@@ -475,68 +474,63 @@ class AdvancedAuditAnalyzer:
         
         self._log_event("BANK_VERIFY_START", "Starting bank payment verification")
         
-        matched_records = []
-        partial_records = []
-        unmatched_records = []
-        
-        for idx, award_row in self.duplicates.iterrows():
-            # Extract reference fields from award
-            award_refs = []
-            if 'PaymentReference' in award_row and pd.notna(award_row['PaymentReference']):
-                award_refs.append(str(award_row['PaymentReference']).strip())
-            if 'PaymentReference_D1' in award_row and pd.notna(award_row['PaymentReference_D1']):
-                award_refs.append(str(award_row['PaymentReference_D1']).strip())
-            
-            if not award_refs:
-                # No reference to match
-                unmatched_records.append(award_row.to_dict())
-                continue
-            
-            # Try to find match in bank statement
-            match_found = False
-            partial_match = False
-            bank_match = None
-            
-            for award_ref in award_refs:
-                # Clean reference
-                award_ref_clean = re.sub(r'[^\w]', '', award_ref).lower()
-                
-                # Vectorized matching (faster)
-                bank_matches = self.bank_data[
-                    (self.bank_data['AwardRef10Digits'].astype(str).str.lower().str.contains(award_ref_clean[-self.REF_LAST_DIGITS:], na=False)) |
-                    (self.bank_data['AwardRef'].astype(str).str.lower().str.contains(award_ref_clean[-self.REF_LAST_DIGITS:], na=False))
-                ]
-                
-                if len(bank_matches) > 0:
-                    # Take first match
-                    bank_match = bank_matches.iloc[0]
-                    match_found = True
-                    break
-                
-                if match_found:
-                    break
-            
-            # Categorize result
-            award_dict = award_row.to_dict()
-            if match_found and bank_match is not None:
-                award_dict['BankTransferAmount'] = bank_match.get('TransferAmount')
-                award_dict['BankTransactionDate'] = bank_match.get('TransactionDate')
-                award_dict['BankBeneficiary'] = bank_match.get('BeneficiaryName')
-                award_dict['BankReference'] = bank_match.get('BankReference')
-                matched_records.append(award_dict)
-            elif partial_match and bank_match is not None:
-                award_dict['BankTransferAmount'] = bank_match.get('TransferAmount')
-                award_dict['BankTransactionDate'] = bank_match.get('TransactionDate')
-                award_dict['BankBeneficiary'] = bank_match.get('BeneficiaryName')
-                award_dict['BankReference'] = bank_match.get('BankReference')
-                partial_records.append(award_dict)
-            else:
-                unmatched_records.append(award_dict)
-        
-        # Convert to DataFrames
-        matched_df = pd.DataFrame(matched_records) if matched_records else pd.DataFrame()
-        partial_df = pd.DataFrame(partial_records) if partial_records else pd.DataFrame()
-        unmatched_df = pd.DataFrame(unmatched_records) if unmatched_records else pd.DataFrame()
+        duplicates = self.duplicates
+        
+        # Normalize bank reference columns once and index every
+        # REF_LAST_DIGITS-long window (same semantics as str.contains)
+        ref_index = ReferenceIndex(
+            self.bank_data,
+            last_digits=self.REF_LAST_DIGITS,
+            columns=('AwardRef10Digits', 'AwardRef'),
+            contains=True
+        )
+        
+        # One long (award, reference) table joined against the index in one pass
+        melted = melt_references(duplicates, columns=('PaymentReference', 'PaymentReference_D1'))
+        pairs = ref_index.join(melted).sort_values(['award_pos', 'ref_rank', 'bank_pos'], kind='stable')
+        
+        # Vectorized amount comparison
+        if 'AwardAmount' in duplicates.columns:
+            award_amounts = pd.to_numeric(duplicates['AwardAmount'], errors='coerce').to_numpy(dtype=float)
+        else:
+            award_amounts = np.full(len(duplicates), np.nan)
+        if 'TransferAmount' in self.bank_data.columns:
+            bank_amounts = pd.to_numeric(self.bank_data['TransferAmount'], errors='coerce').to_numpy(dtype=float)
+        else:
+            bank_amounts = np.full(len(self.bank_data), np.nan)
+        
+        pairs['AmountDifference'] = np.abs(
+            award_amounts[pairs['award_pos'].to_numpy()] - bank_amounts[pairs['bank_pos'].to_numpy()]
+        )
+        amount_ok = (pairs['AmountDifference'] <= self.AMOUNT_TOLERANCE).to_numpy()
+        
+        # Matched: first reference/bank row with the same amount.
+        # Partial: reference found but no bank row with the same amount.
+        full = pairs[amount_ok].drop_duplicates('award_pos', keep='first')
+        partial = pairs[~pairs['award_pos'].isin(full['award_pos'])].drop_duplicates('award_pos', keep='first')
+        
+        def with_bank_fields(found: pd.DataFrame) -> pd.DataFrame:
+            if len(found) == 0:
+                return pd.DataFrame()
+            records = duplicates.iloc[found['award_pos'].to_numpy()].reset_index(drop=True)
+            bank_rows = self.bank_data.iloc[found['bank_pos'].to_numpy()]
+            for target, source in [('BankTransferAmount', 'TransferAmount'),
+                                   ('BankTransactionDate', 'TransactionDate'),
+                                   ('BankBeneficiary', 'BeneficiaryName'),
+                                   ('BankReference', 'BankReference')]:
+                records[target] = bank_rows[source].to_numpy() if source in bank_rows.columns else None
+            return records
+        
+        matched_df = with_bank_fields(full)
+        partial_df = with_bank_fields(partial)
+        if len(partial_df) > 0:
+            partial_df['AmountDifference'] = partial['AmountDifference'].to_numpy()
+        
+        found = np.zeros(len(duplicates), dtype=bool)
+        found[pairs['award_pos'].to_numpy(dtype=np.int64)] = True
+        unmatched_df = duplicates.iloc[np.flatnonzero(~found)].reset_index(drop=True)
+        if len(unmatched_df) == 0:
+            unmatched_df = pd.DataFrame()
         
         self._log_event("BANK_VERIFY_COMPLETE", 
                        f"Verified {len(self.duplicates)} records",
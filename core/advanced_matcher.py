@@ -2,37 +2,77 @@
 """
 🔗 محرك المطابقة المتقدم - Advanced Matching Engine
 ======================================================
-مطابقة متعددة الطبقات: Exact → Fuzzy → Record Linkage
+مطابقة متعددة الطبقات: IBAN → Exact → Fuzzy → Record Linkage → Split Payments
 
 Libraries Used:
 - pandas>=2.1.0
-- rapidfuzz>=3.5.0
-- recordlinkage>=0.16.0
+- rapidfuzz>=3.6.0
 - numpy>=1.24.0
 
 Install if missing:
-pip install pandas rapidfuzz recordlinkage numpy
+pip install pandas rapidfuzz numpy
 """
 
 import pandas as pd
 import numpy as np
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import JaroWinkler
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
-import recordlinkage as rl
-from recordlinkage.compare import Compare
+
+from core.match_engine import (
+    SECONDS_PER_DAY,
+    BankWindowIndex,
+    amounts_to_cents,
+    bank_column,
+    dates_to_seconds,
+    day_diff,
+    fuzzy_best_in_window,
+    fuzzy_pairs_in_window,
+    iban_keys,
+    iban_pairs,
+    name_ranks,
+    sorted_neighbourhood_pairs
+)
+from core.assignment import one_to_one_assignment
+from core.match_results import MatchResultBuilder
+from core.split_payments import SPLIT_MAX_CANDIDATES, SPLIT_MAX_PARTS, find_split_payments
+
+# أعمدة البنك في نتائج المطابقة: (الأسماء البديلة، القيمة الافتراضية)
+MATCH_BANK_COLUMNS = {
+    'BankReference': (['BankReference'], ''),
+    'TransferAmount': (['TransferAmount', 'BankAmount'], 0),
+    'TransferDate': (['TransferDate', 'BankDate'], None),
+    'BeneficiaryName': (['BeneficiaryName', 'BankName'], ''),
+}
+
+
+def match_bank_columns(bank_df: pd.DataFrame) -> Dict[str, Tuple[List[str], object]]:
+    """أعمدة البنك في نتائج المطابقة (+ BankKey للمطابقة التدريجية إن وجد)"""
+    bank_columns = dict(MATCH_BANK_COLUMNS)
+    if 'BankKey' in bank_df.columns:
+        bank_columns['BankKey'] = (['BankKey'], '')
+    return bank_columns
+
+# أدنى تشابه جيب تمام (مقاطع حرفية) لمرشحي المطابقة بالاسم أولاً قبل تقييم rapidfuzz
+NAME_FIRST_MIN_SIMILARITY = 0.3
 
 class AdvancedMatcher:
     """محرك المطابقة المتقدم"""
     
-    def __init__(self, fuzzy_threshold: int = 90):
+    def __init__(self, fuzzy_threshold: int = 90, similarity_cache=None, one_to_one: bool = False):
         """
         تهيئة محرك المطابقة
         
         Args:
             fuzzy_threshold: عتبة التطابق الضبابي (0-100)
+            similarity_cache: ذاكرة تشابه دائمة (core.similarity_cache.SimilarityCache) - اختياري
+            one_to_one: إسناد واحد-لواحد - التحويل الواحد لا يُنسب لأكثر من جائزة
+                        (داخل كل طبقة وعبر الطبقات في match_all_layers)
         """
         self.fuzzy_threshold = fuzzy_threshold
+        self.similarity_cache = similarity_cache
+        self.one_to_one = one_to_one
         self.match_results = None
     
     def exact_match(
@@ -44,12 +84,16 @@ class AdvancedMatcher:
         """
         المطابقة الحتمية (Exact Matching)
         
-        Library Used: pandas
+        Library Used: pandas, numpy (core.match_engine)
+        
+        محرك عمودي: كتل البنك حسب المبلغ بالهللات مرتبة حسب التاريخ،
+        والنافذة الزمنية تُحل بـ searchsorted بدلاً من حلقة awards × bank
         
         القواعد:
         - AwardAmount == TransferAmount
         - الفرق بين التواريخ ≤ time_window_days
         - (اختياري) BankReference موجود
+        - one_to_one: أقرب تاريخ بدلاً من أول صف، والتحويل لجائزة واحدة
         
         Args:
             awards_df: بيانات الجوائز
@@ -59,50 +103,155 @@ class AdvancedMatcher:
         Returns:
             DataFrame بالمطابقات الحتمية
         """
-        matches = []
+        if len(awards_df) == 0 or len(bank_df) == 0:
+            return pd.DataFrame()
         
-        for _, award in awards_df.iterrows():
-            award_amount = award.get('AwardAmount', 0)
-            entry_date = award.get('EntryDate')
+        # فهرسة البنك مرة واحدة: (المبلغ بالهللات، التاريخ)
+        bank_index = BankWindowIndex.from_frame(bank_df)
+        
+        award_cents, amount_ok = amounts_to_cents(bank_column(awards_df, ['AwardAmount'], 0))
+        award_seconds, date_ok = dates_to_seconds(bank_column(awards_df, ['EntryDate'], None))
+        
+        # حل النافذة الزمنية لكل الجوائز دفعة واحدة
+        lo, hi = bank_index.day_window(
+            award_cents, award_seconds, amount_ok & date_ok, time_window_days
+        )
+        
+        if self.one_to_one:
+            # كل الأزواج المرشحة ثم الإسناد: أقرب تاريخ ← أول صف في كشف البنك
+            pair_award, pair_bank = bank_index.window_pairs(lo, hi)
+            if len(pair_award) == 0:
+                return pd.DataFrame()
+            pair_diffs = day_diff(award_seconds[pair_award], bank_index.seconds[pair_bank])
+            best = self._select_pairs(pair_award, pair_bank, (pair_bank, pair_diffs))
+            award_pos, bank_pos = pair_award[best], pair_bank[best]
+        else:
+            # أول مطابقة فقط (حسب ترتيب كشف البنك)
+            first_bank = bank_index.first_in_window(lo, hi)
+            award_pos = np.flatnonzero(first_bank >= 0)
             
-            if pd.isna(award_amount) or pd.isna(entry_date):
-                continue
+            if len(award_pos) == 0:
+                return pd.DataFrame()
             
-            # البحث في كشف البنك
-            for _, bank in bank_df.iterrows():
-                bank_amount = bank.get('TransferAmount', bank.get('BankAmount', 0))
-                transfer_date = bank.get('TransferDate', bank.get('BankDate'))
-                
-                if pd.isna(bank_amount) or pd.isna(transfer_date):
-                    continue
-                
-                # شرط المبلغ
-                if abs(award_amount - bank_amount) > 0.01:
-                    continue
-                
-                # شرط التاريخ
-                try:
-                    date_diff = abs((entry_date - transfer_date).days)
-                    if date_diff > time_window_days:
-                        continue
-                except:
-                    continue
-                
-                # مطابقة ناجحة
-                match = {
-                    **award.to_dict(),
-                    'BankReference': bank.get('BankReference', ''),
-                    'TransferAmount': bank_amount,
-                    'TransferDate': transfer_date,
-                    'BeneficiaryName': bank.get('BeneficiaryName', bank.get('BankName', '')),
-                    'MatchType': 'Exact',
-                    'MatchScore': 100,
-                    'DateDiff': date_diff
-                }
-                matches.append(match)
-                break  # أول مطابقة فقط
-        
-        return pd.DataFrame(matches)
+            bank_pos = first_bank[award_pos]
+        
+        return self._build_matches(
+            awards_df, bank_df, award_pos, bank_pos,
+            match_type='Exact',
+            scores=np.full(len(award_pos), 100),
+            date_diffs=day_diff(award_seconds[award_pos], bank_index.seconds[bank_pos])
+        )
+    
+    def iban_match(
+        self,
+        awards_df: pd.DataFrame,
+        bank_df: pd.DataFrame,
+        time_window_days: int = 7
+    ) -> pd.DataFrame:
+        """
+        المطابقة بواسطة IBAN (IBAN Matching)
+        
+        Library Used: pandas (merge), numpy (core.match_engine.iban_pairs)
+        
+        hash-join على IBAN الموحد ثم شرطا المبلغ والنافذة، بنفس قواعد طبقة
+        IBAN في المطابقة الأساسية
+        
+        القواعد:
+        - IBAN الجائزة == IBAN التحويل (بعد التوحيد: أحرف كبيرة بدون مسافات)
+        - AwardAmount == TransferAmount
+        - الفرق بين التواريخ ≤ time_window_days
+        - أقرب تاريخ ← أول صف في كشف البنك
+        
+        Args:
+            awards_df: بيانات الجوائز
+            bank_df: بيانات البنك
+            time_window_days: نافذة التطابق الزمني
+        
+        Returns:
+            DataFrame بمطابقات IBAN (فارغ إذا لم يوجد عمود IBAN في الطرفين)
+        """
+        if len(awards_df) == 0 or len(bank_df) == 0:
+            return pd.DataFrame()
+        if 'IBAN' not in awards_df.columns or 'IBAN' not in bank_df.columns:
+            return pd.DataFrame()
+        
+        award_cents, award_amount_ok = amounts_to_cents(bank_column(awards_df, ['AwardAmount'], None))
+        award_seconds, award_date_ok = dates_to_seconds(bank_column(awards_df, ['EntryDate'], None))
+        bank_cents, bank_amount_ok = amounts_to_cents(bank_column(bank_df, ['TransferAmount', 'BankAmount'], None))
+        bank_seconds, bank_date_ok = dates_to_seconds(bank_column(bank_df, ['TransferDate', 'BankDate'], None))
+        
+        award_pos, bank_pos, date_diffs = iban_pairs(
+            iban_keys(awards_df['IBAN']), award_cents, award_seconds, award_amount_ok & award_date_ok,
+            iban_keys(bank_df['IBAN']), bank_cents, bank_seconds, bank_amount_ok & bank_date_ok,
+            time_window_days,
+            best_only=not self.one_to_one
+        )
+        if len(award_pos) == 0:
+            return pd.DataFrame()
+        
+        if self.one_to_one:
+            # الإسناد: أقرب تاريخ ← أول صف في كشف البنك
+            best = self._select_pairs(award_pos, bank_pos, (bank_pos, date_diffs))
+            award_pos, bank_pos, date_diffs = award_pos[best], bank_pos[best], date_diffs[best]
+        
+        return self._build_matches(
+            awards_df, bank_df, award_pos, bank_pos,
+            match_type='IBAN',
+            scores=np.full(len(award_pos), 100),
+            date_diffs=date_diffs
+        )
+    
+    def _build_matches(
+        self,
+        awards_df: pd.DataFrame,
+        bank_df: pd.DataFrame,
+        award_pos: np.ndarray,
+        bank_pos: np.ndarray,
+        match_type: str,
+        scores: np.ndarray,
+        date_diffs: np.ndarray,
+        **fields
+    ) -> pd.DataFrame:
+        """
+        بناء جدول المطابقات من مواضع (جائزة، بنك)
+        
+        أعمدة الجائزة كاملة + أعمدة البنك + MatchType/MatchScore/DateDiff
+        (+ حقول إضافية، و BankIndex في وضع one_to_one) بنفس ترتيب الأعمدة
+        السابق، مع الحفاظ على فهرس الجوائز الأصلي
+        """
+        if self.one_to_one:
+            # معرّف التحويل لاستبعاده من الطبقات التالية
+            fields['BankIndex'] = bank_df.index.to_numpy()[bank_pos]
+        
+        builder = MatchResultBuilder(len(awards_df))
+        builder.add(award_pos, bank_pos, MatchType=match_type, MatchScore=scores, DateDiff=date_diffs, **fields)
+        
+        return builder.build(
+            awards_df, bank_df,
+            bank_columns=match_bank_columns(bank_df),
+            sort=False,
+            keep_index=True
+        )
+    
+    def _select_pairs(self, award_pos: np.ndarray, bank_pos: np.ndarray, keys: Tuple) -> np.ndarray:
+        """
+        اختيار الأزواج من المرشحين حسب مفاتيح التفضيل (ترتيب lexsort: الأخير أهم)
+        
+        - افتراضياً: أفضل زوج لكل جائزة بشكل مستقل
+        - one_to_one: إسناد واحد-لواحد (core.assignment)، وتكلفة الزوج ترتيبه في التفضيل
+        
+        Returns:
+            مواضع الأزواج المختارة مرتبة حسب الجائزة
+        """
+        if self.one_to_one:
+            cost = np.empty(len(award_pos), dtype=np.float64)
+            cost[np.lexsort(keys)] = np.arange(len(award_pos))
+            chosen = one_to_one_assignment(award_pos, bank_pos, cost)
+            return chosen[np.argsort(award_pos[chosen], kind='stable')]
+        
+        order = np.lexsort(tuple(keys) + (award_pos,))
+        first = np.r_[True, award_pos[order][1:] != award_pos[order][:-1]]
+        return order[first]
     
     def fuzzy_match(
         self,
@@ -113,7 +262,10 @@ class AdvancedMatcher:
         """
         المطابقة الضبابية (Fuzzy Matching)
         
-        Library Used: rapidfuzz, pandas
+        Library Used: rapidfuzz (process.cdist), pandas
+        
+        المرشحون محصورون في كتل (المبلغ، النافذة الزمنية)، ومصفوفة أسماء
+        كل كتلة تُحسب باستدعاء cdist واحد على جميع الأنوية
         
         القواعد:
         - AwardAmount == TransferAmount
@@ -128,60 +280,332 @@ class AdvancedMatcher:
         Returns:
             DataFrame بالمطابقات الضبابية
         """
-        matches = []
-        
-        for _, award in unmatched_awards.iterrows():
-            award_amount = award.get('AwardAmount', 0)
-            entry_date = award.get('EntryDate')
-            owner_name = str(award.get('OwnerName_norm', '')).lower()
-            
-            if pd.isna(award_amount) or pd.isna(entry_date) or not owner_name:
-                continue
-            
-            best_match = None
-            best_score = 0
-            
-            # البحث في كشف البنك
-            for _, bank in bank_df.iterrows():
-                bank_amount = bank.get('TransferAmount', bank.get('BankAmount', 0))
-                transfer_date = bank.get('TransferDate', bank.get('BankDate'))
-                bank_name = str(bank.get('BankName_norm', '')).lower()
-                
-                if pd.isna(bank_amount) or pd.isna(transfer_date) or not bank_name:
-                    continue
-                
-                # شرط المبلغ
-                if abs(award_amount - bank_amount) > 0.01:
-                    continue
-                
-                # شرط التاريخ
-                try:
-                    date_diff = abs((entry_date - transfer_date).days)
-                    if date_diff > time_window_days:
-                        continue
-                except:
+        if len(unmatched_awards) == 0 or len(bank_df) == 0:
+            return pd.DataFrame()
+        
+        bank_index = BankWindowIndex.from_frame(bank_df)
+        
+        award_cents, amount_ok = amounts_to_cents(bank_column(unmatched_awards, ['AwardAmount'], 0))
+        award_seconds, date_ok = dates_to_seconds(bank_column(unmatched_awards, ['EntryDate'], None))
+        
+        # الكتل المرشحة: نفس المبلغ + ضمن النافذة الزمنية
+        lo, hi = bank_index.day_window(
+            award_cents, award_seconds, amount_ok & date_ok, time_window_days
+        )
+        
+        owner_names = bank_column(unmatched_awards, ['OwnerName_norm'], '').astype(str).str.lower()
+        bank_names = bank_column(bank_df, ['BankName_norm'], '').astype(str).str.lower()
+        
+        if self.one_to_one:
+            # كل الأزواج فوق العتبة ثم الإسناد: الدرجة ← أقرب تاريخ ← أول صف في كشف البنك
+            pair_award, pair_bank, pair_score = fuzzy_pairs_in_window(
+                bank_index, lo, hi,
+                owner_names.to_numpy(),
+                bank_names.to_numpy(),
+                score_cutoff=self.fuzzy_threshold,
+                cache=self.similarity_cache
+            )
+            if len(pair_award) == 0:
+                return pd.DataFrame()
+            pair_diffs = day_diff(award_seconds[pair_award], bank_index.seconds[pair_bank])
+            best = self._select_pairs(pair_award, pair_bank, (pair_bank, pair_diffs, -pair_score))
+            
+            return self._build_matches(
+                unmatched_awards, bank_df, pair_award[best], pair_bank[best],
+                match_type='Fuzzy',
+                scores=pair_score[best],
+                date_diffs=pair_diffs[best]
+            )
+        
+        # تقييم كل كتلة باستدعاء cdist واحد متعدد الخيوط
+        best_bank, best_score = fuzzy_best_in_window(
+            bank_index, lo, hi,
+            owner_names.to_numpy(),
+            bank_names.to_numpy(),
+            score_cutoff=self.fuzzy_threshold,
+            cache=self.similarity_cache
+        )
+        
+        award_pos = np.flatnonzero(best_bank >= 0)
+        if len(award_pos) == 0:
+            return pd.DataFrame()
+        
+        bank_pos = best_bank[award_pos]
+        
+        return self._build_matches(
+            unmatched_awards, bank_df, award_pos, bank_pos,
+            match_type='Fuzzy',
+            scores=best_score[award_pos],
+            date_diffs=day_diff(award_seconds[award_pos], bank_index.seconds[bank_pos])
+        )
+    
+    def name_first_match(
+        self,
+        unmatched_awards: pd.DataFrame,
+        bank_df: pd.DataFrame,
+        time_window_days: int = 7,
+        top_k: int = 10
+    ) -> pd.DataFrame:
+        """
+        المطابقة بالاسم أولاً (Name-First Matching)
+        
+        Library Used: scikit-learn/scipy (core.name_index), rapidfuzz (process.cpdist)
+        
+        للجوائز التي أُدخل مبلغها خطأً: المرشحون هم أقرب top_k اسماً من
+        فهرس المقاطع الحرفية (NameIndex) بدون شرط المبلغ، ثم التقييم بـ rapidfuzz
+        
+        القواعد:
+        - similarity(OwnerName, BankName) >= threshold
+        - الفرق بين التواريخ ≤ time_window_days
+        - المبلغ غير مشروط (الفرق يظهر في AmountDiff)
+        
+        Args:
+            unmatched_awards: الجوائز غير المطابقة
+            bank_df: بيانات البنك
+            time_window_days: نافذة التطابق الزمني
+            top_k: عدد الأسماء المرشحة لكل جائزة
+        
+        Returns:
+            DataFrame بأفضل مطابقة لكل جائزة
+        """
+        if len(unmatched_awards) == 0 or len(bank_df) == 0:
+            return pd.DataFrame()
+        
+        try:
+            from core.name_index import NameIndex
+            
+            owner_names = bank_column(unmatched_awards, ['OwnerName_norm'], '').fillna('').astype(str).str.lower()
+            bank_names = bank_column(bank_df, ['BankName_norm'], '').fillna('').astype(str).str.lower()
+            
+            award_pos, bank_pos, _ = NameIndex(bank_names).query(
+                owner_names, top_k=top_k, min_similarity=NAME_FIRST_MIN_SIMILARITY
+            )
+            if len(award_pos) == 0:
+                return pd.DataFrame()
+            
+            # النافذة الزمنية (التاريخ مطلوب في الطرفين)
+            award_seconds, award_date_ok = dates_to_seconds(bank_column(unmatched_awards, ['EntryDate'], None))
+            bank_seconds, bank_date_ok = dates_to_seconds(bank_column(bank_df, ['TransferDate', 'BankDate'], None))
+            date_diffs = day_diff(award_seconds[award_pos], bank_seconds[bank_pos])
+            in_window = award_date_ok[award_pos] & bank_date_ok[bank_pos] & (date_diffs <= time_window_days)
+            award_pos, bank_pos, date_diffs = award_pos[in_window], bank_pos[in_window], date_diffs[in_window]
+            
+            # التقييم بنفس مقياس الطبقة الضبابية (عبر الذاكرة الدائمة إن وُجدت)
+            pair_owner = owner_names.to_numpy()[award_pos]
+            pair_bank = bank_names.to_numpy()[bank_pos]
+            if self.similarity_cache is not None:
+                scores = self.similarity_cache.score_pairs(pair_owner, pair_bank, scorer=fuzz.ratio)
+            else:
+                scores = process.cpdist(pair_owner, pair_bank, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+            passed = np.flatnonzero(scores >= self.fuzzy_threshold)
+            if len(passed) == 0:
+                return pd.DataFrame()
+            
+            # أفضل زوج لكل جائزة: الدرجة ← أقرب تاريخ ← أول صف في كشف البنك
+            best = passed[self._select_pairs(
+                award_pos[passed], bank_pos[passed], (bank_pos[passed], date_diffs[passed], -scores[passed])
+            )]
+            
+            matches = self._build_matches(
+                unmatched_awards, bank_df, award_pos[best], bank_pos[best],
+                match_type='NameFirst',
+                scores=scores[best],
+                date_diffs=date_diffs[best]
+            )
+            
+            award_amounts = pd.to_numeric(bank_column(unmatched_awards, ['AwardAmount'], None), errors='coerce').to_numpy()
+            bank_amounts = pd.to_numeric(bank_column(bank_df, ['TransferAmount', 'BankAmount'], None), errors='coerce').to_numpy()
+            matches['AmountDiff'] = np.abs(award_amounts[award_pos[best]] - bank_amounts[bank_pos[best]])
+            return matches
+        
+        except Exception as e:
+            print(f"⚠️ خطأ في المطابقة بالاسم أولاً: {str(e)}")
+        
+        return pd.DataFrame()
+    
+    def split_payment_match(
+        self,
+        unmatched_awards: pd.DataFrame,
+        bank_df: pd.DataFrame,
+        time_window_days: int = 7,
+        max_parts: int = SPLIT_MAX_PARTS,
+        tolerance_cents: int = 0
+    ) -> pd.DataFrame:
+        """
+        مطابقة الدفعات المجزأة (Split Payment Matching)
+        
+        Library Used: numpy, pandas (core.split_payments)
+        
+        تحويلات المستفيد نفسه ضمن النافذة الزمنية تُجمع لكل جائزة، ثم
+        مجموع جزئي محدود على الهللات (Meet-in-the-Middle) بحد أقصى
+        max_parts دفعات و SPLIT_MAX_CANDIDATES مرشحاً لكل جائزة
+        
+        القواعد:
+        - OwnerName_norm == BankName_norm
+        - الفرق بين تاريخ كل تحويل وتاريخ الجائزة ≤ time_window_days
+        - مجموع 2..max_parts تحويلات == AwardAmount (± tolerance_cents)
+        - التحويل الواحد لا يُستخدم لأكثر من جائزة
+        
+        Args:
+            unmatched_awards: الجوائز غير المطابقة
+            bank_df: بيانات البنك
+            time_window_days: نافذة التطابق الزمني
+            max_parts: أقصى عدد دفعات للجائزة (لا يتجاوز SPLIT_PARTS_LIMIT)
+            tolerance_cents: الفرق المسموح في المجموع بالهللات
+            
+        Returns:
+            DataFrame بصف لكل تحويل (SplitParts = عدد دفعات الجائزة)
+        """
+        if len(unmatched_awards) == 0 or len(bank_df) == 0:
+            return pd.DataFrame()
+        
+        try:
+            award_cents, award_amount_ok = amounts_to_cents(bank_column(unmatched_awards, ['AwardAmount'], None))
+            award_seconds, award_date_ok = dates_to_seconds(bank_column(unmatched_awards, ['EntryDate'], None))
+            bank_cents, bank_amount_ok = amounts_to_cents(bank_column(bank_df, ['TransferAmount', 'BankAmount'], None))
+            bank_seconds, bank_date_ok = dates_to_seconds(bank_column(bank_df, ['TransferDate', 'BankDate'], None))
+            
+            award_pos, bank_pos, parts = find_split_payments(
+                award_cents, award_seconds,
+                bank_column(unmatched_awards, ['OwnerName_norm'], '').astype(str).str.lower().to_numpy(),
+                bank_cents, bank_seconds,
+                bank_column(bank_df, ['BankName_norm'], '').astype(str).str.lower().to_numpy(),
+                window_days=time_window_days,
+                max_parts=max_parts,
+                max_candidates=SPLIT_MAX_CANDIDATES,
+                tolerance_cents=tolerance_cents,
+                award_valid=award_amount_ok & award_date_ok,
+                bank_valid=bank_amount_ok & bank_date_ok
+            )
+            if len(award_pos) == 0:
+                return pd.DataFrame()
+            
+            # مجموع دفعات كل جائزة
+            group_total = pd.Series(bank_cents[bank_pos]).groupby(award_pos).transform('sum').to_numpy() / 100
+            
+            return self._build_matches(
+                unmatched_awards, bank_df, award_pos, bank_pos,
+                match_type='SplitPayment',
+                scores=np.full(len(award_pos), 100),
+                date_diffs=day_diff(award_seconds[award_pos], bank_seconds[bank_pos]),
+                SplitParts=parts,
+                SplitTotal=group_total
+            )
+            
+        except Exception as e:
+            print(f"⚠️ خطأ في مطابقة الدفعات المجزأة: {str(e)}")
+        
+        return pd.DataFrame()
+    
+    def transliteration_match(
+        self,
+        unmatched_awards: pd.DataFrame,
+        bank_df: pd.DataFrame,
+        time_window_days: int = 7,
+        top_k: int = 20
+    ) -> pd.DataFrame:
+        """
+        المطابقة عبر الحروف العربية/اللاتينية (Transliteration Matching)
+        
+        Library Used: core.transliteration (Unidecode + NameIndex), rapidfuzz
+        
+        هياكل الأسماء تُحسب مرة واحدة لكل اسم فريد، والمرشحون أقرب top_k
+        هيكلاً من فهرس هياكل البنك لكل من OwnerName و BeneficiaryEnglishName
+        
+        القواعد:
+        - similarity(هيكل اسم الجائزة، هيكل اسم البنك) >= TRANSLITERATION_THRESHOLD
+        - الفرق بين التواريخ ≤ time_window_days
+        - المبلغ غير مشروط (المبلغ المطابق مُفضَّل عند التساوي، والفرق في AmountDiff)
+          لأن الجوائز ذات المبلغ المطابق تُطابق في الطبقة الحتمية
+        
+        Args:
+            unmatched_awards: الجوائز غير المطابقة
+            bank_df: بيانات البنك
+            time_window_days: نافذة التطابق الزمني
+            top_k: عدد الهياكل المرشحة لكل اسم
+            
+        Returns:
+            DataFrame بأفضل مطابقة لكل جائزة
+        """
+        if len(unmatched_awards) == 0 or len(bank_df) == 0:
+            return pd.DataFrame()
+        
+        try:
+            from core.transliteration import (
+                TRANSLITERATION_AWARD_COLUMNS,
+                TRANSLITERATION_THRESHOLD,
+                TransliterationIndex,
+                skeleton_series
+            )
+            
+            index = TransliterationIndex(bank_column(bank_df, ['BeneficiaryName', 'BankName', 'BankName_norm'], ''))
+            
+            # المرشحون من كل عمود اسم في الجائزة (عربي أو لاتيني)
+            award_parts, bank_parts, skeleton_parts = [], [], []
+            for sources in TRANSLITERATION_AWARD_COLUMNS:
+                if not any(source in unmatched_awards.columns for source in sources):
                     continue
-                
-                # حساب التشابه
-                similarity = fuzz.ratio(owner_name, bank_name)
-                
-                if similarity >= self.fuzzy_threshold and similarity > best_score:
-                    best_score = similarity
-                    best_match = {
-                        **award.to_dict(),
-                        'BankReference': bank.get('BankReference', ''),
-                        'TransferAmount': bank_amount,
-                        'TransferDate': transfer_date,
-                        'BeneficiaryName': bank.get('BeneficiaryName', bank.get('BankName', '')),
-                        'MatchType': 'Fuzzy',
-                        'MatchScore': similarity,
-                        'DateDiff': date_diff
-                    }
-            
-            if best_match:
-                matches.append(best_match)
-        
-        return pd.DataFrame(matches)
+                names = bank_column(unmatched_awards, sources, '')
+                award_pos, bank_pos, _ = index.query(names, top_k=top_k)
+                award_parts.append(award_pos)
+                bank_parts.append(bank_pos)
+                skeleton_parts.append(skeleton_series(names).to_numpy()[award_pos])
+            
+            if not award_parts:
+                return pd.DataFrame()
+            award_pos = np.concatenate(award_parts)
+            bank_pos = np.concatenate(bank_parts)
+            award_skeletons = np.concatenate(skeleton_parts)
+            
+            # النافذة الزمنية (التاريخ مطلوب في الطرفين)
+            award_seconds, award_date_ok = dates_to_seconds(bank_column(unmatched_awards, ['EntryDate'], None))
+            bank_seconds, bank_date_ok = dates_to_seconds(bank_column(bank_df, ['TransferDate', 'BankDate'], None))
+            date_diffs = day_diff(award_seconds[award_pos], bank_seconds[bank_pos])
+            in_window = award_date_ok[award_pos] & bank_date_ok[bank_pos] & (date_diffs <= time_window_days)
+            award_pos, bank_pos = award_pos[in_window], bank_pos[in_window]
+            award_skeletons, date_diffs = award_skeletons[in_window], date_diffs[in_window]
+            if len(award_pos) == 0:
+                return pd.DataFrame()
+            
+            pair_bank = index.skeletons[bank_pos]
+            if self.similarity_cache is not None:
+                scores = self.similarity_cache.score_pairs(award_skeletons, pair_bank, scorer=fuzz.ratio)
+            else:
+                scores = process.cpdist(award_skeletons, pair_bank, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+            
+            passed = np.flatnonzero(scores >= TRANSLITERATION_THRESHOLD)
+            if len(passed) == 0:
+                return pd.DataFrame()
+            
+            award_cents, award_amount_ok = amounts_to_cents(bank_column(unmatched_awards, ['AwardAmount'], None))
+            bank_cents, bank_amount_ok = amounts_to_cents(bank_column(bank_df, ['TransferAmount', 'BankAmount'], None))
+            amount_diff = ~(
+                award_amount_ok[award_pos] & bank_amount_ok[bank_pos] &
+                (award_cents[award_pos] == bank_cents[bank_pos])
+            )
+            
+            # أفضل زوج لكل جائزة: الدرجة ← المبلغ المطابق ← أقرب تاريخ ← أول صف في كشف البنك
+            best = passed[self._select_pairs(
+                award_pos[passed], bank_pos[passed],
+                (bank_pos[passed], date_diffs[passed], amount_diff[passed], -scores[passed])
+            )]
+            
+            matches = self._build_matches(
+                unmatched_awards, bank_df, award_pos[best], bank_pos[best],
+                match_type='Transliteration',
+                scores=scores[best],
+                date_diffs=date_diffs[best]
+            )
+            
+            award_amounts = pd.to_numeric(bank_column(unmatched_awards, ['AwardAmount'], None), errors='coerce').to_numpy()
+            bank_amounts = pd.to_numeric(bank_column(bank_df, ['TransferAmount', 'BankAmount'], None), errors='coerce').to_numpy()
+            matches['AmountDiff'] = np.abs(award_amounts[award_pos[best]] - bank_amounts[bank_pos[best]])
+            return matches
+            
+        except Exception as e:
+            print(f"⚠️ خطأ في المطابقة عبر الحروف العربية/اللاتينية: {str(e)}")
+        
+        return pd.DataFrame()
     
     def record_linkage_match(
         self,
@@ -193,170 +617,228 @@ class AdvancedMatcher:
         """
         مطابقة Record Linkage (للحالات المعقدة)
         
-        Library Used: recordlinkage, pandas
+        Library Used: rapidfuzz (process.cpdist), numpy (core.match_engine)
         
-        استخدام خوارزميات متقدمة للمطابقة المركبة
+        تكتيل متعدد المراحل بالجوار المرتب (Sorted Neighbourhood) على الاسم
+        داخل كتل: (المبلغ، أسبوع التاريخ) ← (أسبوع التاريخ) ← (المبلغ)،
+        ثم تقييم كل الأزواج دفعة واحدة:
+        - name_sim: Jaro-Winkler بين OwnerName_norm و BankName_norm
+        - amount_sim: 1 - الفرق النسبي بين المبلغين
+        - date_sim: 1 - فرق الأيام / (time_window_days + 1)
         
         Args:
             unmatched_awards: الجوائز غير المطابقة
             bank_df: بيانات البنك
             time_window_days: نافذة التطابق الزمني
-            score_threshold: عتبة النتيجة (0-1)
+            score_threshold: عتبة النتيجة (0-1) لمتوسط الميزات
             
         Returns:
-            DataFrame بالمطابقات المحتملة
+            DataFrame بأفضل مطابقة لكل جائزة
         """
         if len(unmatched_awards) == 0 or len(bank_df) == 0:
             return pd.DataFrame()
         
         try:
-            # تحضير البيانات
-            awards_prep = unmatched_awards.copy()
-            bank_prep = bank_df.copy()
-            
-            # إنشاء مؤشرات
-            awards_prep['_idx'] = range(len(awards_prep))
-            bank_prep['_idx'] = range(len(bank_prep))
-            
-            awards_prep.set_index('_idx', inplace=True)
-            bank_prep.set_index('_idx', inplace=True)
-            
-            # إنشاء محرك المطابقة
-            indexer = rl.Index()
-            
-            # استخدام Blocking للتسريع (حسب المبلغ)
-            if 'AwardAmount' in awards_prep.columns:
-                # تقريب المبالغ لإنشاء كتل
-                awards_prep['_amount_block'] = (awards_prep['AwardAmount'] / 1000).astype(int)
-                bank_prep['_amount_block'] = (bank_prep.get('TransferAmount', bank_prep.get('BankAmount', 0)) / 1000).astype(int)
-                
-                indexer.block(left_on='_amount_block', right_on='_amount_block')
-            else:
-                # Full comparison إذا لم يكن هناك عمود مبلغ
-                indexer.full()
-            
-            candidate_pairs = indexer.index(awards_prep, bank_prep)
-            
-            # مقارنة الأزواج
-            compare = Compare()
-            
-            # مقارنة الأسماء (String similarity)
-            if 'OwnerName_norm' in awards_prep.columns and 'BankName_norm' in bank_prep.columns:
-                compare.string(
-                    'OwnerName_norm', 
-                    'BankName_norm',
-                    method='jarowinkler',
-                    label='name_sim'
-                )
-            
-            # مقارنة المبالغ (Exact)
-            if 'AwardAmount' in awards_prep.columns:
-                compare.exact('AwardAmount', '_amount_block', label='amount_match')
-            
-            # تنفيذ المقارنة
-            features = compare.compute(candidate_pairs, awards_prep, bank_prep)
-            
-            # حساب النتيجة الإجمالية
-            if not features.empty:
-                # متوسط ميزات المطابقة
-                features['total_score'] = features.mean(axis=1)
-                
-                # فلترة حسب العتبة
-                potential_matches = features[features['total_score'] >= score_threshold]
-                
-                # تحويل للنتائج النهائية
-                matches = []
-                for (award_idx, bank_idx), row in potential_matches.iterrows():
-                    award = awards_prep.loc[award_idx]
-                    bank = bank_prep.loc[bank_idx]
-                    
-                    # التحقق من النافذة الزمنية
-                    try:
-                        entry_date = award.get('EntryDate')
-                        transfer_date = bank.get('TransferDate', bank.get('BankDate'))
-                        
-                        if pd.notna(entry_date) and pd.notna(transfer_date):
-                            date_diff = abs((entry_date - transfer_date).days)
-                            if date_diff > time_window_days:
-                                continue
-                        else:
-                            date_diff = None
-                    except:
-                        date_diff = None
-                    
-                    match = {
-                        **award.to_dict(),
-                        'BankReference': bank.get('BankReference', ''),
-                        'TransferAmount': bank.get('TransferAmount', bank.get('BankAmount', 0)),
-                        'TransferDate': transfer_date,
-                        'BeneficiaryName': bank.get('BeneficiaryName', bank.get('BankName', '')),
-                        'MatchType': 'RecordLinkage',
-                        'MatchScore': int(row['total_score'] * 100),
-                        'DateDiff': date_diff
-                    }
-                    matches.append(match)
-                
-                return pd.DataFrame(matches)
+            award_cents, award_amount_ok = amounts_to_cents(bank_column(unmatched_awards, ['AwardAmount'], None))
+            award_seconds, award_date_ok = dates_to_seconds(bank_column(unmatched_awards, ['EntryDate'], None))
+            bank_cents, bank_amount_ok = amounts_to_cents(bank_column(bank_df, ['TransferAmount', 'BankAmount'], None))
+            bank_seconds, bank_date_ok = dates_to_seconds(bank_column(bank_df, ['TransferDate', 'BankDate'], None))
+            
+            owner_names = bank_column(unmatched_awards, ['OwnerName_norm'], '').fillna('').astype(str).str.lower().to_numpy()
+            bank_names = bank_column(bank_df, ['BankName_norm'], '').fillna('').astype(str).str.lower().to_numpy()
+            award_rank, bank_rank = name_ranks(owner_names, bank_names)
+            
+            # كتل زمنية بعرض النافذة: أي زوج ضمن النافذة يقع في كتلة مجاورة (±1)
+            bucket_seconds = max(time_window_days, 1) * SECONDS_PER_DAY
+            award_bucket = np.floor_divide(award_seconds, bucket_seconds)
+            bank_bucket = np.floor_divide(bank_seconds, bucket_seconds)
+            
+            award_full = award_amount_ok & award_date_ok
+            bank_full = bank_amount_ok & bank_date_ok
+            passes = [([award_cents], award_amount_ok, [bank_cents], bank_amount_ok)]
+            for offset in (-1, 0, 1):
+                passes.append(([award_cents, award_bucket + offset], award_full, [bank_cents, bank_bucket], bank_full))
+                passes.append(([award_bucket + offset], award_date_ok, [bank_bucket], bank_date_ok))
+            
+            candidates = [
+                sorted_neighbourhood_pairs(a_blocks, award_rank, a_valid, b_blocks, bank_rank, b_valid)
+                for a_blocks, a_valid, b_blocks, b_valid in passes
+            ]
+            # اتحاد المراحل بدون تكرار (فرز + إزالة المتجاور)
+            pair_keys = np.sort(np.concatenate([
+                award_pos.astype(np.int64) * len(bank_df) + bank_pos for award_pos, bank_pos in candidates
+            ]))
+            if len(pair_keys) > 0:
+                pair_keys = pair_keys[np.r_[True, pair_keys[1:] != pair_keys[:-1]]]
+            award_pos, bank_pos = np.divmod(pair_keys, len(bank_df))
+            
+            # النافذة الزمنية (عند توفر التاريخين)
+            both_dates = award_date_ok[award_pos] & bank_date_ok[bank_pos]
+            date_diffs = np.where(both_dates, day_diff(award_seconds[award_pos], bank_seconds[bank_pos]), 0)
+            in_window = ~both_dates | (date_diffs <= time_window_days)
+            award_pos, bank_pos = award_pos[in_window], bank_pos[in_window]
+            both_dates, date_diffs = both_dates[in_window], date_diffs[in_window]
+            
+            if len(award_pos) == 0:
+                return pd.DataFrame()
+            
+            # تقييم الأزواج دفعة واحدة
+            features = []
+            if 'OwnerName_norm' in unmatched_awards.columns and 'BankName_norm' in bank_df.columns:
+                features.append(process.cpdist(
+                    owner_names[award_pos], bank_names[bank_pos],
+                    scorer=JaroWinkler.normalized_similarity, workers=-1
+                ))
+            
+            both_amounts = award_amount_ok[award_pos] & bank_amount_ok[bank_pos]
+            a_cents = award_cents[award_pos].astype(float)
+            b_cents = bank_cents[bank_pos].astype(float)
+            scale = np.maximum(np.maximum(np.abs(a_cents), np.abs(b_cents)), 1)
+            features.append(np.where(both_amounts, np.clip(1 - np.abs(a_cents - b_cents) / scale, 0, 1), np.nan))
+            features.append(np.where(both_dates, 1 - date_diffs / (time_window_days + 1), np.nan))
+            
+            with np.errstate(invalid='ignore'):
+                total_score = np.nanmean(np.column_stack(features), axis=1)
+            
+            # أفضل زوج لكل جائزة (عند التساوي: أول صف في كشف البنك)
+            passed = np.flatnonzero(np.nan_to_num(total_score) >= score_threshold)
+            if len(passed) == 0:
+                return pd.DataFrame()
+            
+            best = passed[self._select_pairs(
+                award_pos[passed], bank_pos[passed], (bank_pos[passed], -total_score[passed])
+            )]
+            
+            return self._build_matches(
+                unmatched_awards, bank_df, award_pos[best], bank_pos[best],
+                match_type='RecordLinkage',
+                scores=(total_score[best] * 100).astype(int),
+                date_diffs=np.where(both_dates[best], date_diffs[best], np.nan)
+            )
             
         except Exception as e:
             print(f"⚠️ خطأ في Record Linkage: {str(e)}")
         
         return pd.DataFrame()
     
+    def _remaining_bank(self, bank_df: pd.DataFrame, matches: pd.DataFrame) -> pd.DataFrame:
+        """تحويلات البنك غير المستخدمة بعد طبقة (في وضع one_to_one فقط)"""
+        if not self.one_to_one or len(matches) == 0:
+            return bank_df
+        return bank_df[~bank_df.index.isin(matches['BankIndex'])]
+    
     def match_all_layers(
         self,
         awards_df: pd.DataFrame,
         bank_df: pd.DataFrame,
         time_window_days: int = 7,
-        use_record_linkage: bool = False
+        use_record_linkage: bool = False,
+        use_name_first: bool = False,
+        use_transliteration: bool = False,
+        use_split_payments: bool = False
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
         تطبيق جميع طبقات المطابقة
         
-        Library Used: pandas, rapidfuzz, recordlinkage
+        Library Used: pandas, rapidfuzz
+        
+        IBAN (عند وجود عمود IBAN في الطرفين) → Exact → Fuzzy → الطبقات الاختيارية
         
         Args:
             awards_df: بيانات الجوائز
             bank_df: بيانات البنك
             time_window_days: نافذة التطابق الزمني
             use_record_linkage: استخدام Record Linkage
+            use_name_first: المطابقة بالاسم أولاً للباقي (مبلغ مُدخل خطأً)
+            use_transliteration: المطابقة عبر الحروف العربية/اللاتينية (اسم البنك بالإنجليزية)
+            use_split_payments: مطابقة الجوائز المصروفة على عدة تحويلات
             
         Returns:
             (matched_df, unmatched_df)
         """
-        print("🔍 المطابقة الطبقة 1: Exact Matching...")
-        exact_matches = self.exact_match(awards_df, bank_df, time_window_days)
+        if self.one_to_one and not bank_df.index.is_unique:
+            bank_df = bank_df.reset_index(drop=True)
+        
+        # الطبقة 1: IBAN - قبل Exact لأن كل زوج IBAN (نفس المبلغ ضمن النافذة) مرشح Exact أيضاً
+        iban_matches = pd.DataFrame()
+        if 'IBAN' in awards_df.columns and 'IBAN' in bank_df.columns:
+            print("🔍 المطابقة الطبقة 1: IBAN Matching...")
+            iban_matches = self.iban_match(awards_df, bank_df, time_window_days)
+            bank_df = self._remaining_bank(bank_df, iban_matches)
+            print(f"   ✅ مطابقات IBAN: {len(iban_matches)}")
+        
+        unmatched = awards_df
+        if len(iban_matches) > 0:
+            unmatched = awards_df[~awards_df.index.isin(iban_matches.index)]
+        
+        print("🔍 المطابقة الطبقة 2: Exact Matching...")
+        exact_matches = self.exact_match(unmatched, bank_df, time_window_days)
+        bank_df = self._remaining_bank(bank_df, exact_matches)
         
         # تحديد غير المطابقة
         if len(exact_matches) > 0:
             matched_indices = exact_matches.index
-            unmatched = awards_df[~awards_df.index.isin(matched_indices)]
+            unmatched = unmatched[~unmatched.index.isin(matched_indices)]
         else:
-            unmatched = awards_df.copy()
+            unmatched = unmatched.copy()
         
         print(f"   ✅ مطابقات حتمية: {len(exact_matches)}")
         
-        # الطبقة 2: Fuzzy
-        print("🔍 المطابقة الطبقة 2: Fuzzy Matching...")
+        # الطبقة 3: Fuzzy
+        print("🔍 المطابقة الطبقة 3: Fuzzy Matching...")
         fuzzy_matches = self.fuzzy_match(unmatched, bank_df, time_window_days)
+        bank_df = self._remaining_bank(bank_df, fuzzy_matches)
         print(f"   ✅ مطابقات ضبابية: {len(fuzzy_matches)}")
         
         # تحديث غير المطابقة
         if len(fuzzy_matches) > 0:
             unmatched = unmatched[~unmatched.index.isin(fuzzy_matches.index)]
         
-        # الطبقة 3: Record Linkage (اختياري)
+        # الطبقة 4: Record Linkage (اختياري)
         rl_matches = pd.DataFrame()
         if use_record_linkage and len(unmatched) > 0:
-            print("🔍 المطابقة الطبقة 3: Record Linkage...")
+            print("🔍 المطابقة الطبقة 4: Record Linkage...")
             rl_matches = self.record_linkage_match(unmatched, bank_df, time_window_days)
+            bank_df = self._remaining_bank(bank_df, rl_matches)
             print(f"   ✅ مطابقات Record Linkage: {len(rl_matches)}")
             
             if len(rl_matches) > 0:
                 unmatched = unmatched[~unmatched.index.isin(rl_matches.index)]
         
+        # الطبقة 5: الدفعات المجزأة (اختياري) - قبل الطبقات التي لا تشترط المبلغ
+        split_matches = pd.DataFrame()
+        if use_split_payments and len(unmatched) > 0:
+            print("🔍 المطابقة الطبقة 5: Split Payment Matching...")
+            split_matches = self.split_payment_match(unmatched, bank_df, time_window_days)
+            bank_df = self._remaining_bank(bank_df, split_matches)
+            print(f"   ✅ مطابقات الدفعات المجزأة: {split_matches.index.nunique()} جائزة ({len(split_matches)} تحويل)")
+            
+            if len(split_matches) > 0:
+                unmatched = unmatched[~unmatched.index.isin(split_matches.index)]
+        
+        # الطبقة 6: الحروف العربية/اللاتينية (اختياري)
+        translit_matches = pd.DataFrame()
+        if use_transliteration and len(unmatched) > 0:
+            print("🔍 المطابقة الطبقة 6: Transliteration Matching...")
+            translit_matches = self.transliteration_match(unmatched, bank_df, time_window_days)
+            bank_df = self._remaining_bank(bank_df, translit_matches)
+            print(f"   ✅ مطابقات عبر الحروف العربية/اللاتينية: {len(translit_matches)}")
+            
+            if len(translit_matches) > 0:
+                unmatched = unmatched[~unmatched.index.isin(translit_matches.index)]
+        
+        # الطبقة 7: الاسم أولاً (اختياري)
+        name_matches = pd.DataFrame()
+        if use_name_first and len(unmatched) > 0:
+            print("🔍 المطابقة الطبقة 7: Name-First Matching...")
+            name_matches = self.name_first_match(unmatched, bank_df, time_window_days)
+            print(f"   ✅ مطابقات بالاسم أولاً: {len(name_matches)}")
+            
+            if len(name_matches) > 0:
+                unmatched = unmatched[~unmatched.index.isin(name_matches.index)]
+        
         # دمج جميع المطابقات
-        all_matches = pd.concat([exact_matches, fuzzy_matches, rl_matches], ignore_index=True)
+        all_matches = pd.concat([iban_matches, exact_matches, fuzzy_matches, rl_matches, split_matches, translit_matches, name_matches], ignore_index=True)
         
         print(f"\n📊 إجمالي المطابقات: {len(all_matches)}")
         print(f"📊 غير المطابقة: {len(unmatched)}")
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+🔗 الإسناد واحد-لواحد - One-to-One Assignment
+==============================================
+كل طبقة مطابقة تختار أفضل تحويل لكل جائزة بشكل مستقل، فقد يُنسب
+التحويل الواحد لعدة جوائز ويتضخم معدل المطابقة. الإسناد يحل ذلك على
+رسم المرشحين المتفرق (جائزة — تحويل):
+
+1. المكونات المترابطة (scipy.sparse.csgraph) - المكونات صغيرة في الواقع
+2. المكون النجمي (جائزة واحدة أو تحويل واحد): أقل تكلفة مباشرة (متجهي)
+3. المكون الأكبر حتى ASSIGNMENT_MAX_COMPONENT عقدة في كل طرف:
+   scipy.optimize.linear_sum_assignment (أكبر عدد مطابقات ثم أقل تكلفة)
+4. ما هو أكبر من ذلك: تقريب جشع (الأزواج حسب التكلفة تصاعدياً)
+
+الاستخدام:
+    from core.assignment import one_to_one_assignment
+
+    keep = one_to_one_assignment(award_pos, bank_pos, cost)
+    award_pos, bank_pos = award_pos[keep], bank_pos[keep]
+
+Libraries Used:
+- scipy>=1.11.0 (اختياري - بدونه يُستخدم التقريب الجشع للكل)
+- numpy>=1.24.0
+- pandas>=2.1.0
+
+Install if missing:
+pip install scipy numpy pandas
+"""
+
+import numpy as np
+import pandas as pd
+
+# محاولة استيراد scipy (اختياري)
+try:
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    print("⚠️ scipy غير متوفر - الإسناد واحد-لواحد بالتقريب الجشع فقط")
+
+# أقصى عدد عقد في كل طرف للحل الأمثل (مصفوفة كثيفة بحجم المكون)
+ASSIGNMENT_MAX_COMPONENT = 500
+
+
+def greedy_assignment(award_pos: np.ndarray, bank_pos: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """
+    تقريب جشع: الأزواج حسب التكلفة تصاعدياً، والزوج يُقبل إذا كان طرفاه حرّين
+
+    Returns:
+        مواضع الأزواج المختارة (مرتبة تصاعدياً)
+    """
+    order = np.lexsort((np.arange(len(cost)), cost))
+    used_awards, used_banks, chosen = set(), set(), []
+    for edge, award, bank in zip(order.tolist(), award_pos[order].tolist(), bank_pos[order].tolist()):
+        if award in used_awards or bank in used_banks:
+            continue
+        used_awards.add(award)
+        used_banks.add(bank)
+        chosen.append(edge)
+    return np.sort(np.asarray(chosen, dtype=np.int64))
+
+
+def _optimal_assignment(award_nodes: np.ndarray, bank_nodes: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """
+    الحل الأمثل لمكون واحد: أكبر عدد مطابقات ثم أقل مجموع تكلفة
+
+    الخلايا بلا زوج مرشح تأخذ تكلفة أكبر من مجموع كل التكاليف الحقيقية،
+    فلا تُختار إلا إذا تعذّر غيرها (ثم تُحذف).
+
+    Returns:
+        مواضع الأزواج المختارة داخل المكون
+    """
+    rows, row_ids = np.unique(award_nodes, return_inverse=True)
+    cols, col_ids = np.unique(bank_nodes, return_inverse=True)
+    shifted = cost - cost.min()
+    missing = (shifted.max() + 1.0) * min(len(rows), len(cols)) + 1.0
+
+    matrix = np.full((len(rows), len(cols)), missing)
+    edge_of = np.full((len(rows), len(cols)), -1, dtype=np.int64)
+    # عند تكرار الزوج: أقل تكلفة (يُكتب آخراً)
+    order = np.argsort(-shifted, kind='stable')
+    matrix[row_ids[order], col_ids[order]] = shifted[order]
+    edge_of[row_ids[order], col_ids[order]] = order
+
+    assigned_rows, assigned_cols = linear_sum_assignment(matrix)
+    edges = edge_of[assigned_rows, assigned_cols]
+    return edges[edges >= 0]
+
+
+def one_to_one_assignment(
+    award_pos: np.ndarray,
+    bank_pos: np.ndarray,
+    cost: np.ndarray,
+    max_component: int = ASSIGNMENT_MAX_COMPONENT
+) -> np.ndarray:
+    """
+    إسناد واحد-لواحد على رسم المرشحين: كل جائزة وكل تحويل في زوج واحد على الأكثر
+
+    Args:
+        award_pos: مواضع الجوائز لكل زوج مرشح
+        bank_pos: مواضع التحويلات لكل زوج مرشح
+        cost: تكلفة الزوج (الأقل أفضل)
+        max_component: أقصى عدد عقد في كل طرف للحل الأمثل (الأكبر يُحل جشعاً)
+
+    Returns:
+        مواضع الأزواج المختارة (مرتبة تصاعدياً)
+    """
+    award_pos = np.asarray(award_pos, dtype=np.int64)
+    bank_pos = np.asarray(bank_pos, dtype=np.int64)
+    cost = np.asarray(cost, dtype=np.float64)
+    if len(award_pos) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if not SCIPY_AVAILABLE:
+        return greedy_assignment(award_pos, bank_pos, cost)
+
+    # عقد الرسم: الجوائز أولاً ثم التحويلات
+    award_nodes, award_ids = np.unique(award_pos, return_inverse=True)
+    bank_nodes, bank_ids = np.unique(bank_pos, return_inverse=True)
+    n_nodes = len(award_nodes) + len(bank_nodes)
+    graph = coo_matrix(
+        (np.ones(len(award_ids), dtype=np.int8), (award_ids, bank_ids + len(award_nodes))),
+        shape=(n_nodes, n_nodes)
+    )
+    _, labels = connected_components(graph, directed=False)
+    component = labels[award_ids]
+
+    # عدد عقد كل طرف في كل مكون
+    award_count = pd.Series(award_ids).groupby(component).nunique()
+    bank_count = pd.Series(bank_ids).groupby(component).nunique()
+    edge_award_count = award_count.reindex(component).to_numpy()
+    edge_bank_count = bank_count.reindex(component).to_numpy()
+
+    # المكون النجمي: زوج واحد فقط ممكن - أقل تكلفة (ثم أول زوج)
+    star = (edge_award_count == 1) | (edge_bank_count == 1)
+    star_edges = np.flatnonzero(star)
+    order = star_edges[np.lexsort((star_edges, cost[star_edges], component[star_edges]))]
+    first = np.r_[True, component[order][1:] != component[order][:-1]] if len(order) else np.zeros(0, dtype=bool)
+    chosen = [order[first]]
+
+    # المكونات الأخرى: الحل الأمثل أو الجشع حسب الحجم
+    rest = np.flatnonzero(~star)
+    if len(rest) > 0:
+        rest = rest[np.argsort(component[rest], kind='stable')]
+        bounds = np.flatnonzero(np.r_[True, component[rest][1:] != component[rest][:-1], True])
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            edges = rest[start:stop]
+            comp = component[edges[0]]
+            if max(award_count[comp], bank_count[comp]) <= max_component:
+                picked = _optimal_assignment(award_pos[edges], bank_pos[edges], cost[edges])
+            else:
+                picked = greedy_assignment(award_pos[edges], bank_pos[edges], cost[edges])
+            chosen.append(edges[picked])
+
+    return np.sort(np.concatenate(chosen))
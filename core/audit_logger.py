@@ -6,16 +6,18 @@
 
 Libraries Used:
 - pandas>=2.1.0
+- numpy>=1.24.0
 - duckdb>=0.9.0 (اختياري - للأداء العالي)
 - json (built-in)
 - datetime (built-in)
 - pathlib (built-in)
 
 Install if missing:
-pip install pandas duckdb
+pip install pandas numpy duckdb
 """
 
 import json
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
@@ -155,6 +157,30 @@ class AuditLogger:
                 )
             """)
             
+            # أزواج المطابقة التدريجية (مفتاح الجائزة ← مفتاح صف البنك)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reconciled_pairs (
+                    AwardKey VARCHAR,
+                    BankKey VARCHAR,
+                    MatchType VARCHAR,
+                    MatchScore DOUBLE,
+                    StatusFlag VARCHAR,
+                    ReasonText VARCHAR,
+                    Timestamp TIMESTAMP,
+                    PRIMARY KEY (AwardKey, BankKey)
+                )
+            """)
+            
+            # المفاتيح التي سبقت مطابقتها (KeyType = 'award' / 'bank')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reconciled_keys (
+                    KeyType VARCHAR,
+                    RowKey VARCHAR,
+                    Timestamp TIMESTAMP,
+                    PRIMARY KEY (KeyType, RowKey)
+                )
+            """)
+            
             conn.close()
             print("✅ تم تهيئة قاعدة بيانات DuckDB")
             
@@ -298,6 +324,125 @@ class AuditLogger:
         
         print(f"📝 تم تسجيل {len(match_logs)} مطابقة")
     
+    def load_reconciled_pairs(self, award_keys: pd.Series) -> pd.DataFrame:
+        """
+        أزواج المطابقة المحفوظة للجوائز الحالية فقط
+        
+        Library Used: duckdb
+        
+        Args:
+            award_keys: مفاتيح الجوائز الحالية
+            
+        Returns:
+            DataFrame: AwardKey, BankKey, MatchType, MatchScore, StatusFlag, ReasonText
+        """
+        empty = pd.DataFrame(columns=['AwardKey', 'BankKey', 'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText'])
+        if not self.use_duckdb:
+            return empty
+        
+        try:
+            conn = duckdb.connect(str(self.db_file))
+            current_keys = pd.DataFrame({'AwardKey': award_keys.to_numpy(dtype=object)})
+            conn.register('current_keys', current_keys)
+            df = conn.execute("""
+                SELECT p.AwardKey, p.BankKey, p.MatchType, p.MatchScore, p.StatusFlag, p.ReasonText
+                FROM reconciled_pairs p
+                SEMI JOIN current_keys k ON p.AwardKey = k.AwardKey
+            """).df()
+            conn.close()
+            return df
+        except Exception as e:
+            print(f"⚠️ خطأ في قراءة DuckDB: {str(e)}")
+            return empty
+    
+    def seen_keys(self, key_type: str, keys: pd.Series):
+        """
+        أي المفاتيح سبقت مطابقتها في تشغيل سابق
+        
+        Library Used: duckdb
+        
+        Args:
+            key_type: 'award' أو 'bank'
+            keys: المفاتيح الحالية
+            
+        Returns:
+            مصفوفة bool بطول keys
+        """
+        seen = np.zeros(len(keys), dtype=bool)
+        if not self.use_duckdb:
+            return seen
+        
+        try:
+            conn = duckdb.connect(str(self.db_file))
+            current_keys = pd.DataFrame({'pos': np.arange(len(keys)), 'RowKey': keys.to_numpy(dtype=object)})
+            conn.register('current_keys', current_keys)
+            positions = conn.execute("""
+                SELECT k.pos
+                FROM current_keys k
+                SEMI JOIN reconciled_keys r ON r.RowKey = k.RowKey AND r.KeyType = ?
+            """, [key_type]).fetchnumpy()['pos']
+            conn.close()
+            seen[positions] = True
+        except Exception as e:
+            print(f"⚠️ خطأ في قراءة DuckDB: {str(e)}")
+        
+        return seen
+    
+    def save_reconciliation(
+        self,
+        pairs: pd.DataFrame,
+        award_keys: pd.Series,
+        bank_keys: pd.Series
+    ):
+        """
+        حفظ نتيجة المطابقة التدريجية
+        
+        Library Used: duckdb
+        
+        Args:
+            pairs: الأزواج الجديدة (AwardKey, BankKey, MatchType, MatchScore, StatusFlag, ReasonText)
+            award_keys: مفاتيح الجوائز التي تمت مطابقتها في هذا التشغيل
+            bank_keys: مفاتيح صفوف البنك الجديدة
+        """
+        if not self.use_duckdb:
+            return
+        
+        timestamp = datetime.now()
+        seen = pd.concat([
+            pd.DataFrame({'KeyType': 'award', 'RowKey': award_keys.to_numpy(dtype=object)}),
+            pd.DataFrame({'KeyType': 'bank', 'RowKey': bank_keys.to_numpy(dtype=object)})
+        ], ignore_index=True)
+        
+        try:
+            conn = duckdb.connect(str(self.db_file))
+            conn.register('new_pairs', pairs.reset_index(drop=True))
+            conn.register('new_keys', seen)
+            conn.execute("""
+                INSERT OR IGNORE INTO reconciled_pairs
+                SELECT AwardKey, BankKey, MatchType, MatchScore, StatusFlag, ReasonText, ?
+                FROM new_pairs
+            """, [timestamp])
+            conn.execute("""
+                INSERT OR IGNORE INTO reconciled_keys
+                SELECT KeyType, RowKey, ? FROM new_keys
+            """, [timestamp])
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ خطأ في حفظ DuckDB: {str(e)}")
+    
+    def reset_reconciliation(self):
+        """حذف حالة المطابقة التدريجية (التشغيل التالي يطابق كل البيانات)"""
+        if not self.use_duckdb:
+            return
+        
+        try:
+            conn = duckdb.connect(str(self.db_file))
+            conn.execute("DELETE FROM reconciled_pairs")
+            conn.execute("DELETE FROM reconciled_keys")
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ خطأ في حذف DuckDB: {str(e)}")
+    
     def log_error(
         self,
         error_type: str,
@@ -14,11 +14,11 @@ Camel Race Awards Analyzer
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Iterator, List, Tuple, Optional, Any
 from datetime import datetime, timedelta
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
-import re
-from rapidfuzz import fuzz
 import warnings
 import time
 
@@ -26,12 +26,18 @@ warnings.filterwarnings('ignore')
 
 # استيراد المكونات المتقدمة
 try:
-    from core.advanced_matcher import AdvancedMatcher
+    from core.advanced_matcher import AdvancedMatcher, match_bank_columns
     ADVANCED_MATCHER_AVAILABLE = True
 except ImportError:
     ADVANCED_MATCHER_AVAILABLE = False
     warnings.warn("⚠️ Advanced Matcher غير متوفر - استخدام المطابقة الأساسية")
 
+try:
+    from core.similarity_cache import SimilarityCache
+    SIMILARITY_CACHE_AVAILABLE = True
+except ImportError:
+    SIMILARITY_CACHE_AVAILABLE = False
+
 try:
     from core.audit_logger import AuditLogger
     AUDIT_LOGGER_AVAILABLE = True
@@ -39,6 +45,52 @@ except ImportError:
     AUDIT_LOGGER_AVAILABLE = False
     warnings.warn("⚠️ Audit Logger غير متوفر - لن يتم حفظ السجلات")
 
+from core.match_engine import (
+    BankWindowIndex,
+    amounts_to_cents,
+    bank_column,
+    dates_to_seconds,
+    day_diff,
+    expand_ranges,
+    fuzzy_best_in_window,
+    iban_keys,
+    iban_pairs,
+    sharded_fuzzy_match
+)
+from core.match_results import MatchResultBuilder
+from core.text_normalizer import normalize_series, normalize_text
+
+# أعمدة الجائزة في نتائج المطابقة الأساسية
+BASIC_AWARD_COLUMNS = ['OwnerName', 'Race', 'Season', 'AwardAmount', 'EntryDate']
+
+# أعمدة البنك في نتائج المطابقة الأساسية: (المصدر، القيمة عند عدم المطابقة)
+BASIC_BANK_COLUMNS = {
+    'BankDate': (['BankDate'], pd.NaT),
+    'BankName': (['BankName'], ''),
+    'BankAmount': (['BankAmount'], np.nan),
+    'BankReference': (['BankReference'], ''),
+}
+
+# أنواع المطابقة في الإحصائيات (مطابقات المرجع تُحسب ضمن المطابقات الحتمية)
+MATCH_TYPE_STATISTICS = {
+    'exact_matches': ['Exact', 'Reference-Exact', 'Reference-Diff', 'Reference'],
+    'iban_matches': ['IBAN'],
+    'fuzzy_matches': ['Fuzzy'],
+    'rl_matches': ['RecordLinkage'],
+    'split_payment_matches': ['SplitPayment'],
+    'transliteration_matches': ['Transliteration'],
+    'name_first_matches': ['NameFirst'],
+}
+
+# أعمدة بصمة الصف في المطابقة التدريجية (الموجود منها فقط يدخل في المفتاح)
+AWARD_KEY_COLUMNS = ['Season', 'Race', 'OwnerName', 'AwardAmount', 'EntryDate', 'paymentreference']
+BANK_KEY_COLUMNS = ['BankReference', 'BankName', 'BankAmount', 'BankDate', 'AwardReferenceLong', 'AwardReference']
+
+try:
+    from config import PERFORMANCE
+except ImportError:
+    PERFORMANCE = {'chunk_size': 10000, 'fuzzy_max_workers': None}
+
 try:
     from core.performance_optimizer import PerformanceOptimizer, recommend_optimizer_settings
     PERFORMANCE_OPTIMIZER_AVAILABLE = True
@@ -50,12 +102,21 @@ except ImportError:
 class CamelAwardsAnalyzer:
     """محلل جوائز سباقات الهجن - الإصدار المتقدم v2.0"""
     
-    def __init__(self, use_advanced_features: bool = True):
+    def __init__(
+        self,
+        use_advanced_features: bool = True,
+        use_similarity_cache: bool = False,
+        one_to_one: bool = False
+    ):
         """
         تهيئة المحلل
         
         Args:
             use_advanced_features: استخدام المكونات المتقدمة (مطابقة 3 طبقات، تسجيل، أداء محسّن)
+            use_similarity_cache: حفظ درجات تشابه الأسماء بين التشغيلات
+                                  (outputs/similarity_cache/name_similarity.duckdb)
+            one_to_one: إسناد واحد-لواحد في طبقات AdvancedMatcher - التحويل
+                        الواحد لا يُنسب لأكثر من جائزة
         """
         # المتغيرات الأساسية
         self.awards_data = None
@@ -69,11 +130,24 @@ class CamelAwardsAnalyzer:
         self.logger = None
         self.optimizer = None
         self.current_run_id = None
+        self.reconciliation_store = None
+        self.similarity_cache = None
+        
+        if use_similarity_cache:
+            if SIMILARITY_CACHE_AVAILABLE:
+                self.similarity_cache = SimilarityCache()
+                print("✅ ذاكرة تشابه الأسماء مفعّلة")
+            else:
+                print("⚠️ ذاكرة تشابه الأسماء غير متوفرة - حساب مباشر")
         
         # تهيئة المكونات المتقدمة
         if use_advanced_features:
             if ADVANCED_MATCHER_AVAILABLE:
-                self.matcher = AdvancedMatcher(fuzzy_threshold=90)
+                self.matcher = AdvancedMatcher(
+                    fuzzy_threshold=90,
+                    similarity_cache=self.similarity_cache,
+                    one_to_one=one_to_one
+                )
                 print("✅ Advanced Matcher مفعّل")
             
             if AUDIT_LOGGER_AVAILABLE:
@@ -94,23 +168,7 @@ class CamelAwardsAnalyzer:
         Returns:
             النص المطبّع
         """
-        if pd.isna(text) or not isinstance(text, str):
-            return ""
-
-        # تحويل القيمة إلى نص وإزالة الفواصل السفلية كمسافات
-        text = str(text).replace('_', ' ')
-        # إزالة المسافات الزائدة
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        # توحيد Unicode (تطبيع الحروف العربية)
-        text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
-        text = text.replace('ة', 'ه')
-        text = text.replace('ى', 'ي')
-        
-        # تحويل لأحرف صغيرة
-        text = text.lower()
-        
-        return text
+        return normalize_text(text)
     
     def normalize_column_names(self, df: pd.DataFrame, context: str = "generic") -> pd.DataFrame:
         """
@@ -134,7 +192,8 @@ class CamelAwardsAnalyzer:
             'Season': ['season', 'الموسم', 'موسم'],
             'Race': ['race', 'السباق', 'سباق', 'race name', 'اسم السباق'],
             'AwardAmount': ['award amount', 'awardamount', 'amount', 'المبلغ', 'مبلغ', 'القيمة', 'الجائزة', 'value'],
-            'EntryDate': ['entrydate', 'entry date', 'date', 'التاريخ', 'تاريخ', 'تاريخ الإدخال', 'تاريخ السباق']
+            'EntryDate': ['entrydate', 'entry date', 'date', 'التاريخ', 'تاريخ', 'تاريخ الإدخال', 'تاريخ السباق'],
+            'IBAN': ['iban', 'ibannumber', 'iban number', 'الآيبان', 'رقم الآيبان']
         }
 
         awards_groups = {
@@ -233,7 +292,7 @@ class CamelAwardsAnalyzer:
         
         # إنشاء عمود الاسم المطبّع
         if 'OwnerName' in self.awards_data.columns:
-            self.awards_data['OwnerName_norm'] = self.awards_data['OwnerName'].apply(self.normalize_text)
+            self.awards_data['OwnerName_norm'] = normalize_series(self.awards_data['OwnerName'])
         
         # تحويل التواريخ
         if 'EntryDate' in self.awards_data.columns:
@@ -272,12 +331,7 @@ class CamelAwardsAnalyzer:
                     df = pd.read_excel(file, header=None)
                     
                     # البحث عن الصف الذي يحتوي على headers
-                    header_row = 0
-                    for i in range(min(10, len(df))):
-                        row_values = df.iloc[i].astype(str).str.lower()
-                        if any('name' in str(v) or 'اسم' in str(v) or 'amount' in str(v) or 'مبلغ' in str(v) for v in row_values):
-                            header_row = i
-                            break
+                    header_row = self._find_bank_header_row(df.head(10).values.tolist())
                     
                     # إعادة قراءة الملف مع الـ header الصحيح
                     if header_row > 0:
@@ -287,122 +341,519 @@ class CamelAwardsAnalyzer:
             else:
                 df = pd.read_excel(file)
             
-            # توحيد الأعمدة
-            df = self.normalize_column_names(df, context="bank")
+            self.bank_data = self._prepare_bank_frame(df)
+            return self.bank_data
+            
+        except Exception as e:
+            raise ValueError(f"خطأ في تحميل كشف البنك: {str(e)}")
+    
+    def _prepare_bank_frame(
+        self,
+        df: pd.DataFrame,
+        date_formats: Optional[Dict[str, Optional[str]]] = None
+    ) -> pd.DataFrame:
+        """
+        توحيد كشف البنك بعد القراءة: الأعمدة، المبلغ (أو المدين/الدائن)،
+        التاريخ، الاسم المطبّع (يُطبق على الملف كاملاً أو على كل دفعة)
+        
+        date_formats: صيغ التواريخ المكتشفة في أول دفعة (تُملأ ثم يُعاد استخدامها)
+        """
+        # توحيد الأعمدة
+        df = self.normalize_column_names(df, context="bank")
 
-            # الحفاظ على أعمدة المدين والدائن لاستخدامها في اشتقاق المبلغ
-            bank_debit = None
-            bank_credit = None
+        # الحفاظ على أعمدة المدين والدائن لاستخدامها في اشتقاق المبلغ
+        bank_debit = None
+        bank_credit = None
 
-            if 'BankDebit' in df.columns:
-                df['BankDebit'] = pd.to_numeric(df['BankDebit'], errors='coerce')
-                bank_debit = df['BankDebit']
-            else:
-                for col in df.columns:
-                    if str(col).lower() == 'debit':
-                        bank_debit = pd.to_numeric(df[col], errors='coerce')
-                        df['BankDebit'] = bank_debit
-                        break
+        if 'BankDebit' in df.columns:
+            df['BankDebit'] = pd.to_numeric(df['BankDebit'], errors='coerce')
+            bank_debit = df['BankDebit']
+        else:
+            for col in df.columns:
+                if str(col).lower() == 'debit':
+                    bank_debit = pd.to_numeric(df[col], errors='coerce')
+                    df['BankDebit'] = bank_debit
+                    break
+
+        if 'BankCredit' in df.columns:
+            df['BankCredit'] = pd.to_numeric(df['BankCredit'], errors='coerce')
+            bank_credit = df['BankCredit']
+        else:
+            for col in df.columns:
+                if str(col).lower() == 'credit':
+                    bank_credit = pd.to_numeric(df[col], errors='coerce')
+                    df['BankCredit'] = bank_credit
+                    break
 
-            if 'BankCredit' in df.columns:
-                df['BankCredit'] = pd.to_numeric(df['BankCredit'], errors='coerce')
-                bank_credit = df['BankCredit']
+        # إنشاء عمود المبلغ البنكي أو اشتقاقه من المدين والدائن
+        has_bank_amount = 'BankAmount' in df.columns
+        if has_bank_amount:
+            existing_amount = pd.to_numeric(df['BankAmount'], errors='coerce')
+            if existing_amount.notna().any():
+                df['BankAmount'] = existing_amount
             else:
-                for col in df.columns:
-                    if str(col).lower() == 'credit':
-                        bank_credit = pd.to_numeric(df[col], errors='coerce')
-                        df['BankCredit'] = bank_credit
-                        break
+                df.drop(columns=['BankAmount'], inplace=True)
+                has_bank_amount = False
 
-            # إنشاء عمود المبلغ البنكي أو اشتقاقه من المدين والدائن
-            has_bank_amount = 'BankAmount' in df.columns
-            if has_bank_amount:
-                existing_amount = pd.to_numeric(df['BankAmount'], errors='coerce')
-                if existing_amount.notna().any():
-                    df['BankAmount'] = existing_amount
-                else:
-                    df.drop(columns=['BankAmount'], inplace=True)
-                    has_bank_amount = False
+        if not has_bank_amount:
+            computed_amount = None
+            if bank_debit is not None and bank_credit is not None:
+                computed_amount = bank_debit.fillna(0) - bank_credit.fillna(0)
+            elif bank_debit is not None:
+                computed_amount = bank_debit
+            elif bank_credit is not None:
+                computed_amount = bank_credit
 
-            if not has_bank_amount:
-                computed_amount = None
-                if bank_debit is not None and bank_credit is not None:
-                    computed_amount = bank_debit.fillna(0) - bank_credit.fillna(0)
-                elif bank_debit is not None:
-                    computed_amount = bank_debit
-                elif bank_credit is not None:
-                    computed_amount = bank_credit
+            if computed_amount is not None:
+                df['BankAmount'] = computed_amount
 
-                if computed_amount is not None:
-                    df['BankAmount'] = computed_amount
+        if 'BankAmount' in df.columns:
+            df['BankAmount'] = pd.to_numeric(df['BankAmount'], errors='coerce')
 
-            if 'BankAmount' in df.columns:
-                df['BankAmount'] = pd.to_numeric(df['BankAmount'], errors='coerce')
+        # تعيين تاريخ البنك من أعمدة بديلة إذا لزم الأمر
+        if 'BankDate' not in df.columns:
+            if 'BankValueDate' in df.columns:
+                df['BankDate'] = df['BankValueDate']
+            else:
+                lower_map = {str(col).lower(): col for col in df.columns}
+                for fallback in ['transaction date', 'value date']:
+                    if fallback in lower_map:
+                        df['BankDate'] = df[lower_map[fallback]]
+                        break
+        
+        # إنشاء عمود الاسم المطبّع
+        if 'BankName' in df.columns:
+            df['BankName_norm'] = normalize_series(df['BankName'])
+        
+        # تحويل التواريخ
+        for col in ['BankDate', 'BankValueDate']:
+            if col in df.columns:
+                df[col] = self._parse_bank_dates(df[col], col, date_formats)
+        
+        # تحويل المبالغ لأرقام
+        if 'BankAmount' in df.columns:
+            amount_data = df['BankAmount']
+            if isinstance(amount_data, pd.DataFrame):
+                amount_data = amount_data.iloc[:, 0]
+            df['BankAmount'] = pd.to_numeric(
+                amount_data,
+                errors='coerce'
+            )
 
-            # تعيين تاريخ البنك من أعمدة بديلة إذا لزم الأمر
-            if 'BankDate' not in df.columns:
-                if 'BankValueDate' in df.columns:
-                    df['BankDate'] = df['BankValueDate']
+        for col in ['BankDebit', 'BankCredit']:
+            if col in df.columns:
+                col_data = df[col]
+                if isinstance(col_data, pd.DataFrame):
+                    col_data = col_data.iloc[:, 0]
+                df[col] = pd.to_numeric(col_data, errors='coerce')
+        
+        return df
+    
+    @staticmethod
+    def _parse_bank_dates(
+        values: pd.Series,
+        column: str,
+        date_formats: Optional[Dict[str, Optional[str]]] = None
+    ) -> pd.Series:
+        """
+        تحويل تواريخ البنك (dayfirst)
+        
+        pandas يستنتج الصيغة من أول قيمة غير فارغة، فقد تختلف الصيغة بين
+        الدفعات (مثل 2024-02-05 ← سنة-يوم-شهر). مع date_formats تُستنتج الصيغة
+        مرة واحدة من أول دفعة كما في قراءة الملف كاملاً.
+        """
+        if date_formats is None:
+            return pd.to_datetime(values, errors='coerce', dayfirst=True)
+        
+        if column not in date_formats:
+            sample = values.dropna()
+            sample = sample[sample.astype(str).str.strip() != '']
+            if len(sample) == 0:
+                return pd.to_datetime(values, errors='coerce', dayfirst=True)
+            first = sample.iloc[0]
+            if isinstance(first, str):
+                from pandas.tseries.api import guess_datetime_format
+                date_formats[column] = guess_datetime_format(first.strip(), dayfirst=True)
+            else:
+                date_formats[column] = None
+        
+        date_format = date_formats[column]
+        if date_format is None:
+            return pd.to_datetime(values, errors='coerce', dayfirst=True)
+        return pd.to_datetime(values, errors='coerce', format=date_format)
+    
+    @staticmethod
+    def _find_bank_header_row(rows: List[List[Any]]) -> int:
+        """أول صف (من أول 10) يحتوي على كلمات عناوين الأعمدة (الاسم / المبلغ)"""
+        for i, row in enumerate(rows[:10]):
+            row_values = [str(v).lower() for v in row]
+            if any('name' in v or 'اسم' in v or 'amount' in v or 'مبلغ' in v for v in row_values):
+                return i
+        return 0
+    
+    def iter_bank_chunks(self, file: Any, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        قراءة كشف البنك على دفعات ثابتة الحجم بدلاً من تحميله كاملاً
+        
+        CSV عبر pandas chunksize، و Excel عبر openpyxl (read_only) صفاً بصف
+        مع نفس اكتشاف صف العناوين. كل دفعة تمر بـ _prepare_bank_frame.
+        
+        Args:
+            file: مسار أو ملف مرفوع (csv / xlsx)
+            chunk_size: عدد الصفوف لكل دفعة (الافتراضي config.PERFORMANCE['chunk_size'])
+            
+        Yields:
+            DataFrame لكل دفعة (فهرس متصل عبر الدفعات)
+        """
+        chunk_size = chunk_size or PERFORMANCE.get('chunk_size', 10000)
+        name = str(getattr(file, 'name', file)).lower()
+        date_formats: Dict[str, Optional[str]] = {}
+        
+        if name.endswith('.csv'):
+            for chunk in pd.read_csv(file, chunksize=chunk_size):
+                yield self._prepare_bank_frame(chunk, date_formats)
+            return
+        
+        try:
+            from openpyxl import load_workbook
+            workbook = load_workbook(file, read_only=True, data_only=True)
+        except Exception as e:
+            # xls أو openpyxl غير متوفر: قراءة كاملة ثم تقسيم
+            print(f"⚠️ تعذرت القراءة المتدفقة ({str(e)}) - قراءة الملف كاملاً")
+            df = self.load_bank_statement(file)
+            for start in range(0, len(df), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+            return
+        
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            head = list(islice(rows, 10))
+            header_row = self._find_bank_header_row(head)
+            
+            # أسماء الأعمدة كما يولدها pandas (Unnamed: i ثم .1 للمكرر)
+            columns, counts = [], {}
+            for i, value in enumerate(head[header_row] if head else []):
+                label = f'Unnamed: {i}' if value is None else str(value)
+                if label in counts:
+                    counts[label] += 1
+                    label = f'{label}.{counts[label]}'
                 else:
-                    lower_map = {str(col).lower(): col for col in df.columns}
-                    for fallback in ['transaction date', 'value date']:
-                        if fallback in lower_map:
-                            df['BankDate'] = df[lower_map[fallback]]
-                            break
+                    counts[label] = 0
+                columns.append(label)
             
-            self.bank_data = df
+            offset = 0
+            data_rows = chain(head[header_row + 1:], rows)
+            while True:
+                batch = list(islice(data_rows, chunk_size))
+                if not batch:
+                    break
+                chunk = pd.DataFrame(batch, columns=columns)
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                yield self._prepare_bank_frame(chunk, date_formats)
+        finally:
+            workbook.close()
+    
+    def iter_bank_matches(
+        self,
+        file: Any,
+        time_window_days: int = 7,
+        chunk_size: Optional[int] = None,
+        include_unmatched: bool = True
+    ) -> Iterator[pd.DataFrame]:
+        """
+        مطابقة متدفقة: كل دفعة من كشف البنك تُطابق فور قراءتها
+        
+        فهرس الجوائز يُبنى مرة واحدة (المراجع ← مواضع الجوائز، والمبالغ
+        بالهللات والتواريخ والأسماء كمصفوفات)، وكل دفعة تمر بنفس طبقات
+        _basic_matching على الجوائز غير المطابقة بعد:
+        AwardReferenceLong → AwardReference → IBAN → Fuzzy (اسم + مبلغ + نافذة)
+        
+        مطابقات AwardReferenceLong نهائية وتُرجع مع دفعتها. مطابقات AwardReference
+        وأقرب تحويل بنفس IBAN وأفضل مطابقة ضبابية لكل جائزة مؤقتة (قد تتقدم عليها دفعة لاحقة) وتُرجع
+        في الدفعة الأخيرة، فالنتيجة لا تعتمد على حجم الدفعة. لا يبقى في الذاكرة
+        من البنك إلا الدفعة الحالية + صفوف المطابقات المؤقتة.
+        
+        Args:
+            file: ملف كشف البنك
+            time_window_days: نافذة التطابق الزمني
+            chunk_size: عدد صفوف كل دفعة
+            include_unmatched: إرجاع الجوائز غير المطابقة ضمن الدفعة الأخيرة
             
-            # إنشاء عمود الاسم المطبّع
-            if 'BankName' in self.bank_data.columns:
-                self.bank_data['BankName_norm'] = self.bank_data['BankName'].apply(self.normalize_text)
+        Yields:
+            DataFrame المطابقات لكل دفعة (بأعمدة _basic_matching وفهرس الجوائز الأصلي)
+        """
+        if self.awards_data is None:
+            raise ValueError("يجب تحميل بيانات الجوائز أولاً")
+        
+        awards_clean = self.awards_data[
+            self.awards_data['AwardAmount'].notna() & 
+            self.awards_data['EntryDate'].notna()
+        ]
+        n_awards = len(awards_clean)
+        
+        award_cents, amount_ok = amounts_to_cents(awards_clean['AwardAmount'])
+        award_seconds, date_ok = dates_to_seconds(awards_clean['EntryDate'])
+        award_valid = amount_ok & date_ok
+        award_names = bank_column(awards_clean, ['OwnerName_norm'], '').fillna('').astype(str).to_numpy(dtype=object)
+        
+        if 'paymentreference' in awards_clean.columns:
+            award_ref_values = awards_clean['paymentreference'].astype(str).str.strip().to_numpy()
+        else:
+            award_ref_values = np.full(n_awards, '', dtype=object)
+        award_refs = self._usable_refs(bank_column(awards_clean, ['paymentreference'], None))
+        # IBAN الجوائز يُوحَّد مرة واحدة لكل الدفعات
+        award_ibans = iban_keys(bank_column(awards_clean, ['IBAN'], None))
+        has_award_ibans = award_ibans.notna().any()
+        
+        # فهرس المراجع: كل مرجع = مقطع متصل [start, end) في مواضع الجوائز
+        ref_frame = (
+            pd.DataFrame({'ref': award_refs.to_numpy(dtype=object), 'award_pos': np.arange(n_awards)})
+            .dropna()
+            .sort_values(['ref', 'award_pos'], kind='stable')
+        )
+        ref_sorted = ref_frame['ref'].to_numpy()
+        ref_positions = ref_frame['award_pos'].to_numpy(dtype=np.int64)
+        ref_starts = np.flatnonzero(np.r_[True, ref_sorted[1:] != ref_sorted[:-1]]) if len(ref_sorted) else np.zeros(0, dtype=np.int64)
+        ref_ends = np.r_[ref_starts[1:], len(ref_sorted)].astype(np.int64)
+        ref_keys = pd.Index(ref_sorted[ref_starts], dtype=object)
+        
+        # حالة المطابقة عبر الدفعات (بحجم الجوائز فقط، لا بحجم كشف البنك)
+        long_matched = np.zeros(n_awards, dtype=bool)
+        short_matched = np.zeros(n_awards, dtype=bool)
+        short_award, short_held = [], []
+        iban_diff = np.full(n_awards, np.iinfo(np.int64).max, dtype=np.int64)
+        iban_held = np.full(n_awards, -1, dtype=np.int64)
+        fuzzy_score = np.zeros(n_awards, dtype=np.float64)
+        fuzzy_held = np.full(n_awards, -1, dtype=np.int64)
+        held_bank = []
+        held_rows = 0
+        
+        def hold(bank_clean: pd.DataFrame, bank_pos: np.ndarray) -> np.ndarray:
+            """الاحتفاظ بأعمدة النتيجة لصفوف البنك المؤقتة فقط (مواضعها في held_bank)"""
+            nonlocal held_rows
+            held_bank.append(pd.DataFrame({
+                name: bank_column(bank_clean, sources, default).to_numpy()[bank_pos]
+                for name, (sources, default) in BASIC_BANK_COLUMNS.items()
+            }))
+            positions = np.arange(held_rows, held_rows + len(bank_pos))
+            held_rows += len(bank_pos)
+            return positions
+        
+        def ref_pairs(bank_refs: pd.Series, bank_seconds: np.ndarray, eligible: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            """بحث مراجع الدفعة في فهرس الجوائز + النافذة الزمنية"""
+            slots = ref_keys.get_indexer(bank_refs.to_numpy(dtype=object))
+            bank_hit = np.flatnonzero(slots >= 0)
+            hit, sorted_pos = expand_ranges(ref_starts[slots[bank_hit]], ref_ends[slots[bank_hit]])
+            award_pos = ref_positions[sorted_pos]
+            bank_pos = bank_hit[hit]
+            keep = eligible[award_pos] & (
+                day_diff(award_seconds[award_pos], bank_seconds[bank_pos]) <= time_window_days
+            )
+            award_pos, bank_pos = award_pos[keep], bank_pos[keep]
+            order = np.lexsort((bank_pos, award_pos))
+            return award_pos[order], bank_pos[order]
+        
+        for chunk_number, chunk in enumerate(self.iter_bank_chunks(file, chunk_size), start=1):
+            bank_clean = chunk[chunk['BankAmount'].notna() & chunk['BankDate'].notna()]
+            if len(bank_clean) == 0:
+                continue
+            
+            bank_seconds, _ = dates_to_seconds(bank_clean['BankDate'])
             
-            # تحويل التواريخ
-            if 'BankDate' in self.bank_data.columns:
-                self.bank_data['BankDate'] = pd.to_datetime(
-                    self.bank_data['BankDate'], 
-                    errors='coerce',
-                    dayfirst=True
+            # الطبقة 1: AwardReferenceLong - نهائية فور وصولها
+            if 'AwardReferenceLong' in bank_clean.columns:
+                award_pos, bank_pos = ref_pairs(
+                    self._usable_refs(bank_clean['AwardReferenceLong']), bank_seconds,
+                    np.ones(n_awards, dtype=bool)
                 )
-            if 'BankValueDate' in self.bank_data.columns:
-                self.bank_data['BankValueDate'] = pd.to_datetime(
-                    self.bank_data['BankValueDate'],
-                    errors='coerce',
-                    dayfirst=True
+                if len(award_pos) > 0:
+                    amount_diff = np.abs(
+                        awards_clean['AwardAmount'].to_numpy(dtype=float)[award_pos] -
+                        bank_clean['BankAmount'].to_numpy(dtype=float)[bank_pos]
+                    )
+                    amount_match = amount_diff < 0.01
+                    long_matched[award_pos] = True
+                    print(f"   📦 دفعة {chunk_number}: {len(chunk):,} صف بنكي ← {len(award_pos):,} مطابقة Reference")
+                    yield MatchResultBuilder(n_awards).add(
+                        award_pos, bank_pos,
+                        MatchType=np.where(amount_match, 'Reference-Exact', 'Reference-Diff'),
+                        MatchScore=np.where(amount_match, 100, 95),
+                        StatusFlag=np.where(amount_match, '✅', '⚠️'),
+                        ReasonText=np.where(
+                            amount_match,
+                            'مطابقة بواسطة Reference (AwardReferenceLong)',
+                            np.char.add('مطابقة Reference لكن المبلغ مختلف بـ ', np.char.mod('%.2f', amount_diff))
+                        ),
+                        AwardRef=award_ref_values[award_pos]
+                    ).build(
+                        awards_clean, bank_clean,
+                        bank_columns=BASIC_BANK_COLUMNS,
+                        award_columns=BASIC_AWARD_COLUMNS,
+                        keep_index=True
+                    )
+            
+            # الطبقة 2: AwardReference - مؤقتة حتى نهاية الكشف (قد تسبقها AwardReferenceLong لاحقاً)
+            if 'AwardReference' in bank_clean.columns:
+                award_pos, bank_pos = ref_pairs(
+                    self._usable_refs(bank_clean['AwardReference']), bank_seconds, ~long_matched
                 )
+                if len(award_pos) > 0:
+                    short_award.append(award_pos)
+                    short_held.append(hold(bank_clean, bank_pos))
+                    short_matched[award_pos] = True
             
-            # تحويل المبالغ لأرقام
-            if 'BankAmount' in self.bank_data.columns:
-                amount_data = self.bank_data['BankAmount']
-                if isinstance(amount_data, pd.DataFrame):
-                    amount_data = amount_data.iloc[:, 0]
-                self.bank_data['BankAmount'] = pd.to_numeric(
-                    amount_data,
-                    errors='coerce'
+            # الطبقة 3: أقرب تحويل بنفس IBAN والمبلغ حتى الآن (التساوي: الصف الأسبق)
+            if has_award_ibans and 'IBAN' in bank_clean.columns:
+                bank_cents, bank_amount_ok = amounts_to_cents(bank_clean['BankAmount'])
+                award_pos, bank_pos, date_diffs = iban_pairs(
+                    award_ibans, award_cents, award_seconds, ~long_matched & ~short_matched & award_valid,
+                    iban_keys(bank_clean['IBAN']), bank_cents, bank_seconds, bank_amount_ok,
+                    time_window_days
                 )
-
-            for col in ['BankDebit', 'BankCredit']:
-                if col in self.bank_data.columns:
-                    col_data = self.bank_data[col]
-                    if isinstance(col_data, pd.DataFrame):
-                        col_data = col_data.iloc[:, 0]
-                    self.bank_data[col] = pd.to_numeric(col_data, errors='coerce')
+                better = date_diffs < iban_diff[award_pos]
+                if better.any():
+                    iban_diff[award_pos[better]] = date_diffs[better]
+                    iban_held[award_pos[better]] = hold(bank_clean, bank_pos[better])
             
-            return self.bank_data
+            # الطبقة 4: أفضل مطابقة ضبابية حتى الآن لكل جائزة بلا مرجع ولا IBAN (التساوي: الصف الأسبق)
+            pending = np.flatnonzero(
+                ~long_matched & ~short_matched & (iban_held < 0) & award_valid & (award_names != '')
+            )
+            if len(pending) > 0:
+                index = BankWindowIndex(bank_clean['BankAmount'], bank_clean['BankDate'])
+                lo, hi = index.timestamp_window(
+                    award_cents[pending], award_seconds[pending],
+                    np.ones(len(pending), dtype=bool), time_window_days
+                )
+                bank_names = bank_column(bank_clean, ['BankName_norm'], '').fillna('').astype(str).to_numpy(dtype=object)
+                best_bank, best_score = fuzzy_best_in_window(
+                    index, lo, hi, award_names[pending], bank_names, score_cutoff=85,
+                    cache=self.similarity_cache
+                )
+                better = np.flatnonzero((best_bank >= 0) & (best_score > fuzzy_score[pending]))
+                if len(better) > 0:
+                    fuzzy_score[pending[better]] = best_score[better]
+                    fuzzy_held[pending[better]] = hold(bank_clean, best_bank[better])
+        
+        # إنهاء المطابقات المؤقتة بنفس أولوية _basic_matching
+        results = MatchResultBuilder(n_awards)
+        if short_award:
+            award_pos = np.concatenate(short_award)
+            held_pos = np.concatenate(short_held)
+            keep = ~long_matched[award_pos]
+            results.add(
+                award_pos[keep], held_pos[keep],
+                MatchType='Reference',
+                MatchScore=100,
+                StatusFlag='✅',
+                ReasonText='مطابقة بواسطة Reference (AwardReference)',
+                AwardRef=award_ref_values[award_pos[keep]]
+            )
+        
+        iban_pos = np.flatnonzero((iban_held >= 0) & ~long_matched & ~results.matched)
+        if len(iban_pos) > 0:
+            results.add(
+                iban_pos, iban_held[iban_pos],
+                MatchType='IBAN',
+                MatchScore=100,
+                StatusFlag='✅',
+                ReasonText='مطابقة بواسطة IBAN (نفس المبلغ ضمن النافذة)',
+                AwardRef=award_ref_values[iban_pos]
+            )
+        
+        fuzzy_pos = np.flatnonzero((fuzzy_held >= 0) & ~long_matched & ~results.matched)
+        if len(fuzzy_pos) > 0:
+            scores = fuzzy_score[fuzzy_pos]
+            results.add(
+                fuzzy_pos, fuzzy_held[fuzzy_pos],
+                MatchType='Fuzzy',
+                MatchScore=scores,
+                StatusFlag='✅',
+                ReasonText=[f'مطابقة ضبابية بالاسم {score}%' for score in scores],
+                AwardRef=award_ref_values[fuzzy_pos]
+            )
+        
+        if include_unmatched:
+            unmatched_pos = np.flatnonzero(~long_matched & ~results.matched)
+            if len(unmatched_pos) > 0:
+                results.add(
+                    unmatched_pos, -1,
+                    MatchType='No Match',
+                    MatchScore=0,
+                    StatusFlag='⚠️',
+                    ReasonText='لم يتم العثور على مطابقة في كشف البنك'
+                )
+        
+        if len(results) > 0:
+            held = pd.concat(held_bank, ignore_index=True) if held_bank else pd.DataFrame()
+            yield results.build(
+                awards_clean, held,
+                bank_columns=BASIC_BANK_COLUMNS,
+                award_columns=BASIC_AWARD_COLUMNS,
+                keep_index=True
+            )
+    
+    def match_bank_stream(
+        self,
+        file: Any,
+        time_window_days: int = 7,
+        chunk_size: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        مطابقة الجوائز مع كشف بنك كبير دون تحميله كاملاً في الذاكرة
+        
+        Args:
+            file: ملف كشف البنك (csv / xlsx)
+            time_window_days: نافذة التطابق الزمني
+            chunk_size: عدد صفوف كل دفعة (الافتراضي config.PERFORMANCE['chunk_size'])
             
-        except Exception as e:
-            raise ValueError(f"خطأ في تحميل كشف البنك: {str(e)}")
+        Returns:
+            DataFrame بنفس أعمدة _basic_matching (مرتب حسب الجوائز)
+        """
+        print(f"\n🌊 مطابقة متدفقة لكشف البنك...")
+        start_time = time.time()
+        
+        frames = list(self.iter_bank_matches(file, time_window_days, chunk_size))
+        if frames:
+            merged = pd.concat(frames)
+            merged = merged.iloc[np.argsort(merged.index.to_numpy(), kind='stable')].reset_index(drop=True)
+        else:
+            merged = pd.DataFrame(columns=(
+                BASIC_AWARD_COLUMNS + list(BASIC_BANK_COLUMNS) +
+                ['MatchType', 'MatchScore', 'StatusFlag', 'ReasonText']
+            ))
+        self.merged_results = merged
+        
+        execution_time = time.time() - start_time
+        self.statistics = {
+            'total_awards': len(self.awards_data),
+            **self._match_statistics(merged),
+            'execution_time': execution_time,
+            'time_window_days': time_window_days,
+            'use_record_linkage': False
+        }
+        
+        print(f"✅ اكتملت المطابقة المتدفقة في {execution_time:.2f} ثانية")
+        print(f"   ⚠️ غير مطابق: {self.statistics['unmatched_awards']}")
+        return merged
     
     def match_with_bank(
         self,
         time_window_days: int = 7,
         use_record_linkage: bool = False,
-        files_info: Optional[Dict[str, List[str]]] = None
+        files_info: Optional[Dict[str, List[str]]] = None,
+        backend: str = "pandas",
+        incremental: bool = False,
+        use_transliteration: bool = False,
+        use_split_payments: bool = False,
+        use_name_first: bool = False
     ) -> pd.DataFrame:
         """
         مطابقة بيانات الجوائز مع كشف البنك (الإصدار المتقدم v2.0)
         
         الميزات الجديدة:
-        - مطابقة 3 طبقات: Exact → Fuzzy → Record Linkage
+        - مطابقة متعددة الطبقات: IBAN → Exact → Fuzzy → Record Linkage
         - تسجيل شامل مع Audit Trail
         - أداء محسّن للملفات الكبيرة
         
@@ -410,6 +861,15 @@ class CamelAwardsAnalyzer:
             time_window_days: نافذة التطابق الزمني بالأيام
             use_record_linkage: استخدام مطابقة Record Linkage (للحالات الصعبة)
             files_info: معلومات الملفات للتسجيل (dict مع مفاتيح 'awards_files', 'bank_file')
+            backend: "pandas" (الافتراضي) أو "duckdb" (كل الطبقات كاستعلامات SQL)
+            incremental: مطابقة الجوائز غير المطابقة ومعاملات البنك الجديدة فقط
+                         (الأزواج السابقة محفوظة في outputs/audit_logs/audit.duckdb)
+            use_transliteration: مطابقة الأسماء العربية مع أسماء البنك اللاتينية
+                                 عبر هيكل الاسم (backend="pandas" فقط)
+            use_split_payments: مطابقة الجوائز المصروفة على عدة تحويلات
+                                (طبقات AdvancedMatcher فقط - صف لكل تحويل)
+            use_name_first: المطابقة بالاسم أولاً للباقي - مبلغ مُدخل خطأً
+                            (طبقات AdvancedMatcher فقط، الفرق في AmountDiff)
             
         Returns:
             DataFrame بنتائج المطابقة المتقدمة
@@ -417,6 +877,9 @@ class CamelAwardsAnalyzer:
         if self.awards_data is None or self.bank_data is None:
             raise ValueError("يجب تحميل بيانات الجوائز وكشف البنك أولاً")
         
+        if backend not in ("pandas", "duckdb"):
+            raise ValueError(f"backend غير مدعوم: {backend}")
+        
         print(f"\n🔍 بدء المطابقة المتقدمة...")
         print(f"   📊 جوائز: {len(self.awards_data):,} سجل")
         print(f"   🏦 بنك: {len(self.bank_data):,} سجل")
@@ -425,57 +888,44 @@ class CamelAwardsAnalyzer:
         start_time = time.time()
         
         try:
+            if incremental:
+                self.merged_results = self._incremental_matching(
+                    time_window_days, backend,
+                    use_record_linkage=use_record_linkage,
+                    use_transliteration=use_transliteration,
+                    use_split_payments=use_split_payments,
+                    use_name_first=use_name_first
+                )
+            
+            elif backend == "duckdb" and self._get_duckdb_optimizer() is not None:
+                print(f"   🦆 استخدام DuckDB (Reference → IBAN → Fuzzy كاستعلامات SQL)")
+                self.merged_results = self._duckdb_matching(time_window_days)
+            
             # استخدام المطابق المتقدم إذا كان متاحاً
-            if self.use_advanced_features and self.matcher and ADVANCED_MATCHER_AVAILABLE:
-                print(f"   ✨ استخدام Advanced Matcher (3 طبقات)")
-                
-                # المطابقة بجميع الطبقات
-                matched_df, unmatched_df = self.matcher.match_all_layers(
-                    awards_df=self.awards_data,
-                    bank_df=self.bank_data,
-                    time_window_days=time_window_days,
-                    use_record_linkage=use_record_linkage
+            elif self._advanced_matcher_enabled():
+                print(f"   ✨ استخدام Advanced Matcher (IBAN → Exact → Fuzzy ...)")
+                self.merged_results = self._advanced_matching(
+                    time_window_days,
+                    use_record_linkage=use_record_linkage,
+                    use_transliteration=use_transliteration,
+                    use_split_payments=use_split_payments,
+                    use_name_first=use_name_first
                 )
                 
-                # إضافة أعمدة إضافية للتوافق
-                if len(matched_df) > 0:
-                    matched_df['StatusFlag'] = '✅'
-                    matched_df['ReasonText'] = matched_df.apply(
-                        lambda x: f"مطابقة {x['MatchType']} بنسبة {x['MatchScore']}%",
-                        axis=1
-                    )
-                
-                if len(unmatched_df) > 0:
-                    unmatched_df['MatchType'] = 'No Match'
-                    unmatched_df['MatchScore'] = 0
-                    unmatched_df['BankDate'] = None
-                    unmatched_df['BankReference'] = None
-                    unmatched_df['StatusFlag'] = '⚠️'
-                    unmatched_df['ReasonText'] = 'لم يتم العثور على مطابقة'
-                
-                # دمج النتائج
-                self.merged_results = pd.concat([matched_df, unmatched_df], ignore_index=True)
-                
             else:
                 # استخدام المطابقة الأساسية (الكود القديم)
                 print(f"   ⚠️ استخدام المطابقة الأساسية (Exact + Fuzzy فقط)")
-                self.merged_results = self._basic_matching(time_window_days)
+                self.merged_results = self._basic_matching(time_window_days, use_transliteration=use_transliteration)
             
             # حساب الإحصائيات
             execution_time = time.time() - start_time
             
-            exact_matches = len(self.merged_results[self.merged_results['MatchType'] == 'Exact'])
-            fuzzy_matches = len(self.merged_results[self.merged_results['MatchType'] == 'Fuzzy'])
-            rl_matches = len(self.merged_results[self.merged_results['MatchType'] == 'RecordLinkage'])
-            unmatched = len(self.merged_results[self.merged_results['MatchType'] == 'No Match'])
+            match_statistics = self._match_statistics(self.merged_results)
             
             self.statistics = {
                 'total_awards': len(self.awards_data),
                 'total_bank_records': len(self.bank_data),
-                'exact_matches': exact_matches,
-                'fuzzy_matches': fuzzy_matches,
-                'rl_matches': rl_matches,
-                'unmatched_awards': unmatched,
+                **match_statistics,
                 'execution_time': execution_time,
                 'time_window_days': time_window_days,
                 'use_record_linkage': use_record_linkage
@@ -516,11 +966,19 @@ class CamelAwardsAnalyzer:
             
             # عرض النتائج
             print(f"\n✅ اكتملت المطابقة في {execution_time:.2f} ثانية")
-            print(f"   ✔️ مطابقات حتمية: {exact_matches}")
-            print(f"   ✔️ مطابقات ضبابية: {fuzzy_matches}")
-            if rl_matches > 0:
-                print(f"   ✔️ مطابقات RL: {rl_matches}")
-            print(f"   ⚠️ غير مطابق: {unmatched}")
+            print(f"   ✔️ مطابقات حتمية: {match_statistics['exact_matches']}")
+            if match_statistics['iban_matches'] > 0:
+                print(f"   ✔️ مطابقات IBAN: {match_statistics['iban_matches']}")
+            print(f"   ✔️ مطابقات ضبابية: {match_statistics['fuzzy_matches']}")
+            if match_statistics['rl_matches'] > 0:
+                print(f"   ✔️ مطابقات RL: {match_statistics['rl_matches']}")
+            if match_statistics['split_payment_matches'] > 0:
+                print(f"   ✔️ دفعات مجزأة: {match_statistics['split_payment_matches']}")
+            if match_statistics['transliteration_matches'] > 0:
+                print(f"   ✔️ مطابقات عبر الحروف العربية/اللاتينية: {match_statistics['transliteration_matches']}")
+            if match_statistics['name_first_matches'] > 0:
+                print(f"   ✔️ مطابقات بالاسم أولاً: {match_statistics['name_first_matches']}")
+            print(f"   ⚠️ غير مطابق: {match_statistics['unmatched_awards']}")
             
             return self.merged_results
             
@@ -575,302 +1033,559 @@ class CamelAwardsAnalyzer:
                 results.append(result)
                 continue
             
-    def _basic_matching(self, time_window_days: int) -> pd.DataFrame:
+    @staticmethod
+    def _match_statistics(merged: pd.DataFrame) -> Dict[str, int]:
         """
-        المطابقة الأساسية المحسّنة (Reference-based + Fuzzy fallback)
-        تستخدم merge على Reference Number للأداء العالي
+        عدد الجوائز لكل مجموعة في MATCH_TYPE_STATISTICS + غير المطابق
+        (الدفعات المجزأة: صف لكل تحويل، فالجائزة = SplitParts صفاً)
+        """
+        match_types = merged['MatchType'].astype(str)
+        weights = pd.Series(1.0, index=merged.index)
+        if 'SplitParts' in merged.columns:
+            split = match_types == 'SplitPayment'
+            weights[split] = 1.0 / pd.to_numeric(merged.loc[split, 'SplitParts'], errors='coerce')
+        counts = weights.groupby(match_types).sum().round().astype(int)
+        
+        statistics = {
+            key: int(counts.reindex(types, fill_value=0).sum())
+            for key, types in MATCH_TYPE_STATISTICS.items()
+        }
+        statistics['unmatched_awards'] = int(counts.get('No Match', 0))
+        return statistics
+    
+    @staticmethod
+    def _usable_refs(values: pd.Series) -> pd.Series:
+        """المراجع كنص منظف، وNaN للقيم الفارغة أو 'nan'"""
+        refs = values.astype(str).str.strip()
+        return refs.where(values.notna() & (refs != '') & (refs != 'nan'))
+    
+    @staticmethod
+    def _row_keys(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+        """
+        بصمة ثابتة لكل صف بين التشغيلات: hash محتوى الأعمدة + رقم التكرار
+        (الصفوف المتطابقة تماماً تأخذ مفاتيح مختلفة حسب ترتيب ظهورها)
+        """
+        available = [col for col in columns if col in df.columns]
+        if available:
+            hashes = pd.util.hash_pandas_object(df[available].astype(str), index=False)
+        else:
+            hashes = pd.Series(np.zeros(len(df), dtype=np.uint64), index=df.index)
+        occurrence = hashes.groupby(hashes).cumcount()
+        return hashes.astype(str) + '-' + occurrence.astype(str)
+    
+    def _build_results(
+        self,
+        results: MatchResultBuilder,
+        awards_clean: pd.DataFrame,
+        bank_clean: pd.DataFrame
+    ) -> pd.DataFrame:
+        """إرفاق أعمدة الجوائز والبنك (ومفاتيح المطابقة التدريجية إن وجدت)"""
+        award_columns = BASIC_AWARD_COLUMNS + [col for col in ['AwardKey'] if col in awards_clean.columns]
+        bank_columns = dict(BASIC_BANK_COLUMNS)
+        if 'BankKey' in bank_clean.columns:
+            bank_columns['BankKey'] = (['BankKey'], '')
+        return results.build(
+            awards_clean, bank_clean,
+            bank_columns=bank_columns,
+            award_columns=award_columns
+        )
+    
+    def _advanced_matcher_enabled(self) -> bool:
+        """هل تُستخدم طبقات AdvancedMatcher (المسار الافتراضي لـ match_with_bank)"""
+        return bool(self.use_advanced_features and self.matcher and ADVANCED_MATCHER_AVAILABLE)
+    
+    def _advanced_matching(
+        self,
+        time_window_days: int,
+        awards_df: Optional[pd.DataFrame] = None,
+        bank_df: Optional[pd.DataFrame] = None,
+        use_record_linkage: bool = False,
+        use_transliteration: bool = False,
+        use_split_payments: bool = False,
+        use_name_first: bool = False
+    ) -> pd.DataFrame:
+        """
+        المطابقة بجميع طبقات AdvancedMatcher: المطابقات ثم غير المطابقة
+        
+        awards_df / bank_df: مطابقة جزء من البيانات (الافتراضي: كل البيانات المحملة)
+        """
+        awards_df = self.awards_data if awards_df is None else awards_df
+        bank_df = self.bank_data if bank_df is None else bank_df
+        
+        # المطابقة بجميع الطبقات
+        matched_df, unmatched_df = self.matcher.match_all_layers(
+            awards_df=awards_df,
+            bank_df=bank_df,
+            time_window_days=time_window_days,
+            use_record_linkage=use_record_linkage,
+            use_transliteration=use_transliteration,
+            use_split_payments=use_split_payments,
+            use_name_first=use_name_first
+        )
+        
+        # إضافة أعمدة إضافية للتوافق
+        if len(matched_df) > 0:
+            matched_df['StatusFlag'] = '✅'
+            matched_df['ReasonText'] = matched_df.apply(
+                lambda x: f"مطابقة {x['MatchType']} بنسبة {x['MatchScore']}%",
+                axis=1
+            )
+        
+        if len(unmatched_df) > 0:
+            unmatched_df = unmatched_df.copy()
+            unmatched_df['MatchType'] = 'No Match'
+            unmatched_df['MatchScore'] = 0
+            unmatched_df['BankDate'] = None
+            unmatched_df['BankReference'] = None
+            unmatched_df['StatusFlag'] = '⚠️'
+            unmatched_df['ReasonText'] = 'لم يتم العثور على مطابقة'
+            if 'BankKey' in bank_df.columns:
+                unmatched_df['BankKey'] = ''
+        
+        # دمج النتائج
+        return pd.concat([matched_df, unmatched_df], ignore_index=True)
+    
+    def _get_reconciliation_store(self) -> Optional['AuditLogger']:
+        """مخزن أزواج المطابقة السابقة (audit.duckdb الخاص بـ AuditLogger)"""
+        if self.reconciliation_store is None and AUDIT_LOGGER_AVAILABLE:
+            self.reconciliation_store = self.logger or AuditLogger(log_dir="outputs/audit_logs")
+        
+        if self.reconciliation_store is None or not self.reconciliation_store.use_duckdb:
+            print(f"   ⚠️ قاعدة audit.duckdb غير متوفرة - مطابقة كاملة بدلاً من التدريجية")
+            return None
+        
+        return self.reconciliation_store
+    
+    def _incremental_matching(
+        self,
+        time_window_days: int,
+        backend: str,
+        use_record_linkage: bool = False,
+        use_transliteration: bool = False,
+        use_split_payments: bool = False,
+        use_name_first: bool = False
+    ) -> pd.DataFrame:
+        """
+        المطابقة التدريجية: مطابقة الفرق فقط منذ التشغيل السابق
+        
+        1. الجوائز الجديدة ← كل صفوف البنك غير المستهلكة
+        2. الجوائز القديمة غير المطابقة ← صفوف البنك الجديدة فقط
+        3. الجوائز المطابقة سابقاً ← تُعاد من الأزواج المحفوظة بدون مطابقة
+        
+        الفرق يُطابق بنفس المحرك وخيارات الطبقات التي يختارها match_with_bank
+        بدون incremental، والأزواج (AwardKey, BankKey) والمفاتيح التي شوهدت
+        تُحفظ في audit.duckdb
+        """
+        use_advanced = False
+        if backend == "duckdb" and self._get_duckdb_optimizer() is not None:
+            matcher = self._duckdb_matching
+        elif self._advanced_matcher_enabled():
+            use_advanced = True
+            matcher = partial(
+                self._advanced_matching,
+                use_record_linkage=use_record_linkage,
+                use_transliteration=use_transliteration,
+                use_split_payments=use_split_payments,
+                use_name_first=use_name_first
+            )
+        else:
+            matcher = partial(self._basic_matching, use_transliteration=use_transliteration)
+        
+        store = self._get_reconciliation_store()
+        if store is None:
+            return matcher(time_window_days)
+        
+        # AdvancedMatcher يُبقي الجوائز الناقصة كـ No Match، والمحركات الأخرى تستبعدها
+        awards = self.awards_data
+        if not use_advanced:
+            awards = awards[awards['AwardAmount'].notna() & awards['EntryDate'].notna()]
+        awards = awards.assign(AwardKey=self._row_keys(awards, AWARD_KEY_COLUMNS))
+        bank = self.bank_data.assign(BankKey=self._row_keys(self.bank_data, BANK_KEY_COLUMNS))
+        
+        previous = store.load_reconciled_pairs(awards['AwardKey'])
+        award_seen = store.seen_keys('award', awards['AwardKey'])
+        bank_seen = store.seen_keys('bank', bank['BankKey'])
+        award_done = awards['AwardKey'].isin(previous['AwardKey']).to_numpy()
+        bank_used = bank['BankKey'].isin(previous['BankKey']).to_numpy()
+        
+        new_awards = awards[~award_seen & ~award_done]
+        pending_awards = awards[award_seen & ~award_done]
+        print(f"   🔁 مطابقة تدريجية: {award_done.sum():,} جائزة مطابقة سابقاً، "
+              f"{len(new_awards):,} جائزة جديدة، {(~bank_seen).sum():,} معاملة بنكية جديدة")
+        
+        new_results = []
+        if len(new_awards) > 0:
+            part = matcher(time_window_days, new_awards, bank[~bank_used])
+            new_results.append(part)
+            bank_used |= bank['BankKey'].isin(part.loc[part['MatchType'] != 'No Match', 'BankKey']).to_numpy()
+        if len(pending_awards) > 0:
+            new_results.append(matcher(time_window_days, pending_awards, bank[~bank_seen & ~bank_used]))
+        
+        # الجوائز المطابقة سابقاً: صف البنك من المفتاح المحفوظ (-1 إذا لم يعد موجوداً)
+        done_awards = awards[award_done]
+        results = MatchResultBuilder(len(done_awards))
+        if len(previous) > 0:
+            results.add(
+                pd.Index(done_awards['AwardKey']).get_indexer(previous['AwardKey']),
+                pd.Index(bank['BankKey']).get_indexer(previous['BankKey']),
+                MatchType=previous['MatchType'].to_numpy(),
+                MatchScore=previous['MatchScore'].to_numpy(),
+                StatusFlag=previous['StatusFlag'].to_numpy(),
+                ReasonText=previous['ReasonText'].to_numpy()
+            )
+        if use_advanced:
+            previous_results = results.build(done_awards, bank, bank_columns=match_bank_columns(bank))
+        else:
+            previous_results = self._build_results(results, done_awards, bank)
+        
+        new_frame = pd.concat(new_results, ignore_index=True) if new_results else previous_results.iloc[:0]
+        new_matches = new_frame[new_frame['MatchType'] != 'No Match']
+        store.save_reconciliation(
+            new_matches[['AwardKey', 'BankKey', 'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText']],
+            award_keys=awards.loc[~award_seen, 'AwardKey'],
+            bank_keys=bank.loc[~bank_seen, 'BankKey']
+        )
+        print(f"      ✓ {len(new_matches):,} مطابقة جديدة محفوظة")
+        
+        # نفس ترتيب الجوائز الأصلي
+        parts = [frame for frame in (previous_results, new_frame) if len(frame) > 0]
+        merged = pd.concat(parts, ignore_index=True) if parts else new_frame.reset_index(drop=True)
+        order = pd.Index(awards['AwardKey']).get_indexer(merged['AwardKey'])
+        return merged.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+    
+    def _get_duckdb_optimizer(self) -> Optional['PerformanceOptimizer']:
+        """تهيئة Performance Optimizer (اتصال DuckDB) عند الحاجة"""
+        if self.optimizer is None and PERFORMANCE_OPTIMIZER_AVAILABLE:
+            self.optimizer = PerformanceOptimizer(use_duckdb=True)
+        
+        if self.optimizer is None or not self.optimizer.use_duckdb:
+            print(f"   ⚠️ DuckDB غير متوفر - استخدام محرك pandas")
+            return None
+        
+        return self.optimizer
+    
+    def _duckdb_matching(
+        self,
+        time_window_days: int,
+        awards_df: Optional[pd.DataFrame] = None,
+        bank_df: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """
+        المطابقة عبر DuckDB: نفس أعمدة _basic_matching
+        
+        الجداول المسجلة في DuckDB أعمدة مختصرة فقط (المواضع، المبلغ بالهللات،
+        التاريخ بالثواني، المراجع، الأسماء)، وأعمدة الجوائز والبنك
+        تُرفق بعد الاستعلام بعملية take واحدة
+        """
+        awards_df = self.awards_data if awards_df is None else awards_df
+        bank_df = self.bank_data if bank_df is None else bank_df
+        awards_clean = awards_df[
+            awards_df['AwardAmount'].notna() & 
+            awards_df['EntryDate'].notna()
+        ]
+        bank_clean = bank_df[
+            bank_df['BankAmount'].notna() & 
+            bank_df['BankDate'].notna()
+        ]
+        
+        if 'paymentreference' in awards_clean.columns:
+            award_ref_text = awards_clean['paymentreference'].astype(str).str.strip()
+        else:
+            award_ref_text = pd.Series('', index=awards_clean.index)
+        
+        award_refs = self._usable_refs(bank_column(awards_clean, ['paymentreference'], None))
+        
+        awards_slim = pd.DataFrame({
+            'award_pos': np.arange(len(awards_clean), dtype=np.int64),
+            'cents': amounts_to_cents(awards_clean['AwardAmount'])[0],
+            'ts': dates_to_seconds(awards_clean['EntryDate'])[0],
+            'ref': award_refs.to_numpy(dtype=object),
+            'iban': iban_keys(bank_column(awards_clean, ['IBAN'], None)).to_numpy(dtype=object),
+            'name': bank_column(awards_clean, ['OwnerName_norm'], '').fillna('').astype(str).to_numpy(dtype=object),
+        })
+        bank_slim = pd.DataFrame({
+            'bank_pos': np.arange(len(bank_clean), dtype=np.int64),
+            'cents': amounts_to_cents(bank_clean['BankAmount'])[0],
+            'ts': dates_to_seconds(bank_clean['BankDate'])[0],
+            'ref_long': self._usable_refs(bank_column(bank_clean, ['AwardReferenceLong'], None)).to_numpy(dtype=object),
+            'ref_short': self._usable_refs(bank_column(bank_clean, ['AwardReference'], None)).to_numpy(dtype=object),
+            'iban': iban_keys(bank_column(bank_clean, ['IBAN'], None)).to_numpy(dtype=object),
+            'name': bank_column(bank_clean, ['BankName_norm'], '').fillna('').astype(str).to_numpy(dtype=object),
+        })
+        
+        pairs = self.optimizer.match_bank_duckdb(
+            awards_slim, bank_slim,
+            time_window_days=time_window_days,
+            fuzzy_threshold=85,
+            temp_directory="outputs/duckdb_tmp"
+        )
+        
+        for match_type in ['Reference-Exact', 'Reference-Diff', 'Reference', 'IBAN', 'Fuzzy']:
+            count = int((pairs['MatchType'] == match_type).sum())
+            if count > 0:
+                print(f"      ✓ {count:,} مطابقة {match_type}")
+        
+        results = MatchResultBuilder(len(awards_clean))
+        award_pos = pairs['award_pos'].to_numpy(dtype=np.int64)
+        if len(award_pos) > 0:
+            results.add(
+                award_pos, pairs['bank_pos'].to_numpy(dtype=np.int64),
+                MatchType=pairs['MatchType'].to_numpy(),
+                MatchScore=pairs['MatchScore'].to_numpy(),
+                StatusFlag=pairs['StatusFlag'].to_numpy(),
+                ReasonText=pairs['ReasonText'].to_numpy(),
+                AwardRef=award_ref_text.to_numpy()[award_pos]
+            )
+        results.add_unmatched(
+            MatchType='No Match',
+            MatchScore=0,
+            StatusFlag='⚠️',
+            ReasonText='لم يتم العثور على مطابقة في كشف البنك'
+        )
+        
+        return self._build_results(results, awards_clean, bank_clean)
+    
+    def _basic_matching(
+        self,
+        time_window_days: int,
+        awards_df: Optional[pd.DataFrame] = None,
+        bank_df: Optional[pd.DataFrame] = None,
+        use_transliteration: bool = False
+    ) -> pd.DataFrame:
+        """
+        المطابقة الأساسية المحسّنة (Reference-based → IBAN → Fuzzy fallback)
+        تستخدم merge على Reference Number و IBAN للأداء العالي
+        
+        awards_df / bank_df: مطابقة جزء من البيانات (الافتراضي: كل البيانات المحملة)
+        use_transliteration: طبقة إضافية تطابق هيكل الاسم العربي/اللاتيني
+                             (نفس المبلغ والنافذة) لأسماء البنك اللاتينية
         """
         print(f"   🚀 استخدام خوارزمية محسّنة (reference-based matching)")
         
+        awards_df = self.awards_data if awards_df is None else awards_df
+        bank_df = self.bank_data if bank_df is None else bank_df
+        
         # تنظيف البيانات
-        awards_clean = self.awards_data[
-            self.awards_data['AwardAmount'].notna() & 
-            self.awards_data['EntryDate'].notna()
+        awards_clean = awards_df[
+            awards_df['AwardAmount'].notna() & 
+            awards_df['EntryDate'].notna()
         ].copy()
         
-        bank_clean = self.bank_data[
-            self.bank_data['BankAmount'].notna() & 
-            self.bank_data['BankDate'].notna()
+        bank_clean = bank_df[
+            bank_df['BankAmount'].notna() & 
+            bank_df['BankDate'].notna()
         ].copy()
         
-        # إضافة مؤشر للجوائز للحفاظ على الترتيب
-        awards_clean['_award_idx'] = range(len(awards_clean))
-        bank_clean['_bank_idx'] = range(len(bank_clean))
+        # كل الطبقات تضيف مواضع (جائزة، بنك) إلى مجمّع عمودي واحد
+        results = MatchResultBuilder(len(awards_clean))
+        
+        def ref_pairs(award_refs: pd.Series, bank_refs: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+            """hash-join على المرجع + النافذة الزمنية (مواضع الجوائز والبنك)"""
+            left = pd.DataFrame({'ref': award_refs.to_numpy(), 'award_pos': np.arange(len(award_refs))}).dropna()
+            right = pd.DataFrame({'ref': bank_refs.to_numpy(), 'bank_pos': np.arange(len(bank_refs))}).dropna()
+            pairs = left.merge(right, on='ref', how='inner')
+            award_pos = pairs['award_pos'].to_numpy(dtype=np.int64)
+            bank_pos = pairs['bank_pos'].to_numpy(dtype=np.int64)
+            in_window = day_diff(award_seconds[award_pos], bank_seconds[bank_pos]) <= time_window_days
+            return award_pos[in_window], bank_pos[in_window]
+        
+        award_seconds, _ = dates_to_seconds(awards_clean['EntryDate'])
+        bank_seconds, _ = dates_to_seconds(bank_clean['BankDate'])
         
         # الطبقة 1: مطابقة بواسطة Reference Number
         print(f"   🔑 المطابقة بواسطة Reference Number...")
-        matched_results = []
         
         # إعداد عمود Reference في الجوائز
         if 'paymentreference' in awards_clean.columns:
-            awards_clean['AwardRef'] = awards_clean['paymentreference'].astype(str).str.strip()
+            award_ref_text = awards_clean['paymentreference'].astype(str).str.strip()
         else:
-            awards_clean['AwardRef'] = ''
-        
-        # تصفية الجوائز التي لها reference فقط
-        awards_with_ref = awards_clean[
-            awards_clean['AwardRef'].notna() & 
-            (awards_clean['AwardRef'] != '') & 
-            (awards_clean['AwardRef'] != 'nan')
-        ].copy()
+            award_ref_text = pd.Series('', index=awards_clean.index)
+        award_refs = self._usable_refs(bank_column(awards_clean, ['paymentreference'], None))
+        award_ref_values = award_ref_text.to_numpy()
         
-        print(f"      📋 {len(awards_with_ref):,} جائزة لديها Reference Number")
+        print(f"      📋 {award_refs.notna().sum():,} جائزة لديها Reference Number")
         
         # محاولة المطابقة مع AwardReferenceLong أولاً (أعلى نسبة تطابق)
-        if len(awards_with_ref) > 0 and 'AwardReferenceLong' in bank_clean.columns:
-            bank_clean['BankRef'] = bank_clean['AwardReferenceLong'].astype(str).str.strip()
+        if award_refs.notna().any() and 'AwardReferenceLong' in bank_clean.columns:
+            bank_refs = self._usable_refs(bank_clean['AwardReferenceLong'])
+            print(f"      📋 {bank_refs.notna().sum():,} معاملة بنكية لديها AwardReferenceLong")
             
-            # تصفية البنك للسجلات التي لها reference فقط
-            bank_with_ref = bank_clean[
-                bank_clean['BankRef'].notna() & 
-                (bank_clean['BankRef'] != '') & 
-                (bank_clean['BankRef'] != 'nan')
-            ].copy()
+            common_refs = pd.Index(award_refs.dropna().unique()).intersection(bank_refs.dropna().unique())
+            print(f"      🔗 {len(common_refs):,} Reference مشترك بين الملفين")
             
-            print(f"      📋 {len(bank_with_ref):,} معاملة بنكية لديها AwardReferenceLong")
+            award_pos, bank_pos = ref_pairs(award_refs, bank_refs)
+            if len(award_pos) > 0:
+                amount_diff = np.abs(
+                    awards_clean['AwardAmount'].to_numpy(dtype=float)[award_pos] -
+                    bank_clean['BankAmount'].to_numpy(dtype=float)[bank_pos]
+                )
+                amount_match = amount_diff < 0.01
+                results.add(
+                    award_pos, bank_pos,
+                    MatchType=np.where(amount_match, 'Reference-Exact', 'Reference-Diff'),
+                    MatchScore=np.where(amount_match, 100, 95),
+                    StatusFlag=np.where(amount_match, '✅', '⚠️'),
+                    ReasonText=np.where(
+                        amount_match,
+                        'مطابقة بواسطة Reference (AwardReferenceLong)',
+                        np.char.add('مطابقة Reference لكن المبلغ مختلف بـ ', np.char.mod('%.2f', amount_diff))
+                    ),
+                    AwardRef=award_ref_values[award_pos]
+                )
+                print(f"      ✓ {len(award_pos):,} مطابقة عبر AwardReferenceLong")
+        
+        # محاولة المطابقة مع AwardReference للسجلات المتبقية
+        remaining_refs = award_refs.where(~results.matched)
+        if remaining_refs.notna().any() and 'AwardReference' in bank_clean.columns:
+            bank_refs2 = self._usable_refs(bank_clean['AwardReference'])
             
-            # إيجاد References المشتركة فقط
-            common_refs = set(awards_with_ref['AwardRef'].unique()).intersection(
-                set(bank_with_ref['BankRef'].unique())
-            )
+            common_refs2 = pd.Index(remaining_refs.dropna().unique()).intersection(bank_refs2.dropna().unique())
+            if len(common_refs2) > 0:
+                print(f"      🔗 {len(common_refs2):,} Reference مشترك إضافي في AwardReference")
             
-            print(f"      🔗 {len(common_refs):,} Reference مشترك بين الملفين")
+            award_pos, bank_pos = ref_pairs(remaining_refs, bank_refs2)
+            if len(award_pos) > 0:
+                results.add(
+                    award_pos, bank_pos,
+                    MatchType='Reference',
+                    MatchScore=100,
+                    StatusFlag='✅',
+                    ReasonText='مطابقة بواسطة Reference (AwardReference)',
+                    AwardRef=award_ref_values[award_pos]
+                )
+                print(f"      ✓ {len(award_pos):,} مطابقة عبر AwardReference")
+        
+        # الطبقة 2: IBAN - hash-join ثم نفس المبلغ والنافذة (قبل التقييم الضبابي المكلف)
+        unmatched_pos = results.unmatched_positions()
+        if len(unmatched_pos) > 0 and 'IBAN' in awards_clean.columns and 'IBAN' in bank_clean.columns:
+            print(f"   🏦 المطابقة بواسطة IBAN...")
+            award_cents, amount_ok = amounts_to_cents(awards_clean['AwardAmount'].iloc[unmatched_pos])
+            bank_cents, bank_amount_ok = amounts_to_cents(bank_clean['BankAmount'])
             
-            if len(common_refs) > 0:
-                # تصفية البيانات للـ references المشتركة فقط
-                awards_filtered = awards_with_ref[awards_with_ref['AwardRef'].isin(common_refs)]
-                bank_filtered = bank_with_ref[bank_with_ref['BankRef'].isin(common_refs)]
-                
-                ref_merge = pd.merge(
-                    awards_filtered,
-                    bank_filtered,
-                    left_on='AwardRef',
-                    right_on='BankRef',
-                    how='inner',
-                    suffixes=('', '_bank')
+            award_pos, bank_pos, _ = iban_pairs(
+                iban_keys(awards_clean['IBAN'].iloc[unmatched_pos]), award_cents,
+                award_seconds[unmatched_pos], amount_ok,
+                iban_keys(bank_clean['IBAN']), bank_cents, bank_seconds, bank_amount_ok,
+                time_window_days
+            )
+            if len(award_pos) > 0:
+                results.add(
+                    unmatched_pos[award_pos], bank_pos,
+                    MatchType='IBAN',
+                    MatchScore=100,
+                    StatusFlag='✅',
+                    ReasonText='مطابقة بواسطة IBAN (نفس المبلغ ضمن النافذة)',
+                    AwardRef=award_ref_values[unmatched_pos[award_pos]]
                 )
+                print(f"      ✓ {len(award_pos):,} مطابقة عبر IBAN")
+        
+        # الطبقة 3: مطابقة ضبابية على الاسم والمبلغ (للسجلات المتبقية فقط)
+        unmatched_pos = results.unmatched_positions()
+        if len(unmatched_pos) > 0:
+            # جميع الجوائز المتبقية تُقيَّم (بدون حد أقصى) - موزعة على شرائح (الموسم، المبلغ)
+            print(f"   🔍 مطابقة ضبابية لـ {len(unmatched_pos):,} جائزة متبقية...")
+            unmatched_awards = awards_clean.iloc[unmatched_pos]
             
-            if len(ref_merge) > 0:
-                # تصفية حسب النافذة الزمنية
-                ref_merge['_date_diff'] = (ref_merge['EntryDate'] - ref_merge['BankDate']).dt.days.abs()
-                ref_merge = ref_merge[ref_merge['_date_diff'] <= time_window_days]
-                
-                if len(ref_merge) > 0:
-                    # التحقق من تطابق المبلغ
-                    ref_merge['_amount_diff'] = (ref_merge['AwardAmount'] - ref_merge['BankAmount']).abs()
-                    ref_merge['_amount_match'] = ref_merge['_amount_diff'] < 0.01
-                    
-                    ref_merge['MatchType'] = ref_merge['_amount_match'].apply(
-                        lambda x: 'Reference-Exact' if x else 'Reference-Diff'
-                    )
-                    ref_merge['MatchScore'] = ref_merge.apply(
-                        lambda row: 100 if row['_amount_match'] else 95, axis=1
-                    )
-                    ref_merge['StatusFlag'] = ref_merge['_amount_match'].apply(
-                        lambda x: '✅' if x else '⚠️'
-                    )
-                    ref_merge['ReasonText'] = ref_merge.apply(
-                        lambda row: 'مطابقة بواسطة Reference (AwardReferenceLong)' if row['_amount_match']
-                        else f'مطابقة Reference لكن المبلغ مختلف بـ {row["_amount_diff"]:.2f}',
-                        axis=1
-                    )
-                    matched_results.append(ref_merge)
-                    print(f"      ✓ {len(ref_merge):,} مطابقة عبر AwardReferenceLong")
-        
-        # محاولة المطابقة مع AwardReference للسجلات المتبقية
-        matched_award_idx = set()
-        if matched_results:
-            for df in matched_results:
-                matched_award_idx.update(df['_award_idx'].tolist())
-        
-        unmatched_awards = awards_clean[~awards_clean['_award_idx'].isin(matched_award_idx)].copy()
-        
-        # تصفية السجلات التي لها reference
-        unmatched_with_ref = unmatched_awards[
-            unmatched_awards['AwardRef'].notna() & 
-            (unmatched_awards['AwardRef'] != '') & 
-            (unmatched_awards['AwardRef'] != 'nan')
-        ].copy()
-        
-        if len(unmatched_with_ref) > 0 and 'AwardReference' in bank_clean.columns:
-            bank_clean['BankRef2'] = bank_clean['AwardReference'].astype(str).str.strip()
+            award_cents, amount_ok = amounts_to_cents(unmatched_awards['AwardAmount'])
+            award_seconds, date_ok = dates_to_seconds(unmatched_awards['EntryDate'])
+            bank_cents, bank_amount_ok = amounts_to_cents(bank_clean['BankAmount'])
+            bank_seconds, bank_date_ok = dates_to_seconds(bank_clean['BankDate'])
             
-            bank_with_ref2 = bank_clean[
-                bank_clean['BankRef2'].notna() & 
-                (bank_clean['BankRef2'] != '') & 
-                (bank_clean['BankRef2'] != 'nan')
-            ].copy()
+            award_names = bank_column(unmatched_awards, ['OwnerName_norm'], '').fillna('').astype(str)
+            bank_names = bank_column(bank_clean, ['BankName_norm'], '').fillna('').astype(str)
+            seasons = unmatched_awards['Season'].to_numpy() if 'Season' in unmatched_awards.columns else None
             
-            # إيجاد References المشتركة
-            common_refs2 = set(unmatched_with_ref['AwardRef'].unique()).intersection(
-                set(bank_with_ref2['BankRef2'].unique())
+            # كل شريحة تحمل جزءها من البنك فقط (في العملية الحالية - آمن داخل Streamlit)
+            best_bank, best_score = sharded_fuzzy_match(
+                award_cents, award_seconds, amount_ok & date_ok, award_names.to_numpy(),
+                bank_cents, bank_seconds, bank_amount_ok & bank_date_ok, bank_names.to_numpy(),
+                window_days=time_window_days,
+                score_cutoff=85,
+                seasons=seasons,
+                window_mode='timestamp',
+                max_workers=PERFORMANCE.get('fuzzy_max_workers'),
+                cache=self.similarity_cache
             )
             
-            if len(common_refs2) > 0:
-                print(f"      🔗 {len(common_refs2):,} Reference مشترك إضافي في AwardReference")
-                
-                awards_filtered2 = unmatched_with_ref[unmatched_with_ref['AwardRef'].isin(common_refs2)]
-                bank_filtered2 = bank_with_ref2[bank_with_ref2['BankRef2'].isin(common_refs2)]
-                
-                ref_merge2 = pd.merge(
-                    awards_filtered2,
-                    bank_filtered2,
-                    left_on='AwardRef',
-                    right_on='BankRef2',
-                    how='inner',
-                    suffixes=('', '_bank')
+            fuzzy_pos = np.flatnonzero(best_bank >= 0)
+            if len(fuzzy_pos) > 0:
+                scores = best_score[fuzzy_pos]
+                results.add(
+                    unmatched_pos[fuzzy_pos], best_bank[fuzzy_pos],
+                    MatchType='Fuzzy',
+                    MatchScore=scores,
+                    StatusFlag='✅',
+                    ReasonText=[f'مطابقة ضبابية بالاسم {score}%' for score in scores],
+                    AwardRef=award_ref_values[unmatched_pos[fuzzy_pos]]
                 )
+                print(f"      ✓ {len(fuzzy_pos):,} مطابقة ضبابية")
+        
+        # الطبقة 4: هيكل الاسم عبر الحروف العربية/اللاتينية (اختياري)
+        unmatched_pos = results.unmatched_positions()
+        if use_transliteration and len(unmatched_pos) > 0:
+            from core.transliteration import TRANSLITERATION_AWARD_COLUMNS, TRANSLITERATION_THRESHOLD, skeleton_series
             
-            if len(ref_merge2) > 0:
-                ref_merge2['_date_diff'] = (ref_merge2['EntryDate'] - ref_merge2['BankDate']).dt.days.abs()
-                ref_merge2 = ref_merge2[ref_merge2['_date_diff'] <= time_window_days]
-                
-                if len(ref_merge2) > 0:
-                    ref_merge2['MatchType'] = 'Reference'
-                    ref_merge2['MatchScore'] = 100
-                    ref_merge2['StatusFlag'] = '✅'
-                    ref_merge2['ReasonText'] = 'مطابقة بواسطة Reference (AwardReference)'
-                    matched_results.append(ref_merge2)
-                    print(f"      ✓ {len(ref_merge2):,} مطابقة عبر AwardReference")
-        
-        # الطبقة 2: مطابقة ضبابية على الاسم والمبلغ (للسجلات المتبقية فقط)
-        matched_award_idx = set()
-        if matched_results:
-            for df in matched_results:
-                matched_award_idx.update(df['_award_idx'].tolist())
-        
-        unmatched_awards = awards_clean[~awards_clean['_award_idx'].isin(matched_award_idx)].copy()
-        
-        fuzzy_matches = []
-        if len(unmatched_awards) > 0:
-            # تحديد عدد السجلات للمطابقة الضبابية
-            max_fuzzy = min(len(unmatched_awards), 5000)  # حد أقصى 5000 لتجنب استهلاك الذاكرة
+            print(f"   🔤 مطابقة عبر الحروف العربية/اللاتينية لـ {len(unmatched_pos):,} جائزة متبقية...")
+            unmatched_awards = awards_clean.iloc[unmatched_pos]
             
-            if len(unmatched_awards) > max_fuzzy:
-                print(f"   ⚠️ تحديد المطابقة الضبابية لـ {max_fuzzy:,} جائزة فقط (من {len(unmatched_awards):,})")
-                # اختيار أول 5000 سجل
-                unmatched_for_fuzzy = unmatched_awards.head(max_fuzzy)
-            else:
-                unmatched_for_fuzzy = unmatched_awards
+            award_cents, amount_ok = amounts_to_cents(unmatched_awards['AwardAmount'])
+            award_seconds, date_ok = dates_to_seconds(unmatched_awards['EntryDate'])
+            bank_cents, bank_amount_ok = amounts_to_cents(bank_clean['BankAmount'])
+            bank_seconds, bank_date_ok = dates_to_seconds(bank_clean['BankDate'])
             
-            print(f"   🔍 مطابقة ضبابية لـ {len(unmatched_for_fuzzy):,} جائزة متبقية...")
+            # الهيكل يُحسب مرة واحدة لكل اسم فريد
+            bank_skeletons = skeleton_series(bank_column(bank_clean, ['BankName', 'BankName_norm'], '')).to_numpy()
+            seasons = unmatched_awards['Season'].to_numpy() if 'Season' in unmatched_awards.columns else None
             
-            for idx, award_row in unmatched_for_fuzzy.iterrows():
-                award_amount = award_row['AwardAmount']
-                award_date = award_row['EntryDate']
-                award_name_norm = award_row.get('OwnerName_norm', '')
-                
-                # تصفية البنك حسب المبلغ والتاريخ
-                date_min = award_date - pd.Timedelta(days=time_window_days)
-                date_max = award_date + pd.Timedelta(days=time_window_days)
-                
-                candidate_bank = bank_clean[
-                    (bank_clean['BankAmount'] == award_amount) &
-                    (bank_clean['BankDate'] >= date_min) &
-                    (bank_clean['BankDate'] <= date_max)
-                ]
-                
-                if len(candidate_bank) == 0:
+            best_bank = np.full(len(unmatched_pos), -1, dtype=np.int64)
+            best_score = np.zeros(len(unmatched_pos), dtype=np.float64)
+            for sources in TRANSLITERATION_AWARD_COLUMNS:
+                if not any(source in unmatched_awards.columns for source in sources):
                     continue
-                
-                # حساب النتيجة الضبابية
-                best_score = 0
-                best_bank_row = None
-                
-                for _, bank_row in candidate_bank.iterrows():
-                    bank_name_norm = bank_row.get('BankName_norm', '')
-                    if bank_name_norm:
-                        score = fuzz.ratio(award_name_norm, bank_name_norm)
-                        
-                        if score >= 85 and score > best_score:
-                            best_score = score
-                            best_bank_row = bank_row
-                
-                if best_bank_row is not None:
-                    fuzzy_match = award_row.to_dict()
-                    fuzzy_match.update({
-                        'BankDate': best_bank_row['BankDate'],
-                        'BankName': best_bank_row.get('BankName', ''),
-                        'BankAmount': best_bank_row['BankAmount'],
-                        'BankReference': best_bank_row.get('BankReference', ''),
-                        'MatchType': 'Fuzzy',
-                        'MatchScore': best_score,
-                        'StatusFlag': '✅',
-                        'ReasonText': f'مطابقة ضبابية بالاسم {best_score}%'
-                    })
-                    fuzzy_matches.append(fuzzy_match)
-                
-                # طباعة التقدم كل 500 سجل
-                if (len(fuzzy_matches) + 1) % 500 == 0:
-                    print(f"      معالجة: {len(fuzzy_matches):,} مطابقة ضبابية...")
-            
-            if len(fuzzy_matches) > 0:
-                print(f"      ✓ {len(fuzzy_matches):,} مطابقة ضبابية")
-        
-        # دمج النتائج
-        results_list = []
-        
-        # إضافة المطابقات بالـ Reference
-        for ref_match in matched_results:
-            ref_results = ref_match[[
-                'OwnerName', 'Race', 'Season', 'AwardAmount', 'EntryDate',
-                'BankDate', 'BankName', 'BankAmount', 'BankReference',
-                'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText', '_award_idx'
-            ]].copy()
-            # إضافة عمود AwardRef إذا كان موجوداً
-            if 'AwardRef' in ref_match.columns:
-                ref_results['AwardRef'] = ref_match['AwardRef']
-            results_list.append(ref_results)
-        
-        # إضافة المطابقات الضبابية
-        if fuzzy_matches:
-            fuzzy_df = pd.DataFrame(fuzzy_matches)
-            fuzzy_results = fuzzy_df[[
-                'OwnerName', 'Race', 'Season', 'AwardAmount', 'EntryDate',
-                'BankDate', 'BankName', 'BankAmount', 'BankReference',
-                'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText', '_award_idx'
-            ]].copy()
-            # إضافة عمود AwardRef إذا كان موجوداً
-            if 'AwardRef' in fuzzy_df.columns:
-                fuzzy_results['AwardRef'] = fuzzy_df['AwardRef']
-            results_list.append(fuzzy_results)
-        
-        # تحديث مؤشر الجوائز المطابقة
-        matched_award_idx = set()
-        for df in results_list:
-            matched_award_idx.update(df['_award_idx'].tolist())
-        
-        # إضافة الجوائز غير المطابقة
-        final_unmatched = awards_clean[~awards_clean['_award_idx'].isin(matched_award_idx)].copy()
-        if len(final_unmatched) > 0:
-            final_unmatched['BankDate'] = pd.NaT
-            final_unmatched['BankName'] = ''
-            final_unmatched['BankAmount'] = np.nan
-            final_unmatched['BankReference'] = ''
-            final_unmatched['MatchType'] = 'No Match'
-            final_unmatched['MatchScore'] = 0
-            final_unmatched['StatusFlag'] = '⚠️'
-            final_unmatched['ReasonText'] = 'لم يتم العثور على مطابقة في كشف البنك'
+                award_skeletons = skeleton_series(bank_column(unmatched_awards, sources, '')).to_numpy()
+                source_bank, source_score = sharded_fuzzy_match(
+                    award_cents, award_seconds, amount_ok & date_ok, award_skeletons,
+                    bank_cents, bank_seconds, bank_amount_ok & bank_date_ok, bank_skeletons,
+                    window_days=time_window_days,
+                    score_cutoff=TRANSLITERATION_THRESHOLD,
+                    seasons=seasons,
+                    window_mode='timestamp',
+                    max_workers=PERFORMANCE.get('fuzzy_max_workers'),
+                    cache=self.similarity_cache
+                )
+                better = source_score > best_score
+                best_bank[better] = source_bank[better]
+                best_score[better] = source_score[better]
             
-            unmatched_results = final_unmatched[[
-                'OwnerName', 'Race', 'Season', 'AwardAmount', 'EntryDate',
-                'BankDate', 'BankName', 'BankAmount', 'BankReference',
-                'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText', '_award_idx'
-            ]].copy()
-            results_list.append(unmatched_results)
-        
-        # دمج كل النتائج
-        if results_list:
-            final_results = pd.concat(results_list, ignore_index=True)
-            final_results = final_results.sort_values('_award_idx').drop(columns=['_award_idx'])
-        else:
-            final_results = pd.DataFrame(columns=[
-                'OwnerName', 'Race', 'Season', 'AwardAmount', 'EntryDate',
-                'BankDate', 'BankName', 'BankAmount', 'BankReference',
-                'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText'
-            ])
-        
-        return final_results
+            translit_pos = np.flatnonzero(best_bank >= 0)
+            if len(translit_pos) > 0:
+                scores = best_score[translit_pos]
+                results.add(
+                    unmatched_pos[translit_pos], best_bank[translit_pos],
+                    MatchType='Transliteration',
+                    MatchScore=scores,
+                    StatusFlag='✅',
+                    ReasonText=[f'مطابقة بهيكل الاسم (عربي/لاتيني) {score}%' for score in scores],
+                    AwardRef=award_ref_values[unmatched_pos[translit_pos]]
+                )
+                print(f"      ✓ {len(translit_pos):,} مطابقة عبر الحروف العربية/اللاتينية")
+        
+        # الجوائز غير المطابقة
+        results.add_unmatched(
+            MatchType='No Match',
+            MatchScore=0,
+            StatusFlag='⚠️',
+            ReasonText='لم يتم العثور على مطابقة في كشف البنك'
+        )
+        
+        if len(results) == 0:
+            return pd.DataFrame(columns=(
+                BASIC_AWARD_COLUMNS + list(BASIC_BANK_COLUMNS) +
+                ['MatchType', 'MatchScore', 'StatusFlag', 'ReasonText']
+            ))
+        
+        # إرفاق أعمدة الجوائز والبنك مرة واحدة
+        return self._build_results(results, awards_clean, bank_clean)
     
     def detect_internal_duplicates(self) -> pd.DataFrame:
         """
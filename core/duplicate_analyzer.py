@@ -11,8 +11,163 @@ from difflib import SequenceMatcher
 from datetime import timedelta
 import logging
 
+from core.match_engine import expand_ranges
+
 logger = logging.getLogger(__name__)
 
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+    logger.warning("rapidfuzz غير متوفر - التطابق الضبابي بـ difflib فقط")
+
+# أقصى عدد خلايا في كل مصفوفة cdist (أسماء الكتلة × أسماء المقارنة)
+FUZZY_BLOCK_MAX_CELLS = 2_000_000
+
+
+def _blocked_name_pairs(names: np.ndarray,
+                        threshold: float,
+                        prefix_len: int = 0,
+                        blocks: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    أزواج الأسماء الفريدة المتشابهة (fuzz.ratio) عبر كتل الطول والبادئة
+    
+    - الكتلة (اختياري): المقارنة داخل نفس رقم الكتلة فقط (مثل الأعمدة المتطابقة)
+    - البادئة: المقارنة داخل الأسماء التي تبدأ بنفس prefix_len حرف فقط
+      (0 = بدون تقييد البادئة؛ القيمة الموجبة تفقد الأزواج المختلفة في أول حرف)
+    - الطول: fuzz.ratio >= t يتطلب |l1 - l2| <= (1 - t)(l1 + l2)، فكل
+      مجموعة طول تُقارن فقط بالأطوال من l حتى l(2 - t)/t - بدون فقد
+    
+    كل كتلة تُقيَّم باستدعاء process.cdist واحد (score_cutoff + workers=-1)
+    
+    Args:
+        names: الأسماء الفريدة (غير فارغة)
+        threshold: عتبة التشابه (0-1)
+        prefix_len: طول البادئة المشتركة المطلوبة
+        blocks: رقم الكتلة لكل اسم (None = كتلة واحدة)
+        
+    Returns:
+        (i, j, similarity) - مواضع في names مع i < j
+    """
+    lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+    prefixes = pd.Series(names, dtype=object).str[:prefix_len] if prefix_len > 0 else pd.Series('', index=range(len(names)))
+    blocks = np.zeros(len(names), dtype=np.int64) if blocks is None else np.asarray(blocks)
+    max_ratio = (2 - threshold) / threshold if threshold > 0 else np.inf
+    
+    parts = []
+    for _, block in pd.Series(np.arange(len(names))).groupby([blocks, prefixes.to_numpy()], sort=False):
+        block = block.to_numpy()
+        block = block[np.lexsort((block, lengths[block]))]
+        block_lengths = lengths[block]
+        block_names = names[block]
+        
+        starts = np.flatnonzero(np.r_[True, block_lengths[1:] != block_lengths[:-1]])
+        stops = np.r_[starts[1:], len(block)]
+        for start, stop in zip(starts, stops):
+            # نفس الطول والأطوال الأكبر الممكنة فقط (الأصغر قورنت سابقاً)
+            col_stop = np.searchsorted(block_lengths, block_lengths[start] * max_ratio + 1e-9, side='right')
+            step = max(1, FUZZY_BLOCK_MAX_CELLS // max(col_stop - start, 1))
+            for row in range(start, stop, step):
+                row_stop = min(row + step, stop)
+                scores = process.cdist(
+                    list(block_names[row:row_stop]), list(block_names[start:col_stop]),
+                    scorer=fuzz.ratio, score_cutoff=threshold * 100,
+                    dtype=np.float32, workers=-1
+                )
+                rows, cols = np.nonzero(scores)
+                rows, cols = rows + row, cols + start
+                keep = cols > rows
+                first, second = block[rows[keep]], block[cols[keep]]
+                parts.append((
+                    np.minimum(first, second), np.maximum(first, second),
+                    scores[rows[keep] - row, cols[keep] - start] / 100
+                ))
+    
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    return tuple(np.concatenate([part[k] for part in parts]) for k in range(3))
+
+
+class _UnionFind:
+    """
+    اتحاد-بحث على مصفوفة NumPy: كل دفعة أزواج تُدمج متجهياً
+    (ربط الجذر الأكبر بالأصغر ثم ضغط المسارات بالقفز على المؤشرات)
+    """
+    
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int64)
+    
+    def roots(self) -> np.ndarray:
+        """جذر كل عنصر (مع ضغط كامل للمسارات)"""
+        while True:
+            grand = self.parent[self.parent]
+            if np.array_equal(grand, self.parent):
+                return self.parent
+            self.parent = grand
+    
+    def union(self, a: np.ndarray, b: np.ndarray) -> None:
+        """دمج مجموعات كل زوج (a[k], b[k])"""
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        while len(a) > 0:
+            roots = self.roots()
+            root_a, root_b = roots[a], roots[b]
+            pending = root_a != root_b
+            if not pending.any():
+                return
+            a, b = a[pending], b[pending]
+            low = np.minimum(root_a[pending], root_b[pending])
+            high = np.maximum(root_a[pending], root_b[pending])
+            np.minimum.at(self.parent, high, low)
+
+
+def _maximal_collision_sets(codes: List[np.ndarray],
+                            min_size: int = 1) -> Tuple[np.ndarray, np.ndarray, List[Tuple[int, ...]]]:
+    """
+    مجموعات الأعمدة العظمى التي يتكرر فيها كل صف (بحث عمقي في شبكة التوليفات)
+    
+    - مفتاح التوليفة يُبنى من مفتاح الأب وترميز العمود الجديد (بدون نسخ الصفوف)
+    - التوليفة بلا تصادم لا تُوسَّع، والتوسيع على صفوفها المتكررة فقط
+    - التكرار على مجموعة يستلزم التكرار على كل مجموعاتها الجزئية، فالمجموعة
+      عظمى للصف إذا لم يتكرر الصف بإضافة أي عمود واحد
+    
+    Returns:
+        (rows, set_ids, combos) - زوج لكل (صف، مجموعة عظمى بحجم ≥ min_size)
+    """
+    n = len(codes[0]) if codes else 0
+    cardinality = [int(col_codes.max()) + 1 if n else 1 for col_codes in codes]
+    found_rows, found_sets, combos = [], [], []
+    
+    def visit(combo: Tuple[int, ...], rows: np.ndarray, keys: np.ndarray) -> None:
+        extended = np.zeros(len(rows), dtype=bool)
+        children = []
+        for col in range(len(codes)):
+            if col in combo:
+                continue
+            child_keys, _ = pd.factorize(keys * cardinality[col] + codes[col][rows])
+            duplicated = np.bincount(child_keys)[child_keys] > 1
+            if not duplicated.any():
+                continue
+            extended |= duplicated
+            if not combo or col > combo[-1]:
+                children.append((col, duplicated, child_keys))
+        
+        if len(combo) >= min_size:
+            maximal = rows[~extended]
+            if len(maximal) > 0:
+                found_rows.append(maximal)
+                found_sets.append(np.full(len(maximal), len(combos), dtype=np.int64))
+                combos.append(combo)
+        
+        for col, duplicated, child_keys in children:
+            visit(combo + (col,), rows[duplicated], child_keys[duplicated])
+    
+    visit((), np.arange(n, dtype=np.int64), np.zeros(n, dtype=np.int64))
+    if not combos:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), []
+    return np.concatenate(found_rows), np.concatenate(found_sets), combos
+
 
 class DuplicateAnalyzer:
     """محلل متقدم للدفعات المكررة"""
@@ -126,7 +281,9 @@ class DuplicateAnalyzer:
     def find_fuzzy_duplicates(self,
                              name_col: str,
                              threshold: float = 0.90,
-                             additional_cols: Optional[List[str]] = None) -> pd.DataFrame:
+                             additional_cols: Optional[List[str]] = None,
+                             engine: str = 'rapidfuzz',
+                             prefix_len: int = 0) -> pd.DataFrame:
         """
         البحث عن تكرارات ضبابية (أسماء متشابهة وليست متطابقة تماماً)
         
@@ -134,6 +291,10 @@ class DuplicateAnalyzer:
             name_col: عمود الأسماء
             threshold: عتبة التشابه (0-1)، القيمة الافتراضية 0.90 (90%)
             additional_cols: أعمدة إضافية للتحقق منها
+            engine: 'rapidfuzz' (كتل الطول والبادئة + cdist) أو 'difflib' (كل الأزواج)
+            prefix_len: طول البادئة المشتركة في محرك rapidfuzz (0 = بدون تقييد وبدون فقد؛
+                        القيمة الموجبة أسرع لكنها تفقد الأسماء المختلفة في أول حرف
+                        مثل "احمد" / "أحمد")
             
         Returns:
             DataFrame بالتكرارات الضبابية
@@ -150,6 +311,9 @@ class DuplicateAnalyzer:
         # تنظيف وتطبيع الأسماء
         df_work['_normalized_name'] = df_work[name_col].str.lower().str.replace(r'\s+', ' ', regex=True)
         
+        if engine == 'rapidfuzz' and RAPIDFUZZ_AVAILABLE:
+            return self._find_fuzzy_duplicates_blocked(df_work, name_col, threshold, additional_cols, prefix_len)
+        
         unique_names = df_work['_normalized_name'].unique()
         
         for i, name1 in enumerate(unique_names):
@@ -195,6 +359,53 @@ class DuplicateAnalyzer:
             logger.info("لم يتم العثور على تطابقات ضبابية")
             return pd.DataFrame()
     
+    def _find_fuzzy_duplicates_blocked(self,
+                                       df_work: pd.DataFrame,
+                                       name_col: str,
+                                       threshold: float,
+                                       additional_cols: Optional[List[str]],
+                                       prefix_len: int) -> pd.DataFrame:
+        """
+        محرك rapidfuzz للتكرارات الضبابية: أزواج الأسماء من كتل الطول والبادئة،
+        وعدد الصفوف وأول قيمة لكل اسم من groupby واحد (بدل مسح الجدول لكل زوج)
+        """
+        grouped = df_work.groupby('_normalized_name', sort=False)
+        counts = grouped.size()
+        firsts = grouped.nth(0).set_index('_normalized_name').reindex(counts.index)
+        
+        names = counts.index.to_numpy(dtype=object)
+        named = np.flatnonzero(names != '')
+        i, j, similarity = _blocked_name_pairs(names[named], threshold, prefix_len)
+        i, j = named[i], named[j]
+        
+        # التحقق من الأعمدة الإضافية (أول قيمة لكل اسم)
+        keep = np.ones(len(i), dtype=bool)
+        for col in additional_cols or []:
+            if col in firsts.columns:
+                values = firsts[col].to_numpy(dtype=object)
+                keep &= values[i] == values[j]
+        i, j, similarity = i[keep], j[keep], similarity[keep]
+        
+        if len(i) == 0:
+            logger.info("لم يتم العثور على تطابقات ضبابية")
+            return pd.DataFrame()
+        
+        # نفس ترتيب محرك difflib: حسب ظهور الاسم الأول ثم الثاني
+        order = np.lexsort((j, i))
+        i, j, similarity = i[order], j[order], similarity[order]
+        originals = firsts[name_col].to_numpy(dtype=object)
+        fuzzy_df = pd.DataFrame({
+            'name1': names[i],
+            'name2': names[j],
+            'similarity': similarity.astype(float),
+            'count1': counts.to_numpy()[i],
+            'count2': counts.to_numpy()[j],
+            'original_name1': originals[i],
+            'original_name2': originals[j]
+        })
+        logger.info(f"تم العثور على {len(fuzzy_df)} تطابق ضبابي")
+        return fuzzy_df
+    
     def find_partial_duplicates(self,
                                columns: List[str],
                                min_matching_cols: int = 2) -> pd.DataFrame:
@@ -206,36 +417,37 @@ class DuplicateAnalyzer:
             min_matching_cols: الحد الأدنى من الأعمدة المتطابقة
             
         Returns:
-            DataFrame بالتكرارات الجزئية
+            DataFrame بصف لكل سجل متكرر: matching_columns (المجموعات العظمى
+            مفصولة بـ " | ") و match_count (حجم أكبرها)
         """
         logger.info(f"البحث عن تكرارات جزئية (حد أدنى: {min_matching_cols} عمود)...")
         
-        partial_duplicates = []
-        
-        # إنشاء جميع التوليفات الممكنة
-        from itertools import combinations
-        
-        for r in range(min_matching_cols, len(columns) + 1):
-            for col_combination in combinations(columns, r):
-                mask = self.df.duplicated(subset=list(col_combination), keep=False)
-                if mask.any():
-                    dups = self.df[mask].copy()
-                    dups['matching_columns'] = ', '.join(col_combination)
-                    dups['match_count'] = len(col_combination)
-                    partial_duplicates.append(dups)
-        
-        if partial_duplicates:
-            result = pd.concat(partial_duplicates, ignore_index=True)
-            result = result.drop_duplicates()
-            logger.info(f"تم العثور على {len(result)} تكرار جزئي")
-            return result
-        else:
+        # ترميز كل عمود مرة واحدة (القيم الفارغة تتطابق كما في duplicated)
+        codes = [pd.factorize(self.df[col], use_na_sentinel=False)[0].astype(np.int64) for col in columns]
+        rows, set_ids, combos = _maximal_collision_sets(codes, max(min_matching_cols, 1))
+        
+        if len(rows) == 0:
             return pd.DataFrame()
+        
+        # صف لكل سجل: مجموعاته العظمى (الأكبر أولاً) وحجم أكبرها
+        sizes = np.array([len(combo) for combo in combos])[set_ids]
+        labels = np.array([', '.join(columns[col] for col in combo) for combo in combos], dtype=object)
+        order = np.lexsort((set_ids, -sizes, rows))
+        per_row = pd.DataFrame({
+            'row': rows[order], 'label': labels[set_ids[order]], 'size': sizes[order]
+        }).groupby('row', sort=True).agg(matching_columns=('label', ' | '.join), match_count=('size', 'max'))
+        
+        result = self.df.iloc[per_row.index.to_numpy()].copy()
+        result['matching_columns'] = per_row['matching_columns'].to_numpy()
+        result['match_count'] = per_row['match_count'].to_numpy()
+        logger.info(f"تم العثور على {len(result)} تكرار جزئي")
+        return result
     
     def find_multi_field_duplicates(self,
                                     columns: List[str],
                                     fuzzy_match: bool = False,
-                                    fuzzy_threshold: float = 0.90) -> pd.DataFrame:
+                                    fuzzy_threshold: float = 0.90,
+                                    engine: str = 'rapidfuzz') -> pd.DataFrame:
         """
         البحث عن تكرارات بناءً على عدة حقول
         
@@ -243,6 +455,7 @@ class DuplicateAnalyzer:
             columns: قائمة الحقول للبحث عن التكرارات بناءً عليها
             fuzzy_match: تفعيل التطابق الضبابي للحقول النصية
             fuzzy_threshold: عتبة التشابه للتطابق الضبابي (0-1)
+            engine: 'rapidfuzz' (كتل + اتحاد-بحث، مجموعات متعدية) أو 'difflib' (حلقة كل الأزواج)
             
         Returns:
             DataFrame بالتكرارات المكتشفة
@@ -259,7 +472,10 @@ class DuplicateAnalyzer:
         # إذا كان التطابق الضبابي مفعّل والعمود نصي
         if fuzzy_match:
             # تطبيق التطابق الضبابي للحقول النصية
-            text_columns = [col for col in columns if df_work[col].dtype == 'object']
+            text_columns = [
+                col for col in columns
+                if df_work[col].dtype == 'object' or pd.api.types.is_string_dtype(df_work[col])
+            ]
             
             if text_columns:
                 logger.info(f"تطبيق التطابق الضبابي على: {text_columns}")
@@ -276,9 +492,14 @@ class DuplicateAnalyzer:
                     )
                 
                 # البحث عن التطابقات الضبابية
-                duplicates = self._find_fuzzy_multi_field_duplicates(
-                    df_work, columns, text_columns, fuzzy_threshold
-                )
+                if engine == 'rapidfuzz' and RAPIDFUZZ_AVAILABLE:
+                    duplicates = self._cluster_fuzzy_multi_field_duplicates(
+                        df_work, columns, text_columns, fuzzy_threshold
+                    )
+                else:
+                    duplicates = self._find_fuzzy_multi_field_duplicates(
+                        df_work, columns, text_columns, fuzzy_threshold
+                    )
             else:
                 # لا توجد أعمدة نصية، استخدام التطابق التام
                 duplicates = self._find_exact_multi_field_duplicates(df_work, columns)
@@ -388,39 +609,109 @@ class DuplicateAnalyzer:
         else:
             return pd.DataFrame()
     
+    def _cluster_fuzzy_multi_field_duplicates(self,
+                                              df: pd.DataFrame,
+                                              columns: List[str],
+                                              text_columns: List[str],
+                                              threshold: float) -> pd.DataFrame:
+        """
+        تجميع التكرارات الضبابية في عدة حقول (مجموعات متعدية لا تعتمد على الترتيب)
+        
+        - كتل على الأعمدة غير النصية (تطابق تام، والقيم الفارغة لا تطابق)
+        - العقد: القيم النصية المطبّعة الفريدة داخل الكتلة (الصفوف المتطابقة عقدة واحدة)
+        - الأزواج المرشحة من العمود النصي الأول داخل الكتلة (كتل الطول + cdist)،
+          ثم التحقق من باقي الأعمدة النصية بـ cpdist
+        - دمج الأزواج باتحاد-بحث على مصفوفة NumPy
+        """
+        exact_columns = [col for col in columns if col not in text_columns]
+        normalized = [f'_normalized_{col}' for col in text_columns]
+        
+        if exact_columns:
+            blocks = df.groupby(exact_columns, sort=False, dropna=True).ngroup().to_numpy()
+        else:
+            blocks = np.zeros(len(df), dtype=np.int64)
+        rows = np.flatnonzero(blocks >= 0)
+        
+        # العقد: (الكتلة، القيم النصية) الفريدة بترتيب الظهور
+        keys = ['_block'] + normalized
+        node_frame = df.iloc[rows][normalized].assign(_block=blocks[rows])
+        row_node = node_frame.groupby(keys, sort=False).ngroup().to_numpy()
+        nodes = node_frame.drop_duplicates(keys)
+        
+        # أزواج قيم العمود الأول داخل الكتلة + القيمة مع نفسها
+        value_of_node = nodes.groupby(['_block', normalized[0]], sort=False).ngroup().to_numpy()
+        values = nodes.drop_duplicates(['_block', normalized[0]])
+        value_i, value_j, _ = _blocked_name_pairs(
+            values[normalized[0]].to_numpy(dtype=object), threshold,
+            prefix_len=0, blocks=values['_block'].to_numpy()
+        )
+        value_i = np.r_[value_i, np.arange(len(values))]
+        value_j = np.r_[value_j, np.arange(len(values))]
+        
+        # توسيع أزواج القيم إلى أزواج العقد
+        node_order = np.argsort(value_of_node, kind='stable')
+        counts = np.bincount(value_of_node, minlength=len(values))
+        stops = np.cumsum(counts)
+        starts = stops - counts
+        pair, pos_a = expand_ranges(starts[value_i], stops[value_i])
+        pair_b, pos_b = expand_ranges(starts[value_j[pair]], stops[value_j[pair]])
+        node_a, node_b = node_order[pos_a[pair_b]], node_order[pos_b]
+        distinct = node_a < node_b
+        node_a, node_b = node_a[distinct], node_b[distinct]
+        
+        # باقي الأعمدة النصية
+        for col in normalized[1:]:
+            col_values = nodes[col].to_numpy(dtype=object)
+            scores = process.cpdist(
+                list(col_values[node_a]), list(col_values[node_b]),
+                scorer=fuzz.ratio, dtype=np.float32, workers=-1
+            )
+            similar = scores >= threshold * 100
+            node_a, node_b = node_a[similar], node_b[similar]
+        
+        groups = _UnionFind(len(nodes))
+        groups.union(node_a, node_b)
+        row_root = groups.roots()[row_node]
+        
+        duplicated = np.bincount(row_root, minlength=len(nodes))[row_root] > 1
+        if not duplicated.any():
+            return pd.DataFrame()
+        
+        duplicates = df.iloc[rows[duplicated]].copy()
+        duplicates['duplicate_group'], _ = pd.factorize(row_root[duplicated])
+        return duplicates
+    
     def _find_duplicates_with_time_window(self,
                                          df: pd.DataFrame,
                                          comparison_cols: List[str],
                                          date_col: str,
                                          window_days: int) -> pd.DataFrame:
-        """البحث عن التكرارات ضمن نافذة زمنية محددة"""
-        duplicates = []
-        
-        # تجميع حسب الأعمدة المقارنة
-        grouped = df.groupby(comparison_cols)
+        """
+        البحث عن التكرارات ضمن نافذة زمنية محددة
         
-        for name, group in grouped:
-            if len(group) < 2:
-                continue
-            
-            # فرز حسب التاريخ
-            group = group.sort_values(date_col)
-            dates = group[date_col].values
-            
-            # التحقق من وجود تكرارات ضمن النافذة الزمنية
-            for i in range(len(dates)):
-                for j in range(i + 1, len(dates)):
-                    time_diff = (dates[j] - dates[i]) / np.timedelta64(1, 'D')
-                    
-                    if time_diff <= window_days:
-                        duplicates.extend([group.iloc[i], group.iloc[j]])
+        فرز واحد حسب (مفتاح المقارنة، التاريخ): أقرب صف للصف في مجموعته هو
+        جاره في الترتيب، فيكفي فرق التاريخ مع الصف السابق. كل صف يظهر مرة واحدة.
+        """
+        keys = df.groupby(comparison_cols, sort=False, dropna=True).ngroup().to_numpy()
+        dates = df[date_col].to_numpy()
+        order = np.lexsort((dates, keys))
+        keys, dates = keys[order], dates[order]
+        
+        # صفان متجاوران من نفس المجموعة ضمن النافذة
+        close = (
+            (keys[1:] == keys[:-1]) & (keys[1:] >= 0)
+            & ((dates[1:] - dates[:-1]) / np.timedelta64(1, 'D') <= window_days)
+        )
+        flagged = np.zeros(len(order), dtype=bool)
+        flagged[1:] |= close
+        flagged[:-1] |= close
         
-        if duplicates:
-            result = pd.DataFrame(duplicates)
-            result['duplicate_group'] = result.groupby(comparison_cols).ngroup()
-            return result
-        else:
+        if not flagged.any():
             return pd.DataFrame()
+        
+        result = df.iloc[order[flagged]].copy()
+        result['duplicate_group'] = result.groupby(comparison_cols).ngroup()
+        return result
     
     def _calculate_duplicate_stats(self, duplicates: pd.DataFrame, comparison_cols: List[str]) -> None:
         """حساب إحصائيات التكرارات"""
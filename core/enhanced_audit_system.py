@@ -19,9 +19,11 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Any, Optional
-import re
 import warnings
 
+from core.match_engine import AmountRangeIndex, amounts_to_cents, dates_to_seconds, day_diff
+from core.reference_index import ReferenceIndex, clean_reference, clean_reference_series, melt_references
+
 warnings.filterwarnings('ignore')
 
 
@@ -356,6 +358,7 @@ class EnhancedBankMatcher:
     - مطابقة مرنة (آخر N أرقام)
     - فحص المبلغ والتاريخ
     - تصنيف ثلاثي: Matched / Partial / Unmatched
+    - (اختياري) ربط نطاقي بالمبلغ ±التسامح والتاريخ ±النافذة لغير المطابق
     """
     
     def __init__(
@@ -377,11 +380,17 @@ class EnhancedBankMatcher:
         self.matched_records = []
         self.partial_records = []
         self.unmatched_records = []
+        
+        # فهرس اللواحق المرجعية (يُبنى مرة واحدة لكل كشف بنك)
+        self.reference_index: Optional[ReferenceIndex] = None
+        self._indexed_bank: Optional[pd.DataFrame] = None
     
     def match_awards_to_bank(
         self,
         awards_df: pd.DataFrame,
-        bank_df: pd.DataFrame
+        bank_df: pd.DataFrame,
+        bulk: bool = False,
+        amount_window: bool = False
     ) -> Dict[str, pd.DataFrame]:
         """
         مطابقة جميع سجلات الجوائز مع كشف البنك
@@ -389,6 +398,9 @@ class EnhancedBankMatcher:
         Args:
             awards_df: DataFrame الجوائز
             bank_df: DataFrame البنك
+            bulk: التحقق الجماعي (join واحد لكل المراجع بدلاً من حلقة صفوف)
+            amount_window: مطابقة غير المطابق بالمبلغ (±amount_tolerance) والتاريخ
+                           (±date_window_days) بدون مرجع ← partial بحالة AMOUNT_WINDOW
             
         Returns:
             قاموس يحتوي على: matched, partial, unmatched
@@ -404,9 +416,24 @@ class EnhancedBankMatcher:
         # تحضير بيانات البنك
         bank_df = self._prepare_bank_data(bank_df)
         
+        # بناء فهرس المراجع مرة واحدة (بدلاً من مسح str.contains لكل مرجع)
+        self._build_reference_index(bank_df)
+        print(f"   🔑 فهرس المراجع: {len(self.reference_index):,} لاحقة فريدة")
+        
         total = len(awards_df)
         print(f"\n🔄 معالجة {total:,} سجل...")
         
+        if bulk:
+            matched_df, partial_df, unmatched_df = self._match_awards_bulk(awards_df, bank_df)
+            if amount_window:
+                partial_df, unmatched_df = self._match_amount_window(partial_df, unmatched_df, bank_df)
+            self._print_statistics(matched_df, partial_df, unmatched_df, total)
+            return {
+                'matched': matched_df,
+                'partial': partial_df,
+                'unmatched': unmatched_df
+            }
+        
         # معالجة كل سجل
         for idx, row in awards_df.iterrows():
             match_result = self._match_single_award(row, bank_df)
@@ -424,6 +451,9 @@ class EnhancedBankMatcher:
         partial_df = pd.DataFrame(self.partial_records) if self.partial_records else pd.DataFrame()
         unmatched_df = pd.DataFrame(self.unmatched_records) if self.unmatched_records else pd.DataFrame()
         
+        if amount_window:
+            partial_df, unmatched_df = self._match_amount_window(partial_df, unmatched_df, bank_df)
+        
         # إحصائيات
         self._print_statistics(matched_df, partial_df, unmatched_df, total)
         
@@ -441,9 +471,7 @@ class EnhancedBankMatcher:
         ref_fields = ['AwardRef', 'AwardRef10Digits', 'BankReference']
         for field in ref_fields:
             if field in bank_df.columns:
-                bank_df[field] = bank_df[field].astype(str).str.strip()
-                bank_df[field] = bank_df[field].str.replace(r'[^\w]', '', regex=True)
-                bank_df[field] = bank_df[field].str.lower()
+                bank_df[field] = clean_reference_series(bank_df[field])
         
         # التأكد من أن المبلغ رقمي
         if 'TransferAmount' in bank_df.columns:
@@ -474,10 +502,13 @@ class EnhancedBankMatcher:
     
     def _clean_reference(self, ref: str) -> str:
         """تنظيف رقم مرجعي"""
-        ref = str(ref).strip()
-        ref = re.sub(r'[^\w]', '', ref)  # إزالة كل ما عدا حروف وأرقام
-        ref = ref.lower()
-        return ref
+        return clean_reference(ref)
+    
+    def _build_reference_index(self, bank_df: pd.DataFrame) -> ReferenceIndex:
+        """بناء فهرس آخر N خانات لأعمدة المراجع في البنك"""
+        self.reference_index = ReferenceIndex(bank_df, last_digits=self.ref_last_digits)
+        self._indexed_bank = bank_df
+        return self.reference_index
     
     def _match_single_award(self, award_row: pd.Series, bank_df: pd.DataFrame) -> Dict:
         """مطابقة سجل جائزة واحد مع البنك"""
@@ -549,44 +580,231 @@ class EnhancedBankMatcher:
         
         return {'status': 'UNMATCHED', 'data': award_data}
     
-    def _find_bank_matches(self, ref_clean: str, bank_df: pd.DataFrame) -> pd.DataFrame:
-        """البحث عن مطابقات في البنك"""
-        ref_last = ref_clean[-self.ref_last_digits:]
-        
-        # البحث في جميع الأعمدة الممكنة
-        matches = pd.DataFrame()
+    def _match_awards_bulk(
+        self,
+        awards_df: pd.DataFrame,
+        bank_df: pd.DataFrame
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """
+        التحقق الجماعي: نفس تصنيف _match_single_award بدون حلقة صفوف
         
-        # قائمة الأعمدة المحتملة للمراجع
-        possible_ref_columns = ['AwardRef', 'AwardRef10Digits', 'BankReference', 'PaymentReference']
+        1. melt لكل المراجع ← (award_pos, ref_rank, ref_clean)
+        2. hash-join واحد مع فهرس اللواحق
+        3. أول مرجع له صفوف بنكية يحسم النتيجة؛ ضمنه أول صف بمبلغ
+           ضمن التسامح = MATCHED_100، وإلا أول صف = PARTIAL
         
-        for col in possible_ref_columns:
-            if col in bank_df.columns:
-                col_matches = bank_df[
-                    bank_df[col].astype(str).str.contains(ref_last, na=False, case=False)
-                ]
-                if len(col_matches) > 0:
-                    matches = pd.concat([matches, col_matches], ignore_index=True)
+        Returns:
+            (matched_df, partial_df, unmatched_df)
+        """
+        if self.reference_index is None or self._indexed_bank is not bank_df:
+            self._build_reference_index(bank_df)
         
-        # إزالة التكرارات
-        if len(matches) > 0:
-            matches = matches.drop_duplicates()
+        melted = melt_references(awards_df)
+        pairs = self.reference_index.join(melted)
         
-        return matches
-    
-    def _verify_amount(self, award_amount: float, bank_matches: pd.DataFrame) -> Optional[Dict]:
-        """التحقق من المبلغ"""
-        for idx, bank_row in bank_matches.iterrows():
-            bank_amount = bank_row.get('TransferAmount')
+        if 'AwardAmount' in awards_df.columns:
+            award_amounts = pd.to_numeric(awards_df['AwardAmount'], errors='coerce').to_numpy(dtype=float)
+        else:
+            award_amounts = np.zeros(len(awards_df))
+        if 'TransferAmount' in bank_df.columns:
+            bank_amounts = bank_df['TransferAmount'].to_numpy(dtype=float)
+        else:
+            bank_amounts = np.full(len(bank_df), np.nan)
+        
+        # المرجع الحاسم = أول مرجع (حسب الأولوية) له صفوف في البنك
+        deciding_rank = pairs.groupby('award_pos')['ref_rank'].transform('min')
+        pairs = pairs[pairs['ref_rank'] == deciding_rank].reset_index(drop=True)
+        
+        pair_award = award_amounts[pairs['award_pos'].to_numpy()]
+        pair_bank = bank_amounts[pairs['bank_pos'].to_numpy()]
+        amount_ok = ~np.isnan(pair_bank) & (np.abs(pair_award - pair_bank) <= self.amount_tolerance)
+        
+        full = pairs[amount_ok].drop_duplicates('award_pos', keep='first')
+        partial = pairs[~pairs['award_pos'].isin(full['award_pos'])].drop_duplicates('award_pos', keep='first')
+        
+        def take(frame: pd.DataFrame, col: str):
+            if col not in bank_df.columns:
+                return None
+            return bank_df[col].to_numpy()[frame['bank_pos'].to_numpy()]
+        
+        # MATCHED_100
+        matched_df = awards_df.iloc[full['award_pos'].to_numpy()].reset_index(drop=True)
+        if len(matched_df) > 0:
+            matched_df['MatchStatus'] = 'MATCHED_100'
+            matched_df['MatchReason'] = '✅ مطابقة بنكية كاملة'
+            matched_df['MatchedReference'] = full['reference'].to_numpy()
+            matched_df['BankTransferAmount'] = take(full, 'TransferAmount')
+            matched_df['BankTransactionDate'] = take(full, 'TransactionDate')
+            matched_df['BankValueDate'] = take(full, 'ValueDate')
+            matched_df['BankBeneficiary'] = take(full, 'BeneficiaryName')
+            matched_df['BankReference'] = take(full, 'BankReference')
+            matched_df['BankIBAN'] = take(full, 'IBAN')
+            matched_df['AmountDifference'] = 0.00
             
-            if pd.isna(bank_amount):
-                continue
+            # فحص التاريخ (اختياري)
+            if 'EntryDate' in matched_df.columns:
+                date_check = self._verify_dates_bulk(matched_df['EntryDate'], bank_df, full['bank_pos'].to_numpy())
+                if date_check.notna().any():
+                    matched_df['DateCheck'] = date_check
+        else:
+            matched_df = pd.DataFrame()
+        
+        # PARTIAL
+        partial_df = awards_df.iloc[partial['award_pos'].to_numpy()].reset_index(drop=True)
+        if len(partial_df) > 0:
+            if 'TransferAmount' in bank_df.columns:
+                bank_amount = bank_amounts[partial['bank_pos'].to_numpy()]
+                award_amount = award_amounts[partial['award_pos'].to_numpy()]
+                diff = np.where(bank_amount != 0, np.abs(award_amount - bank_amount), 0.0)
+            else:
+                bank_amount = np.zeros(len(partial))
+                diff = np.zeros(len(partial))
             
-            diff = abs(award_amount - bank_amount)
+            partial_df['MatchStatus'] = 'PARTIAL'
+            partial_df['MatchReason'] = '⚠️ Ref مطابق - مبلغ مختلف (فرق: ' + pd.Series(np.char.mod('%.2f', diff)) + ')'
+            partial_df['MatchedReference'] = partial['reference'].to_numpy()
+            partial_df['BankTransferAmount'] = bank_amount
+            partial_df['AmountDifference'] = diff
+            partial_df['BankReference'] = take(partial, 'BankReference')
+        else:
+            partial_df = pd.DataFrame()
+        
+        # UNMATCHED + NO_REFERENCE (بترتيب الجوائز الأصلي)
+        found = np.zeros(len(awards_df), dtype=bool)
+        found[pairs['award_pos'].to_numpy()] = True
+        unmatched_pos = np.flatnonzero(~found)
+        unmatched_df = awards_df.iloc[unmatched_pos].reset_index(drop=True)
+        if len(unmatched_df) > 0:
+            attempted = melted.groupby('award_pos')['reference'].agg(' | '.join)
+            attempted = attempted.reindex(unmatched_pos)
+            has_refs = attempted.notna().to_numpy()
             
-            if diff <= self.amount_tolerance:
-                return bank_row.to_dict()
+            unmatched_df['MatchStatus'] = np.where(has_refs, 'UNMATCHED', 'NO_REFERENCE')
+            unmatched_df['MatchReason'] = np.where(has_refs, '❌ Ref غير موجود بالبنك', '❌ لا يوجد رقم مرجعي')
+            if has_refs.any():
+                unmatched_df['AttemptedRefs'] = attempted.to_numpy()
+        else:
+            unmatched_df = pd.DataFrame()
+        
+        return matched_df, partial_df, unmatched_df
+    
+    def _verify_dates_bulk(self, award_dates: pd.Series, bank_df: pd.DataFrame, bank_pos: np.ndarray) -> pd.Series:
+        """نسخة عمودية من _verify_date (NaN للجوائز بدون تاريخ)"""
+        award_dates = pd.to_datetime(award_dates.reset_index(drop=True), errors='coerce')
         
-        return None
+        date_col = 'TransactionDate' if 'TransactionDate' in bank_df.columns else 'ValueDate'
+        if date_col in bank_df.columns:
+            bank_dates = pd.to_datetime(bank_df[date_col], errors='coerce').iloc[bank_pos].reset_index(drop=True)
+        else:
+            bank_dates = pd.Series(pd.NaT, index=award_dates.index, dtype='datetime64[ns]')
+        
+        diff_days = (award_dates - bank_dates).dt.days.abs()
+        diff_text = diff_days.astype('Int64').astype(str)
+        
+        date_check = pd.Series(
+            np.select(
+                [bank_dates.isna(), diff_days <= self.date_window_days],
+                ['تاريخ البنك غير متاح', '✅ ضمن النافذة (' + diff_text + ' يوم)'],
+                default='⚠️ خارج النافذة (' + diff_text + ' يوم)'
+            ),
+            dtype=object
+        )
+        return date_check.where(award_dates.notna())
+    
+    def _find_bank_matches(self, ref_clean: str, bank_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        البحث عن مطابقات في البنك
+        
+        استعلام hash في فهرس اللواحق: آخر N خانات من المرجع مقابل آخر N
+        خانات من AwardRef / AwardRef10Digits / BankReference / PaymentReference
+        """
+        if self.reference_index is None or self._indexed_bank is not bank_df:
+            self._build_reference_index(bank_df)
+        
+        positions = self.reference_index.positions(ref_clean)
+        
+        return bank_df.iloc[positions].reset_index(drop=True)
+    
+    def _verify_amount(self, award_amount: float, bank_matches: pd.DataFrame) -> Optional[Dict]:
+        """التحقق من المبلغ: أول صف بمبلغ ضمن التسامح (فحص عمودي بدلاً من iterrows)"""
+        if 'TransferAmount' not in bank_matches.columns or len(bank_matches) == 0:
+            return None
+        
+        bank_amounts = pd.to_numeric(bank_matches['TransferAmount'], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            within = np.flatnonzero(np.abs(award_amount - bank_amounts) <= self.amount_tolerance)
+        
+        if len(within) == 0:
+            return None
+        return bank_matches.iloc[within[0]].to_dict()
+    
+    def _match_amount_window(
+        self,
+        partial_df: pd.DataFrame,
+        unmatched_df: pd.DataFrame,
+        bank_df: pd.DataFrame
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        مطابقة غير المطابق بالمبلغ والتاريخ (ربط نطاقي عبر AmountRangeIndex)
+        
+        الشرط: abs(المبلغ - التحويل) <= amount_tolerance و abs(فرق الأيام) <= date_window_days
+        الأفضل لكل جائزة: أقل فرق مبلغ ← أقل فرق أيام ← أول صف في كشف البنك
+        
+        Returns:
+            (partial_df + المطابقات الجديدة، unmatched_df المتبقي)
+        """
+        required = 'AwardAmount' in unmatched_df.columns and 'EntryDate' in unmatched_df.columns
+        date_col = 'TransactionDate' if 'TransactionDate' in bank_df.columns else 'ValueDate'
+        if len(unmatched_df) == 0 or not required or 'TransferAmount' not in bank_df.columns \
+                or date_col not in bank_df.columns:
+            return partial_df, unmatched_df
+        
+        index = AmountRangeIndex(bank_df['TransferAmount'], bank_df[date_col])
+        award_cents, amount_ok = amounts_to_cents(unmatched_df['AwardAmount'])
+        award_seconds, date_ok = dates_to_seconds(unmatched_df['EntryDate'])
+        
+        award_pos, bank_pos = index.range_join(
+            award_cents, amount_ok & date_ok, int(round(self.amount_tolerance * 100)),
+            seconds=award_seconds, window_days=self.date_window_days
+        )
+        if len(award_pos) == 0:
+            return partial_df, unmatched_df
+        
+        cents_diff = np.abs(award_cents[award_pos] - index.cents[bank_pos])
+        days_diff = day_diff(award_seconds[award_pos], index.seconds[bank_pos])
+        order = np.lexsort((bank_pos, days_diff, cents_diff, award_pos))
+        best = order[np.r_[True, award_pos[order][1:] != award_pos[order][:-1]]]
+        award_pos, bank_pos = award_pos[best], bank_pos[best]
+        cents_diff, days_diff = cents_diff[best], days_diff[best]
+        
+        def take(col: str):
+            if col not in bank_df.columns:
+                return None
+            return bank_df[col].to_numpy()[bank_pos]
+        
+        found_df = unmatched_df.iloc[award_pos].reset_index(drop=True)
+        found_df['MatchStatus'] = 'AMOUNT_WINDOW'
+        found_df['MatchReason'] = [
+            f'⚠️ مطابقة بالمبلغ (فرق: {diff / 100:.2f}) والتاريخ ({days} يوم) بدون Ref'
+            for diff, days in zip(cents_diff, days_diff)
+        ]
+        found_df['BankTransferAmount'] = take('TransferAmount')
+        found_df['BankTransactionDate'] = take('TransactionDate')
+        found_df['BankValueDate'] = take('ValueDate')
+        found_df['BankBeneficiary'] = take('BeneficiaryName')
+        found_df['BankReference'] = take('BankReference')
+        found_df['BankIBAN'] = take('IBAN')
+        found_df['AmountDifference'] = cents_diff / 100
+        
+        remaining = np.ones(len(unmatched_df), dtype=bool)
+        remaining[award_pos] = False
+        unmatched_df = unmatched_df.iloc[np.flatnonzero(remaining)].reset_index(drop=True)
+        partial_df = pd.concat([partial_df, found_df], ignore_index=True)
+        
+        print(f"   📏 مطابقة بالمبلغ ±{self.amount_tolerance:.2f} والتاريخ ±{self.date_window_days} يوم: "
+              f"{len(found_df):,} سجل")
+        
+        return partial_df, unmatched_df
     
     def _verify_date(self, award_date: pd.Timestamp, bank_row: Dict) -> str:
         """التحقق من التاريخ"""
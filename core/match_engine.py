@@ -0,0 +1,942 @@
+# -*- coding: utf-8 -*-
+"""
+⚡ محرك المطابقة العمودي - Columnar Match Engine
+==================================================
+فهرسة كشف البنك حسب (المبلغ بالهللات، التاريخ) مرة واحدة،
+ثم حل النافذة الزمنية ±time_window_days بعمليات numpy.searchsorted
+بدلاً من الحلقات المتداخلة (awards × bank)
+
+Libraries Used:
+- numpy>=1.24.0
+- pandas>=2.1.0
+- rapidfuzz>=3.5.0 (process.cdist للمطابقة الضبابية على كتل)
+
+Install if missing:
+pip install numpy pandas rapidfuzz
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from rapidfuzz import fuzz, process
+from typing import Any, Callable, List, Optional, Tuple
+
+SECONDS_PER_DAY = 86400
+
+# حدود حجم مصفوفة الأسماء لكل استدعاء cdist (ذاكرة محدودة لكل كتلة)
+FUZZY_BLOCK_MAX_CELLS = 2_000_000
+FUZZY_BLOCK_MAX_ROWS = 512
+
+# العدد التقريبي للجوائز في كل شريحة من شرائح المطابقة الضبابية الموزعة
+FUZZY_SHARD_ROWS = 20_000
+
+# أدنى عدد جوائز لتشغيل العمليات المتوازية تلقائياً (max_workers=None)
+# - أقل من ذلك التنفيذ في العملية الحالية (cdist متعدد الخيوط أصلاً)
+FUZZY_PROCESS_MIN_AWARDS = 200_000
+
+# عدد الجيران (قبل/بعد) في الجوار المرتب لكل كتلة ضمن Record Linkage
+LINKAGE_NEIGHBOURS = 10
+
+
+def bank_column(df: pd.DataFrame, names: List[str], default: Any = None) -> pd.Series:
+    """
+    اختيار أول عمود متوفر من قائمة أسماء بديلة
+
+    مكافئ عمودي لـ bank.get('TransferAmount', bank.get('BankAmount', 0))
+
+    Args:
+        df: DataFrame المصدر
+        names: أسماء الأعمدة حسب الأولوية
+        default: القيمة الافتراضية إذا لم يتوفر أي عمود
+
+    Returns:
+        Series بنفس فهرس df
+    """
+    for name in names:
+        if name in df.columns:
+            column = df[name]
+            # أعمدة مكررة بنفس الاسم - استخدام الأول
+            if isinstance(column, pd.DataFrame):
+                column = column.iloc[:, 0]
+            return column
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+
+def amounts_to_cents(values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    تحويل المبالغ إلى هللات صحيحة (int64)
+
+    Args:
+        values: مبالغ (Series / array)
+
+    Returns:
+        (cents, valid) - valid=False للقيم الفارغة أو غير الرقمية
+    """
+    amounts = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    valid = np.isfinite(amounts)
+    cents = np.zeros(len(amounts), dtype=np.int64)
+    cents[valid] = np.round(amounts[valid] * 100).astype(np.int64)
+    return cents, valid
+
+
+def dates_to_seconds(values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    تحويل التواريخ إلى ثوانٍ منذ epoch (int64)
+
+    Args:
+        values: تواريخ (Series / array)
+
+    Returns:
+        (seconds, valid) - valid=False للتواريخ الفارغة أو غير الصالحة
+    """
+    dates = pd.to_datetime(pd.Series(values), errors='coerce')
+    if getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    valid = dates.notna().to_numpy()
+    seconds = np.zeros(len(dates), dtype=np.int64)
+    if valid.any():
+        seconds[valid] = dates[valid].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    return seconds, valid
+
+
+def day_diff(award_seconds: np.ndarray, bank_seconds: np.ndarray) -> np.ndarray:
+    """
+    الفرق بالأيام بنفس دلالة abs((entry_date - transfer_date).days)
+    """
+    return np.abs(np.floor_divide(award_seconds - bank_seconds, SECONDS_PER_DAY))
+
+
+def expand_ranges(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    تحويل نطاقات [lo, hi) لكل جائزة إلى أزواج مرشحة
+
+    Returns:
+        (award_pos, sorted_pos) - award_pos مرتب تصاعدياً
+    """
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    award_pos = np.repeat(np.arange(len(lo)), counts)
+    if total == 0:
+        return award_pos, np.zeros(0, dtype=np.int64)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    sorted_pos = np.repeat(lo, counts) + offsets
+    return award_pos, sorted_pos
+
+
+def iban_keys(values) -> pd.Series:
+    """
+    توحيد أرقام IBAN كمفاتيح ربط (كل قيمة فريدة تُعالج مرة واحدة)
+
+    أحرف كبيرة بدون مسافات أو فواصل أو بادئة "IBAN"، والقيمة غير الصالحة
+    (ليست حرفين + رقمين + 4-30 حرفاً/رقماً) تصبح NaN
+
+    Returns:
+        Series بنفس طول المدخلات (فهرس 0..n-1)
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    cleaned = (
+        pd.Series(np.asarray(uniques, dtype=object)).astype(str).str.upper()
+        .str.replace(r'[^0-9A-Z]', '', regex=True)
+        .str.replace(r'^IBAN', '', regex=True)
+    )
+    cleaned = cleaned.where(cleaned.str.fullmatch(r'[A-Z]{2}[0-9]{2}[0-9A-Z]{4,30}'))
+    keys = np.append(cleaned.to_numpy(dtype=object), np.nan)
+    return pd.Series(keys[codes], dtype=object)
+
+
+def iban_pairs(
+    award_ibans: pd.Series,
+    award_cents: np.ndarray,
+    award_seconds: np.ndarray,
+    award_valid: np.ndarray,
+    bank_ibans: pd.Series,
+    bank_cents: np.ndarray,
+    bank_seconds: np.ndarray,
+    bank_valid: np.ndarray,
+    window_days: int,
+    best_only: bool = True
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    hash-join على IBAN الموحد (من iban_keys) ثم شرطا المبلغ والنافذة متجهياً
+
+    القواعد:
+    - IBAN الجائزة == IBAN التحويل
+    - المبلغ بالهللات متساوٍ
+    - الفرق بين التواريخ ≤ window_days
+
+    أفضل تحويل لكل جائزة: أقرب تاريخ ← أول صف في كشف البنك
+    (best_only=False: كل الأزواج المرشحة، مثلاً للإسناد واحد-لواحد)
+
+    Returns:
+        (award_pos, bank_pos, date_diffs) - مرتبة حسب الجائزة
+    """
+    award_ibans = pd.Series(np.asarray(award_ibans, dtype=object)).where(award_valid)
+    bank_ibans = pd.Series(np.asarray(bank_ibans, dtype=object)).where(bank_valid)
+    left = pd.DataFrame({'iban': award_ibans, 'award_pos': np.arange(len(award_ibans))}).dropna()
+    right = pd.DataFrame({'iban': bank_ibans, 'bank_pos': np.arange(len(bank_ibans))}).dropna()
+    pairs = left.merge(right, on='iban', how='inner')
+
+    award_pos = pairs['award_pos'].to_numpy(dtype=np.int64)
+    bank_pos = pairs['bank_pos'].to_numpy(dtype=np.int64)
+    date_diffs = day_diff(award_seconds[award_pos], bank_seconds[bank_pos])
+    keep = (award_cents[award_pos] == bank_cents[bank_pos]) & (date_diffs <= window_days)
+    award_pos, bank_pos, date_diffs = award_pos[keep], bank_pos[keep], date_diffs[keep]
+    if len(award_pos) == 0:
+        return award_pos, bank_pos, date_diffs
+
+    order = np.lexsort((bank_pos, date_diffs, award_pos))
+    if not best_only:
+        return award_pos[order], bank_pos[order], date_diffs[order]
+    first = order[np.r_[True, award_pos[order][1:] != award_pos[order][:-1]]]
+    return award_pos[first], bank_pos[first], date_diffs[first]
+
+
+def name_ranks(award_names: np.ndarray, bank_names: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ترتيب معجمي مشترك للأسماء (أعداد صحيحة قابلة للفرز مع مفاتيح الكتل)
+
+    Returns:
+        (award_rank, bank_rank)
+    """
+    names = np.concatenate([np.asarray(award_names, dtype=object), np.asarray(bank_names, dtype=object)])
+    ranks, _ = pd.factorize(names.astype(str).astype(object), sort=True)
+    ranks = ranks.astype(np.int64)
+    return ranks[:len(award_names)], ranks[len(award_names):]
+
+
+def sorted_neighbourhood_pairs(
+    award_blocks: List[np.ndarray],
+    award_rank: np.ndarray,
+    award_valid: np.ndarray,
+    bank_blocks: List[np.ndarray],
+    bank_rank: np.ndarray,
+    bank_valid: np.ndarray,
+    neighbours: int = LINKAGE_NEIGHBOURS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    أزواج مرشحة بطريقة الجوار المرتب (Sorted Neighbourhood)
+
+    صفوف البنك مرتبة حسب (الكتلة، ترتيب الاسم)، وكل جائزة تأخذ
+    `neighbours` صفاً قبل موضع اسمها وبعده داخل نفس الكتلة فقط،
+    فلا ينفجر عدد المرشحين عندما تتكدس الجوائز حول مبالغ شائعة.
+
+    Args:
+        award_blocks: أعمدة مفتاح الكتلة للجوائز (مصفوفات int64)
+        award_rank: ترتيب أسماء الجوائز (name_ranks)
+        award_valid: الجوائز الصالحة للتكتيل
+        bank_blocks: أعمدة مفتاح الكتلة للبنك (بنفس الترتيب)
+        bank_rank: ترتيب أسماء البنك
+        bank_valid: صفوف البنك الصالحة للتكتيل
+        neighbours: عدد الجيران في كل اتجاه
+
+    Returns:
+        (award_pos, bank_pos)
+    """
+    n_awards = len(award_rank)
+    keys = np.column_stack([
+        np.concatenate([np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)])
+        for a, b in zip(award_blocks, bank_blocks)
+    ])
+    _, block_id = np.unique(keys, axis=0, return_inverse=True)
+    block_id = block_id.ravel().astype(np.int64)
+
+    span = int(max(award_rank.max(initial=0), bank_rank.max(initial=0))) + 1
+    award_block, bank_block = block_id[:n_awards], block_id[n_awards:]
+    award_key = award_block * span + award_rank
+    bank_key = bank_block * span + bank_rank
+
+    bank_idx = np.flatnonzero(bank_valid)
+    order = bank_idx[np.argsort(bank_key[bank_idx], kind='stable')]
+    sorted_keys = bank_key[order]
+    sorted_block = bank_block[order]
+
+    pos = np.searchsorted(sorted_keys, award_key, side='left')
+    lo = np.maximum(pos - neighbours, np.searchsorted(sorted_block, award_block, side='left'))
+    hi = np.minimum(pos + neighbours, np.searchsorted(sorted_block, award_block, side='right'))
+    hi = np.where(award_valid, hi, lo)
+
+    award_pos, sorted_pos = expand_ranges(lo, hi)
+    return award_pos, order[sorted_pos]
+
+
+class BankWindowIndex:
+    """
+    فهرس كشف البنك حسب (المبلغ بالهللات، التاريخ)
+
+    الصفوف مرتبة حسب (المبلغ، التاريخ، الموضع الأصلي)، وكل مبلغ يمثل
+    كتلة (bucket) متصلة. المفتاح المركب bucket_id * span + offset يسمح
+    بإيجاد نافذة كل جائزة داخل كتلتها بـ searchsorted واحد للمصفوفة كاملة.
+    """
+
+    def __init__(self, amounts, dates):
+        """
+        بناء الفهرس مرة واحدة
+
+        Args:
+            amounts: مبالغ البنك (بترتيب الصفوف الأصلي)
+            dates: تواريخ البنك (بترتيب الصفوف الأصلي)
+        """
+        cents, amount_ok = amounts_to_cents(amounts)
+        seconds, date_ok = dates_to_seconds(dates)
+        self._build(cents, seconds, amount_ok & date_ok)
+
+    @classmethod
+    def from_cents(cls, cents: np.ndarray, seconds: np.ndarray, valid: np.ndarray) -> 'BankWindowIndex':
+        """بناء الفهرس من مصفوفات محوّلة مسبقاً (هللات، ثوانٍ، قناع الصلاحية)"""
+        index = cls.__new__(cls)
+        index._build(cents, seconds, valid)
+        return index
+
+    def _build(self, cents: np.ndarray, seconds: np.ndarray, valid: np.ndarray):
+        """ترتيب الصفوف وبناء المفاتيح المركبة"""
+        self.size = len(cents)
+        self.cents = cents
+        self.seconds = seconds
+        self.valid = valid
+
+        valid_pos = np.flatnonzero(self.valid)
+        # ترتيب ثابت: المبلغ ثم التاريخ ثم الموضع الأصلي
+        self.order = valid_pos[np.lexsort((valid_pos, seconds[valid_pos], cents[valid_pos]))]
+
+        sorted_cents = cents[self.order]
+        sorted_seconds = seconds[self.order]
+        self.bucket_values, bucket_ids = np.unique(sorted_cents, return_inverse=True)
+
+        if len(self.order) > 0:
+            self.base = int(sorted_seconds.min())
+            self.span = int(sorted_seconds.max()) - self.base + 1
+        else:
+            self.base = 0
+            self.span = 1
+
+        self.keys = bucket_ids.astype(np.int64) * self.span + (sorted_seconds - self.base)
+        self._min_table = None
+
+    @classmethod
+    def from_frame(
+        cls,
+        bank_df: pd.DataFrame,
+        amount_columns: Tuple[str, ...] = ('TransferAmount', 'BankAmount'),
+        date_columns: Tuple[str, ...] = ('TransferDate', 'BankDate')
+    ) -> 'BankWindowIndex':
+        """بناء الفهرس من DataFrame البنك حسب أسماء الأعمدة المتاحة"""
+        return cls(
+            bank_column(bank_df, list(amount_columns), 0),
+            bank_column(bank_df, list(date_columns), None)
+        )
+
+    def bounds(
+        self,
+        cents: np.ndarray,
+        lo_seconds: np.ndarray,
+        hi_seconds: np.ndarray,
+        valid: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        نطاق [lo, hi) في الترتيب المفهرس لكل جائزة
+
+        الشرط: نفس المبلغ بالهللات و lo_seconds <= التاريخ <= hi_seconds
+
+        Args:
+            cents: مبالغ الجوائز بالهللات
+            lo_seconds: الحد الأدنى للتاريخ (شامل)
+            hi_seconds: الحد الأعلى للتاريخ (شامل)
+            valid: قناع الجوائز الصالحة
+
+        Returns:
+            (lo, hi) مواضع في self.order
+        """
+        n = len(cents)
+        lo = np.zeros(n, dtype=np.int64)
+        hi = np.zeros(n, dtype=np.int64)
+        if n == 0 or len(self.bucket_values) == 0:
+            return lo, hi
+
+        bucket = np.searchsorted(self.bucket_values, cents)
+        bucket_clip = np.minimum(bucket, len(self.bucket_values) - 1)
+        found = valid & (bucket < len(self.bucket_values)) & (self.bucket_values[bucket_clip] == cents)
+
+        # حصر الإزاحة داخل الكتلة حتى لا تتسرب النافذة إلى كتلة مجاورة
+        lo_off = np.clip(lo_seconds - self.base, 0, self.span)
+        hi_off = np.clip(hi_seconds - self.base, -1, self.span - 1)
+        bucket_key = bucket_clip.astype(np.int64) * self.span
+
+        lo = np.searchsorted(self.keys, bucket_key + lo_off, side='left')
+        hi = np.searchsorted(self.keys, bucket_key + hi_off, side='right')
+        hi = np.where(found, np.maximum(hi, lo), lo)
+        return lo, hi
+
+    def timestamp_window(
+        self,
+        cents: np.ndarray,
+        seconds: np.ndarray,
+        valid: np.ndarray,
+        window_days: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        نافذة مطابقة لشرط entry - window <= transfer <= entry + window
+        (مقارنة طوابع زمنية كاملة كما في فلترة pandas بين date_min و date_max)
+        """
+        return self.bounds(
+            cents,
+            seconds - window_days * SECONDS_PER_DAY,
+            seconds + window_days * SECONDS_PER_DAY,
+            valid
+        )
+
+    def window(
+        self,
+        cents: np.ndarray,
+        seconds: np.ndarray,
+        valid: np.ndarray,
+        window_days: int,
+        mode: str = 'day'
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        النافذة حسب النمط: 'day' (دلالة .days) أو 'timestamp' (طوابع كاملة)
+        """
+        if mode == 'timestamp':
+            return self.timestamp_window(cents, seconds, valid, window_days)
+        return self.day_window(cents, seconds, valid, window_days)
+
+    def day_window(
+        self,
+        cents: np.ndarray,
+        seconds: np.ndarray,
+        valid: np.ndarray,
+        window_days: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        نافذة مطابقة لشرط abs((entry_date - transfer_date).days) <= window_days
+
+        (entry - transfer).days تقرّب للأسفل، لذا الشرط يكافئ:
+        entry - (window+1) يوم < transfer <= entry + window يوم
+        """
+        lo_seconds = seconds - (window_days + 1) * SECONDS_PER_DAY + 1
+        hi_seconds = seconds + window_days * SECONDS_PER_DAY
+        return self.bounds(cents, lo_seconds, hi_seconds, valid)
+
+    def first_in_window(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """
+        أول صف بنكي (حسب الترتيب الأصلي) داخل نافذة كل جائزة
+
+        استعلام أصغر قيمة على نطاق (Range Minimum Query) بجدول متناثر
+        يُبنى مرة واحدة، فلا تُوسَّع النوافذ الكبيرة إلى أزواج مرشحة
+
+        Returns:
+            مواضع البنك الأصلية، -1 إذا لم توجد مطابقة
+        """
+        first = np.full(len(lo), -1, dtype=np.int64)
+        has_match = hi > lo
+        if not has_match.any():
+            return first
+
+        table = self._min_position_table()
+        lo_m = lo[has_match]
+        hi_m = hi[has_match]
+        level = np.floor(np.log2(hi_m - lo_m)).astype(np.int64)
+        # تصحيح أخطاء التقريب في log2
+        level -= (np.left_shift(1, level) > hi_m - lo_m)
+
+        left = table[level, lo_m]
+        right = table[level, hi_m - np.left_shift(1, level)]
+        first[has_match] = np.minimum(left, right)
+        return first
+
+    def window_pairs(self, lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        كل الأزواج المرشحة (جائزة، صف بنكي) داخل النوافذ
+
+        Returns:
+            (award_pos, bank_pos) - مواضع البنك الأصلية، مرتبة حسب الجائزة
+        """
+        award_pos, sorted_pos = expand_ranges(lo, hi)
+        return award_pos, self.order[sorted_pos]
+
+    def _min_position_table(self) -> np.ndarray:
+        """جدول متناثر: table[k, i] = أصغر موضع أصلي في order[i : i + 2**k]"""
+        if self._min_table is None:
+            n = len(self.order)
+            levels = max(1, int(np.log2(n)) + 1) if n > 0 else 1
+            table = np.empty((levels, n), dtype=np.int64)
+            table[0] = self.order
+            for k in range(1, levels):
+                half = 1 << (k - 1)
+                table[k] = table[k - 1]
+                table[k, :n - half] = np.minimum(table[k - 1, :n - half], table[k - 1, half:])
+            self._min_table = table
+        return self._min_table
+
+
+class AmountRangeIndex:
+    """
+    فهرس مبالغ البنك المرتبة (بالهللات) لربط نطاقي: المبلغ ضمن ±التسامح
+    والتاريخ ضمن ±النافذة
+
+    الصفوف مرتبة حسب (المبلغ، الموضع الأصلي)، ونطاق المبلغ لكل جائزة يُحل
+    بـ searchsorted (حد أدنى/أعلى) للمصفوفة كاملة، ثم تُفحص النافذة الزمنية
+    على الأزواج المرشحة فقط.
+    """
+
+    def __init__(self, amounts, dates=None):
+        """
+        Args:
+            amounts: مبالغ البنك (بترتيب الصفوف الأصلي)
+            dates: تواريخ البنك (اختياري - مطلوب لشرط النافذة)
+        """
+        self.cents, amount_ok = amounts_to_cents(amounts)
+        if dates is None:
+            self.seconds = np.zeros(len(self.cents), dtype=np.int64)
+            self.date_ok = np.zeros(len(self.cents), dtype=bool)
+        else:
+            self.seconds, self.date_ok = dates_to_seconds(dates)
+
+        valid_pos = np.flatnonzero(amount_ok)
+        self.order = valid_pos[np.argsort(self.cents[valid_pos], kind='stable')]
+        self.sorted_cents = self.cents[self.order]
+
+    def amount_range(
+        self,
+        cents: np.ndarray,
+        valid: np.ndarray,
+        tolerance_cents: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        نطاق [lo, hi) في self.order لشرط abs(المبلغ - مبلغ الجائزة) <= التسامح
+
+        Returns:
+            (lo, hi) - نطاق فارغ للجوائز غير الصالحة
+        """
+        lo = np.searchsorted(self.sorted_cents, cents - tolerance_cents, side='left')
+        hi = np.searchsorted(self.sorted_cents, cents + tolerance_cents, side='right')
+        return lo, np.where(valid, hi, lo)
+
+    def range_join(
+        self,
+        cents: np.ndarray,
+        valid: np.ndarray,
+        tolerance_cents: int,
+        seconds: Optional[np.ndarray] = None,
+        window_days: Optional[int] = None,
+        max_pairs: int = FUZZY_BLOCK_MAX_CELLS
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        كل الأزواج (جائزة، بنك) ضمن تسامح المبلغ، وضمن النافذة الزمنية
+        (دلالة abs(.days) <= window_days) عند تمرير seconds و window_days
+
+        الجوائز تُعالج على دفعات بحد max_pairs زوج مرشح لكل دفعة.
+
+        Args:
+            cents: مبالغ الجوائز بالهللات
+            valid: قناع الجوائز الصالحة (المبلغ، والتاريخ عند وجود النافذة)
+            tolerance_cents: التسامح بالهللات
+            seconds: تواريخ الجوائز (ثوانٍ)
+            window_days: النافذة الزمنية (None = بدون شرط تاريخ)
+            max_pairs: الحد الأقصى للأزواج المرشحة في كل دفعة
+
+        Returns:
+            (award_pos, bank_pos) - مرتبة حسب الجائزة ثم المبلغ ثم ترتيب كشف البنك
+        """
+        lo, hi = self.amount_range(cents, valid, tolerance_cents)
+        active = np.flatnonzero(hi > lo)
+        block_id = np.cumsum(hi[active] - lo[active]) // max(max_pairs, 1)
+        cuts = np.flatnonzero(np.diff(block_id)) + 1
+
+        award_parts, bank_parts = [], []
+        for block in np.split(active, cuts):
+            pair_award, sorted_pos = expand_ranges(lo[block], hi[block])
+            pair_award = block[pair_award]
+            pair_bank = self.order[sorted_pos]
+
+            if window_days is not None and seconds is not None:
+                in_window = (
+                    self.date_ok[pair_bank] &
+                    (day_diff(seconds[pair_award], self.seconds[pair_bank]) <= window_days)
+                )
+                pair_award, pair_bank = pair_award[in_window], pair_bank[in_window]
+
+            award_parts.append(pair_award)
+            bank_parts.append(pair_bank)
+
+        if not award_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(award_parts), np.concatenate(bank_parts)
+
+
+def fuzzy_best_in_window(
+    index: BankWindowIndex,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    award_names: np.ndarray,
+    bank_names: np.ndarray,
+    score_cutoff: float,
+    scorer: Callable = fuzz.ratio,
+    workers: int = -1,
+    cache: Optional[Any] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    أفضل صف بنكي لكل جائزة حسب تشابه الاسم داخل نافذتها (المبلغ + التاريخ)
+
+    الجوائز مرتبة حسب بداية نافذتها، فتتجمع في كتل تشترك في شريحة
+    متصلة من البنك المفهرس. كل كتلة تُقيَّم باستدعاء واحد لـ
+    rapidfuzz.process.cdist متعدد الخيوط، ثم تُحجب الخلايا خارج نافذة
+    كل جائزة. عند تساوي الدرجات يُختار أول صف حسب ترتيب كشف البنك.
+
+    Args:
+        index: فهرس البنك
+        lo, hi: نوافذ الجوائز (من day_window / timestamp_window)
+        award_names: أسماء الجوائز المطبّعة ('' = تجاهل)
+        bank_names: أسماء البنك المطبّعة بترتيب الصفوف الأصلي ('' = تجاهل)
+        score_cutoff: أدنى درجة تشابه مقبولة
+        scorer: دالة التشابه (rapidfuzz)
+        workers: عدد الخيوط لـ cdist (-1 = جميع الأنوية)
+        cache: ذاكرة تشابه دائمة (SimilarityCache) - تُقيَّم الأزواج داخل
+               النوافذ فقط عبر الذاكرة بدلاً من كتل cdist
+
+    Returns:
+        (best_bank, best_score) - best_bank = -1 إذا لم توجد مطابقة
+    """
+    n = len(lo)
+    best_bank = np.full(n, -1, dtype=np.int64)
+    best_score = np.zeros(n, dtype=np.float64)
+
+    award_names = np.asarray(award_names, dtype=object)
+    active = np.flatnonzero((hi > lo) & (award_names != ''))
+    if len(active) == 0:
+        return best_bank, best_score
+
+    if cache is not None:
+        return _cached_best_in_window(
+            index, lo, hi, active, award_names, bank_names,
+            score_cutoff, scorer, workers, cache, best_bank, best_score
+        )
+
+    sorted_names = np.asarray(bank_names, dtype=object)[index.order]
+    sorted_name_ok = sorted_names != ''
+    no_position = np.iinfo(np.int64).max
+
+    # ترتيب الجوائز حسب بداية النافذة لتكوين كتل متجاورة
+    active = active[np.lexsort((hi[active], lo[active]))]
+
+    start = 0
+    while start < len(active):
+        # توسيع الكتلة ما دامت مصفوفة الأسماء ضمن الحدود
+        col_lo = lo[active[start]]
+        col_hi = hi[active[start]]
+        stop = start + 1
+        while stop < len(active) and stop - start < FUZZY_BLOCK_MAX_ROWS:
+            next_hi = max(col_hi, hi[active[stop]])
+            if (stop - start + 1) * (next_hi - col_lo) > FUZZY_BLOCK_MAX_CELLS:
+                break
+            col_hi = next_hi
+            stop += 1
+
+        block = active[start:stop]
+        start = stop
+
+        scores = process.cdist(
+            list(award_names[block]),
+            list(sorted_names[col_lo:col_hi]),
+            scorer=scorer,
+            score_cutoff=score_cutoff,
+            dtype=np.float64,
+            workers=workers
+        )
+
+        columns = np.arange(col_lo, col_hi)
+        in_window = (
+            (columns[None, :] >= lo[block][:, None]) &
+            (columns[None, :] < hi[block][:, None]) &
+            sorted_name_ok[None, col_lo:col_hi] &
+            (scores >= score_cutoff) & (scores > 0)
+        )
+        scores = np.where(in_window, scores, 0.0)
+        row_best = scores.max(axis=1)
+
+        # عند التساوي: أول صف حسب ترتيب كشف البنك الأصلي
+        ties = in_window & (scores == row_best[:, None])
+        positions = np.where(ties, index.order[col_lo:col_hi][None, :], no_position).min(axis=1)
+
+        found = row_best > 0
+        best_bank[block[found]] = positions[found]
+        best_score[block[found]] = row_best[found]
+
+    return best_bank, best_score
+
+
+def _cached_best_in_window(
+    index: BankWindowIndex,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    active: np.ndarray,
+    award_names: np.ndarray,
+    bank_names: np.ndarray,
+    score_cutoff: float,
+    scorer: Callable,
+    workers: int,
+    cache: Any,
+    best_bank: np.ndarray,
+    best_score: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    نسخة fuzzy_best_in_window عبر ذاكرة التشابه: أزواج النوافذ فقط
+    (على دفعات بحد FUZZY_BLOCK_MAX_CELLS زوج) بنفس قاعدة الاختيار
+    """
+    bank_names = np.asarray(bank_names, dtype=object)
+    counts = hi[active] - lo[active]
+    block_id = np.cumsum(counts) // FUZZY_BLOCK_MAX_CELLS
+    cuts = np.flatnonzero(np.diff(block_id)) + 1
+
+    for block in np.split(active, cuts):
+        pair_award, sorted_pos = expand_ranges(lo[block], hi[block])
+        pair_award = block[pair_award]
+        pair_bank = index.order[sorted_pos]
+
+        named = bank_names[pair_bank] != ''
+        pair_award, pair_bank = pair_award[named], pair_bank[named]
+        if len(pair_award) == 0:
+            continue
+
+        scores = cache.score_pairs(award_names[pair_award], bank_names[pair_bank], scorer=scorer, workers=workers)
+        passed = np.flatnonzero((scores >= score_cutoff) & (scores > 0))
+        if len(passed) == 0:
+            continue
+
+        # أعلى درجة لكل جائزة، وعند التساوي أول صف حسب ترتيب كشف البنك
+        order = passed[np.lexsort((pair_bank[passed], -scores[passed], pair_award[passed]))]
+        first = order[np.r_[True, pair_award[order][1:] != pair_award[order][:-1]]]
+        best_bank[pair_award[first]] = pair_bank[first]
+        best_score[pair_award[first]] = scores[first]
+
+    return best_bank, best_score
+
+
+def fuzzy_pairs_in_window(
+    index: BankWindowIndex,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    award_names: np.ndarray,
+    bank_names: np.ndarray,
+    score_cutoff: float,
+    scorer: Callable = fuzz.ratio,
+    workers: int = -1,
+    cache: Optional[Any] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    كل الأزواج داخل النوافذ التي تبلغ درجتها score_cutoff (وليس الأفضل فقط)
+
+    مدخل الإسناد واحد-لواحد: الأزواج تُقيَّم بـ cpdist (أو عبر الذاكرة)
+    على دفعات بحد FUZZY_BLOCK_MAX_CELLS زوج
+
+    Returns:
+        (award_pos, bank_pos, score) - مرتبة حسب الجائزة
+    """
+    award_names = np.asarray(award_names, dtype=object)
+    bank_names = np.asarray(bank_names, dtype=object)
+    active = np.flatnonzero((hi > lo) & (award_names != ''))
+    counts = hi[active] - lo[active]
+    block_id = np.cumsum(counts) // FUZZY_BLOCK_MAX_CELLS
+    cuts = np.flatnonzero(np.diff(block_id)) + 1
+
+    parts = []
+    for block in np.split(active, cuts):
+        pair_award, pair_bank = index.window_pairs(lo[block], hi[block])
+        pair_award = block[pair_award]
+
+        named = bank_names[pair_bank] != ''
+        pair_award, pair_bank = pair_award[named], pair_bank[named]
+        if len(pair_award) == 0:
+            continue
+
+        if cache is not None:
+            scores = cache.score_pairs(award_names[pair_award], bank_names[pair_bank], scorer=scorer, workers=workers)
+        else:
+            scores = process.cpdist(
+                list(award_names[pair_award]), list(bank_names[pair_bank]),
+                scorer=scorer, dtype=np.float64, workers=workers
+            )
+        passed = (scores >= score_cutoff) & (scores > 0)
+        parts.append((pair_award[passed], pair_bank[passed], scores[passed]))
+
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+
+def plan_fuzzy_shards(
+    award_cents: np.ndarray,
+    award_valid: np.ndarray,
+    seasons: Optional[np.ndarray] = None,
+    shard_rows: int = FUZZY_SHARD_ROWS
+) -> List[np.ndarray]:
+    """
+    تقسيم الجوائز إلى شرائح حسب (الموسم، المبلغ)
+
+    مجموعة (موسم، مبلغ) لا تُقسم بين شريحتين، والتقسيم حتمي
+    (لا يعتمد على ترتيب إنهاء العمال).
+
+    Returns:
+        قائمة بمواضع الجوائز لكل شريحة
+    """
+    positions = np.flatnonzero(award_valid)
+    if len(positions) == 0:
+        return []
+
+    if seasons is None:
+        season_codes = np.zeros(len(positions), dtype=np.int64)
+    else:
+        season_codes, _ = pd.factorize(pd.Series(seasons).iloc[positions].astype(str), sort=True)
+
+    order = np.lexsort((positions, award_cents[positions], season_codes))
+    positions = positions[order]
+    season_codes = season_codes[order]
+    cents = award_cents[positions]
+
+    # بداية كل مجموعة (موسم، مبلغ)
+    group_start = np.r_[True, (season_codes[1:] != season_codes[:-1]) | (cents[1:] != cents[:-1])]
+    group_starts = np.flatnonzero(group_start)
+
+    # كل مجموعة تُسند للشريحة التي تبدأ فيها
+    shard_of_group = group_starts // max(1, shard_rows)
+    cut = group_starts[np.r_[False, shard_of_group[1:] != shard_of_group[:-1]]]
+    return [shard for shard in np.split(positions, cut) if len(shard) > 0]
+
+
+def _score_fuzzy_shard(
+    award_cents: np.ndarray,
+    award_seconds: np.ndarray,
+    award_names: np.ndarray,
+    bank_cents: np.ndarray,
+    bank_seconds: np.ndarray,
+    bank_names: np.ndarray,
+    window_days: int,
+    window_mode: str,
+    score_cutoff: float,
+    scorer: Callable,
+    workers: int,
+    cache: Optional[Any] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    مطابقة شريحة واحدة (تُنفذ داخل عامل مستقل)
+
+    العامل يستلم شريحته من البنك فقط ويبني فهرسها محلياً.
+
+    Returns:
+        (best_bank, best_score) - best_bank موضع داخل شريحة البنك
+    """
+    index = BankWindowIndex.from_cents(bank_cents, bank_seconds, np.ones(len(bank_cents), dtype=bool))
+    lo, hi = index.window(
+        award_cents, award_seconds, np.ones(len(award_cents), dtype=bool), window_days, window_mode
+    )
+    return fuzzy_best_in_window(
+        index, lo, hi, award_names, bank_names,
+        score_cutoff=score_cutoff, scorer=scorer, workers=workers, cache=cache
+    )
+
+
+def sharded_fuzzy_match(
+    award_cents: np.ndarray,
+    award_seconds: np.ndarray,
+    award_valid: np.ndarray,
+    award_names: np.ndarray,
+    bank_cents: np.ndarray,
+    bank_seconds: np.ndarray,
+    bank_valid: np.ndarray,
+    bank_names: np.ndarray,
+    window_days: int,
+    score_cutoff: float,
+    seasons: Optional[np.ndarray] = None,
+    window_mode: str = 'day',
+    scorer: Callable = fuzz.ratio,
+    max_workers: Optional[int] = None,
+    shard_rows: int = FUZZY_SHARD_ROWS,
+    cache: Optional[Any] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    مطابقة ضبابية موزعة على شرائح (الموسم، المبلغ)، في العملية الحالية
+    أو عبر ProcessPoolExecutor عند الطلب أو للبيانات الكبيرة
+
+    كل الجوائز تُقيَّم (بدون حد أقصى). كل عامل يحمل فقط صفوف البنك
+    ذات المبالغ الموجودة في شريحته وضمن مدى تواريخها، والنتائج تُدمج
+    حسب موضع الجائزة فتكون حتمية مهما كان ترتيب إنهاء العمال.
+
+    Args:
+        award_*: مصفوفات الجوائز (هللات، ثوانٍ، صلاحية، أسماء)
+        bank_*: مصفوفات البنك بترتيب الصفوف الأصلي
+        window_days: النافذة الزمنية
+        score_cutoff: أدنى درجة تشابه
+        seasons: موسم كل جائزة (اختياري - للتقسيم)
+        window_mode: 'day' أو 'timestamp' (انظر BankWindowIndex.window)
+        scorer: دالة التشابه
+        max_workers: عدد العمليات (None = الافتراضي: عدد الأنوية فقط إذا بلغت الجوائز
+                     FUZZY_PROCESS_MIN_AWARDS وإلا في العملية الحالية،
+                     1 = بدون عمليات إطلاقاً - مثلاً على Windows حيث تعيد
+                     العمليات استيراد السكربت الرئيسي مثل تطبيق Streamlit)
+        shard_rows: الحجم التقريبي لكل شريحة
+        cache: ذاكرة تشابه دائمة (SimilarityCache) - الشرائح تُنفذ تسلسلياً
+               في العملية الحالية لأن ملف الذاكرة لا يُشارك بين العمليات
+
+    Returns:
+        (best_bank, best_score) - best_bank موضع البنك الأصلي أو -1
+    """
+    n = len(award_cents)
+    best_bank = np.full(n, -1, dtype=np.int64)
+    best_score = np.zeros(n, dtype=np.float64)
+
+    award_names = np.asarray(award_names, dtype=object)
+    bank_names = np.asarray(bank_names, dtype=object)
+    shards = plan_fuzzy_shards(award_cents, award_valid & (award_names != ''), seasons, shard_rows)
+    if not shards:
+        return best_bank, best_score
+
+    margin_before = (window_days + 1) * SECONDS_PER_DAY
+    margin_after = window_days * SECONDS_PER_DAY
+    bank_ok = bank_valid & (bank_names != '')
+
+    # تحضير شرائح البنك: المبالغ نفسها ضمن مدى تواريخ الشريحة فقط
+    tasks = []
+    for shard in shards:
+        shard_seconds = award_seconds[shard]
+        bank_pos = np.flatnonzero(
+            bank_ok &
+            np.isin(bank_cents, np.unique(award_cents[shard])) &
+            (bank_seconds >= shard_seconds.min() - margin_before) &
+            (bank_seconds <= shard_seconds.max() + margin_after)
+        )
+        tasks.append((shard, bank_pos))
+
+    if max_workers is None:
+        n_shard_awards = sum(len(shard) for shard in shards)
+        max_workers = (os.cpu_count() or 1) if n_shard_awards >= FUZZY_PROCESS_MIN_AWARDS else 1
+    max_workers = 1 if cache is not None else min(max_workers, len(tasks))
+
+    def task_args(shard, bank_pos, workers):
+        return (
+            award_cents[shard], award_seconds[shard], award_names[shard],
+            bank_cents[bank_pos], bank_seconds[bank_pos], bank_names[bank_pos],
+            window_days, window_mode, score_cutoff, scorer, workers
+        )
+
+    results = None
+    if max_workers > 1:
+        try:
+            # خيط واحد لـ cdist داخل كل عملية لتجنب التزاحم على الأنوية
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(_score_fuzzy_shard, *task_args(shard, bank_pos, 1))
+                           for shard, bank_pos in tasks]
+                results = [future.result() for future in futures]
+        except Exception as e:
+            print(f"⚠️ تعذر تشغيل العمليات المتوازية ({str(e)}) - التنفيذ التسلسلي")
+            results = None
+
+    if results is None:
+        results = [_score_fuzzy_shard(*task_args(shard, bank_pos, -1), cache) for shard, bank_pos in tasks]
+
+    # الدمج حسب موضع الجائزة (حتمي)
+    for (shard, bank_pos), (shard_bank, shard_score) in zip(tasks, results):
+        found = shard_bank >= 0
+        best_bank[shard[found]] = bank_pos[shard_bank[found]]
+        best_score[shard[found]] = shard_score[found]
+
+    return best_bank, best_score
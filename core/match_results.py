@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+🧱 مجمّع نتائج المطابقة العمودي - Columnar Match Result Builder
+=================================================================
+كل طبقة مطابقة تضيف مصفوفات (موضع الجائزة، موضع صف البنك، حقول النتيجة)
+بدلاً من قاموس لكل جائزة، وأعمدة الجوائز والبنك تُرفق مرة واحدة
+في النهاية بعملية take واحدة.
+
+Libraries Used:
+- numpy>=1.24.0
+- pandas>=2.1.0
+
+Install if missing:
+pip install numpy pandas
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.match_engine import bank_column
+
+# مواصفة عمود بنكي: (أسماء المصدر البديلة، القيمة عند غياب العمود أو صف البنك)
+BankColumnSpec = Tuple[List[str], Any]
+
+
+class MatchResultBuilder:
+    """
+    مجمّع نتائج المطابقة
+
+    كل استدعاء add يضيف كتلة من الصفوف (مصفوفات NumPy) وليس صفاً واحداً،
+    والجائزة الواحدة قد تظهر في أكثر من صف (مثل merge على المرجع).
+    """
+
+    def __init__(self, n_awards: int):
+        """
+        Args:
+            n_awards: عدد الجوائز (مواضع 0..n_awards-1)
+        """
+        self.n_awards = n_awards
+        self.matched = np.zeros(n_awards, dtype=bool)
+        self._chunks: List[Tuple[np.ndarray, np.ndarray, Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return sum(len(award_pos) for award_pos, _, _ in self._chunks)
+
+    def add(self, award_pos, bank_pos, **fields) -> 'MatchResultBuilder':
+        """
+        إضافة كتلة مطابقات
+
+        Args:
+            award_pos: مواضع الجوائز
+            bank_pos: مواضع صفوف البنك (-1 = بدون صف بنكي)
+            **fields: أعمدة النتيجة (مصفوفة بطول الكتلة أو قيمة ثابتة)
+        """
+        award_pos = np.asarray(award_pos, dtype=np.int64)
+        bank_pos = np.broadcast_to(np.asarray(bank_pos, dtype=np.int64), award_pos.shape)
+        self._chunks.append((award_pos, bank_pos, fields))
+        self.matched[award_pos[bank_pos >= 0]] = True
+        return self
+
+    def unmatched_positions(self) -> np.ndarray:
+        """مواضع الجوائز التي لم تُطابق بعد"""
+        return np.flatnonzero(~self.matched)
+
+    def add_unmatched(self, **fields) -> 'MatchResultBuilder':
+        """إضافة كل الجوائز غير المطابقة (بدون صف بنكي)"""
+        positions = self.unmatched_positions()
+        if len(positions) > 0:
+            self.add(positions, -1, **fields)
+        return self
+
+    def build(
+        self,
+        awards_df: pd.DataFrame,
+        bank_df: pd.DataFrame,
+        bank_columns: Dict[str, BankColumnSpec],
+        award_columns: Optional[Sequence[str]] = None,
+        sort: bool = True,
+        keep_index: bool = False
+    ) -> pd.DataFrame:
+        """
+        بناء جدول النتائج: أعمدة الجائزة ← أعمدة البنك ← حقول النتيجة
+
+        Args:
+            awards_df: الجوائز (المواضع تشير إلى صفوفه)
+            bank_df: كشف البنك
+            bank_columns: {اسم العمود الناتج: (أسماء المصدر، القيمة الافتراضية)}
+            award_columns: أعمدة الجائزة المطلوبة (None = كلها)
+            sort: ترتيب الصفوف حسب موضع الجائزة (ترتيب مستقر)
+            keep_index: الإبقاء على فهرس الجوائز الأصلي
+
+        Returns:
+            DataFrame النتائج
+        """
+        if self._chunks:
+            award_pos = np.concatenate([chunk[0] for chunk in self._chunks])
+            bank_pos = np.concatenate([chunk[1] for chunk in self._chunks])
+        else:
+            award_pos = np.zeros(0, dtype=np.int64)
+            bank_pos = np.zeros(0, dtype=np.int64)
+
+        order = np.argsort(award_pos, kind='stable') if sort else np.arange(len(award_pos))
+        award_pos, bank_pos = award_pos[order], bank_pos[order]
+
+        # أعمدة الجائزة: take واحد
+        awards = awards_df if award_columns is None else awards_df[list(award_columns)]
+        result = awards.iloc[award_pos]
+        result = result.copy() if keep_index else result.reset_index(drop=True)
+
+        # أعمدة البنك: take واحد لكل عمود
+        has_bank = bank_pos >= 0
+        safe_pos = np.where(has_bank, bank_pos, 0)
+        for name, (sources, default) in bank_columns.items():
+            values = bank_column(bank_df, sources, default).to_numpy()
+            if len(values) == 0:
+                column = pd.Series(default, index=pd.RangeIndex(len(bank_pos)))
+            else:
+                column = pd.Series(values[safe_pos])
+                if not has_bank.all():
+                    column = column.astype(object).where(has_bank, default).infer_objects()
+            result[name] = column.to_numpy()
+
+        # حقول النتيجة: دمج الكتل (الحقول الغائبة في كتلة = NaN)
+        field_names = list(dict.fromkeys(name for _, _, fields in self._chunks for name in fields))
+        for name in field_names:
+            parts = []
+            for chunk_award_pos, _, fields in self._chunks:
+                size = len(chunk_award_pos)
+                value = fields.get(name, np.nan)
+                if np.ndim(value) == 0:
+                    parts.append(pd.Series(value, index=pd.RangeIndex(size)))
+                else:
+                    parts.append(pd.Series(np.asarray(value)))
+            column = pd.concat(parts, ignore_index=True) if parts else pd.Series(dtype=object)
+            result[name] = column.to_numpy()[order]
+
+        return result
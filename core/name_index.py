@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+🔎 فهرس الأسماء بالمقاطع الحرفية - Character N-gram Name Index
+=================================================================
+فهرس مقلوب لأسماء المستفيدين في كشف البنك لاسترجاع أقرب الأسماء
+بدون ضرب كارتيزي (جوائز × بنك):
+
+- مصفوفة TF-IDF متفرقة على المقاطع الحرفية الثلاثية (char_wb 3-grams)
+  للأسماء الفريدة فقط، بمتجهات مطبّعة (L2)
+- الاستعلام = ضرب متفرق (استعلام × منقول الفهرس) على دفعات، فلا تُلمس
+  إلا الأسماء التي تشترك في مقطع واحد على الأقل (قوائم الترحيل)
+- أعلى top_k اسماً لكل استعلام حسب تشابه جيب التمام، ثم توزيعها على صفوف البنك
+
+النتيجة مرشحون فقط: التقييم النهائي يبقى بـ rapidfuzz.
+
+الاستخدام:
+    from core.name_index import NameIndex
+
+    index = NameIndex(bank_df['BankName_norm'])
+    query_pos, bank_pos, similarity = index.query(awards_df['OwnerName_norm'], top_k=10)
+
+Libraries Used:
+- scikit-learn>=1.3.0 (TfidfVectorizer)
+- scipy>=1.11.0 (sparse)
+- numpy>=1.24.0
+- pandas>=2.1.0
+
+Install if missing:
+pip install scikit-learn scipy numpy pandas
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from core.match_engine import expand_ranges
+
+# عدد صفوف الاستعلام في كل ضرب متفرق (يحد من حجم مصفوفة التشابه المؤقتة)
+NAME_INDEX_BLOCK_ROWS = 256
+
+
+def _group_rows(values: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    تجميع الصفوف حسب الاسم الفريد (الفارغ مستبعد)
+
+    Returns:
+        (uniques, order, starts, stops) - صفوف الاسم u هي order[starts[u]:stops[u]]
+    """
+    names = pd.Series(np.asarray(values, dtype=object)).fillna('').astype(str).str.strip()
+    codes, uniques = pd.factorize(names.where(names != ''), use_na_sentinel=True)
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.argsort(codes[valid], kind='stable')]
+    counts = np.bincount(codes[valid], minlength=len(uniques))
+    stops = np.cumsum(counts)
+    return np.asarray(uniques, dtype=object), order, stops - counts, stops
+
+
+class NameIndex:
+    """
+    فهرس مقلوب لأسماء البنك (TF-IDF على المقاطع الحرفية)
+
+    الأسماء يُفترض أنها مطبّعة مسبقاً (BankName_norm / normalize_series).
+    """
+
+    def __init__(self, names: Sequence, ngram: int = 3):
+        """
+        Args:
+            names: أسماء البنك بترتيب الصفوف ('' / NaN = غير مفهرس)
+            ngram: طول المقطع الحرفي
+        """
+        self.ngram = ngram
+        self.n_rows = len(names)
+        self.names, self._order, self._starts, self._stops = _group_rows(names)
+
+        self.vectorizer = TfidfVectorizer(
+            analyzer='char_wb',
+            ngram_range=(ngram, ngram),
+            lowercase=True,
+            sublinear_tf=True,
+            dtype=np.float32
+        )
+        self.matrix = None
+        self._postings = None
+        if len(self.names) > 0:
+            try:
+                self.matrix = self.vectorizer.fit_transform(self.names)
+                # قوائم الترحيل: مقطع ← الأسماء التي تحتويه
+                self._postings = self.matrix.T.tocsr()
+            except ValueError as e:
+                print(f"⚠️ تعذر بناء فهرس الأسماء: {str(e)}")
+                self.matrix = None
+
+    def __len__(self) -> int:
+        """عدد الأسماء الفريدة المفهرسة"""
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def query(
+        self,
+        names: Sequence,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        block_rows: int = NAME_INDEX_BLOCK_ROWS
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        أقرب top_k اسماً فريداً لكل استعلام، موزعة على صفوف البنك
+
+        Args:
+            names: أسماء الاستعلام (مثل OwnerName_norm)
+            top_k: عدد الأسماء الفريدة المرشحة لكل استعلام
+            min_similarity: أدنى تشابه جيب تمام (0-1)
+            block_rows: عدد الأسماء الفريدة في كل ضرب متفرق
+
+        Returns:
+            (query_pos, bank_pos, similarity) - مرتبة حسب query_pos ثم التشابه تنازلياً
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if self.matrix is None or top_k <= 0:
+            return empty
+
+        query_names, query_order, query_starts, query_stops = _group_rows(names)
+        if len(query_names) == 0:
+            return empty
+
+        # الضرب المتفرق على دفعات: (اسم استعلام فريد، اسم بنك فريد، تشابه)
+        parts = []
+        for start in range(0, len(query_names), block_rows):
+            vectors = self.vectorizer.transform(query_names[start:start + block_rows])
+            product = (vectors @ self._postings).tocsr()
+            product.sort_indices()
+            rows = np.repeat(np.arange(product.shape[0]), np.diff(product.indptr))
+            cols, sims = product.indices, product.data
+            # التصفية قبل الفرز: min_similarity يقلص حجم الفرز كثيراً
+            keep = sims > max(min_similarity, 0.0)
+            rows, cols, sims = rows[keep], cols[keep], sims[keep]
+
+            # أعلى top_k لكل صف (عند التساوي: أول اسم حسب ترتيب الظهور)
+            # مفتاح واحد: الصف + (1 - التشابه)، والفرز المستقر يحفظ ترتيب الأعمدة
+            order = np.argsort(rows + (1.0 - sims.astype(np.float64)), kind='stable')
+            rows, cols, sims = rows[order], cols[order], sims[order]
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+            top = rank < top_k
+            parts.append((rows[top] + start, cols[top], sims[top]))
+
+        query_unique = np.concatenate([part[0] for part in parts]).astype(np.int64)
+        name_unique = np.concatenate([part[1] for part in parts]).astype(np.int64)
+        similarity = np.concatenate([part[2] for part in parts])
+
+        # توزيع الاسم الفريد على صفوف البنك التي تحمله
+        pair_pos, row_offset = expand_ranges(self._starts[name_unique], self._stops[name_unique])
+        bank_pos = self._order[row_offset]
+        query_unique, similarity = query_unique[pair_pos], similarity[pair_pos]
+
+        # ثم توزيع استعلام الاسم الفريد على صفوف الاستعلام
+        pair_pos, row_offset = expand_ranges(query_starts[query_unique], query_stops[query_unique])
+        query_pos = query_order[row_offset]
+        bank_pos, similarity = bank_pos[pair_pos], similarity[pair_pos]
+
+        order = np.lexsort((bank_pos, -similarity, query_pos))
+        return query_pos[order], bank_pos[order], similarity[order]
@@ -5,13 +5,14 @@
 تسريع معالجة الملفات الكبيرة باستخدام DuckDB و Dask
 
 Libraries Used:
-- duckdb>=0.9.0 (للاستعلامات SQL السريعة)
+- duckdb>=0.9.0 (للاستعلامات SQL السريعة ومطابقة البنك بـ range joins)
+- rapidfuzz>=3.5.0 (دالة fuzz_ratio داخل استعلام مطابقة البنك)
 - dask[complete]>=2023.12.0 (للمعالجة الموزعة)
 - pandas>=2.1.0
 - pyarrow>=14.0.0
 
 Install if missing:
-pip install duckdb "dask[complete]" pandas pyarrow
+pip install duckdb "dask[complete]" pandas pyarrow rapidfuzz
 """
 
 import pandas as pd
@@ -51,6 +52,7 @@ class PerformanceOptimizer:
         self.use_duckdb = use_duckdb and DUCKDB_AVAILABLE
         self.use_dask = use_dask and DASK_AVAILABLE
         self.conn = None
+        self._fuzz_ratio_registered = False
         
         if self.use_duckdb:
             self._init_duckdb()
@@ -250,6 +252,155 @@ class PerformanceOptimizer:
                 how=how
             )
     
+    def match_bank_duckdb(
+        self,
+        awards: pd.DataFrame,
+        bank: pd.DataFrame,
+        time_window_days: int = 7,
+        fuzzy_threshold: float = 85,
+        temp_directory: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        مطابقة الجوائز مع البنك بالكامل داخل DuckDB
+        
+        Library Used: duckdb, pyarrow, rapidfuzz
+        
+        نفس طبقات CamelAwardsAnalyzer._basic_matching وعتباتها
+        (كل طبقة على الجوائز المتبقية فقط):
+        1. Reference (AwardReferenceLong) + فحص المبلغ - كل الأزواج ضمن النافذة
+        2. Reference (AwardReference) - كل الأزواج ضمن النافذة
+        3. IBAN: نفس IBAN والمبلغ ضمن النافذة (أقرب تاريخ ← أول صف بنكي)
+        4. Fuzzy: نفس المبلغ + نافذة الطوابع الكاملة (entry ± W يوم) +
+           fuzz.ratio >= العتبة (دالة rapidfuzz مسجلة في DuckDB)، أعلى
+           تشابه ← أول صف بنكي
+        
+        نافذة المراجع و IBAN بنفس دلالة abs((entry - bank).days) <= W كشرط نطاق
+        (range join) على الثواني: entry - (W+1) يوم < bank <= entry + W يوم
+        
+        Args:
+            awards: award_pos, cents, ts (ثوانٍ), ref, iban, name
+            bank: bank_pos, cents, ts, ref_long, ref_short, iban, name
+            time_window_days: نافذة التطابق الزمني
+            fuzzy_threshold: عتبة التشابه fuzz.ratio (0-100)
+            temp_directory: مجلد التفريغ على القرص عند تجاوز الذاكرة
+            
+        Returns:
+            DataFrame: award_pos, bank_pos, MatchType, MatchScore, StatusFlag, ReasonText
+        """
+        if not self.use_duckdb:
+            raise RuntimeError("DuckDB غير مفعّل")
+        
+        import pyarrow as pa
+        
+        conn = self.conn
+        if temp_directory:
+            Path(temp_directory).mkdir(parents=True, exist_ok=True)
+            conn.execute(f"SET temp_directory = '{Path(temp_directory).as_posix()}'")
+        
+        self._register_fuzz_ratio()
+        conn.register('awards_arrow', pa.Table.from_pandas(awards, preserve_index=False))
+        conn.register('bank_arrow', pa.Table.from_pandas(bank, preserve_index=False))
+        
+        before = (time_window_days + 1) * 86400
+        after = time_window_days * 86400
+        window = f"b.ts > a.ts - {before} AND b.ts <= a.ts + {after}"
+        timestamp_window = f"b.ts >= a.ts - {after} AND b.ts <= a.ts + {after}"
+        remaining = "awards_arrow a ANTI JOIN matched m ON a.award_pos = m.award_pos"
+        
+        try:
+            conn.execute("""
+                CREATE OR REPLACE TEMP TABLE matched (
+                    award_pos BIGINT, bank_pos BIGINT, MatchType VARCHAR,
+                    MatchScore DOUBLE, StatusFlag VARCHAR, ReasonText VARCHAR
+                )
+            """)
+            
+            # الطبقة 1: AwardReferenceLong + فحص المبلغ
+            conn.execute(f"""
+                INSERT INTO matched
+                SELECT a.award_pos, b.bank_pos,
+                       CASE WHEN a.cents = b.cents THEN 'Reference-Exact' ELSE 'Reference-Diff' END,
+                       CASE WHEN a.cents = b.cents THEN 100 ELSE 95 END,
+                       CASE WHEN a.cents = b.cents THEN '✅' ELSE '⚠️' END,
+                       CASE WHEN a.cents = b.cents THEN 'مطابقة بواسطة Reference (AwardReferenceLong)'
+                            ELSE 'مطابقة Reference لكن المبلغ مختلف بـ ' || printf('%.2f', abs(a.cents - b.cents) / 100.0)
+                       END
+                FROM awards_arrow a
+                JOIN bank_arrow b ON a.ref = b.ref_long AND {window}
+            """)
+            
+            # الطبقة 2: AwardReference للجوائز المتبقية
+            conn.execute(f"""
+                INSERT INTO matched
+                SELECT a.award_pos, b.bank_pos, 'Reference', 100, '✅',
+                       'مطابقة بواسطة Reference (AwardReference)'
+                FROM {remaining}
+                JOIN bank_arrow b ON a.ref = b.ref_short AND {window}
+            """)
+            
+            # الطبقة 3: IBAN + نفس المبلغ ضمن النافذة (أقرب تاريخ ثم أول صف)
+            conn.execute(f"""
+                INSERT INTO matched
+                SELECT award_pos, bank_pos, 'IBAN', 100, '✅',
+                       'مطابقة بواسطة IBAN (نفس المبلغ ضمن النافذة)'
+                FROM (
+                    SELECT a.award_pos, b.bank_pos,
+                           abs(floor((a.ts - b.ts) / 86400.0)) AS day_diff
+                    FROM {remaining}
+                    JOIN bank_arrow b ON a.iban = b.iban AND a.cents = b.cents AND {window}
+                )
+                QUALIFY row_number() OVER (PARTITION BY award_pos ORDER BY day_diff, bank_pos) = 1
+            """)
+            
+            # الطبقة 4: تشابه الاسم ضمن نفس المبلغ والنافذة (أعلى تشابه ثم أول صف)
+            # - نص السبب يُبنى بعد الاستعلام بنفس تنسيق الدرجة في pandas
+            conn.execute(f"""
+                INSERT INTO matched
+                SELECT award_pos, bank_pos, 'Fuzzy', score, '✅', NULL
+                FROM (
+                    SELECT a.award_pos, b.bank_pos, fuzz_ratio(a.name, b.name) AS score
+                    FROM {remaining}
+                    JOIN bank_arrow b ON a.cents = b.cents AND {timestamp_window}
+                    WHERE a.name <> '' AND b.name <> ''
+                )
+                WHERE score >= {float(fuzzy_threshold)} AND score > 0
+                QUALIFY row_number() OVER (PARTITION BY award_pos ORDER BY score DESC, bank_pos) = 1
+            """)
+            
+            result = conn.execute("SELECT * FROM matched ORDER BY award_pos, bank_pos").df()
+            fuzzy = (result['MatchType'] == 'Fuzzy').to_numpy()
+            result.loc[fuzzy, 'ReasonText'] = [
+                f'مطابقة ضبابية بالاسم {score}%' for score in result.loc[fuzzy, 'MatchScore']
+            ]
+            return result
+        finally:
+            conn.unregister('awards_arrow')
+            conn.unregister('bank_arrow')
+    
+    def _register_fuzz_ratio(self):
+        """
+        تسجيل fuzz_ratio(a, b) في اتصال DuckDB (مرة واحدة)
+        
+        دالة Arrow متجهية: كل دفعة أزواج تُقيَّم باستدعاء واحد لـ
+        rapidfuzz.process.cpdist، فتكون الدرجات نفس درجات محرك pandas
+        """
+        if self._fuzz_ratio_registered:
+            return
+        
+        import numpy as np
+        import pyarrow as pa
+        from rapidfuzz import fuzz, process
+        
+        def fuzz_ratio(left, right):
+            scores = process.cpdist(
+                left.to_pylist(), right.to_pylist(),
+                scorer=fuzz.ratio, dtype=np.float64, workers=-1
+            )
+            return pa.array(scores, type=pa.float64())
+        
+        self.conn.create_function('fuzz_ratio', fuzz_ratio, ['VARCHAR', 'VARCHAR'], 'DOUBLE', type='arrow')
+        self._fuzz_ratio_registered = True
+    
     def aggregate_by_group_duckdb(
         self,
         df: pd.DataFrame,
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+🐻‍❄️ مطابقة Polars الكسولة - Polars Lazy Matcher
+==================================================
+مطابقة الجوائز مع كشف البنك مباشرة على مخرجات data_loader_v2
+(read_awards_excel / read_bank_excel) بدون التحويل إلى pandas:
+
+1. Reference: hash join بين مراجع الجائزة (الأساسي ثم المفوضين)
+   و BankReference بعد التنظيف، ضمن النافذة الزمنية ± time_window_days
+   (كما في طبقات المراجع في pandas و DuckDB) + فحص المبلغ
+2. Exact: join_asof على التاريخ مع by=amount_cents و tolerance = النافذة
+   (أقرب تحويل بنفس المبلغ بالهللات)
+3. No Match: الباقي
+
+الخطة كلها LazyFrame وتُجمع مرة واحدة بمحرك streaming.
+
+الاستخدام:
+    from core.data_loader_v2 import read_awards_excel, read_bank_excel
+    from core.polars_matcher import match_awards_polars
+
+    results = match_awards_polars(read_awards_excel(a), read_bank_excel(b))
+
+Libraries Used:
+- polars>=1.0.0
+
+Install if missing:
+pip install polars
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Sequence, Union
+
+import polars as pl
+
+# أعمدة مراجع الدفع في مخرجات read_awards_excel حسب الأولوية
+POLARS_AWARD_REFERENCE_COLUMNS = (
+    "PaymentReference",
+    "DelegatePaymentReference",
+    "SecondDelegatePaymentReference",
+    "ThirdDelegatePaymentReference",
+)
+
+# أعمدة البنك في النتيجة: {اسم العمود الناتج: عمود read_bank_excel}
+POLARS_BANK_COLUMNS = {
+    "BankDate": "TransferDate",
+    "BankName": "BeneficiaryName",
+    "BankAmount": "TransferAmount",
+    "BankReference": "BankReference",
+}
+
+FrameLike = Union[pl.DataFrame, pl.LazyFrame]
+
+
+def _lazy(frame: FrameLike) -> pl.LazyFrame:
+    """تحويل DataFrame إلى LazyFrame (بدون نسخ)"""
+    return frame.lazy() if isinstance(frame, pl.DataFrame) else frame
+
+
+def clean_reference_expr(column: str) -> pl.Expr:
+    """نسخة Polars من clean_reference: حروف وأرقام فقط + أحرف صغيرة"""
+    return (
+        pl.col(column).cast(pl.Utf8, strict=False)
+        .str.strip_chars()
+        .str.replace_all(r"[^\w]", "")
+        .str.to_lowercase()
+    )
+
+
+def amount_cents_expr(column: str) -> pl.Expr:
+    """المبلغ بالهللات (Int64) - null للقيم غير الرقمية"""
+    return (pl.col(column).cast(pl.Float64, strict=False) * 100).round(0).cast(pl.Int64)
+
+
+def _usable_reference(expr: pl.Expr) -> pl.Expr:
+    """المرجع صالح إذا لم يكن فارغاً أو 'nan' / 'none'"""
+    return expr.is_not_null() & ~expr.is_in(["", "nan", "none"])
+
+
+def match_awards_polars(
+    awards: FrameLike,
+    bank: FrameLike,
+    time_window_days: int = 7,
+    reference_columns: Sequence[str] = POLARS_AWARD_REFERENCE_COLUMNS,
+    streaming: bool = True,
+) -> pl.DataFrame:
+    """
+    مطابقة الجوائز مع البنك بخطة Polars كسولة واحدة
+
+    Args:
+        awards: جوائز بأعمدة read_awards_excel (AwardAmount, EntryDate, مراجع الدفع)
+        bank: كشف بنك بأعمدة read_bank_excel (TransferAmount, TransferDate, BankReference)
+        time_window_days: نافذة التطابق الزمني (abs(الفرق بالأيام) <= W)
+        reference_columns: أعمدة مراجع الجائزة حسب الأولوية
+        streaming: الجمع بمحرك streaming (ذاكرة أقل)
+
+    Returns:
+        Polars DataFrame: أعمدة الجائزة ← BankDate, BankName, BankAmount, BankReference
+        ← MatchType, MatchScore, StatusFlag, ReasonText (صف لكل جائزة بترتيبها الأصلي)
+    """
+    awards_lf = _lazy(awards).with_row_index("award_pos")
+    bank_lf = _lazy(bank).with_row_index("bank_pos")
+    award_names = awards_lf.collect_schema().names()
+    bank_names = bank_lf.collect_schema().names()
+
+    awards_keys = awards_lf.select(
+        "award_pos",
+        amount_cents_expr("AwardAmount").alias("amount_cents"),
+        pl.col("EntryDate").cast(pl.Date, strict=False).alias("match_date"),
+    )
+    bank_keys = bank_lf.select(
+        "bank_pos",
+        amount_cents_expr("TransferAmount").alias("amount_cents"),
+        pl.col("TransferDate").cast(pl.Date, strict=False).alias("match_date"),
+    )
+
+    # الطبقة 1: hash join على المراجع المنظفة ضمن النافذة (أولوية المرجع ثم ترتيب كشف البنك)
+    reference_parts = [
+        awards_lf.select(
+            "award_pos",
+            pl.lit(rank, dtype=pl.Int64).alias("ref_rank"),
+            clean_reference_expr(col).alias("ref_clean"),
+        )
+        for rank, col in enumerate(reference_columns)
+        if col in award_names
+    ]
+    if reference_parts and "BankReference" in bank_names:
+        award_refs = pl.concat(reference_parts).filter(_usable_reference(pl.col("ref_clean")))
+        bank_refs = bank_lf.select(
+            "bank_pos", clean_reference_expr("BankReference").alias("ref_clean")
+        ).filter(_usable_reference(pl.col("ref_clean")))
+
+        amount_diff = (pl.col("amount_cents") - pl.col("amount_cents_bank")).abs()
+        amount_match = amount_diff.fill_null(1) == 0
+        day_diff = (pl.col("match_date") - pl.col("match_date_bank")).dt.total_days().abs()
+        reference_matches = (
+            award_refs.join(bank_refs, on="ref_clean", how="inner")
+            .join(awards_keys, on="award_pos", how="left")
+            .join(bank_keys, on="bank_pos", how="left", suffix="_bank")
+            .filter(day_diff <= time_window_days)
+            .sort(["award_pos", "ref_rank", "bank_pos"])
+            .unique(subset="award_pos", keep="first", maintain_order=True)
+            .select(
+                "award_pos",
+                "bank_pos",
+                pl.when(amount_match).then(pl.lit("Reference-Exact"))
+                .otherwise(pl.lit("Reference-Diff")).alias("MatchType"),
+                pl.when(amount_match).then(100.0).otherwise(95.0).alias("MatchScore"),
+                pl.when(amount_match).then(pl.lit("✅")).otherwise(pl.lit("⚠️")).alias("StatusFlag"),
+                pl.when(amount_match).then(pl.lit("مطابقة بواسطة Reference (BankReference)"))
+                .otherwise(
+                    pl.format(
+                        "مطابقة Reference لكن المبلغ مختلف بـ {}.{}",
+                        amount_diff // 100,
+                        (amount_diff % 100).cast(pl.Utf8).str.zfill(2),
+                    )
+                ).alias("ReasonText"),
+            )
+        )
+    else:
+        reference_matches = pl.LazyFrame(schema={
+            "award_pos": pl.UInt32, "bank_pos": pl.UInt32, "MatchType": pl.Utf8,
+            "MatchScore": pl.Float64, "StatusFlag": pl.Utf8, "ReasonText": pl.Utf8,
+        })
+
+    # الطبقة 2: أقرب تحويل بنفس المبلغ ضمن النافذة (join_asof بدلاً من range join)
+    remaining = (
+        awards_keys.join(reference_matches.select("award_pos"), on="award_pos", how="anti")
+        .drop_nulls(["amount_cents", "match_date"])
+        .sort("match_date")
+    )
+    candidates = bank_keys.drop_nulls(["amount_cents", "match_date"]).sort("match_date")
+    exact_matches = (
+        remaining.join_asof(
+            candidates,
+            on="match_date",
+            by="amount_cents",
+            strategy="nearest",
+            tolerance=timedelta(days=time_window_days),
+            check_sortedness=False,
+        )
+        .filter(pl.col("bank_pos").is_not_null())
+        .select(
+            "award_pos",
+            "bank_pos",
+            pl.lit("Exact").alias("MatchType"),
+            pl.lit(100.0).alias("MatchScore"),
+            pl.lit("✅").alias("StatusFlag"),
+            pl.lit("مطابقة حتمية (المبلغ + التاريخ)").alias("ReasonText"),
+        )
+    )
+
+    matches = pl.concat([reference_matches, exact_matches], how="vertical_relaxed")
+
+    # إرفاق أعمدة الجائزة والبنك (صف لكل جائزة بترتيبها الأصلي)
+    bank_columns = bank_lf.select(
+        "bank_pos",
+        *[
+            (pl.col(source) if source in bank_names else pl.lit(None)).alias(name)
+            for name, source in POLARS_BANK_COLUMNS.items()
+        ],
+    )
+    result = (
+        awards_lf.join(matches, on="award_pos", how="left", maintain_order="left")
+        .join(bank_columns, on="bank_pos", how="left", maintain_order="left")
+        .with_columns(
+            pl.col("MatchType").fill_null("No Match"),
+            pl.col("MatchScore").fill_null(0.0),
+            pl.col("StatusFlag").fill_null("⚠️"),
+            pl.col("ReasonText").fill_null("لم يتم العثور على مطابقة في كشف البنك"),
+        )
+        .sort("award_pos")
+        .select(
+            [col for col in award_names if col != "award_pos"]
+            + list(POLARS_BANK_COLUMNS)
+            + ["MatchType", "MatchScore", "StatusFlag", "ReasonText"]
+        )
+    )
+
+    return result.collect(engine="streaming" if streaming else "auto")
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+🔑 فهرس المراجع البنكية - Reference Suffix Index
+==================================================
+فهرس يُبنى مرة واحدة على كشف البنك: آخر N خانات (بعد التنظيف)
+من أعمدة المراجع ← مواضع الصفوف.
+
+البحث عن مرجع جائزة يصبح استعلام hash بدلاً من مسح
+str.contains على كامل كشف البنك لكل مرجع.
+
+للتحقق الجماعي: melt_references تحوّل مراجع الجوائز (PaymentReference
+و D1..D3) إلى جدول طويل، و ReferenceIndex.join تطابقه مع الفهرس دفعة واحدة.
+
+Libraries Used:
+- pandas>=2.1.0
+- numpy>=1.24.0
+
+Install if missing:
+pip install pandas numpy
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from typing import Sequence, Tuple
+
+# أعمدة المراجع في كشف البنك حسب الأولوية
+BANK_REFERENCE_COLUMNS = ('AwardRef', 'AwardRef10Digits', 'BankReference', 'PaymentReference')
+
+# أعمدة مراجع الدفع في سجل الجائزة حسب الأولوية (المرجع الأساسي ثم المفوضين)
+AWARD_REFERENCE_COLUMNS = ('PaymentReference', 'PaymentReference_D1', 'PaymentReference_D2', 'PaymentReference_D3')
+
+
+def clean_reference(ref) -> str:
+    """تنظيف رقم مرجعي: إزالة كل ما عدا الحروف والأرقام + أحرف صغيرة"""
+    ref = str(ref).strip()
+    ref = re.sub(r'[^\w]', '', ref)
+    return ref.lower()
+
+
+def clean_reference_series(values: pd.Series) -> pd.Series:
+    """نسخة عمودية من clean_reference"""
+    return (
+        values.astype(str)
+        .str.strip()
+        .str.replace(r'[^\w]', '', regex=True)
+        .str.lower()
+    )
+
+
+def melt_references(
+    awards_df: pd.DataFrame,
+    columns: Sequence[str] = AWARD_REFERENCE_COLUMNS
+) -> pd.DataFrame:
+    """
+    تحويل مراجع الجوائز إلى جدول طويل: صف لكل (جائزة، مرجع)
+
+    القيم الفارغة و 'nan' / 'none' تُستبعد (نفس قواعد _extract_all_references).
+
+    Args:
+        awards_df: DataFrame الجوائز
+        columns: أعمدة المراجع حسب الأولوية
+
+    Returns:
+        DataFrame بالأعمدة: award_pos, ref_rank, reference, ref_clean
+        مرتب حسب موضع الجائزة ثم أولوية المرجع
+    """
+    parts = []
+    for rank, col in enumerate(columns):
+        if col not in awards_df.columns:
+            continue
+        values = awards_df[col]
+        if isinstance(values, pd.DataFrame):
+            # عمود مكرر - يُتجاهل كما في الاستخراج صفاً بصف
+            continue
+        values = values.reset_index(drop=True)
+        refs = values.astype(str).str.strip()
+        usable = values.notna() & ~refs.str.lower().isin(['nan', 'none', ''])
+        parts.append(pd.DataFrame({
+            'award_pos': np.flatnonzero(usable.to_numpy()),
+            'ref_rank': rank,
+            'reference': refs[usable].to_numpy(dtype=object)
+        }))
+
+    if not parts:
+        return pd.DataFrame({
+            'award_pos': np.zeros(0, dtype=np.int64),
+            'ref_rank': np.zeros(0, dtype=np.int64),
+            'reference': pd.Series(dtype=object),
+            'ref_clean': pd.Series(dtype=object)
+        })
+
+    melted = (
+        pd.concat(parts, ignore_index=True)
+        .sort_values(['award_pos', 'ref_rank'], kind='stable')
+        .reset_index(drop=True)
+    )
+    melted['ref_clean'] = clean_reference_series(melted['reference'])
+    return melted
+
+
+class ReferenceIndex:
+    """
+    فهرس لاحقة المراجع (آخر N خانات) ← مواضع صفوف البنك
+
+    ترتيب المواضع لكل لاحقة: حسب أولوية العمود ثم ترتيب كشف البنك،
+    مع إزالة الصف المكرر (نفس ترتيب concat + drop_duplicates السابق).
+    """
+
+    def __init__(
+        self,
+        bank_df: pd.DataFrame,
+        last_digits: int = 10,
+        columns: Sequence[str] = BANK_REFERENCE_COLUMNS,
+        contains: bool = False
+    ):
+        """
+        Args:
+            bank_df: كشف البنك
+            last_digits: عدد الخانات الأخيرة المستخدمة كمفتاح
+            columns: أعمدة المراجع حسب الأولوية
+            contains: فهرسة كل مقطع بطول N داخل المرجع (بدلاً من اللاحقة فقط)
+                      ليطابق بحث str.contains عن آخر N خانات من مرجع الجائزة
+        """
+        self.last_digits = last_digits
+        self.contains = contains
+        self.columns = [col for col in columns if col in bank_df.columns]
+        self.size = len(bank_df)
+
+        parts = []
+        for rank, col in enumerate(self.columns):
+            values = bank_df[col]
+            if isinstance(values, pd.DataFrame):
+                values = values.iloc[:, 0]
+            cleaned = clean_reference_series(values.reset_index(drop=True))
+            lengths = cleaned.str.len()
+            # المراجع الأقصر من N لا يمكن أن تحتوي على مفتاح بطول N
+            usable = lengths >= last_digits
+            parts.append(pd.DataFrame({
+                'suffix': cleaned[usable].str[-last_digits:],
+                'rank': rank,
+                'position': np.flatnonzero(usable.to_numpy())
+            }))
+
+            if contains:
+                # باقي المقاطع: الإزاحة k من بداية المرجع
+                max_offset = int(lengths.max()) - last_digits if len(lengths) else -1
+                for offset in range(max_offset):
+                    window = lengths >= last_digits + offset + 1
+                    parts.append(pd.DataFrame({
+                        'suffix': cleaned[window].str[offset:offset + last_digits],
+                        'rank': rank,
+                        'position': np.flatnonzero(window.to_numpy())
+                    }))
+
+        if parts:
+            entries = pd.concat(parts, ignore_index=True)
+        else:
+            entries = pd.DataFrame({'suffix': pd.Series(dtype=object), 'rank': [], 'position': []})
+
+        entries = (
+            entries.sort_values(['suffix', 'rank', 'position'], kind='stable')
+            .drop_duplicates(['suffix', 'position'], keep='first')
+        )
+
+        # كل لاحقة = مقطع متصل [start, end) في مصفوفة المواضع
+        suffixes = entries['suffix'].to_numpy()
+        boundaries = np.flatnonzero(np.r_[True, suffixes[1:] != suffixes[:-1]]) if len(suffixes) else np.zeros(0, dtype=np.int64)
+
+        self._keys = pd.Index(suffixes[boundaries])
+        self._starts = boundaries
+        self._ends = np.r_[boundaries[1:], len(suffixes)].astype(np.int64)
+        self._positions = entries['position'].to_numpy(dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def suffix(self, ref_clean: str) -> str:
+        """اللاحقة المستخدمة كمفتاح لمرجع منظف"""
+        return ref_clean[-self.last_digits:]
+
+    def positions(self, ref_clean: str) -> np.ndarray:
+        """
+        مواضع صفوف البنك المطابقة لمرجع منظف
+
+        Args:
+            ref_clean: مرجع بعد clean_reference
+
+        Returns:
+            مصفوفة مواضع (فارغة إذا لم يوجد)
+        """
+        slot = self._keys.get_indexer([self.suffix(ref_clean)])[0]
+        if slot < 0:
+            return np.zeros(0, dtype=np.int64)
+        return self._positions[self._starts[slot]:self._ends[slot]]
+
+    def lookup(self, suffixes: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        بحث جماعي (hash-join) لمجموعة لواحق
+
+        Args:
+            suffixes: لواحق منظفة بطول last_digits
+
+        Returns:
+            (query_pos, bank_pos) - كل زوج مطابق، مرتب حسب الاستعلام
+            ثم أولوية العمود ثم ترتيب كشف البنك
+        """
+        slots = self._keys.get_indexer(pd.Index(suffixes, dtype=object))
+        found = np.flatnonzero(slots >= 0)
+        if len(found) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+
+        starts = self._starts[slots[found]]
+        counts = self._ends[slots[found]] - starts
+        query_pos = np.repeat(found, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        bank_pos = self._positions[np.repeat(starts, counts) + offsets]
+        return query_pos, bank_pos
+
+    def join(self, melted: pd.DataFrame, ref_column: str = 'ref_clean') -> pd.DataFrame:
+        """
+        مطابقة جدول مراجع طويل (من melt_references) مع الفهرس دفعة واحدة
+
+        المراجع الأقصر من last_digits تُستبعد قبل البحث.
+
+        Args:
+            melted: جدول المراجع الطويل
+            ref_column: عمود المرجع المنظف
+
+        Returns:
+            صفوف melted المطابقة مكررة لكل صف بنكي + عمود bank_pos،
+            بنفس ترتيب melted ثم أولوية العمود ثم ترتيب كشف البنك
+        """
+        cleaned = melted[ref_column]
+        usable = np.flatnonzero((cleaned.str.len() >= self.last_digits).to_numpy())
+        query_pos, bank_pos = self.lookup(cleaned.iloc[usable].str[-self.last_digits:].to_numpy())
+
+        pairs = melted.iloc[usable[query_pos]].reset_index(drop=True)
+        pairs['bank_pos'] = bank_pos
+        return pairs
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+💾 ذاكرة تشابه الأسماء الدائمة - Persistent Name Similarity Cache
+===================================================================
+أسماء الملاك والمستفيدين تتكرر في كل موسم وكل كشف شهري، فدرجة
+التشابه لكل زوج (الاسم أ، الاسم ب، المقياس) تُحفظ في ملف DuckDB محلي
+تحت outputs/ وتُسترجع في التشغيلات اللاحقة بدلاً من إعادة الحساب:
+
+- بحث جماعي: join واحد بين الأزواج المطلوبة وجدول الذاكرة
+- إدراج مجمّع للأزواج الجديدة فقط (INSERT OR IGNORE)
+- إخلاء حسب الحجم: حذف الأزواج الأقدم استخداماً عند تجاوز max_entries
+
+الاستخدام:
+    from core.similarity_cache import SimilarityCache
+
+    cache = SimilarityCache()
+    scores = cache.score_pairs(owner_names, bank_names)  # fuzz.ratio افتراضياً
+
+Libraries Used:
+- duckdb>=0.9.0 (اختياري - بدونه تُحسب الدرجات مباشرة)
+- rapidfuzz>=3.6.0
+- pandas>=2.1.0
+- numpy>=1.24.0
+
+Install if missing:
+pip install duckdb rapidfuzz pandas numpy
+"""
+
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+# محاولة استيراد duckdb (اختياري)
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+    print("⚠️ duckdb غير متوفر - ذاكرة التشابه معطلة")
+
+# الملف الافتراضي للذاكرة
+SIMILARITY_CACHE_FILE = "outputs/similarity_cache/name_similarity.duckdb"
+
+# الحد الأقصى لعدد الأزواج المحفوظة قبل الإخلاء
+SIMILARITY_CACHE_MAX_ENTRIES = 5_000_000
+
+
+def scorer_key(scorer: Callable) -> str:
+    """اسم ثابت للمقياس (جزء من مفتاح الذاكرة)"""
+    return f"{getattr(scorer, '__module__', '')}.{getattr(scorer, '__name__', repr(scorer))}"
+
+
+class SimilarityCache:
+    """ذاكرة دائمة لدرجات تشابه أزواج الأسماء"""
+
+    def __init__(
+        self,
+        db_file: str = SIMILARITY_CACHE_FILE,
+        max_entries: int = SIMILARITY_CACHE_MAX_ENTRIES
+    ):
+        """
+        Args:
+            db_file: ملف DuckDB للذاكرة
+            max_entries: الحد الأقصى لعدد الأزواج (الإخلاء بعد كل إدراج)
+        """
+        self.db_file = Path(db_file)
+        self.max_entries = max_entries
+        self.enabled = DUCKDB_AVAILABLE
+        self.hits = 0
+        self.misses = 0
+
+        if self.enabled:
+            try:
+                self.db_file.parent.mkdir(parents=True, exist_ok=True)
+                with duckdb.connect(str(self.db_file)) as conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS name_similarity (
+                            Scorer VARCHAR,
+                            NameA VARCHAR,
+                            NameB VARCHAR,
+                            Score DOUBLE,
+                            LastUsed TIMESTAMP,
+                            PRIMARY KEY (Scorer, NameA, NameB)
+                        )
+                    """)
+            except Exception as e:
+                print(f"⚠️ تعذر تهيئة ذاكرة التشابه: {str(e)}")
+                self.enabled = False
+
+    def __len__(self) -> int:
+        """عدد الأزواج المحفوظة"""
+        if not self.enabled:
+            return 0
+        with duckdb.connect(str(self.db_file)) as conn:
+            return conn.execute("SELECT COUNT(*) FROM name_similarity").fetchone()[0]
+
+    def lookup(self, names_a: Sequence, names_b: Sequence, scorer: Callable = fuzz.ratio) -> np.ndarray:
+        """
+        بحث جماعي عن درجات الأزواج (وتحديث LastUsed للموجود منها)
+
+        Library Used: duckdb
+
+        Args:
+            names_a, names_b: الأزواج (نفس الطول)
+            scorer: المقياس
+
+        Returns:
+            مصفوفة الدرجات (NaN = غير محفوظ)
+        """
+        scores = np.full(len(names_a), np.nan)
+        if not self.enabled or len(names_a) == 0:
+            return scores
+
+        pairs = pd.DataFrame({
+            'PairID': np.arange(len(names_a)),
+            'NameA': np.asarray(names_a, dtype=object),
+            'NameB': np.asarray(names_b, dtype=object),
+        })
+        try:
+            with duckdb.connect(str(self.db_file)) as conn:
+                conn.register('requested_pairs', pairs)
+                found = conn.execute("""
+                    SELECT p.PairID, c.Score
+                    FROM requested_pairs p
+                    JOIN name_similarity c
+                      ON c.Scorer = ? AND c.NameA = p.NameA AND c.NameB = p.NameB
+                """, [scorer_key(scorer)]).df()
+                if len(found) > 0:
+                    conn.execute("""
+                        UPDATE name_similarity SET LastUsed = current_timestamp
+                        FROM requested_pairs p
+                        WHERE name_similarity.Scorer = ?
+                          AND name_similarity.NameA = p.NameA AND name_similarity.NameB = p.NameB
+                    """, [scorer_key(scorer)])
+        except Exception as e:
+            print(f"⚠️ خطأ في البحث في ذاكرة التشابه: {str(e)}")
+            return scores
+
+        scores[found['PairID'].to_numpy(dtype=np.int64)] = found['Score'].to_numpy(dtype=np.float64)
+        return scores
+
+    def store(
+        self,
+        names_a: Sequence,
+        names_b: Sequence,
+        scores: Sequence,
+        scorer: Callable = fuzz.ratio
+    ):
+        """
+        إدراج مجمّع لدرجات أزواج جديدة ثم الإخلاء حسب الحجم
+
+        Library Used: duckdb
+        """
+        if not self.enabled or len(names_a) == 0:
+            return
+
+        rows = pd.DataFrame({
+            'NameA': np.asarray(names_a, dtype=object),
+            'NameB': np.asarray(names_b, dtype=object),
+            'Score': np.asarray(scores, dtype=np.float64),
+        })
+        try:
+            with duckdb.connect(str(self.db_file)) as conn:
+                conn.register('new_pairs', rows)
+                conn.execute("""
+                    INSERT OR IGNORE INTO name_similarity
+                    SELECT ?, NameA, NameB, Score, current_timestamp FROM new_pairs
+                """, [scorer_key(scorer)])
+            self.evict()
+        except Exception as e:
+            print(f"⚠️ خطأ في الحفظ في ذاكرة التشابه: {str(e)}")
+
+    def evict(self, max_entries: int = None) -> int:
+        """
+        حذف الأزواج الأقدم استخداماً حتى لا يتجاوز الحجم max_entries
+
+        Returns:
+            عدد الأزواج المحذوفة
+        """
+        if not self.enabled:
+            return 0
+
+        max_entries = self.max_entries if max_entries is None else max_entries
+        with duckdb.connect(str(self.db_file)) as conn:
+            excess = conn.execute("SELECT COUNT(*) FROM name_similarity").fetchone()[0] - max_entries
+            if excess <= 0:
+                return 0
+            conn.execute("""
+                DELETE FROM name_similarity WHERE rowid IN (
+                    SELECT rowid FROM name_similarity ORDER BY LastUsed, rowid LIMIT ?
+                )
+            """, [int(excess)])
+        return int(excess)
+
+    def clear(self):
+        """مسح الذاكرة بالكامل"""
+        if self.enabled:
+            with duckdb.connect(str(self.db_file)) as conn:
+                conn.execute("DELETE FROM name_similarity")
+
+    def score_pairs(
+        self,
+        names_a: Sequence,
+        names_b: Sequence,
+        scorer: Callable = fuzz.ratio,
+        workers: int = -1
+    ) -> np.ndarray:
+        """
+        درجات تشابه الأزواج: من الذاكرة أولاً، والباقي يُحسب بـ cpdist ويُحفظ
+
+        Library Used: rapidfuzz (process.cpdist), duckdb
+
+        Args:
+            names_a, names_b: الأزواج (نفس الطول)
+            scorer: المقياس
+            workers: عدد الخيوط لـ cpdist
+
+        Returns:
+            مصفوفة الدرجات (float64)
+        """
+        names_a = np.asarray(names_a, dtype=object)
+        names_b = np.asarray(names_b, dtype=object)
+        if len(names_a) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        # الأزواج الفريدة فقط
+        pair_codes, unique_pairs = pd.factorize(pd.MultiIndex.from_arrays([names_a, names_b]))
+        unique_a = unique_pairs.get_level_values(0).to_numpy(dtype=object)
+        unique_b = unique_pairs.get_level_values(1).to_numpy(dtype=object)
+
+        unique_scores = self.lookup(unique_a, unique_b, scorer)
+        missing = np.flatnonzero(np.isnan(unique_scores))
+        self.hits += len(unique_scores) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing) > 0:
+            unique_scores[missing] = process.cpdist(
+                list(unique_a[missing]), list(unique_b[missing]),
+                scorer=scorer, dtype=np.float64, workers=workers
+            )
+            self.store(unique_a[missing], unique_b[missing], unique_scores[missing], scorer)
+
+        return unique_scores[pair_codes]
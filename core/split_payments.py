@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+✂️ كشف الدفعات المجزأة - Split Payment Detection
+=================================================
+بعض الجوائز تُصرف على دفعتين أو ثلاث مجموعها = AwardAmount، فلا
+تطابق أي تحويل منفرد. الكشف يتم على مرحلتين:
+
+1. التجميع: تحويلات المستفيد نفسه (الاسم المطبّع) ضمن النافذة الزمنية
+   للجائزة، وكل تحويل أقل من مبلغ الجائزة - عبر فرز واحد و searchsorted
+   على مفتاح (الاسم، التاريخ) بدون ضرب كارتيزي
+2. مجموع جزئي محدود (Subset-Sum) على الهللات الصحيحة بطريقة
+   Meet-in-the-Middle: مجموعات نصف الحجم من الطرفين ثم searchsorted
+   على المجاميع المرتبة
+
+حدود صارمة تُبقي الكشف سريعاً على الكشوف الكاملة:
+- SPLIT_MAX_PARTS / SPLIT_PARTS_LIMIT: أقصى عدد دفعات للجائزة الواحدة
+- SPLIT_MAX_CANDIDATES: أقصى عدد تحويلات مرشحة لكل جائزة (الأقرب تاريخاً)
+
+الاستخدام:
+    from core.split_payments import find_split_payments
+
+    award_pos, bank_pos, group_size = find_split_payments(
+        award_cents, award_seconds, owner_names,
+        bank_cents, bank_seconds, bank_names,
+        window_days=7
+    )
+
+Libraries Used:
+- numpy>=1.24.0
+- pandas>=2.1.0
+- itertools (built-in)
+
+Install if missing:
+pip install numpy pandas
+"""
+
+from itertools import combinations
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.match_engine import SECONDS_PER_DAY, day_diff, expand_ranges
+
+# عدد الدفعات الافتراضي للجائزة الواحدة، والحد الصارم الذي لا يُتجاوز
+SPLIT_MAX_PARTS = 3
+SPLIT_PARTS_LIMIT = 4
+
+# أقصى عدد تحويلات مرشحة لكل جائزة (C(20, 3) = 1140 مجموعة كحد أقصى)
+SPLIT_MAX_CANDIDATES = 20
+
+
+def _combinations(n: int, size: int) -> np.ndarray:
+    """كل مجموعات المواضع بحجم size من n (مصفوفة (m, size))"""
+    return np.array(list(combinations(range(n), size)), dtype=np.int64).reshape(-1, size)
+
+
+def subset_sum(
+    cents: Sequence,
+    target: int,
+    max_parts: int = SPLIT_MAX_PARTS,
+    tolerance_cents: int = 0,
+    min_parts: int = 2
+) -> np.ndarray:
+    """
+    كل المجموعات الجزئية بأقل حجم ممكن التي مجموعها = target (± tolerance_cents)
+
+    Meet-in-the-Middle: المجموعة بحجم k تُقسم إلى أول k//2 موضعاً والباقي،
+    ومجاميع النصف الثاني مرتبة فيُحل النصف الأول بـ searchsorted.
+    شرط max(النصف الأول) < min(النصف الثاني) يجعل كل مجموعة تظهر مرة واحدة.
+
+    Args:
+        cents: المبالغ بالهللات (موجبة)
+        target: المبلغ المطلوب بالهللات
+        max_parts: أقصى حجم للمجموعة
+        tolerance_cents: الفرق المسموح في المجموع
+        min_parts: أدنى حجم للمجموعة
+
+    Returns:
+        مصفوفة (m, k) بمواضع كل مجموعة مطابقة (m = 0 إذا لم توجد)
+    """
+    cents = np.asarray(cents, dtype=np.int64)
+    ascending = np.sort(cents)
+    low, high = target - tolerance_cents, target + tolerance_cents
+
+    for size in range(max(min_parts, 1), min(max_parts, len(cents)) + 1):
+        # تقليم: أصغر size مبالغ تتجاوز الهدف أو أكبرها لا تبلغه
+        if ascending[:size].sum() > high or ascending[-size:].sum() < low:
+            continue
+
+        left = _combinations(len(cents), size // 2)
+        right = _combinations(len(cents), size - size // 2)
+        left_sum = cents[left].sum(axis=1)
+        right_sum = cents[right].sum(axis=1)
+        order = np.argsort(right_sum, kind='stable')
+        right, right_sum = right[order], right_sum[order]
+
+        lo = np.searchsorted(right_sum, low - left_sum, side='left')
+        hi = np.searchsorted(right_sum, high - left_sum, side='right')
+        left_pos, right_pos = expand_ranges(lo, hi)
+        if len(left_pos) == 0:
+            continue
+
+        found = np.hstack([left[left_pos], right[right_pos]])
+        if size // 2 > 0:
+            found = found[left[left_pos].max(axis=1) < right[right_pos].min(axis=1)]
+        if len(found) > 0:
+            return found
+
+    return np.zeros((0, 0), dtype=np.int64)
+
+
+def find_split_payments(
+    award_cents: np.ndarray,
+    award_seconds: np.ndarray,
+    award_names: Sequence,
+    bank_cents: np.ndarray,
+    bank_seconds: np.ndarray,
+    bank_names: Sequence,
+    window_days: int = 7,
+    max_parts: int = SPLIT_MAX_PARTS,
+    max_candidates: int = SPLIT_MAX_CANDIDATES,
+    tolerance_cents: int = 0,
+    award_valid: np.ndarray = None,
+    bank_valid: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    الجوائز المصروفة على عدة تحويلات لنفس المستفيد
+
+    القواعد:
+    - اسم البنك المطبّع == اسم المالك المطبّع (الفارغ مستبعد)
+    - الفرق بين تاريخ كل تحويل وتاريخ الجائزة ≤ window_days
+    - 0 < مبلغ كل تحويل < مبلغ الجائزة
+    - مجموع 2..max_parts تحويلات = مبلغ الجائزة (± tolerance_cents)
+    - كل تحويل يُستخدم لجائزة واحدة فقط (الجوائز حسب ترتيبها)
+
+    عند تعدد الحلول: أقل عدد دفعات ← أقل فرق في المجموع ← أقل مجموع
+    فروق الأيام ← التحويلات الأسبق في كشف البنك.
+
+    Args:
+        award_cents, award_seconds, award_names: الجوائز (هللات، ثوانٍ، أسماء مطبّعة)
+        bank_cents, bank_seconds, bank_names: البنك (هللات، ثوانٍ، أسماء مطبّعة)
+        window_days: نافذة التطابق الزمني
+        max_parts: أقصى عدد دفعات (لا يتجاوز SPLIT_PARTS_LIMIT)
+        max_candidates: أقصى عدد تحويلات مرشحة لكل جائزة
+        tolerance_cents: الفرق المسموح في المجموع
+        award_valid, bank_valid: صلاحية المبلغ والتاريخ (افتراضياً الكل صالح)
+
+    Returns:
+        (award_pos, bank_pos, group_size) - صف لكل تحويل، مرتبة حسب الجائزة
+    """
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    n_awards, n_bank = len(award_cents), len(bank_cents)
+    max_parts = min(max_parts, SPLIT_PARTS_LIMIT)
+    if n_awards == 0 or n_bank == 0 or max_parts < 2:
+        return empty
+
+    award_valid = np.ones(n_awards, dtype=bool) if award_valid is None else np.asarray(award_valid, dtype=bool)
+    bank_valid = np.ones(n_bank, dtype=bool) if bank_valid is None else np.asarray(bank_valid, dtype=bool)
+
+    # ترميز مشترك للأسماء (الفارغ = -1)
+    names = pd.Series(np.concatenate([
+        np.asarray(award_names, dtype=object), np.asarray(bank_names, dtype=object)
+    ])).fillna('').astype(str).str.strip()
+    codes, _ = pd.factorize(names.where(names != ''), use_na_sentinel=True)
+    award_codes, bank_codes = codes[:n_awards], codes[n_awards:]
+
+    award_valid = award_valid & (award_codes >= 0) & (award_cents > 0)
+    bank_valid = bank_valid & (bank_codes >= 0) & (bank_cents > 0)
+    if not award_valid.any() or not bank_valid.any():
+        return empty
+
+    # مفتاح مركب (الاسم، التاريخ) للبنك مرتب مرة واحدة
+    margin = (window_days + 1) * SECONDS_PER_DAY
+    base = min(award_seconds[award_valid].min(), bank_seconds[bank_valid].min()) - margin
+    span = max(award_seconds[award_valid].max(), bank_seconds[bank_valid].max()) + margin - base + 1
+    bank_rows = np.flatnonzero(bank_valid)
+    bank_key = bank_codes[bank_rows] * span + (bank_seconds[bank_rows] - base)
+    order = np.argsort(bank_key, kind='stable')
+    bank_rows, bank_key = bank_rows[order], bank_key[order]
+
+    award_rows = np.flatnonzero(award_valid)
+    award_key = award_codes[award_rows] * span + (award_seconds[award_rows] - base)
+    lo = np.searchsorted(bank_key, award_key - margin, side='left')
+    hi = np.searchsorted(bank_key, award_key + margin, side='right')
+    pair_award, sorted_pos = expand_ranges(lo, hi)
+    pair_award, pair_bank = award_rows[pair_award], bank_rows[sorted_pos]
+
+    diffs = day_diff(award_seconds[pair_award], bank_seconds[pair_bank])
+    keep = (diffs <= window_days) & (bank_cents[pair_bank] < award_cents[pair_award] + tolerance_cents)
+    pair_award, pair_bank, diffs = pair_award[keep], pair_bank[keep], diffs[keep]
+
+    # أقرب max_candidates تحويلاً لكل جائزة
+    order = np.lexsort((pair_bank, diffs, pair_award))
+    pair_award, pair_bank, diffs = pair_award[order], pair_bank[order], diffs[order]
+    rank = np.arange(len(pair_award)) - np.searchsorted(pair_award, pair_award, side='left')
+    top = rank < max_candidates
+    pair_award, pair_bank, diffs = pair_award[top], pair_bank[top], diffs[top]
+
+    # المجموع الجزئي للجوائز ذات مرشحَين على الأقل فقط
+    starts = np.flatnonzero(np.r_[True, pair_award[1:] != pair_award[:-1]]) if len(pair_award) else np.zeros(0, dtype=np.int64)
+    stops = np.r_[starts[1:], len(pair_award)]
+    used = np.zeros(n_bank, dtype=bool)
+    result_award, result_bank, result_size = [], [], []
+
+    for start, stop in zip(starts, stops):
+        if stop - start < 2:
+            continue
+        candidates = pair_bank[start:stop]
+        free = ~used[candidates]
+        if free.sum() < 2:
+            continue
+        candidates, candidate_diffs = candidates[free], diffs[start:stop][free]
+        target = int(award_cents[pair_award[start]])
+
+        groups = subset_sum(bank_cents[candidates], target, max_parts, tolerance_cents)
+        if len(groups) == 0:
+            continue
+
+        # أفضل مجموعة: أقل فرق في المجموع ← أقل مجموع فروق الأيام ← الأسبق في القائمة
+        sum_gap = np.abs(bank_cents[candidates][groups].sum(axis=1) - target)
+        best = groups[np.lexsort((candidate_diffs[groups].sum(axis=1), sum_gap))[0]]
+        chosen = np.sort(candidates[best])
+        used[chosen] = True
+        result_award.append(np.full(len(chosen), pair_award[start], dtype=np.int64))
+        result_bank.append(chosen)
+        result_size.append(np.full(len(chosen), len(chosen), dtype=np.int64))
+
+    if not result_award:
+        return empty
+    return np.concatenate(result_award), np.concatenate(result_bank), np.concatenate(result_size)
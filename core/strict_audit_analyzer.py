@@ -24,7 +24,9 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Tuple, Any
-import re
+
+from core.reference_index import ReferenceIndex, clean_reference_series, melt_references
+from core.text_normalizer import normalize_series, normalize_text
 
 
 class StrictAuditAnalyzer:
@@ -53,15 +55,12 @@ class StrictAuditAnalyzer:
         self.AMOUNT_TOLERANCE = 0.00  # Must be EXACT
         self.REQUIRE_ALL_FIELDS = True  # All fields mandatory
         
+        # أعمدة جدول تفاصيل المطابقة البنكية (ترتيب ثابت)
+        self.DETAIL_COLUMNS = ['OwnerName', 'AwardAmount', 'BankAmount', 'Reference', 'Status']
+        
     def normalize_text(self, text: str) -> str:
         """تنظيف النص بشكل صارم"""
-        if pd.isna(text) or text is None:
-            return None
-        
-        text = str(text).strip()
-        text = ' '.join(text.split())  # Remove multiple spaces
-        text = text.lower()
-        
+        text = normalize_text(text, fold_arabic=False, underscores=False, coerce=True)
         return text if text else None
     
     def validate_awards_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
@@ -187,7 +186,10 @@ class StrictAuditAnalyzer:
         df_normalized = df.copy()
         for field in ['Season', 'Race', 'OwnerName']:
             if field in df_normalized.columns:
-                df_normalized[f'{field}_normalized'] = df_normalized[field].apply(self.normalize_text)
+                normalized = normalize_series(
+                    df_normalized[field], fold_arabic=False, underscores=False, coerce=True, missing=None
+                )
+                df_normalized[f'{field}_normalized'] = normalized.where(normalized != '', None)
         
         # Create composite key (5 fields - WITHOUT OwnerName)
         # المفتاح المركب: الموسم|السباق|رقم المشارك|رقم البطاقة|المبلغ
@@ -297,17 +299,13 @@ class StrictAuditAnalyzer:
         print("🏦 التحقق من كشف البنك بمعيار 100% دقة")
         print("="*80)
         
-        matched_records = []
-        unmatched_records = []
-        match_details = []
-        
         # Prepare bank data
         bank_df = bank_df.copy()
         
         # Ensure reference fields are strings and cleaned
         for ref_field in ['AwardRef', 'AwardRef10Digits', 'BankReference']:
             if ref_field in bank_df.columns:
-                bank_df[ref_field] = bank_df[ref_field].astype(str).str.strip().str.replace(r'[^\w]', '', regex=True).str.lower()
+                bank_df[ref_field] = clean_reference_series(bank_df[ref_field])
         
         # Ensure amount is numeric
         if 'TransferAmount' in bank_df.columns:
@@ -320,128 +318,91 @@ class StrictAuditAnalyzer:
         
         print(f"\n🔄 معالجة {len(duplicates):,} سجل...")
         
-        for idx, award_row in duplicates.iterrows():
-            # Extract reference numbers
-            award_refs = []
-            
-            # Check PaymentReference
-            if 'PaymentReference' in award_row and pd.notna(award_row['PaymentReference']):
-                ref = str(award_row['PaymentReference']).strip()
-                if ref and ref.lower() not in ['nan', 'none', '']:
-                    award_refs.append(ref)
-            
-            # Check PaymentReference_D1
-            if 'PaymentReference_D1' in award_row and pd.notna(award_row['PaymentReference_D1']):
-                ref = str(award_row['PaymentReference_D1']).strip()
-                if ref and ref.lower() not in ['nan', 'none', '']:
-                    award_refs.append(ref)
-            
-            # Get award amount
-            award_amount = award_row.get('AwardAmount', 0)
-            
-            # If no references, mark as unmatched
-            if not award_refs:
-                award_dict = award_row.to_dict()
-                award_dict['MatchStatus'] = 'NO_REFERENCE'
-                award_dict['MatchReason'] = 'لا يوجد رقم مرجعي في سجل الجائزة'
-                unmatched_records.append(award_dict)
-                continue
-            
-            # Try to find EXACT match in bank
-            match_found = False
-            best_match = None
-            
-            for award_ref in award_refs:
-                # Clean reference
-                award_ref_clean = re.sub(r'[^\w]', '', award_ref).lower()
-                
-                if len(award_ref_clean) < 10:
-                    continue
-                
-                # Get last 10 digits
-                award_ref_last10 = award_ref_clean[-10:]
-                
-                # Find matches by reference
-                ref_matches = bank_df[
-                    (bank_df['AwardRef'].str.contains(award_ref_last10, na=False, case=False)) |
-                    (bank_df['AwardRef10Digits'].str.contains(award_ref_last10, na=False, case=False))
-                ]
-                
-                if len(ref_matches) > 0:
-                    # Check amount EXACTLY
-                    exact_matches = ref_matches[
-                        (ref_matches['TransferAmount'].notna()) &
-                        (abs(ref_matches['TransferAmount'] - award_amount) <= self.AMOUNT_TOLERANCE)
-                    ]
-                    
-                    if len(exact_matches) > 0:
-                        best_match = exact_matches.iloc[0]
-                        match_found = True
-                        break
+        # جدول المراجع الطويل (PaymentReference ثم D1) + join واحد مع فهرس
+        # كل مقاطع الـ 10 خانات في AwardRef / AwardRef10Digits (= str.contains)
+        melted = melt_references(duplicates, columns=('PaymentReference', 'PaymentReference_D1'))
+        ref_index = ReferenceIndex(bank_df, last_digits=10, columns=('AwardRef', 'AwardRef10Digits'), contains=True)
+        pairs = ref_index.join(melted).sort_values(['award_pos', 'ref_rank', 'bank_pos'], kind='stable')
+        
+        if 'AwardAmount' in duplicates.columns:
+            award_amounts = pd.to_numeric(duplicates['AwardAmount'], errors='coerce').to_numpy(dtype=float)
+        else:
+            award_amounts = np.zeros(len(duplicates))
+        bank_amounts = bank_df['TransferAmount'].to_numpy(dtype=float)
+        
+        pair_bank = bank_amounts[pairs['bank_pos'].to_numpy()]
+        amount_ok = ~np.isnan(pair_bank) & (
+            np.abs(pair_bank - award_amounts[pairs['award_pos'].to_numpy()]) <= self.AMOUNT_TOLERANCE
+        )
+        
+        # أول مرجع (ثم أول صف بنكي) بمبلغ مطابق لكل جائزة
+        best = pairs[amount_ok].drop_duplicates('award_pos', keep='first')
+        
+        n = len(duplicates)
+        has_refs = np.zeros(n, dtype=bool)
+        has_refs[melted['award_pos'].to_numpy()] = True
+        ref_exists = np.zeros(n, dtype=bool)
+        ref_exists[pairs['award_pos'].to_numpy()] = True
+        amount_matches = np.zeros(n, dtype=bool)
+        amount_matches[best['award_pos'].to_numpy()] = True
+        
+        status = np.select(
+            [amount_matches, ~has_refs],
+            ['MATCHED_100', 'NO_REFERENCE'],
+            default='UNMATCHED'
+        )
+        reason = np.select(
+            [amount_matches, ~has_refs, ref_exists],
+            ['✅ مطابقة بنكية كاملة', 'لا يوجد رقم مرجعي في سجل الجائزة', '⚠️ Ref مطابق - مبلغ مختلف'],
+            default='❌ Ref غير موجود بالبنك'
+        )
+        
+        # MATCHED
+        matched_df = duplicates.iloc[best['award_pos'].to_numpy()].reset_index(drop=True)
+        if len(matched_df) > 0:
+            bank_pos = best['bank_pos'].to_numpy()
             
-            # Categorize result
-            award_dict = award_row.to_dict()
+            def take(col):
+                return bank_df[col].to_numpy()[bank_pos] if col in bank_df.columns else None
             
-            if match_found and best_match is not None:
-                # MATCHED - 100% criteria met
-                award_dict['MatchStatus'] = 'MATCHED_100'
-                award_dict['MatchReason'] = '✅ مطابقة بنكية كاملة'
-                award_dict['BankTransferAmount'] = best_match['TransferAmount']
-                award_dict['BankTransactionDate'] = best_match.get('TransactionDate')
-                award_dict['BankValueDate'] = best_match.get('ValueDate')
-                award_dict['BankBeneficiary'] = best_match.get('BeneficiaryName')
-                award_dict['BankReference'] = best_match.get('BankReference')
-                award_dict['BankIBAN'] = best_match.get('IBAN')
-                award_dict['AmountDifference'] = 0.00
-                
-                matched_records.append(award_dict)
-                
-                match_details.append({
-                    'OwnerName': award_row.get('OwnerName'),
-                    'AwardAmount': award_amount,
-                    'BankAmount': best_match['TransferAmount'],
-                    'Reference': award_refs[0] if award_refs else 'N/A',
-                    'Status': '✅ مطابق'
-                })
-            else:
-                # UNMATCHED
-                award_dict['MatchStatus'] = 'UNMATCHED'
-                
-                # Determine specific reason - SHORT and CLEAR
-                if not award_refs:
-                    award_dict['MatchReason'] = '❌ لا يوجد Reference'
-                else:
-                    # Check if reference exists but amount differs
-                    ref_check = False
-                    for award_ref in award_refs:
-                        award_ref_clean = re.sub(r'[^\w]', '', award_ref).lower()
-                        if len(award_ref_clean) >= 10:
-                            award_ref_last10 = award_ref_clean[-10:]
-                            ref_exists = bank_df[
-                                (bank_df['AwardRef'].str.contains(award_ref_last10, na=False, case=False)) |
-                                (bank_df['AwardRef10Digits'].str.contains(award_ref_last10, na=False, case=False))
-                            ]
-                            if len(ref_exists) > 0:
-                                ref_check = True
-                                break
-                    
-                    if ref_check:
-                        award_dict['MatchReason'] = '⚠️ Ref مطابق - مبلغ مختلف'
-                    else:
-                        award_dict['MatchReason'] = '❌ Ref غير موجود بالبنك'
-                
-                unmatched_records.append(award_dict)
-                
-                match_details.append({
-                    'OwnerName': award_row.get('OwnerName'),
-                    'AwardAmount': award_amount,
-                    'Reference': award_refs[0] if award_refs else 'N/A',
-                    'Status': '❌ غير مطابق'
-                })
-        
-        # Convert to DataFrames
-        matched_df = pd.DataFrame(matched_records) if matched_records else pd.DataFrame()
-        unmatched_df = pd.DataFrame(unmatched_records) if unmatched_records else pd.DataFrame()
+            matched_df['MatchStatus'] = 'MATCHED_100'
+            matched_df['MatchReason'] = '✅ مطابقة بنكية كاملة'
+            matched_df['BankTransferAmount'] = take('TransferAmount')
+            matched_df['BankTransactionDate'] = take('TransactionDate')
+            matched_df['BankValueDate'] = take('ValueDate')
+            matched_df['BankBeneficiary'] = take('BeneficiaryName')
+            matched_df['BankReference'] = take('BankReference')
+            matched_df['BankIBAN'] = take('IBAN')
+            matched_df['AmountDifference'] = 0.00
+        else:
+            matched_df = pd.DataFrame()
+        
+        # UNMATCHED + NO_REFERENCE (بترتيب السجلات الأصلي)
+        unmatched_pos = np.flatnonzero(~amount_matches)
+        unmatched_df = duplicates.iloc[unmatched_pos].reset_index(drop=True)
+        if len(unmatched_df) > 0:
+            unmatched_df['MatchStatus'] = status[unmatched_pos]
+            unmatched_df['MatchReason'] = reason[unmatched_pos]
+        else:
+            unmatched_df = pd.DataFrame()
+        
+        # تفاصيل المطابقة: سجل لكل جائزة لها مرجع (أعمدة ثابتة، BankAmount فارغ لغير المطابق)
+        detail_pos = np.flatnonzero(has_refs)
+        if len(detail_pos) > 0:
+            first_refs = melted.drop_duplicates('award_pos', keep='first')
+            bank_amount = np.full(n, np.nan)
+            bank_amount[best['award_pos'].to_numpy()] = bank_amounts[best['bank_pos'].to_numpy()]
+            details = pd.DataFrame({
+                'OwnerName': (duplicates['OwnerName'].to_numpy()[detail_pos]
+                              if 'OwnerName' in duplicates.columns else None),
+                'AwardAmount': (duplicates['AwardAmount'].to_numpy()[detail_pos]
+                                if 'AwardAmount' in duplicates.columns else 0),
+                'BankAmount': bank_amount[detail_pos],
+                'Reference': first_refs['reference'].to_numpy(),
+                'Status': np.where(amount_matches[detail_pos], '✅ مطابق', '❌ غير مطابق')
+            }, columns=self.DETAIL_COLUMNS)
+        else:
+            details = pd.DataFrame(columns=self.DETAIL_COLUMNS)
         
         # Statistics
         total = len(duplicates)
@@ -471,7 +432,7 @@ class StrictAuditAnalyzer:
         return {
             'matched': matched_df,
             'unmatched': unmatched_df,
-            'details': pd.DataFrame(match_details)
+            'details': details
         }
     
     def generate_strict_reports(self, output_dir: str = "outputs") -> Dict[str, str]:
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+🔤 تطبيع النصوص العربية - Shared Text Normalizer
+==================================================
+تطبيع مشترك للأسماء بين المحللات (CamelAwardsAnalyzer, StrictAuditAnalyzer,
+AdvancedAuditAnalyzer):
+
+- جدول str.maketrans واحد لتوحيد الألف والتاء المربوطة والياء
+- تطبيع القيم الفريدة فقط (pd.factorize) ثم إعادة توزيعها على الصفوف
+- ذاكرة LRU محدودة تحتفظ بالنتائج بين الملفات
+
+Libraries Used:
+- pandas>=2.1.0
+- numpy>=1.24.0
+- re, functools (built-in)
+
+Install if missing:
+pip install pandas numpy
+"""
+
+import re
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+# توحيد الحروف: أ إ آ ← ا ، ة ← ه ، ى ← ي
+ARABIC_FOLDING = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ة': 'ه', 'ى': 'ي'})
+
+# الحد الأقصى لعدد النصوص المحفوظة في ذاكرة التطبيع
+NORMALIZE_CACHE_SIZE = 200_000
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize(text: str, fold_arabic: bool, underscores: bool) -> str:
+    """تطبيع نص واحد (محفوظ في ذاكرة LRU)"""
+    if underscores:
+        text = text.replace('_', ' ')
+    text = _WHITESPACE.sub(' ', text).strip()
+    if fold_arabic:
+        text = text.translate(ARABIC_FOLDING)
+    return text.lower()
+
+
+def normalize_text(
+    text: Any,
+    fold_arabic: bool = True,
+    underscores: bool = True,
+    coerce: bool = False
+) -> str:
+    """
+    تطبيع نص: مسافات موحدة + أحرف صغيرة (+ توحيد الحروف العربية)
+
+    Args:
+        text: النص
+        fold_arabic: توحيد الألف والتاء المربوطة والياء
+        underscores: تحويل _ إلى مسافة
+        coerce: تحويل القيم غير النصية (أرقام...) إلى نص بدلاً من ''
+
+    Returns:
+        النص المطبّع ('' للقيم الفارغة أو غير النصية)
+    """
+    if not isinstance(text, str):
+        if not coerce or pd.isna(text):
+            return ""
+        text = str(text)
+    return _normalize(text, fold_arabic, underscores)
+
+
+def normalize_series(
+    values: pd.Series,
+    fold_arabic: bool = True,
+    underscores: bool = True,
+    coerce: bool = False,
+    missing: Any = ""
+) -> pd.Series:
+    """
+    تطبيع عمود كامل: القيم الفريدة فقط تُطبَّع ثم تُوزَّع على الصفوف
+
+    Args:
+        values: العمود
+        fold_arabic, underscores, coerce: كما في normalize_text
+        missing: القيمة الناتجة للخلايا الفارغة (NaN / None)
+
+    Returns:
+        Series بنفس الفهرس والاسم
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    normalized = np.empty(len(uniques) + 1, dtype=object)
+    normalized[:-1] = [normalize_text(value, fold_arabic, underscores, coerce) for value in uniques]
+    normalized[-1] = missing
+    return pd.Series(normalized[codes], index=values.index, name=values.name)
+
+
+def clear_normalize_cache():
+    """مسح ذاكرة التطبيع"""
+    _normalize.cache_clear()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+🔤 فهرس الأسماء عبر الحروف العربية/اللاتينية - Transliteration Index
+=====================================================================
+ربط الاسم العربي (OwnerName) بالاسم اللاتيني في كشف البنك عبر
+"هيكل" لاتيني موحد للاسم في الكتابتين:
+
+- العربية: جدول تحويل مخصص (ح/ه ← h، خ/ق/ك ← k، ش/س/ص ← s ...)،
+  وحروف العلة والهمزة والعين تُحذف
+- اللاتينية: Unidecode ثم توحيد الثنائيات (kh, sh, th, dh, gh) والحروف
+  المتقاربة (q/c ← k، g ← j، v ← f) وحذف حروف العلة
+- ثم حذف h في آخر الكلمة (ة / ah) ودمج الحروف المكررة وإزالة المسافات
+
+    'محمد بن راشد آل مكتوم'           → mhmdbnrsdlmktm
+    'Mohammed Bin Rashid Al Maktoum'  → mhmdbnrsdlmktm
+
+الهيكل يُحسب مرة واحدة لكل اسم فريد، والهياكل تُفهرس بـ NameIndex
+(مقاطع حرفية) فلا يُقيَّم كل اسم عربي مقابل كل اسم لاتيني.
+
+الاستخدام:
+    from core.transliteration import TransliterationIndex, name_skeleton
+
+    index = TransliterationIndex(bank_df['BeneficiaryName'])
+    award_pos, bank_pos, similarity = index.query(awards_df['OwnerName'], top_k=20)
+
+Libraries Used:
+- Unidecode>=1.3.0 (اختياري - للحروف اللاتينية المشكّلة)
+- pandas>=2.1.0
+- numpy>=1.24.0
+- re (built-in)
+
+Install if missing:
+pip install Unidecode pandas numpy
+"""
+
+import re
+from typing import Any, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.name_index import NameIndex
+
+try:
+    from unidecode import unidecode
+    UNIDECODE_AVAILABLE = True
+except ImportError:
+    import unicodedata
+    UNIDECODE_AVAILABLE = False
+    print("⚠️ Unidecode غير متوفر - إزالة التشكيل اللاتيني فقط (NFKD)")
+
+    def unidecode(text: str) -> str:
+        return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+# أعمدة أسماء الجائزة التي تُطابق عبر الهيكل (الأسماء البديلة لكل مصدر)
+TRANSLITERATION_AWARD_COLUMNS = [['OwnerName', 'OwnerName_norm'], ['BeneficiaryEnglishName']]
+
+# عتبة تشابه الهياكل (fuzz.ratio) - الهيكل بلا حروف علة فالعتبة أقل من المطابقة الضبابية
+TRANSLITERATION_THRESHOLD = 85
+
+# العربية ← حرف الهيكل ('' = يُحذف: حروف العلة والهمزة والعين)
+ARABIC_SKELETON = str.maketrans({
+    'ا': '', 'أ': '', 'إ': '', 'آ': '', 'ٱ': '', 'ء': '', 'ؤ': '', 'ئ': '',
+    'ى': '', 'و': '', 'ي': '', 'ع': '',
+    'ب': 'b', 'ت': 't', 'ث': 't', 'ج': 'j', 'ح': 'h', 'خ': 'k',
+    'د': 'd', 'ذ': 'd', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 's',
+    'ص': 's', 'ض': 'd', 'ط': 't', 'ظ': 'z', 'غ': 'j', 'ف': 'f',
+    'ق': 'k', 'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'ة': 'h',
+    'پ': 'b', 'چ': 'j', 'ڤ': 'f', 'گ': 'j', 'ک': 'k', 'ی': '',
+    'ـ': '',  # التطويل
+})
+
+# الثنائيات اللاتينية ← حرف واحد (قبل توحيد الحروف)
+LATIN_DIGRAPHS = (('kh', 'k'), ('sh', 's'), ('ch', 's'), ('th', 't'), ('dh', 'd'), ('gh', 'j'), ('ph', 'f'))
+
+# توحيد الحروف اللاتينية: حروف العلة تُحذف، وكل ما ليس حرفاً يصبح مسافة
+LATIN_SKELETON = str.maketrans({
+    **{vowel: '' for vowel in 'aeiouyw'},
+    'q': 'k', 'c': 'k', 'g': 'j', 'v': 'f', 'p': 'b', 'x': 'ks',
+})
+
+_NON_LETTER = re.compile(r'[^a-z]+')
+_WORD_FINAL_H = re.compile(r'(?<=[a-z])h\b')
+_REPEATED = re.compile(r'(.)\1+')
+_DIACRITICS = re.compile(r'[ً-ْٰ]')
+
+
+def name_skeleton(text: Any) -> str:
+    """
+    الهيكل اللاتيني الموحد لاسم عربي أو لاتيني
+
+    Args:
+        text: الاسم
+
+    Returns:
+        الهيكل ('' للقيم الفارغة أو غير النصية)
+    """
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    for digraph, letter in LATIN_DIGRAPHS:
+        text = text.replace(digraph, letter)
+    text = _DIACRITICS.sub('', text).translate(ARABIC_SKELETON)
+    text = _NON_LETTER.sub(' ', unidecode(text).lower()).translate(LATIN_SKELETON)
+    text = _WORD_FINAL_H.sub('', text)
+    return _REPEATED.sub(r'\1', text.replace(' ', ''))
+
+
+def skeleton_series(values: pd.Series) -> pd.Series:
+    """
+    هياكل عمود كامل: القيم الفريدة فقط تُحوّل ثم تُوزَّع على الصفوف
+
+    Returns:
+        Series بنفس الفهرس ('' للخلايا الفارغة)
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    skeletons = np.empty(len(uniques) + 1, dtype=object)
+    skeletons[:-1] = [name_skeleton(value) for value in uniques]
+    skeletons[-1] = ''
+    return pd.Series(skeletons[codes], index=values.index, name=values.name)
+
+
+class TransliterationIndex:
+    """
+    فهرس هياكل أسماء البنك (عربية أو لاتينية) لاسترجاع مرشحي أسماء الجوائز
+    بأي من الكتابتين
+    """
+
+    def __init__(self, names: Sequence, ngram: int = 3):
+        """
+        Args:
+            names: أسماء البنك بترتيب الصفوف (عربية أو لاتينية)
+            ngram: طول المقطع الحرفي في فهرس الهياكل
+        """
+        self.skeletons = skeleton_series(pd.Series(np.asarray(names, dtype=object))).to_numpy()
+        self.index = NameIndex(self.skeletons, ngram=ngram)
+
+    def query(
+        self,
+        names: Sequence,
+        top_k: int = 20,
+        min_similarity: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        أقرب top_k هيكلاً لكل اسم استعلام
+
+        Args:
+            names: أسماء الاستعلام (عربية أو لاتينية)
+            top_k: عدد الهياكل الفريدة المرشحة لكل اسم
+            min_similarity: أدنى تشابه جيب تمام بين الهياكل
+
+        Returns:
+            (query_pos, bank_pos, similarity) - كما في NameIndex.query
+        """
+        skeletons = skeleton_series(pd.Series(np.asarray(names, dtype=object))).to_numpy()
+        return self.index.query(skeletons, top_k=top_k, min_similarity=min_similarity)
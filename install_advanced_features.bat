@@ -67,7 +67,7 @@ if errorlevel 1 (
 echo.
 
 echo [4/6] 📊 تثبيت مكتبات البيانات - Data Libraries...
-pip install polars>=0.20.0
+pip install polars>=1.0.0
 if errorlevel 1 (
     echo ⚠️ تحذير: فشل تثبيت polars (اختياري)
 )
@@ -12,7 +12,7 @@ echo.
 
 REM Core Processing
 pip install pandas>=2.1.0 --upgrade
-pip install polars>=0.19.0
+pip install polars>=1.0.0
 pip install pyarrow>=14.0.0
 pip install openpyxl>=3.1.0
 pip install xlsxwriter>=3.1.0
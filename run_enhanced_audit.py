@@ -336,7 +336,7 @@ def main():
         
         # Step 6: Match with bank
         if len(duplicates) > 0:
-            match_results = bank_matcher.match_awards_to_bank(duplicates, bank_normalized)
+            match_results = bank_matcher.match_awards_to_bank(duplicates, bank_normalized, bulk=True)
         else:
             print("\n⚠️ تخطي المطابقة البنكية (لا توجد تكرارات)")
     else:
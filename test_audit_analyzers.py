@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+🧪 اختبار التحقق البنكي في محللات التدقيق
+Test Audit Analyzers Bank Verification
+=======================================
+مقارنة التحقق الجماعي (join على فهرس المراجع) مع تنفيذ مرجعي صفاً بصف
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# إضافة المسار للوصول للوحدات
+sys.path.insert(0, str(Path(__file__).parent))
+
+from core.advanced_audit_analyzer import AdvancedAuditAnalyzer
+from core.reference_index import clean_reference
+from core.strict_audit_analyzer import StrictAuditAnalyzer
+
+
+def make_verification_data(n: int = 120, seed: int = 7):
+    """
+    جوائز مكررة + كشف بنك بكل الحالات:
+    مبلغ مطابق، مبلغ مختلف (جزئي)، مرجع قصير، مرجع غير موجود، مبالغ فارغة
+    """
+    rng = np.random.default_rng(seed)
+    refs = [f'{rng.integers(10**11, 10**12)}' for _ in range(n)]
+    amounts = rng.choice([1000.0, 2500.0, 5000.0], n)
+    amounts[rng.random(n) < 0.1] = np.nan
+
+    payment_ref = np.array(refs, dtype=object)
+    kind = rng.integers(0, 6, n)
+    payment_ref[kind == 0] = None                                      # بدون مرجع
+    payment_ref[kind == 1] = [ref[-6:] for ref in payment_ref[kind == 1]]  # مرجع قصير
+    payment_ref[kind == 2] = [f'PR-{ref[:4]}-{ref[4:]}' for ref in payment_ref[kind == 2]]  # مع رموز
+    d1 = np.where(rng.random(n) < 0.3, [f'9{ref[1:]}' for ref in refs], None)
+    d1[rng.random(n) < 0.1] = 'nan'
+
+    duplicates = pd.DataFrame({
+        'AwardId': np.arange(n),
+        'OwnerName': [f'مالك {k % 17}' for k in range(n)],
+        'AwardAmount': amounts,
+        'PaymentReference': payment_ref,
+        'PaymentReference_D1': d1,
+    })
+
+    # البنك: جزء من المراجع (بعضها مرتين، بعضها بمبلغ مختلف أو فارغ)
+    rows = []
+    for k in rng.choice(n, int(n * 0.7), replace=False):
+        ref = refs[k] if rng.random() < 0.8 else f'9{refs[k][1:]}'
+        bank_amount = amounts[k] if rng.random() < 0.6 else rng.choice([999.0, np.nan])
+        for _ in range(rng.integers(1, 3)):
+            rows.append({
+                'AwardRef': f'TRX/{ref}/{rng.integers(10, 99)}',
+                'AwardRef10Digits': ref[-10:] if rng.random() < 0.5 else None,
+                'TransferAmount': bank_amount,
+                'TransactionDate': f'2024-03-{rng.integers(1, 28):02d}',
+                'ValueDate': '2024-03-28',
+                'BeneficiaryName': f'مستفيد {k}',
+                'BankReference': f'BR-{len(rows)}',
+                'IBAN': f'SA{len(rows):022d}',
+            })
+            bank_amount = rng.choice([amounts[k], 777.0])
+    bank = pd.DataFrame(rows).sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    return duplicates, bank
+
+
+def award_references(award_row: pd.Series) -> list:
+    """مراجع الجائزة بالأولوية (بدون الفارغ و 'nan' / 'none')"""
+    refs = []
+    for col in ['PaymentReference', 'PaymentReference_D1']:
+        if col in award_row and pd.notna(award_row[col]):
+            ref = str(award_row[col]).strip()
+            if ref and ref.lower() not in ['nan', 'none', '']:
+                refs.append(ref)
+    return refs
+
+
+def bank_rows_containing(bank: pd.DataFrame, ref: str, last_digits: int = 10) -> pd.DataFrame:
+    """صفوف البنك التي يحتوي AwardRef أو AwardRef10Digits المنظف على آخر N خانات"""
+    ref_clean = clean_reference(ref)
+    if len(ref_clean) < last_digits:
+        return bank.iloc[0:0]
+    key = ref_clean[-last_digits:]
+    found = np.zeros(len(bank), dtype=bool)
+    for col in ['AwardRef10Digits', 'AwardRef']:
+        found |= bank[col].map(lambda value: key in clean_reference(value)).to_numpy()
+    return bank[found]
+
+
+def assert_same_frame(actual: pd.DataFrame, expected: pd.DataFrame, label: str):
+    """نفس الأعمدة ونفس القيم (NaN = None)"""
+    assert list(actual.columns) == list(expected.columns), f"❌ {label}: أعمدة مختلفة"
+    assert len(actual) == len(expected), f"❌ {label}: {len(actual)} != {len(expected)}"
+    left = actual.astype(object).where(actual.notna(), None).to_numpy()
+    right = expected.astype(object).where(expected.notna(), None).to_numpy()
+    assert (left == right).all(), f"❌ {label}: قيم مختلفة"
+
+
+def reference_advanced_verification(duplicates: pd.DataFrame, bank: pd.DataFrame, tolerance: float = 0.0):
+    """تنفيذ مرجعي صفاً بصف لـ AdvancedAuditAnalyzer.verify_bank_payments"""
+    matched, partial, unmatched = [], [], []
+    for _, award_row in duplicates.iterrows():
+        candidates = [row for ref in award_references(award_row)
+                      for _, row in bank_rows_containing(bank, ref).iterrows()]
+        award_amount = pd.to_numeric(award_row['AwardAmount'], errors='coerce')
+        same_amount = [row for row in candidates if abs(award_amount - row['TransferAmount']) <= tolerance]
+
+        record = award_row.to_dict()
+        if not candidates:
+            unmatched.append(record)
+            continue
+        bank_row = same_amount[0] if same_amount else candidates[0]
+        record['BankTransferAmount'] = bank_row['TransferAmount']
+        record['BankTransactionDate'] = bank_row['TransactionDate']
+        record['BankBeneficiary'] = bank_row['BeneficiaryName']
+        record['BankReference'] = bank_row['BankReference']
+        if same_amount:
+            matched.append(record)
+        else:
+            record['AmountDifference'] = abs(award_amount - bank_row['TransferAmount'])
+            partial.append(record)
+    return tuple(pd.DataFrame(records) for records in (matched, partial, unmatched))
+
+
+def reference_strict_verification(duplicates: pd.DataFrame, bank: pd.DataFrame, tolerance: float = 0.0):
+    """تنفيذ مرجعي صفاً بصف لـ StrictAuditAnalyzer.verify_bank_strict (الحلقة الأصلية)"""
+    bank = bank.copy()
+    for col in ['AwardRef', 'AwardRef10Digits', 'BankReference']:
+        bank[col] = bank[col].map(clean_reference)
+
+    matched, unmatched, details = [], [], []
+    for _, award_row in duplicates.iterrows():
+        refs = award_references(award_row)
+        record = award_row.to_dict()
+        if not refs:
+            record['MatchStatus'] = 'NO_REFERENCE'
+            record['MatchReason'] = 'لا يوجد رقم مرجعي في سجل الجائزة'
+            unmatched.append(record)
+            continue
+
+        best, ref_found = None, False
+        for ref in refs:
+            ref_matches = bank_rows_containing(bank, ref)
+            ref_found = ref_found or len(ref_matches) > 0
+            exact = ref_matches[
+                ref_matches['TransferAmount'].notna()
+                & ((ref_matches['TransferAmount'] - award_row['AwardAmount']).abs() <= tolerance)
+            ]
+            if len(exact) > 0:
+                best = exact.iloc[0]
+                break
+
+        if best is not None:
+            record.update({
+                'MatchStatus': 'MATCHED_100',
+                'MatchReason': '✅ مطابقة بنكية كاملة',
+                'BankTransferAmount': best['TransferAmount'],
+                'BankTransactionDate': best['TransactionDate'],
+                'BankValueDate': best['ValueDate'],
+                'BankBeneficiary': best['BeneficiaryName'],
+                'BankReference': best['BankReference'],
+                'BankIBAN': best['IBAN'],
+                'AmountDifference': 0.00,
+            })
+            matched.append(record)
+        else:
+            record['MatchStatus'] = 'UNMATCHED'
+            record['MatchReason'] = '⚠️ Ref مطابق - مبلغ مختلف' if ref_found else '❌ Ref غير موجود بالبنك'
+            unmatched.append(record)
+
+        details.append({
+            'OwnerName': award_row['OwnerName'],
+            'AwardAmount': award_row['AwardAmount'],
+            'BankAmount': best['TransferAmount'] if best is not None else np.nan,
+            'Reference': refs[0],
+            'Status': '✅ مطابق' if best is not None else '❌ غير مطابق',
+        })
+    return pd.DataFrame(matched), pd.DataFrame(unmatched), pd.DataFrame(details)
+
+
+def test_advanced_verify_bank_payments():
+    """اختبار verify_bank_payments: نفس (matched, partial, unmatched) للتنفيذ المرجعي"""
+    duplicates, bank = make_verification_data()
+    analyzer = AdvancedAuditAnalyzer()
+    analyzer.duplicates = duplicates
+    analyzer.bank_data = bank
+
+    actual = analyzer.verify_bank_payments()
+    expected = reference_advanced_verification(duplicates, bank)
+    for label, got, want in zip(['matched', 'partial', 'unmatched'], actual, expected):
+        assert_same_frame(got, want, label)
+
+    matched, partial, unmatched = actual
+    assert len(matched) > 0 and len(partial) > 0 and len(unmatched) > 0
+    # الحالات المطلوبة كلها ممثلة في البيانات
+    short_refs = duplicates['PaymentReference'].map(lambda ref: isinstance(ref, str) and len(ref) < 10)
+    short_only = set(duplicates.loc[short_refs & duplicates['PaymentReference_D1'].isna(), 'AwardId'])
+    assert short_only and short_only <= set(unmatched['AwardId']), "❌ المرجع القصير يجب ألا يطابق"
+    assert partial['AwardAmount'].isna().any() or partial['BankTransferAmount'].isna().any()
+    assert not matched['AwardAmount'].isna().any()
+
+    print(f"✅ verify_bank_payments: {len(matched)} مطابق، {len(partial)} جزئي، {len(unmatched)} غير مطابق")
+
+
+def test_strict_verify_bank():
+    """اختبار verify_bank_strict: نفس نتائج الحلقة الأصلية + أعمدة تفاصيل ثابتة"""
+    duplicates, bank = make_verification_data()
+    analyzer = StrictAuditAnalyzer()
+
+    result = analyzer.verify_bank_strict(duplicates, bank)
+    expected_matched, expected_unmatched, expected_details = reference_strict_verification(duplicates, bank)
+    assert_same_frame(result['matched'], expected_matched, 'matched')
+    assert_same_frame(result['unmatched'], expected_unmatched, 'unmatched')
+    assert_same_frame(result['details'], expected_details, 'details')
+    assert set(result['unmatched']['MatchStatus']) == {'NO_REFERENCE', 'UNMATCHED'}
+
+    # ترتيب أعمدة التفاصيل لا يعتمد على نتيجة أول سجل
+    expected_columns = ['OwnerName', 'AwardAmount', 'BankAmount', 'Reference', 'Status']
+    for subset in (duplicates.iloc[::-1], duplicates[duplicates['AwardAmount'].isna()], duplicates.iloc[0:0]):
+        details = analyzer.verify_bank_strict(subset, bank)['details']
+        assert list(details.columns) == expected_columns, "❌ ترتيب أعمدة التفاصيل متغير"
+
+    print(f"✅ verify_bank_strict: {len(result['matched'])} مطابق = الحلقة الأصلية")
+
+
+if __name__ == "__main__":
+    test_advanced_verify_bank_payments()
+    test_strict_verify_bank()
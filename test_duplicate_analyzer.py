@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+🧪 اختبار محلل الدفعات المكررة
+Test Duplicate Analyzer
+============================
+مقارنة المحركات المتجهية مع البحث الشامل على بيانات عشوائية صغيرة
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# إضافة المسار للوصول للوحدات
+sys.path.insert(0, str(Path(__file__).parent))
+
+from rapidfuzz import fuzz
+
+from core.duplicate_analyzer import DuplicateAnalyzer
+
+FIRST_NAMES = ['محمد', 'احمد', 'علي', 'حسن', 'خالد', 'سالم', 'راشد', 'ناصر', 'فهد', 'سعيد', 'يوسف', 'حمد']
+
+
+def make_names_frame(n: int = 400, seed: int = 22) -> pd.DataFrame:
+    """أسماء ثلاثية عشوائية (تتقارب كثيراً) + أعمدة إضافية"""
+    rng = np.random.default_rng(seed)
+    names = [' '.join(rng.choice(FIRST_NAMES, 3)) for _ in range(n)]
+    # تنويعات كتابية لنفس الاسم (مسافات + أحرف كبيرة)
+    names[:20] = [f'  {name.upper()}  ' for name in names[20:40]]
+    return pd.DataFrame({
+        'Name': names,
+        'Race': rng.choice(['سباق 1', 'سباق 2'], n),
+        'Amount': rng.choice([1000, 2000, 5000], n),
+    })
+
+
+def test_fuzzy_duplicates_engine():
+    """اختبار محرك rapidfuzz: نفس أزواج البحث الشامل بـ fuzz.ratio"""
+    df = make_names_frame()
+    analyzer = DuplicateAnalyzer(df)
+    normalized = df['Name'].str.strip().str.lower().str.replace(r'\s+', ' ', regex=True)
+    unique_names = normalized.unique()
+
+    expected = [
+        (a, b) for k, a in enumerate(unique_names) for b in unique_names[k + 1:]
+        if fuzz.ratio(a, b) >= 85
+    ]
+    # الافتراضي بدون تقييد البادئة: كتل الطول وحدها بدون فقد
+    result = analyzer.find_fuzzy_duplicates('Name', threshold=0.85)
+    assert list(zip(result['name1'], result['name2'])) == expected, "❌ أزواج مختلفة عن البحث الشامل"
+    assert (result['similarity'] >= 0.85).all()
+
+    legacy = analyzer.find_fuzzy_duplicates('Name', threshold=0.85, engine='difflib')
+    assert list(result.columns) == list(legacy.columns)
+
+    # عدد الصفوف وأول قيمة أصلية لكل اسم
+    first_original = df.groupby(normalized, sort=False)['Name'].first().str.strip()
+    counts = normalized.value_counts()
+    assert (result['count1'].to_numpy() == counts[result['name1']].to_numpy()).all()
+    assert (result['original_name2'].to_numpy() == first_original[result['name2']].to_numpy()).all()
+
+    # الأعمدة الإضافية: أول قيمة لكل اسم يجب أن تتساوى
+    with_race = analyzer.find_fuzzy_duplicates('Name', threshold=0.85, additional_cols=['Race'], prefix_len=0)
+    first_race = df.groupby(normalized, sort=False)['Race'].first()
+    expected_race = [(a, b) for a, b in expected if first_race[a] == first_race[b]]
+    assert list(zip(with_race['name1'], with_race['name2'])) == expected_race
+
+    # كتل البادئة (اختياري): مجموعة جزئية من الأزواج ببادئة مشتركة
+    prefixed = analyzer.find_fuzzy_duplicates('Name', threshold=0.85, prefix_len=1)
+    assert list(zip(prefixed['name1'], prefixed['name2'])) == [(a, b) for a, b in expected if a[0] == b[0]]
+    assert len(prefixed) < len(result), "❌ الافتراضي يجب ألا يفقد الأزواج المختلفة في أول حرف"
+
+    print(f"✅ محرك rapidfuzz للتكرارات الضبابية: {len(result)} زوج = البحث الشامل")
+
+
+def connected_groups(n: int, linked) -> set:
+    """المكونات المترابطة (أكثر من صف) لرسم الصفوف - بحث شامل"""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for a in range(n):
+        for b in range(a + 1, n):
+            if linked(a, b):
+                parent[find(a)] = find(b)
+    groups = {}
+    for row in range(n):
+        groups.setdefault(find(row), set()).add(row)
+    return {frozenset(group) for group in groups.values() if len(group) > 1}
+
+
+def result_groups(result: pd.DataFrame) -> set:
+    """مجموعات فهارس الصفوف حسب duplicate_group"""
+    if result.empty:
+        return set()
+    return {frozenset(rows) for rows in result.groupby('duplicate_group').groups.values()}
+
+
+def test_fuzzy_multi_field_clusters():
+    """اختبار تجميع التكرارات متعددة الحقول: مجموعات متعدية = المكونات المترابطة"""
+    df = make_names_frame(n=200)
+    analyzer = DuplicateAnalyzer(df)
+    names = df['Name'].str.strip().str.lower().str.replace(r'\s+', ' ', regex=True).tolist()
+    races = df['Race'].tolist()
+    amounts = df['Amount'].tolist()
+
+    # المبلغ عمود رقمي: تطابق تام (كتلة)، والاسم ضبابي
+    result = analyzer.find_multi_field_duplicates(['Name', 'Amount'], fuzzy_match=True, fuzzy_threshold=0.85)
+    expected = connected_groups(len(df), lambda a, b: (
+        amounts[a] == amounts[b] and fuzz.ratio(names[a], names[b]) >= 85
+    ))
+    assert result_groups(result) == expected, "❌ المجموعات تختلف عن المكونات المترابطة"
+    assert result.groupby('duplicate_group')['Amount'].nunique().eq(1).all(), "❌ مجموعة تعبر كتلة المبلغ"
+    assert result['duplicate_group'].iloc[0] == 0
+
+    # عمودان نصيان: كل الأعمدة النصية يجب أن تتشابه
+    both = analyzer.find_multi_field_duplicates(['Name', 'Race'], fuzzy_match=True, fuzzy_threshold=0.85)
+    expected_both = connected_groups(len(df), lambda a, b: (
+        fuzz.ratio(names[a], names[b]) >= 85 and fuzz.ratio(races[a], races[b]) >= 85
+    ))
+    assert result_groups(both) == expected_both
+
+    # الترتيب لا يغيّر المجموعات
+    shuffled = df.sample(frac=1.0, random_state=7)
+    reordered = DuplicateAnalyzer(shuffled).find_multi_field_duplicates(
+        ['Name', 'Amount'], fuzzy_match=True, fuzzy_threshold=0.85
+    )
+    assert result_groups(reordered) == expected
+
+    print(f"✅ تجميع التكرارات متعددة الحقول: {len(expected)} مجموعة متعدية")
+
+
+def test_time_window_duplicates():
+    """اختبار التكرار ضمن نافذة زمنية: كل صف له جار بنفس المفتاح ضمن النافذة، مرة واحدة"""
+    rng = np.random.default_rng(24)
+    n = 300
+    df = pd.DataFrame({
+        'Owner': rng.choice(FIRST_NAMES[:5], n),
+        'Amount': rng.choice([1000, 2000], n),
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'),
+    })
+    df.loc[:4, 'Owner'] = None  # المفتاح الفارغ لا يطابق
+    analyzer = DuplicateAnalyzer(df)
+
+    result = analyzer.find_payment_duplicates('Owner', 'Amount', date_col='Date', time_window_days=3)
+    expected = {
+        a for a in range(n) for b in range(n)
+        if a != b and df['Owner'][a] is not None
+        and (df['Owner'][a], df['Amount'][a]) == (df['Owner'][b], df['Amount'][b])
+        and abs((df['Date'][a] - df['Date'][b]).days) <= 3
+    }
+    assert result.index.is_unique, "❌ صف مكرر في النتيجة"
+    assert set(result.index) == expected, "❌ الصفوف تختلف عن البحث الشامل"
+
+    # المجموعة = (الجهة، المبلغ)
+    assert (result.groupby('duplicate_group')[['Owner', 'Amount']].nunique() == 1).all().all()
+    assert (result['duplicate_count'] == result.groupby('duplicate_group')['Owner'].transform('size')).all()
+
+    # نافذة أقل من يوم: نفس التاريخ فقط
+    same_day = analyzer.find_payment_duplicates('Owner', 'Amount', date_col='Date', time_window_days=0.5)
+    assert same_day.duplicated(['Owner', 'Amount', 'Date'], keep=False).all()
+    assert len(same_day) == df.dropna().duplicated(['Owner', 'Amount', 'Date'], keep=False).sum()
+
+    print(f"✅ التكرار ضمن نافذة زمنية: {len(result)} صف بدون تكرار")
+
+
+def test_partial_duplicates_lattice():
+    """اختبار التكرار الجزئي: المجموعات العظمى لكل سجل = البحث الشامل بـ duplicated"""
+    from itertools import combinations
+
+    rng = np.random.default_rng(25)
+    n = 150
+    df = pd.DataFrame({
+        'Owner': rng.choice(FIRST_NAMES[:6], n),
+        'Amount': rng.choice([1000.0, 2000.0, np.nan], n),
+        'Race': rng.choice(['سباق 1', 'سباق 2', 'سباق 3'], n),
+        'Horse': rng.choice([f'حصان {k}' for k in range(40)], n),
+    })
+    columns = list(df.columns)
+    analyzer = DuplicateAnalyzer(df)
+
+    for min_cols in (1, 2, 3):
+        result = analyzer.find_partial_duplicates(columns, min_matching_cols=min_cols)
+        assert result.index.is_unique, "❌ السجل مكرر في النتيجة"
+
+        # البحث الشامل: كل توليفة متكررة لكل صف ثم العظمى فقط
+        colliding = {row: [] for row in range(n)}
+        for size in range(1, len(columns) + 1):
+            for combo in combinations(columns, size):
+                for row in np.flatnonzero(df.duplicated(subset=list(combo), keep=False)):
+                    colliding[row].append(set(combo))
+        expected = {}
+        for row, sets in colliding.items():
+            maximal = [s for s in sets if len(s) >= min_cols and not any(s < other for other in sets)]
+            if maximal:
+                expected[row] = {frozenset(s) for s in maximal}
+
+        actual = {
+            row: {frozenset(label.split(', ')) for label in labels.split(' | ')}
+            for row, labels in result['matching_columns'].items()
+        }
+        assert actual == expected, f"❌ المجموعات العظمى تختلف (حد أدنى {min_cols})"
+        assert (result['match_count'] == [max(len(s) for s in expected[row]) for row in result.index]).all()
+
+    print(f"✅ التكرار الجزئي بشبكة التوليفات: {len(result)} سجل بمجموعاته العظمى")
+
+
+if __name__ == "__main__":
+    test_fuzzy_duplicates_engine()
+    test_fuzzy_multi_field_clusters()
+    test_time_window_duplicates()
+    test_partial_duplicates_lattice()
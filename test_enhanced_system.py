@@ -105,6 +105,74 @@ def test_bank_matcher():
     return matcher
 
 
+def test_reference_index():
+    """اختبار فهرس لواحق المراجع"""
+    print("\n" + "="*80)
+    print("🧪 اختبار ReferenceIndex")
+    print("="*80)
+    
+    from core.reference_index import ReferenceIndex, clean_reference
+    
+    bank = pd.DataFrame({
+        'AwardRef': ['00821B291050', '821-B731-113', 'nan', '123'],
+        'AwardRef10Digits': ['1B291050', '21B7311130', '', '5555555555'],
+        'BankReference': ['BNK001', 'BNK002', 'X821B291050', 'BNK004'],
+    })
+    
+    index = ReferenceIndex(bank, last_digits=10)
+    
+    # آخر 10 خانات بعد التنظيف، بترتيب أولوية العمود ثم ترتيب البنك
+    assert list(index.positions(clean_reference('821B291050'))) == [0, 2], "❌ خطأ في مواضع المرجع"
+    assert list(index.positions(clean_reference('821 B731 113'))) == [1], "❌ فشل تنظيف المرجع"
+    assert len(index.positions(clean_reference('999X999999'))) == 0, "❌ مرجع غير موجود أعاد نتائج"
+    
+    query_pos, bank_pos = index.lookup(['821b291050', '999x999999', '5555555555'])
+    assert list(zip(query_pos, bank_pos)) == [(0, 0), (0, 2), (2, 3)], "❌ خطأ في البحث الجماعي"
+    
+    # فهرس الاحتواء: أي مقطع بطول 10 داخل المرجع (مثل str.contains)
+    contains_index = ReferenceIndex(bank, last_digits=10, columns=['AwardRef'], contains=True)
+    assert list(contains_index.positions('00821b2910')) == [0], "❌ فشل مطابقة مقطع داخلي"
+    assert len(index.positions('00821b2910')) == 0, "❌ فهرس اللواحق طابق مقطعاً داخلياً"
+    
+    print(f"\n✅ جميع الاختبارات نجحت!")
+
+
+def test_bulk_bank_matching():
+    """اختبار التحقق الجماعي: نفس نتائج المطابقة صفاً بصف"""
+    print("\n" + "="*80)
+    print("🧪 اختبار التحقق الجماعي (bulk)")
+    print("="*80)
+    
+    awards = pd.DataFrame({
+        'OwnerName': ['محمد', 'علي', 'أحمد', 'سالم', 'خالد'],
+        'AwardAmount': [5000.00, 3000.00, 2000.00, 1000.00, 4000.00],
+        'PaymentReference': ['821B291050', '821B731113', '999X999999', '', '12'],
+        'PaymentReference_D1': ['', '822B111111', '821-B291-050', None, 'nan'],
+        'PaymentReference_D2': [None, None, None, None, '822B111111'],
+        'EntryDate': pd.to_datetime(['2024-01-10', '2024-01-10', '2024-03-01', None, '2024-01-01']),
+    }, index=[10, 20, 30, 40, 50])
+    
+    bank = pd.DataFrame({
+        'AwardRef': ['821B291050', '821B731113', '822B111111'],
+        'AwardRef10Digits': ['1B291050', '1B731113', ''],
+        'BankReference': ['BNK001', 'BNK002', 'BNK003'],
+        'TransferAmount': [5000.00, 2999.00, 4000.00],
+        'TransactionDate': pd.to_datetime(['2024-01-15', '2024-01-16', None]),
+        'BeneficiaryName': ['محمد أحمد', 'علي سعيد', 'خالد'],
+    })
+    
+    row_results = EnhancedBankMatcher().match_awards_to_bank(awards, bank)
+    bulk_results = EnhancedBankMatcher().match_awards_to_bank(awards, bank, bulk=True)
+    
+    for key in ['matched', 'partial', 'unmatched']:
+        pd.testing.assert_frame_equal(row_results[key], bulk_results[key], check_dtype=False)
+    
+    assert list(bulk_results['unmatched']['MatchStatus']) == ['NO_REFERENCE'], "❌ خطأ في تصنيف غير المطابق"
+    assert list(bulk_results['partial']['MatchedReference']) == ['821B731113', '821-B291-050'], "❌ المرجع الحاسم غير صحيح"
+    
+    print(f"\n✅ التحقق الجماعي يطابق المطابقة صفاً بصف")
+
+
 def test_ground_truth_validator():
     """اختبار مدقق الحالات المعروفة"""
     print("\n" + "="*80)
@@ -201,6 +269,68 @@ def test_composite_key():
     print(f"   البرمبت يطلب تطابق تام بعد التطبيع الشكلي فقط")
 
 
+def test_amount_window_matching():
+    """اختبار الربط النطاقي: المبلغ ±التسامح والتاريخ ±النافذة"""
+    print("\n" + "="*80)
+    print("🧪 اختبار AmountRangeIndex + مطابقة المبلغ والتاريخ")
+    print("="*80)
+    
+    import numpy as np
+    from core.match_engine import AmountRangeIndex, amounts_to_cents, dates_to_seconds
+    
+    rng = np.random.default_rng(18)
+    bank_amounts = pd.Series(rng.choice([999.5, 1000.0, 1000.25, 1002.0, 2000.0, np.nan], 300))
+    bank_dates = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60, 300), unit='D'))
+    bank_dates[::29] = pd.NaT
+    award_amounts = pd.Series(rng.choice([1000.0, 2000.0, 1500.0, np.nan], 80))
+    award_dates = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60, 80), unit='D'))
+    
+    index = AmountRangeIndex(bank_amounts, bank_dates)
+    cents, amount_ok = amounts_to_cents(award_amounts)
+    seconds, date_ok = dates_to_seconds(award_dates)
+    award_pos, bank_pos = index.range_join(cents, amount_ok & date_ok, 50, seconds=seconds, window_days=5, max_pairs=500)
+    
+    expected = [
+        (a, b)
+        for a in range(len(award_amounts)) if pd.notna(award_amounts[a])
+        for b in range(len(bank_amounts))
+        if pd.notna(bank_amounts[b]) and pd.notna(bank_dates[b])
+        and abs(award_amounts[a] - bank_amounts[b]) <= 0.5
+        and abs((award_dates[a] - bank_dates[b]).days) <= 5
+    ]
+    assert sorted(zip(award_pos.tolist(), bank_pos.tolist())) == expected, "❌ الربط النطاقي لا يطابق البحث الشامل"
+    
+    # تحويلات برسوم بنكية: بدون مرجع في البنك
+    awards = pd.DataFrame({
+        'OwnerName': ['محمد', 'علي', 'سالم'],
+        'AwardAmount': [5000.00, 3000.00, 2000.00],
+        'PaymentReference': ['821B291050', '821B731113', ''],
+        'EntryDate': pd.to_datetime(['2024-01-10', '2024-01-10', '2024-02-01']),
+    })
+    bank = pd.DataFrame({
+        'AwardRef': ['', '', ''],
+        'BankReference': ['BNK001', 'BNK002', 'BNK003'],
+        'TransferAmount': [4975.00, 2990.00, 2000.00],
+        'TransactionDate': pd.to_datetime(['2024-01-12', '2024-03-01', '2024-02-03']),
+        'BeneficiaryName': ['محمد', 'علي', 'سالم'],
+    })
+    
+    plain = EnhancedBankMatcher(amount_tolerance=25.0).match_awards_to_bank(awards, bank, bulk=True)
+    assert len(plain['unmatched']) == 3 and len(plain['partial']) == 0
+    
+    for bulk in (False, True):
+        results = EnhancedBankMatcher(amount_tolerance=25.0, date_window_days=14).match_awards_to_bank(
+            awards, bank, bulk=bulk, amount_window=True
+        )
+        partial = results['partial']
+        assert list(partial['MatchStatus']) == ['AMOUNT_WINDOW'] * 2, "❌ لم تُطابق التحويلات برسوم"
+        assert list(partial['BankReference']) == ['bnk001', 'bnk003']
+        assert list(partial['AmountDifference']) == [25.0, 0.0]
+        assert list(results['unmatched']['OwnerName']) == ['علي'], "❌ تحويل خارج النافذة طُوبق"
+    
+    print(f"\n✅ الربط النطاقي يطابق البحث الشامل والرسوم البنكية تُطابق ضمن التسامح")
+
+
 def main():
     """البرنامج الرئيسي"""
     print("="*80)
@@ -214,6 +344,11 @@ def main():
         # Test 2: BankMatcher
         matcher = test_bank_matcher()
         
+        # Test 2.5: ReferenceIndex
+        test_reference_index()
+        test_bulk_bank_matching()
+        test_amount_window_matching()
+        
         # Test 3: GroundTruthValidator
         validator = test_ground_truth_validator()
         
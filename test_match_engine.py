@@ -0,0 +1,1005 @@
+# -*- coding: utf-8 -*-
+"""
+🧪 اختبار محرك المطابقة العمودي
+Test Columnar Match Engine
+============================
+مقارنة نتائج المحرك العمودي مع المطابقة المرجعية (حلقات awards × bank)
+على بيانات عشوائية صغيرة
+"""
+
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# إضافة المسار للوصول للوحدات
+sys.path.insert(0, str(Path(__file__).parent))
+
+from rapidfuzz import fuzz
+
+from core.match_engine import (
+    BankWindowIndex,
+    amounts_to_cents,
+    dates_to_seconds,
+    fuzzy_best_in_window,
+    name_ranks,
+    sharded_fuzzy_match,
+    sorted_neighbourhood_pairs
+)
+
+
+def make_sample_data(n_awards: int = 300, n_bank: int = 400, seed: int = 7):
+    """إنشاء بيانات جوائز وبنك عشوائية بمبالغ متكررة وتواريخ متقاربة"""
+    rng = np.random.default_rng(seed)
+    names = ['محمد احمد علي', 'علي حسن محمود', 'فاطمه خالد', 'ساره عبدالله', 'سالم راشد']
+    amounts = [2000.0, 3000.0, 5000.0, 7500.0, 10000.0]
+    start = datetime(2024, 1, 1)
+
+    awards = pd.DataFrame({
+        'OwnerName': rng.choice(names, n_awards),
+        'AwardAmount': rng.choice(amounts, n_awards),
+        'EntryDate': [start + timedelta(days=int(d), hours=int(h))
+                      for d, h in zip(rng.integers(0, 60, n_awards), rng.integers(0, 24, n_awards))],
+    })
+    awards['OwnerName_norm'] = awards['OwnerName']
+    awards.loc[::17, 'AwardAmount'] = np.nan
+
+    bank = pd.DataFrame({
+        'BankName_norm': rng.choice(names + ['محمد احمد', 'فاطمه خالد احمد'], n_bank),
+        'TransferAmount': rng.choice(amounts, n_bank),
+        'TransferDate': [start + timedelta(days=int(d), hours=int(h))
+                         for d, h in zip(rng.integers(0, 60, n_bank), rng.integers(0, 24, n_bank))],
+        'BankReference': [f'REF{i:05d}' for i in range(n_bank)],
+    })
+    bank['BeneficiaryName'] = bank['BankName_norm']
+    bank.loc[::23, 'TransferDate'] = pd.NaT
+    return awards, bank
+
+
+def reference_first_match(awards: pd.DataFrame, bank: pd.DataFrame, window: int) -> dict:
+    """المطابقة المرجعية: أول صف بنكي بنفس المبلغ وضمن النافذة"""
+    result = {}
+    for a_idx, award in awards.iterrows():
+        if pd.isna(award['AwardAmount']) or pd.isna(award['EntryDate']):
+            continue
+        for b_pos, (_, bank_row) in enumerate(bank.iterrows()):
+            if pd.isna(bank_row['TransferAmount']) or pd.isna(bank_row['TransferDate']):
+                continue
+            if abs(award['AwardAmount'] - bank_row['TransferAmount']) > 0.01:
+                continue
+            if abs((award['EntryDate'] - bank_row['TransferDate']).days) > window:
+                continue
+            result[a_idx] = b_pos
+            break
+    return result
+
+
+def test_bank_window_index():
+    """اختبار فهرس البنك: أول مطابقة ضمن النافذة"""
+    awards, bank = make_sample_data()
+    index = BankWindowIndex(bank['TransferAmount'], bank['TransferDate'])
+
+    cents, amount_ok = amounts_to_cents(awards['AwardAmount'])
+    seconds, date_ok = dates_to_seconds(awards['EntryDate'])
+
+    for window in [0, 3, 7]:
+        lo, hi = index.day_window(cents, seconds, amount_ok & date_ok, window)
+        first = index.first_in_window(lo, hi)
+        vectorized = {awards.index[i]: int(b) for i, b in enumerate(first) if b >= 0}
+
+        assert vectorized == reference_first_match(awards, bank, window), \
+            f"❌ اختلاف في النتائج (نافذة {window})"
+
+    print("✅ BankWindowIndex يطابق المطابقة المرجعية")
+
+
+def test_exact_match_columns():
+    """اختبار أعمدة ناتج AdvancedMatcher.exact_match"""
+    from core.advanced_matcher import AdvancedMatcher
+
+    awards, bank = make_sample_data(n_awards=120, n_bank=150)
+    exact = AdvancedMatcher().exact_match(awards, bank, time_window_days=7)
+    expected = reference_first_match(awards, bank, 7)
+
+    assert len(exact) == len(expected), "❌ عدد المطابقات غير صحيح"
+    for col in ['BankReference', 'TransferAmount', 'TransferDate',
+                'BeneficiaryName', 'MatchType', 'MatchScore', 'DateDiff']:
+        assert col in exact.columns, f"❌ العمود {col} مفقود"
+
+    for award_idx, row in exact.iterrows():
+        assert row['BankReference'] == bank.iloc[expected[award_idx]]['BankReference']
+        assert row['DateDiff'] <= 7
+
+    print("✅ exact_match يعيد نفس المطابقات والأعمدة")
+
+
+def reference_best_fuzzy(awards: pd.DataFrame, bank: pd.DataFrame, window: int, threshold: float) -> dict:
+    """المطابقة الضبابية المرجعية: أعلى تشابه (أول صف عند التساوي)"""
+    result = {}
+    for a_idx, award in awards.iterrows():
+        if pd.isna(award['AwardAmount']) or pd.isna(award['EntryDate']):
+            continue
+        best_pos, best_score = None, 0
+        for b_pos, (_, bank_row) in enumerate(bank.iterrows()):
+            if pd.isna(bank_row['TransferAmount']) or pd.isna(bank_row['TransferDate']):
+                continue
+            if abs(award['AwardAmount'] - bank_row['TransferAmount']) > 0.01:
+                continue
+            if abs((award['EntryDate'] - bank_row['TransferDate']).days) > window:
+                continue
+            score = fuzz.ratio(award['OwnerName_norm'], bank_row['BankName_norm'])
+            if score >= threshold and score > best_score:
+                best_pos, best_score = b_pos, score
+        if best_pos is not None:
+            result[a_idx] = (best_pos, best_score)
+    return result
+
+
+def test_fuzzy_best_in_window():
+    """اختبار المطابقة الضبابية على كتل cdist"""
+    awards, bank = make_sample_data(n_awards=150, n_bank=200, seed=11)
+    index = BankWindowIndex(bank['TransferAmount'], bank['TransferDate'])
+
+    cents, amount_ok = amounts_to_cents(awards['AwardAmount'])
+    seconds, date_ok = dates_to_seconds(awards['EntryDate'])
+    lo, hi = index.day_window(cents, seconds, amount_ok & date_ok, 7)
+
+    best_bank, best_score = fuzzy_best_in_window(
+        index, lo, hi,
+        awards['OwnerName_norm'].to_numpy(),
+        bank['BankName_norm'].to_numpy(),
+        score_cutoff=80
+    )
+    vectorized = {
+        awards.index[i]: (int(best_bank[i]), best_score[i])
+        for i in range(len(awards)) if best_bank[i] >= 0
+    }
+
+    expected = reference_best_fuzzy(awards, bank, 7, 80)
+    assert vectorized.keys() == expected.keys(), "❌ اختلاف في الجوائز المطابقة"
+    for key, (pos, score) in expected.items():
+        assert vectorized[key][0] == pos, "❌ اختلاف في صف البنك المختار"
+        assert abs(vectorized[key][1] - score) < 1e-9, "❌ اختلاف في درجة التشابه"
+
+    print("✅ fuzzy_best_in_window يطابق المطابقة المرجعية")
+
+
+def test_sharded_fuzzy_match():
+    """اختبار المطابقة الموزعة: نفس النتائج مع شرائح وعمليات متعددة"""
+    awards, bank = make_sample_data(n_awards=400, n_bank=300, seed=5)
+    awards['Season'] = np.where(np.arange(len(awards)) % 2, '2023-2024', '2024-2025')
+
+    cents, amount_ok = amounts_to_cents(awards['AwardAmount'])
+    seconds, date_ok = dates_to_seconds(awards['EntryDate'])
+    bank_cents, bank_amount_ok = amounts_to_cents(bank['TransferAmount'])
+    bank_seconds, bank_date_ok = dates_to_seconds(bank['TransferDate'])
+
+    results = [
+        sharded_fuzzy_match(
+            cents, seconds, amount_ok & date_ok, awards['OwnerName_norm'].to_numpy(),
+            bank_cents, bank_seconds, bank_amount_ok & bank_date_ok, bank['BankName_norm'].to_numpy(),
+            window_days=7, score_cutoff=80, seasons=awards['Season'].to_numpy(),
+            max_workers=workers, shard_rows=shard_rows
+        )
+        for workers, shard_rows in [(1, 10_000), (2, 50)]
+    ]
+
+    # الافتراضي و None تحت الحد: بدون عمليات إطلاقاً
+    import core.match_engine as match_engine
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("❌ تم تشغيل ProcessPoolExecutor بدون طلب")
+
+    original_pool = match_engine.ProcessPoolExecutor
+    match_engine.ProcessPoolExecutor = no_pool
+    try:
+        for workers in ({}, {'max_workers': None}):
+            in_process = sharded_fuzzy_match(
+                cents, seconds, amount_ok & date_ok, awards['OwnerName_norm'].to_numpy(),
+                bank_cents, bank_seconds, bank_amount_ok & bank_date_ok, bank['BankName_norm'].to_numpy(),
+                window_days=7, score_cutoff=80, seasons=awards['Season'].to_numpy(), shard_rows=50,
+                **workers
+            )
+            assert (in_process[0] == results[0][0]).all()
+    finally:
+        match_engine.ProcessPoolExecutor = original_pool
+
+    assert (results[0][0] == results[1][0]).all(), "❌ نتائج الشرائح غير حتمية"
+    assert (results[0][1] == results[1][1]).all(), "❌ درجات الشرائح مختلفة"
+    assert (results[0][0] >= 0).sum() > 0, "❌ لا توجد مطابقات"
+
+    # المحلل يمرر PERFORMANCE['fuzzy_max_workers'] (الافتراضي None = الحد التلقائي)
+    import core.camel_awards_analyzer as analyzer_module
+    analyzer_awards, analyzer_bank = make_analyzer_data(n_awards=200, n_bank=250, seed=5)
+    received = []
+
+    def recording_match(*args, **kwargs):
+        received.append(kwargs.get('max_workers', 'missing'))
+        return sharded_fuzzy_match(*args, **kwargs)
+
+    original_match = analyzer_module.sharded_fuzzy_match
+    original_setting = analyzer_module.PERFORMANCE.get('fuzzy_max_workers')
+    analyzer_module.sharded_fuzzy_match = recording_match
+    try:
+        outputs = []
+        for setting in (None, 2):
+            analyzer_module.PERFORMANCE['fuzzy_max_workers'] = setting
+            received.clear()
+            analyzer = analyzer_module.CamelAwardsAnalyzer(use_advanced_features=False)
+            outputs.append(analyzer._basic_matching(7, awards_df=analyzer_awards, bank_df=analyzer_bank))
+            assert received and all(workers == setting for workers in received), f"❌ لم يُمرر {setting}: {received}"
+        pd.testing.assert_frame_equal(outputs[0], outputs[1])
+    finally:
+        analyzer_module.sharded_fuzzy_match = original_match
+        analyzer_module.PERFORMANCE['fuzzy_max_workers'] = original_setting
+
+    print("✅ sharded_fuzzy_match حتمي عبر الشرائح والعمليات")
+
+
+def test_sorted_neighbourhood_pairs():
+    """اختبار الجوار المرتب: المرشحون من نفس الكتلة وبعدد محدود"""
+    awards, bank = make_sample_data(n_awards=200, n_bank=300, seed=3)
+    cents, amount_ok = amounts_to_cents(awards['AwardAmount'])
+    bank_cents, bank_amount_ok = amounts_to_cents(bank['TransferAmount'])
+    award_rank, bank_rank = name_ranks(awards['OwnerName_norm'].to_numpy(), bank['BankName_norm'].to_numpy())
+
+    award_pos, bank_pos = sorted_neighbourhood_pairs(
+        [cents], award_rank, amount_ok, [bank_cents], bank_rank, bank_amount_ok, neighbours=4
+    )
+
+    assert (cents[award_pos] == bank_cents[bank_pos]).all(), "❌ زوج من كتلتين مختلفتين"
+    assert amount_ok[award_pos].all() and bank_amount_ok[bank_pos].all(), "❌ زوج بقيمة غير صالحة"
+    assert np.bincount(award_pos).max() <= 8, "❌ عدد المرشحين تجاوز حد الجوار"
+    assert (award_rank[award_pos] == bank_rank[bank_pos]).sum() > 0, "❌ الأسماء المتطابقة غير مرشحة"
+
+    print("✅ sorted_neighbourhood_pairs يحصر المرشحين في الكتلة")
+
+
+def test_record_linkage_match():
+    """اختبار Record Linkage: استرجاع أزواج مزروعة (مبلغ مختلف قليلاً)"""
+    from core.advanced_matcher import AdvancedMatcher
+
+    rng = np.random.default_rng(9)
+    first = ['محمد', 'علي', 'سالم', 'خالد', 'حمد', 'جاسم', 'فهد', 'ناصر']
+    n = 500
+    awards = pd.DataFrame({
+        'OwnerName_norm': [' '.join(rng.choice(first, 3)) for _ in range(n)],
+        'AwardAmount': rng.choice([2000.0, 5000.0, 10000.0], n),
+        'EntryDate': datetime(2024, 1, 1) + pd.to_timedelta(rng.integers(0, 90, n), unit='D'),
+    }, index=np.arange(n) + 100)
+    bank = pd.DataFrame({
+        'BankName_norm': awards['OwnerName_norm'].to_numpy(),
+        'TransferAmount': awards['AwardAmount'].to_numpy() - 5,
+        'TransferDate': awards['EntryDate'].to_numpy(),
+        'BankReference': [f'REF{i:05d}' for i in range(n)],
+    }).iloc[rng.permutation(n)].reset_index(drop=True)
+
+    matches = AdvancedMatcher().record_linkage_match(awards, bank, time_window_days=7)
+
+    assert len(matches) == n, "❌ لم تُسترجع كل الأزواج"
+    assert matches.index.equals(awards.index), "❌ فهرس الجوائز الأصلي مفقود"
+    assert (matches['OwnerName_norm'] == bank.set_index('BankReference').loc[
+        matches['BankReference'], 'BankName_norm'].to_numpy()).all(), "❌ زوج خاطئ"
+    assert (matches['DateDiff'] <= 7).all() and (matches['MatchType'] == 'RecordLinkage').all()
+
+    print("✅ record_linkage_match يسترجع الأزواج المزروعة")
+
+
+def test_match_result_builder():
+    """اختبار المجمّع العمودي: كتل متعددة + غير مطابق + take واحد"""
+    from core.match_results import MatchResultBuilder
+
+    awards, bank = make_sample_data(n_awards=6, n_bank=5, seed=1)
+    builder = MatchResultBuilder(len(awards))
+    builder.add([4, 1, 1], [0, 2, 3], MatchType='Exact', MatchScore=np.array([100, 100, 100]))
+    builder.add([3], [4], MatchType='Fuzzy', MatchScore=np.array([91.5]), Extra=['x'])
+    builder.add_unmatched(MatchType='No Match', MatchScore=0)
+
+    result = builder.build(
+        awards, bank,
+        bank_columns={'BankReference': (['BankReference'], ''), 'BankAmount': (['BankAmount'], np.nan)},
+        award_columns=['OwnerName', 'AwardAmount']
+    )
+
+    assert list(result.columns) == ['OwnerName', 'AwardAmount', 'BankReference', 'BankAmount',
+                                     'MatchType', 'MatchScore', 'Extra'], "❌ ترتيب الأعمدة غير صحيح"
+    assert len(result) == 7, "❌ عدد الصفوف غير صحيح"
+    assert list(result['BankReference']) == ['', 'REF00002', 'REF00003', '', 'REF00004', 'REF00000', ''], \
+        "❌ أعمدة البنك غير صحيحة"
+    assert list(result['OwnerName']) == list(awards['OwnerName'].iloc[[0, 1, 1, 2, 3, 4, 5]]), "❌ ترتيب الجوائز"
+    assert result['Extra'].isna().sum() == 6 and result['BankAmount'].isna().all()
+
+    print("✅ MatchResultBuilder يبني النتائج بعملية take واحدة")
+
+
+def make_analyzer_data(n_awards: int = 200, n_bank: int = 250, seed: int = 4):
+    """بيانات عشوائية بأعمدة CamelAwardsAnalyzer (مراجع + أسماء منسقة)"""
+    awards, bank = make_sample_data(n_awards=n_awards, n_bank=n_bank, seed=seed)
+    rng = np.random.default_rng(seed)
+    awards['OwnerName'] = awards['OwnerName_norm']
+    awards['Race'] = 'سباق 1'
+    awards['Season'] = '2023-2024'
+    awards['paymentreference'] = rng.choice([f'R{i}' for i in range(300)] + [np.nan], len(awards))
+    bank = bank.rename(columns={'TransferAmount': 'BankAmount', 'TransferDate': 'BankDate'})
+    bank['BankName'] = bank['BankName_norm']
+    bank['AwardReferenceLong'] = rng.choice([f'R{i}' for i in range(0, 300, 3)] + [np.nan], len(bank))
+    bank['AwardReference'] = rng.choice([f'R{i}' for i in range(300)] + [np.nan], len(bank))
+    return awards, bank
+
+
+def test_duckdb_backend():
+    """اختبار backend=duckdb: نفس نتيجة محرك pandas (Reference → IBAN → Fuzzy)"""
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+    from core.performance_optimizer import DUCKDB_AVAILABLE
+
+    if not DUCKDB_AVAILABLE:
+        print("⚠️ duckdb غير متوفر - تخطي الاختبار")
+        return
+
+    awards, bank = make_analyzer_data(n_awards=200, n_bank=250, seed=4)
+    # IBAN مشترك لبعض الجوائز (بتنسيق مختلف في البنك)
+    rng = np.random.default_rng(10)
+    ibans = [f'SA{k:02d}80000{k:015d}' for k in range(40)]
+    awards['IBAN'] = rng.choice(ibans + [None] * 40, len(awards))
+    bank['IBAN'] = [f'IBAN {iban[:4]} {iban[4:]}' if iban else None for iban in rng.choice(ibans + [None] * 20, len(bank))]
+
+    results = {}
+    for backend in ['pandas', 'duckdb']:
+        analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+        analyzer.awards_data, analyzer.bank_data = awards, bank
+        results[backend] = analyzer.match_with_bank(time_window_days=7, backend=backend)
+
+    def rows(df):
+        columns = ['OwnerName', 'AwardAmount', 'EntryDate', 'AwardRef', 'BankReference', 'BankAmount',
+                   'MatchType', 'MatchScore', 'StatusFlag', 'ReasonText']
+        frame = df[columns].astype(object).where(df[columns].notna(), None)
+        frame['MatchScore'] = df['MatchScore'].astype(float)
+        return sorted(map(tuple, frame.to_numpy().tolist()), key=repr)
+
+    pandas_rows, duck_rows = rows(results['pandas']), rows(results['duckdb'])
+    assert len(pandas_rows) == len(duck_rows), "❌ عدد الصفوف مختلف"
+    assert pandas_rows == duck_rows, "❌ نتائج duckdb تختلف عن pandas"
+
+    counts = results['duckdb']['MatchType'].value_counts()
+    for match_type in ['Reference-Exact', 'IBAN', 'Fuzzy', 'No Match']:
+        assert counts.get(match_type, 0) > 0, f"❌ لا توجد مطابقات {match_type}"
+    assert 'Exact' not in counts
+
+    print(f"✅ backend=duckdb = pandas: {dict(counts)}")
+
+
+def test_polars_matcher():
+    """اختبار مطابقة Polars الكسولة على أعمدة data_loader_v2"""
+    import datetime as dt
+    import polars as pl
+    from core.polars_matcher import match_awards_polars
+
+    awards = pl.DataFrame({
+        'EntryDate': [dt.date(2024, 1, 10)] * 4 + [dt.date(2024, 2, 1)],
+        'OwnerName': ['أ', 'ب', 'ج', 'د', 'هـ'],
+        'AwardAmount': [100.0, 250.5, 300.0, 75.0, 999.0],
+        'PaymentReference': ['X-1', None, 'nan', 'Q9', None],
+        'DelegatePaymentReference': [None, 'y2', None, None, None],
+    })
+    bank = pl.DataFrame({
+        'BankReference': ['x1', 'Y2', 'zz', 'Q9', 'ww'],
+        'BeneficiaryName': ['A', 'B', 'C', 'D', 'E'],
+        'TransferAmount': [100.0, 200.0, 300.0, 50.0, 999.0],
+        'TransferDate': [dt.date(2024, 1, 12), dt.date(2024, 1, 3), dt.date(2024, 1, 17),
+                         dt.date(2024, 1, 1), dt.date(2024, 2, 9)],
+    })
+
+    result = match_awards_polars(awards, bank, time_window_days=7)
+
+    assert result['OwnerName'].to_list() == ['أ', 'ب', 'ج', 'د', 'هـ'], "❌ ترتيب الجوائز تغيّر"
+    # Q9 خارج النافذة (9 أيام) فلا يطابق بالمرجع
+    assert result['MatchType'].to_list() == [
+        'Reference-Exact', 'Reference-Diff', 'Exact', 'No Match', 'No Match'
+    ]
+    assert result['BankReference'].to_list()[:3] == ['x1', 'Y2', 'zz']
+    assert result['ReasonText'][1].endswith('50.50')
+
+    print("✅ مطابقة Polars: مراجع المفوضين + join_asof ضمن النافذة فقط")
+
+
+def test_incremental_matching():
+    """اختبار المطابقة التدريجية: التشغيل الثاني يطابق الفرق فقط"""
+    import tempfile
+    from core.audit_logger import AuditLogger, DUCKDB_AVAILABLE
+    from core.camel_awards_analyzer import BANK_KEY_COLUMNS, CamelAwardsAnalyzer
+
+    if not DUCKDB_AVAILABLE:
+        print("⚠️ duckdb غير متوفر - تخطي الاختبار")
+        return
+
+    awards, bank = make_analyzer_data(n_awards=260, n_bank=300, seed=11)
+
+    def run(store, n_awards, n_bank):
+        analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+        analyzer.reconciliation_store = store
+        analyzer.awards_data, analyzer.bank_data = awards.iloc[:n_awards], bank.iloc[:n_bank]
+        return analyzer.match_with_bank(time_window_days=7, incremental=True)
+
+    # مخزن المطابقة في مجلد مؤقت (لا ملفات في outputs/)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AuditLogger(log_dir=tmp)
+        first = run(store, 200, 180)
+        second = run(store, 260, 300)
+        third = run(store, 260, 300)
+
+    clean_awards = awards['AwardAmount'].notna() & awards['EntryDate'].notna()
+    assert second['AwardKey'].nunique() == clean_awards.sum(), "❌ عدد الجوائز في النتائج"
+
+    # المطابقات السابقة لا تتغير (الجائزة قد تظهر في أكثر من صف عند تعدد صفوف المرجع)
+    pair_columns = ['AwardKey', 'BankKey', 'MatchType']
+    matched_first = first[first['MatchType'] != 'No Match']
+    kept = second[second['AwardKey'].isin(matched_first['AwardKey'])]
+    assert kept[pair_columns].values.tolist() == matched_first[pair_columns].values.tolist(), "❌ تغيّر زوج محفوظ"
+
+    # الجوائز القديمة غير المطابقة تُطابق مع صفوف البنك الجديدة فقط
+    old_bank_keys = set(CamelAwardsAnalyzer._row_keys(bank.iloc[:180], BANK_KEY_COLUMNS))
+    pending = first.loc[first['MatchType'] == 'No Match', 'AwardKey']
+    late = second[second['AwardKey'].isin(pending) & (second['MatchType'] != 'No Match')]
+    assert len(late) > 0, "❌ لم تُطابق أي جائزة معلقة مع البنك الجديد"
+    assert not late['BankKey'].isin(old_bank_keys).any(), "❌ إعادة مطابقة مع صفوف بنك قديمة"
+
+    # تشغيل ثالث بدون بيانات جديدة: نفس النتيجة
+    assert (third['MatchType'] == second['MatchType']).all()
+    assert (third['BankKey'] == second['BankKey']).all()
+
+    print(f"✅ مطابقة تدريجية: {len(matched_first)} زوج محفوظ + {len(late)} مطابقة متأخرة مع البنك الجديد")
+
+
+def test_incremental_advanced_matching():
+    """اختبار المطابقة التدريجية بالمسار الافتراضي (AdvancedMatcher): نفس نتيجة التشغيل العادي"""
+    import tempfile
+    from core.advanced_matcher import AdvancedMatcher
+    from core.audit_logger import AuditLogger, DUCKDB_AVAILABLE
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+
+    if not DUCKDB_AVAILABLE:
+        print("⚠️ duckdb غير متوفر - تخطي الاختبار")
+        return
+
+    awards, bank = make_analyzer_data(n_awards=260, n_bank=300, seed=11)
+
+    def run(store=None, **options):
+        # use_advanced_features=True بدون Audit Logger (لا ملفات في outputs/)
+        analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+        analyzer.use_advanced_features = True
+        analyzer.matcher = AdvancedMatcher(fuzzy_threshold=90)
+        analyzer.reconciliation_store = store
+        analyzer.awards_data, analyzer.bank_data = awards, bank
+        return analyzer.match_with_bank(time_window_days=7, incremental=store is not None, **options)
+
+    def rows(result):
+        # الدرجات المحفوظة في audit.duckdb من نوع DOUBLE
+        columns = ['OwnerName', 'AwardAmount', 'EntryDate', 'BankReference', 'MatchType', 'StatusFlag']
+        result = result.assign(MatchScore=result['MatchScore'].astype(float))
+        return sorted(result[columns + ['MatchScore']].astype(str).values.tolist())
+
+    for options in ({}, {'use_record_linkage': True}):
+        normal = run(**options)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = AuditLogger(log_dir=tmp)
+            first = run(store, **options)
+            second = run(store, **options)
+
+        assert len(first) == len(normal) == len(awards), "❌ التشغيل التدريجي أسقط جوائز"
+        assert rows(first) == rows(normal), f"❌ التشغيل التدريجي الأول يختلف عن العادي ({options})"
+        # التشغيل الثاني يُعيد الأزواج المحفوظة بدون مطابقة
+        assert rows(second) == rows(normal), f"❌ الأزواج المحفوظة تختلف ({options})"
+        # خيارات الطبقات تصل إلى المطابقة التدريجية
+        assert ('RecordLinkage' in set(first['MatchType'])) == bool(options)
+
+    print(f"✅ مطابقة تدريجية (AdvancedMatcher): {normal['MatchType'].value_counts().to_dict()}")
+
+
+def test_bank_stream_matching():
+    """اختبار المطابقة المتدفقة: نفس نتيجة التحميل الكامل مهما كان حجم الدفعة"""
+    import io
+    import tempfile
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+
+    awards, bank = make_analyzer_data(n_awards=300, n_bank=600, seed=5)
+    statement = pd.DataFrame({
+        'Beneficiary Name': bank['BankName'],
+        'Amount': bank['BankAmount'],
+        'Payment Date': bank['BankDate'],
+        'Bank Ref': bank['BankReference'],
+        'Award Ref': bank['AwardReference'],
+        'Award Ref 10 Digits': bank['AwardReferenceLong'],
+    })
+    columns = ['OwnerName', 'AwardAmount', 'BankReference', 'MatchType', 'MatchScore']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = str(Path(tmp) / 'bank.csv')
+        xlsx_path = str(Path(tmp) / 'bank.xlsx')
+        statement.to_csv(csv_path, index=False)
+        with pd.ExcelWriter(xlsx_path) as writer:
+            # صف عنوان قبل الترويسة (اكتشاف صف العناوين)
+            pd.DataFrame([['كشف حساب']]).to_excel(writer, header=False, index=False)
+            statement.to_excel(writer, startrow=2, index=False)
+
+        for path in [csv_path, xlsx_path]:
+            analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+            analyzer.awards_data = awards
+            upload = io.BytesIO(Path(path).read_bytes())
+            upload.name = path
+            analyzer.load_bank_statement(upload)
+            expected = analyzer._basic_matching(7)[columns].fillna('').values.tolist()
+
+            for chunk_size in [97, 10_000]:
+                streamed = analyzer.match_bank_stream(path, time_window_days=7, chunk_size=chunk_size)
+                assert streamed[columns].fillna('').values.tolist() == expected, \
+                    f"❌ {Path(path).suffix} chunk_size={chunk_size} يختلف عن التحميل الكامل"
+
+    print("✅ المطابقة المتدفقة (csv + xlsx) تطابق التحميل الكامل لكل أحجام الدفعات")
+
+
+def test_text_normalizer():
+    """اختبار التطبيع المشترك: القيم الفريدة فقط + نفس نتيجة التطبيع صفاً بصف"""
+    from core.text_normalizer import normalize_series, normalize_text
+
+    values = pd.Series(['  أحمد_ علي  ', 'فاطمة', None, np.nan, 12, '', 'MOHD\tAli', 'مصطفى إبراهيم', 'آمنة'] * 2)
+    normalized = normalize_series(values)
+
+    assert normalized.tolist() == [normalize_text(value) for value in values]
+    assert normalized.tolist()[:9] == ['احمد علي', 'فاطمه', '', '', '', '', 'mohd ali', 'مصطفي ابراهيم', 'امنه']
+    assert normalize_text(12, coerce=True) == '12'
+    assert normalize_text('أ_ب', fold_arabic=False, underscores=False) == 'أ_ب'
+    assert normalize_series(values, missing=None).isna().sum() == 4
+
+    print("✅ التطبيع المشترك يطابق التطبيع صفاً بصف")
+
+
+def test_name_index():
+    """اختبار NameIndex: نفس أعلى top_k للبحث الشامل + مطابقة بالاسم مع مبلغ خاطئ"""
+    from core.advanced_matcher import AdvancedMatcher
+    from core.name_index import NameIndex
+
+    rng = np.random.default_rng(15)
+    first = ['محمد', 'علي', 'سالم', 'خالد', 'حمد', 'جاسم', 'فهد', 'ناصر', 'سعيد', 'راشد']
+    bank_names = [' '.join(rng.choice(first, 3)) for _ in range(400)] + ['', None]
+    query_names = [name[:-1] for name in bank_names[:60]] + ['zzz', '']
+
+    index = NameIndex(bank_names)
+    query_pos, bank_pos, similarity = index.query(query_names, top_k=5)
+
+    # البحث الشامل: تشابه جيب التمام لكل الأزواج على نفس المتجهات
+    dense = (index.vectorizer.transform(query_names) @ index.matrix.T).toarray()
+    for q in range(60):
+        expected = np.sort(dense[q][dense[q] > 0])[::-1][:5]
+        got = similarity[query_pos == q]
+        names_found = set(np.asarray(bank_names, dtype=object)[bank_pos[query_pos == q]])
+        assert np.allclose(np.sort(np.unique(got))[::-1], np.unique(expected)[::-1]), "❌ أعلى top_k مختلف"
+        assert bank_names[q] in names_found, "❌ الاسم الأصلي غير مسترجع"
+    assert not np.isin(query_pos, [60, 61]).any() and not np.isin(bank_pos, [400, 401]).any()
+
+    # مبالغ مُدخلة خطأً: لا مطابقة حتمية/ضبابية لكن الاسم أولاً يسترجعها
+    n = 300
+    awards = pd.DataFrame({
+        'OwnerName_norm': [' '.join(rng.choice(first, 3)) + f' {i}' for i in range(n)],
+        'AwardAmount': rng.choice([2000.0, 5000.0], n),
+        'EntryDate': datetime(2024, 1, 1) + pd.to_timedelta(rng.integers(0, 90, n), unit='D'),
+    }, index=np.arange(n) + 100)
+    bank = pd.DataFrame({
+        'BankName_norm': awards['OwnerName_norm'].to_numpy(),
+        'TransferAmount': awards['AwardAmount'].to_numpy() * 10,
+        'TransferDate': awards['EntryDate'].to_numpy() + pd.Timedelta(days=2),
+        'BankReference': [f'REF{i:05d}' for i in range(n)],
+    }).iloc[rng.permutation(n)].reset_index(drop=True)
+
+    matcher = AdvancedMatcher()
+    matched, unmatched = matcher.match_all_layers(awards, bank, time_window_days=7)
+    assert len(matched) == 0 and len(unmatched) == n
+
+    matched, unmatched = matcher.match_all_layers(awards, bank, time_window_days=7, use_name_first=True)
+    assert len(matched) == n and len(unmatched) == 0, "❌ لم تُسترجع كل الأزواج بالاسم"
+    assert (matched['MatchType'] == 'NameFirst').all() and (matched['MatchScore'] == 100).all()
+    assert (matched['OwnerName_norm'] == bank.set_index('BankReference').loc[
+        matched['BankReference'], 'BankName_norm'].to_numpy()).all(), "❌ زوج خاطئ"
+    assert np.allclose(matched['AmountDiff'], matched['AwardAmount'] * 9)
+
+    # عبر المحلل (اختياري): نفس المطابقات ومحسوبة في الإحصائيات
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+    analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+    analyzer.use_advanced_features, analyzer.matcher = True, matcher
+    analyzer.awards_data, analyzer.bank_data = awards, bank
+    for use_name_first, expected in [(False, 0), (True, n)]:
+        result = analyzer.match_with_bank(time_window_days=7, use_name_first=use_name_first)
+        assert analyzer.statistics['name_first_matches'] == (result['MatchType'] == 'NameFirst').sum() == expected
+        assert analyzer.statistics['unmatched_awards'] == n - expected
+
+    print("✅ NameIndex يسترجع أقرب الأسماء والمطابقة بالاسم أولاً تتجاوز المبلغ الخاطئ")
+
+
+def test_similarity_cache():
+    """اختبار ذاكرة التشابه الدائمة: نفس النتائج + إعادة التشغيل من الذاكرة + الإخلاء"""
+    import tempfile
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+    from core.similarity_cache import DUCKDB_AVAILABLE, SimilarityCache
+
+    if not DUCKDB_AVAILABLE:
+        print("⚠️ duckdb غير متوفر - تخطي الاختبار")
+        return
+
+    # الذاكرة في مجلد مؤقت يُحذف مع ملف duckdb بعد الاختبار (كل عملية تفتح اتصالها وتغلقه)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SimilarityCache(db_file=str(Path(tmp) / "name_similarity.duckdb"))
+
+        awards, bank = make_sample_data(n_awards=150, n_bank=200, seed=11)
+        index = BankWindowIndex(bank['TransferAmount'], bank['TransferDate'])
+        cents, amount_ok = amounts_to_cents(awards['AwardAmount'])
+        seconds, date_ok = dates_to_seconds(awards['EntryDate'])
+        lo, hi = index.day_window(cents, seconds, amount_ok & date_ok, 7)
+        args = (index, lo, hi, awards['OwnerName_norm'].to_numpy(), bank['BankName_norm'].to_numpy())
+
+        expected = fuzzy_best_in_window(*args, score_cutoff=80)
+        cold = fuzzy_best_in_window(*args, score_cutoff=80, cache=cache)
+        misses = cache.misses
+        warm = fuzzy_best_in_window(*args, score_cutoff=80, cache=cache)
+
+        for result in (cold, warm):
+            assert (result[0] == expected[0]).all() and np.allclose(result[1], expected[1]), "❌ اختلاف عن cdist"
+        assert misses > 0 and cache.misses == misses and cache.hits == misses, "❌ التشغيل الثاني لم يُقرأ من الذاكرة"
+        assert len(cache) == misses
+
+        # المطابقة الأساسية بالذاكرة = بدونها
+        awards, bank = make_analyzer_data(n_awards=200, n_bank=250, seed=6)
+        results = []
+        for use_cache in (False, True):
+            analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+            analyzer.similarity_cache = cache if use_cache else None
+            results.append(analyzer._basic_matching(7, awards_df=awards, bank_df=bank))
+        pd.testing.assert_frame_equal(results[0], results[1])
+
+        # الإخلاء: الأقدم استخداماً أولاً
+        before = len(cache)
+        assert cache.evict(max_entries=10) == before - 10 and len(cache) == 10, "❌ لم يُطبق حد الحجم"
+
+    print(f"✅ ذاكرة التشابه: {misses} زوج محسوب مرة واحدة ثم من الذاكرة")
+
+
+def test_transliteration_matching():
+    """اختبار هيكل الاسم: ربط الأسماء العربية بأسماء البنك اللاتينية"""
+    from core.advanced_matcher import AdvancedMatcher
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+    from core.transliteration import name_skeleton
+
+    pairs = [
+        ('محمد بن راشد آل مكتوم', 'Mohammed Bin Rashid Al Maktoum'),
+        ('عبدالله آل ثاني', 'Abdullah Al-Thani'),
+        ('فاطمة خالد', 'Fatima Khalid'),
+        ('يوسف القحطاني', 'Yousef Al Qahtani'),
+        ('جاسم حمد المري', 'Jassim Hamad Al-Marri'),
+        ('عبد الرحمن الكواري', 'Abdulrahman Al Kuwari'),
+        ('خليفة غانم', 'Khalifa Ghanem'),
+        ('ناصر العطية', 'Nasser Al-Attiyah'),
+    ]
+    for arabic, latin in pairs:
+        assert name_skeleton(arabic) == name_skeleton(latin), f"❌ هيكل مختلف: {arabic} / {latin}"
+    assert name_skeleton(None) == '' and name_skeleton('محمد') != name_skeleton('Khalid')
+
+    n = len(pairs)
+    start = datetime(2024, 3, 1)
+    awards = pd.DataFrame({
+        'OwnerName': [arabic for arabic, _ in pairs],
+        'Race': 'سباق 1',
+        'Season': '2023-2024',
+        'AwardAmount': 1000.0 * (np.arange(n) % 3 + 1),
+        'EntryDate': [start + timedelta(days=3 * i) for i in range(n)],
+    })
+    awards['OwnerName_norm'] = awards['OwnerName']
+    order = np.random.default_rng(17).permutation(n)
+    bank = pd.DataFrame({
+        'BankName': [pairs[i][1] for i in order],
+        'BankAmount': awards['AwardAmount'].to_numpy()[order],
+        'BankDate': awards['EntryDate'].to_numpy()[order] + pd.Timedelta(days=1),
+        'BankReference': [f'REF{i:03d}' for i in range(n)],
+    })
+    bank['BankName_norm'] = bank['BankName'].str.lower()
+
+    analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+    plain = analyzer._basic_matching(7, awards_df=awards, bank_df=bank)
+    assert (plain['MatchType'] == 'No Match').all()
+
+    matched = analyzer._basic_matching(7, awards_df=awards, bank_df=bank, use_transliteration=True)
+    assert (matched['MatchType'] == 'Transliteration').all(), "❌ لم تُطابق كل الأسماء عبر الهيكل"
+    expected = dict(pairs)
+    assert (matched['BankName'] == matched['OwnerName'].map(expected)).all(), "❌ زوج خاطئ"
+
+    # AdvancedMatcher: المبلغ غير مشروط (مُدخل خطأً)
+    bank['TransferAmount'] = bank['BankAmount'] + 50
+    bank['TransferDate'] = bank['BankDate']
+    result = AdvancedMatcher().transliteration_match(awards, bank, time_window_days=7)
+    assert len(result) == n and (result['BeneficiaryName'] == result['OwnerName'].map(expected)).all()
+    assert (result['AmountDiff'] == 50).all()
+
+    print("✅ هيكل الاسم يربط الأسماء العربية باللاتينية")
+
+
+def test_split_payment_matching():
+    """اختبار الدفعات المجزأة: مجموع جزئي محدود مقابل البحث الشامل"""
+    from itertools import combinations
+    from core.advanced_matcher import AdvancedMatcher
+    from core.split_payments import subset_sum
+
+    # Meet-in-the-Middle == البحث الشامل (أقل حجم ممكن)
+    rng = np.random.default_rng(19)
+    for _ in range(200):
+        cents = rng.integers(1, 40, size=rng.integers(2, 12)) * 500
+        target = int(rng.integers(2, 80) * 500)
+        found = subset_sum(cents, target, max_parts=3)
+        expected = []
+        for size in (2, 3):
+            expected = [c for c in combinations(range(len(cents)), size) if cents[list(c)].sum() == target]
+            if expected:
+                break
+        assert sorted(map(tuple, np.sort(found, axis=1).tolist())) == sorted(expected), "❌ نتيجة مختلفة عن البحث الشامل"
+
+    start = datetime(2024, 4, 1)
+    awards = pd.DataFrame({
+        'OwnerName_norm': ['سالم', 'راشد', 'حمد', 'ناصر', 'خالد'],
+        'AwardAmount': [10000.0, 15000.0, 8000.0, 7000.0, 5000.0],
+        'EntryDate': [start, start, start + timedelta(days=10), start, start],
+    })
+    bank = pd.DataFrame({
+        'BankName_norm': ['سالم', 'سالم', 'سالم', 'راشد', 'راشد', 'راشد', 'حمد', 'حمد',
+                          'ناصر', 'ناصر', 'علي', 'خالد'],
+        'TransferAmount': [4000.0, 6000.0, 3000.0, 5000.0, 5000.0, 5000.0, 4000.0, 4000.0,
+                           2500.0, 3000.0, 5000.0, 5000.0],
+        'TransferDate': [start + timedelta(days=d) for d in (1, 2, 2, 0, 3, 5, 11, 30, 1, 2, 1, 1)],
+        'BankReference': [f'SPL{i:02d}' for i in range(12)],
+    })
+
+    result = AdvancedMatcher().split_payment_match(awards, bank, time_window_days=7)
+    groups = result.groupby(level=0)['BankReference'].apply(list).to_dict()
+    assert groups == {0: ['SPL00', 'SPL01'], 1: ['SPL03', 'SPL04', 'SPL05']}, f"❌ مجموعات خاطئة: {groups}"
+    assert (result['MatchType'] == 'SplitPayment').all()
+    assert result['SplitParts'].tolist() == [2, 2, 3, 3, 3]
+    assert (result.groupby(level=0)['TransferAmount'].sum() == awards['AwardAmount'].iloc[[0, 1]]).all()
+    assert (result['SplitTotal'] == result['AwardAmount']).all()
+
+    # التحويل الواحد لا يُستخدم لجائزتين
+    twice = pd.concat([awards.iloc[[0]], awards.iloc[[0]]], ignore_index=True)
+    result = AdvancedMatcher().split_payment_match(twice, bank, time_window_days=7)
+    assert result.index.nunique() == 1 and result['BankReference'].is_unique
+
+    # ضمن الطبقات: المبلغ المطابق لتحويل واحد يبقى حتمياً
+    matched, unmatched = AdvancedMatcher().match_all_layers(awards, bank, 7, use_split_payments=True)
+    assert sorted(matched.loc[matched['MatchType'] == 'SplitPayment', 'OwnerName_norm'].unique()) == ['راشد', 'سالم']
+    assert (matched.loc[matched['OwnerName_norm'] == 'خالد', 'MatchType'] == 'Exact').all()
+    assert sorted(unmatched['OwnerName_norm']) == ['حمد', 'ناصر']
+
+    # عبر المحلل (اختياري): الجائزة المجزأة تُحسب مرة واحدة في الإحصائيات (لا مرة لكل تحويل)
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+    analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+    analyzer.use_advanced_features, analyzer.matcher = True, AdvancedMatcher()
+    analyzer.awards_data, analyzer.bank_data = awards, bank
+    for use_split_payments, expected in [(False, (0, 1, 4)), (True, (2, 1, 2))]:
+        result = analyzer.match_with_bank(time_window_days=7, use_split_payments=use_split_payments)
+        stats = analyzer.statistics
+        assert (stats['split_payment_matches'], stats['exact_matches'], stats['unmatched_awards']) == expected
+    assert (result['MatchType'] == 'SplitPayment').sum() == 5
+
+    print("✅ الدفعات المجزأة تُطابق بمجموع جزئي محدود")
+
+
+def test_one_to_one_assignment():
+    """اختبار الإسناد واحد-لواحد: التحويل الواحد لا يُنسب لأكثر من جائزة"""
+    from itertools import combinations
+    from core.advanced_matcher import AdvancedMatcher
+    from core.assignment import one_to_one_assignment
+
+    # الحل == البحث الشامل: أكبر عدد مطابقات ثم أقل مجموع تكلفة
+    rng = np.random.default_rng(20)
+    for _ in range(200):
+        n_a, n_b = rng.integers(1, 5, size=2)
+        edges = [(a, b) for a in range(n_a) for b in range(n_b) if rng.random() < 0.5]
+        if not edges:
+            continue
+        award_pos = np.array([a for a, _ in edges])
+        bank_pos = np.array([b for _, b in edges])
+        cost = rng.integers(0, 10, len(edges)).astype(float)
+        chosen = one_to_one_assignment(award_pos, bank_pos, cost)
+        assert len(set(award_pos[chosen])) == len(chosen) == len(set(bank_pos[chosen]))
+
+        best = max(
+            (size, -cost[list(subset)].sum())
+            for size in range(len(edges) + 1)
+            for subset in combinations(range(len(edges)), size)
+            if len(set(award_pos[list(subset)])) == size == len(set(bank_pos[list(subset)]))
+        )
+        assert (len(chosen), -cost[chosen].sum()) == best, "❌ إسناد غير أمثل"
+
+    # جائزتان بنفس المبلغ والتاريخ وتحويل واحد
+    start = datetime(2024, 5, 1)
+    awards = pd.DataFrame({
+        'OwnerName_norm': ['سالم', 'راشد', 'حمد'],
+        'AwardAmount': [5000.0, 5000.0, 3000.0],
+        'EntryDate': [start, start, start],
+    })
+    bank = pd.DataFrame({
+        'BankName_norm': ['سالم', 'راشد', 'حمد'],
+        'TransferAmount': [5000.0, 5000.0, 3000.0],
+        'TransferDate': [start, start + timedelta(days=10), start + timedelta(days=1)],
+        'BankReference': ['ONE01', 'ONE02', 'ONE03'],
+    })
+    plain = AdvancedMatcher().exact_match(awards, bank, time_window_days=7)
+    assert plain['BankReference'].tolist() == ['ONE01', 'ONE01', 'ONE03'], "❌ السلوك الافتراضي تغير"
+
+    strict = AdvancedMatcher(one_to_one=True).exact_match(awards, bank, time_window_days=7)
+    assert strict['BankReference'].is_unique and len(strict) == 2
+    assert strict['BankIndex'].tolist() == [0, 2]
+
+    # الحل الأمثل لا الجشع: الجائزة 0 تتنازل عن أقرب تحويل للجائزة 1
+    awards['EntryDate'] = [start, start + timedelta(days=4), start]
+    bank['TransferDate'] = [start + timedelta(days=2), start - timedelta(days=2), start]
+    strict = AdvancedMatcher(one_to_one=True).exact_match(awards, bank, time_window_days=3)
+    assert dict(zip(strict.index, strict['BankReference'])) == {0: 'ONE02', 1: 'ONE01', 2: 'ONE03'}
+
+    # عبر الطبقات: التحويل المستخدم في الطبقة الحتمية لا يُعاد في الضبابية
+    awards = pd.DataFrame({
+        'OwnerName_norm': ['سالم', 'سالم'],
+        'AwardAmount': [5000.0, 5000.0],
+        'EntryDate': [start, start],
+    })
+    bank = bank.iloc[[0]]
+    matched, unmatched = AdvancedMatcher(one_to_one=True).match_all_layers(
+        awards, bank, 7, use_record_linkage=True, use_name_first=True
+    )
+    assert len(matched) == 1 and len(unmatched) == 1
+    matched, unmatched = AdvancedMatcher().match_all_layers(awards, bank, 7)
+    assert len(matched) == 2 and len(unmatched) == 0
+
+    # عبر المحلل (اختياري): CamelAwardsAnalyzer(one_to_one=True) - بدون Audit Logger
+    import core.camel_awards_analyzer as analyzer_module
+    original_logger = analyzer_module.AUDIT_LOGGER_AVAILABLE
+    analyzer_module.AUDIT_LOGGER_AVAILABLE = False
+    try:
+        for one_to_one, expected_unmatched in [(False, 0), (True, 1)]:
+            analyzer = analyzer_module.CamelAwardsAnalyzer(use_advanced_features=True, one_to_one=one_to_one)
+            analyzer.awards_data, analyzer.bank_data = awards, bank
+            result = analyzer.match_with_bank(time_window_days=7)
+            assert analyzer.matcher.one_to_one == one_to_one
+            assert analyzer.statistics['unmatched_awards'] == expected_unmatched
+            assert result.loc[result['MatchType'] != 'No Match', 'BankReference'].tolist() == ['ONE01'] * (2 - expected_unmatched)
+    finally:
+        analyzer_module.AUDIT_LOGGER_AVAILABLE = original_logger
+
+    print("✅ الإسناد واحد-لواحد يمنع تكرار التحويل")
+
+
+def test_iban_matching():
+    """اختبار طبقة IBAN: hash-join + المبلغ والنافذة، ونفس النتيجة في المطابقة المتدفقة"""
+    import io
+    import tempfile
+    from core.camel_awards_analyzer import CamelAwardsAnalyzer
+    from core.match_engine import iban_keys
+
+    assert iban_keys(['qa58 dohb 0000 1234', 'IBAN: QA58-DOHB-0000-1234', 'xx', None]).tolist()[:2] == ['QA58DOHB00001234'] * 2
+    assert iban_keys(['xx', None, 'QA58']).isna().all()
+
+    awards, bank = make_analyzer_data(n_awards=300, n_bank=600, seed=21)
+    rng = np.random.default_rng(21)
+    pool = np.array([f'QA{i % 90 + 10}DOHB{i:012d}' for i in range(40)], dtype=object)
+    awards['IBAN'] = np.where(rng.random(len(awards)) < 0.7, rng.choice(pool, len(awards)), None)
+    # صيغة مختلفة في كشف البنك (مسافات + أحرف صغيرة)
+    bank_ibans = rng.choice(pool, len(bank))
+    bank['IBAN'] = [' '.join([iban[i:i + 4] for i in range(0, len(iban), 4)]).lower() for iban in bank_ibans]
+    # اسم مختلف تماماً: لا يُطابق إلا بـ IBAN
+    target = np.flatnonzero(bank['BankAmount'].notna() & bank['BankDate'].notna())[0]
+    awards.loc[awards.index[0], ['paymentreference', 'OwnerName', 'OwnerName_norm', 'IBAN']] = [np.nan, 'zzz', 'zzz', bank_ibans[target]]
+    awards.loc[awards.index[0], ['AwardAmount', 'EntryDate']] = [bank['BankAmount'].iloc[target], bank['BankDate'].iloc[target]]
+
+    analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+    analyzer.awards_data, analyzer.bank_data = awards, bank
+    result = analyzer._basic_matching(7)
+    iban_rows = result[result['MatchType'] == 'IBAN']
+    assert len(iban_rows) > 0 and (result.loc[result['OwnerName'] == 'zzz', 'MatchType'] == 'IBAN').all()
+
+    # القواعد: نفس IBAN + نفس المبلغ + ضمن النافذة
+    by_ref = bank.set_index('BankReference')
+    matched_bank = by_ref.loc[iban_rows['BankReference']]
+    award_side = iban_rows[['OwnerName', 'AwardAmount', 'EntryDate']].assign(
+        BankIBAN=iban_keys(matched_bank['IBAN']).to_numpy(), Row=np.arange(len(iban_rows))
+    ).merge(awards[['OwnerName', 'AwardAmount', 'EntryDate', 'IBAN']], on=['OwnerName', 'AwardAmount', 'EntryDate'])
+    same_iban = award_side['BankIBAN'].to_numpy() == iban_keys(award_side['IBAN']).to_numpy()
+    assert award_side.loc[same_iban, 'Row'].nunique() == len(iban_rows), "❌ IBAN مختلف"
+    assert np.allclose(matched_bank['BankAmount'].to_numpy(), iban_rows['AwardAmount'].to_numpy())
+    assert result.loc[result['OwnerName'] == 'zzz', 'BankReference'].tolist() == [bank['BankReference'].iloc[target]]
+    assert ((iban_rows['EntryDate'] - iban_rows['BankDate']).abs().dt.days <= 8).all()
+
+    # المطابقة المتدفقة: نفس النتيجة لكل أحجام الدفعات
+    statement = pd.DataFrame({
+        'Beneficiary Name': bank['BankName'],
+        'Amount': bank['BankAmount'],
+        'Payment Date': bank['BankDate'],
+        'Bank Ref': bank['BankReference'],
+        'Award Ref': bank['AwardReference'],
+        'Award Ref 10 Digits': bank['AwardReferenceLong'],
+        'IBAN Number': bank['IBAN'],
+    })
+    columns = ['OwnerName', 'AwardAmount', 'BankReference', 'MatchType', 'MatchScore']
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = str(Path(tmp) / 'bank.csv')
+        statement.to_csv(csv_path, index=False)
+        analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+        analyzer.awards_data = awards
+        upload = io.BytesIO(Path(csv_path).read_bytes())
+        upload.name = csv_path
+        analyzer.load_bank_statement(upload)
+        expected = analyzer._basic_matching(7)[columns].fillna('').values.tolist()
+        assert sum(row[3] == 'IBAN' for row in expected) == len(iban_rows)
+
+        for chunk_size in [97, 10_000]:
+            streamed = analyzer.match_bank_stream(csv_path, time_window_days=7, chunk_size=chunk_size)
+            assert streamed[columns].fillna('').values.tolist() == expected, \
+                f"❌ chunk_size={chunk_size} يختلف عن التحميل الكامل"
+
+    # AdvancedMatcher: طبقة IBAN قبل Exact = أقرب تحويل بنفس IBAN والمبلغ ضمن النافذة
+    from core.advanced_matcher import AdvancedMatcher
+    from core.camel_awards_analyzer import MATCH_TYPE_STATISTICS
+    from core.match_engine import day_diff
+    award_keys, bank_keys = iban_keys(awards['IBAN']).to_numpy(), iban_keys(bank['IBAN']).to_numpy()
+    award_seconds = awards['EntryDate'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    bank_seconds = bank['BankDate'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+    expected_iban = {}
+    for pos in range(len(awards)):
+        if pd.isna(award_keys[pos]) or pd.isna(awards['AwardAmount'].iloc[pos]) or pd.isna(awards['EntryDate'].iloc[pos]):
+            continue
+        diffs = day_diff(award_seconds[pos], bank_seconds)
+        candidates = np.flatnonzero(
+            (bank_keys == award_keys[pos]) & (bank['BankAmount'].to_numpy() == awards['AwardAmount'].iloc[pos])
+            & bank['BankDate'].notna().to_numpy() & (diffs <= 7)
+        )
+        if len(candidates) > 0:
+            expected_iban[awards.index[pos]] = bank['BankReference'].iloc[candidates[np.argmin(diffs[candidates])]]
+
+    layered, _ = AdvancedMatcher().match_all_layers(awards, bank, 7)
+    layer_rows = layered[layered['MatchType'] == 'IBAN']
+    direct = AdvancedMatcher().iban_match(awards, bank, 7)
+    assert dict(zip(direct.index, direct['BankReference'])) == expected_iban, "❌ iban_match يختلف عن المرجع"
+    assert len(layer_rows) == len(expected_iban) > 0 and 'zzz' in set(layer_rows['OwnerName'])
+    paired = AdvancedMatcher(one_to_one=True).iban_match(awards, bank, 7)
+    assert paired['BankReference'].is_unique and len(paired) > 0
+
+    # الإحصائيات تحسب كل أنواع المطابقة (المسار المتقدم والأساسي)
+    analyzer = CamelAwardsAnalyzer(use_advanced_features=False)
+    analyzer.awards_data, analyzer.bank_data = awards, bank
+    for use_advanced in (True, False):
+        analyzer.use_advanced_features = use_advanced
+        analyzer.matcher = AdvancedMatcher(fuzzy_threshold=90) if use_advanced else None
+        merged = analyzer.match_with_bank(time_window_days=7)
+        stats = analyzer.statistics
+        counts = merged['MatchType'].value_counts()
+        assert stats['iban_matches'] == counts.get('IBAN', 0) > 0, "❌ مطابقات IBAN غير محسوبة"
+        assert stats['exact_matches'] == counts.filter(like='Exact').sum() + counts.get('Reference', 0) + counts.get('Reference-Diff', 0)
+        assert sum(stats[key] for key in MATCH_TYPE_STATISTICS) + stats['unmatched_awards'] == len(merged)
+
+    print(f"✅ طبقة IBAN: {len(iban_rows)} مطابقة قبل التقييم الضبابي ({len(layer_rows)} في AdvancedMatcher)")
+
+
+if __name__ == "__main__":
+    test_bank_window_index()
+    test_exact_match_columns()
+    test_fuzzy_best_in_window()
+    test_sharded_fuzzy_match()
+    test_sorted_neighbourhood_pairs()
+    test_record_linkage_match()
+    test_match_result_builder()
+    test_duckdb_backend()
+    test_polars_matcher()
+    test_incremental_matching()
+    test_incremental_advanced_matching()
+    test_bank_stream_matching()
+    test_text_normalizer()
+    test_name_index()
+    test_similarity_cache()
+    test_transliteration_matching()
+    test_split_payment_matching()
+    test_one_to_one_assignment()
+    test_iban_matching()